@@ -0,0 +1,3 @@
+"""
+Performance benchmark package (python -m bench.run)
+"""
@@ -0,0 +1,54 @@
+"""
+Fournisseurs externes simulés pour le banc de performance
+- FakeRekognition : recherche de visages déterministe sur les photos seedées (latence réseau simulée, bloquante
+  comme l'appel boto3 réel, donc exécutée dans le pool io)
+- FakeLlmChat : remplace LlmChat pour le chatbot (latence asynchrone simulée) ; le module emergentintegrations
+  étant importé à la demande, install_fake_llm() l'enregistre dans sys.modules
+"""
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import time
+import types
+
+FAKE_FACE_LATENCY = float(os.environ.get("BENCH_FACE_LATENCY", 0.05))
+FAKE_LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY", 0.2))
+MATCHES_PER_SEARCH = 20
+
+
+class FakeRekognition:
+    def __init__(self, faces: dict):
+        self.faces = faces
+
+    def search_faces_by_image(self, CollectionId, Image, MaxFaces=100, FaceMatchThreshold=70):
+        time.sleep(FAKE_FACE_LATENCY)
+        photo_ids = self.faces.get(CollectionId, [])
+        seed = int(hashlib.sha256(Image["Bytes"]).hexdigest()[:8], 16)
+        matches = random.Random(seed).sample(photo_ids, min(MATCHES_PER_SEARCH, MaxFaces, len(photo_ids)))
+        return {"FaceMatches": [{"Similarity": 99.0, "Face": {"ExternalImageId": photo_id}} for photo_id in matches]}
+
+
+class FakeLlmChat:
+    def __init__(self, api_key=None, session_id=None, system_message=None):
+        self.session_id = session_id
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, message):
+        await asyncio.sleep(FAKE_LLM_LATENCY)
+        return "Nos formules mariage vont de 1500€ à 4500€. Souhaitez-vous un devis personnalisé ?"
+
+
+class FakeUserMessage:
+    def __init__(self, text):
+        self.text = text
+
+
+def install_fake_llm():
+    module = types.ModuleType("emergentintegrations.llm.chat")
+    module.LlmChat = FakeLlmChat
+    module.UserMessage = FakeUserMessage
+    sys.modules["emergentintegrations.llm.chat"] = module
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Banc de performance des routes critiques
+Démarre l'application en processus (httpx + ASGITransport, événements startup/shutdown compris) contre un
+MongoDB local ou un substitut en mémoire (mongomock-motor), seede des volumes réalistes puis charge en parallèle :
+images de galerie, ZIP HD, chatbot, heartbeat, contenu public, recherche PhotoFind (visages simulés).
+
+Rapporte par scénario p50/p95/p99, débit et RSS, et compare à une référence enregistrée.
+
+Exécuter depuis backend/ :
+    python -m bench.run                                  # MongoDB local, base creativindustry_bench
+    python -m bench.run --mongo memory --scale 0.05      # sans MongoDB (pip install mongomock-motor)
+    python -m bench.run --save-baseline                  # enregistre bench/baseline.json
+    python -m bench.run --fail-on-regression             # code retour 1 si régression > --tolerance
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+BACKEND_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+RESULTS_DIR = BENCH_DIR / "results"
+# Les latences de quelques millisecondes sont bruitées : en dessous, une hausse n'est pas une régression
+MIN_SIGNIFICANT_MS = 2.0
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    build: object                # (dataset, tokens, rng) -> (path, kwargs httpx)
+    weight: float = 1.0          # fraction du nombre de requêtes (scénarios lourds)
+
+
+def _client_headers(tokens, rng):
+    return {"Authorization": f"Bearer {rng.choice(tokens['clients'])}"}
+
+
+SCENARIOS = [
+    Scenario("public_content", "GET", lambda d, t, r: ("/api/content", {})),
+    Scenario("public_services", "GET", lambda d, t, r: ("/api/services", {})),
+    Scenario("gallery_image", "GET", lambda d, t, r: (f"/uploads/galleries/{r.choice(d.image_files)}", {})),
+    Scenario("gallery_zip", "GET",
+             lambda d, t, r: (f"/api/client/gallery/{d.zip_gallery[1]}/download-hd",
+                              {"headers": {"Authorization": f"Bearer {t['zip_client']}"}}),
+             weight=0.05),
+    Scenario("chat_send", "POST",
+             lambda d, t, r: ("/api/chat", {"json": {"session_id": r.choice(d.chat_sessions),
+                                                     "message": "Quels sont vos tarifs mariage ?"}})),
+    Scenario("client_chat_history", "GET", lambda d, t, r: ("/api/chat/my-messages", {"headers": _client_headers(t, r)})),
+    Scenario("heartbeat", "POST", lambda d, t, r: ("/api/client/activity/heartbeat", {"headers": _client_headers(t, r)})),
+    Scenario("photofind_search", "POST",
+             lambda d, t, r: (f"/api/public/photofind/{r.choice(list(d.photofind_events))}/search",
+                              {"files": {"file": ("selfie.jpg", r.randbytes(64 * 1024), "image/jpeg")}}),
+             weight=0.5),
+]
+
+
+# ==================== STATISTIQUES ====================
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * pct / 100
+    low = int(index)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def rss_mb() -> float:
+    """RSS courant (Linux), sinon pic RSS du processus"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "rss_mb": rss_mb(),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """Régressions par rapport à la référence : latence en hausse, débit en baisse ou RSS en hausse de plus de `tolerance`"""
+    regressions = []
+    for name, result in current.get("scenarios", {}).items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if not reference:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            before, after = reference[metric], result[metric]
+            if after - before > MIN_SIGNIFICANT_MS and after > before * (1 + tolerance):
+                regressions.append({"scenario": name, "metric": metric, "baseline": before, "current": after})
+        if reference["rps"] and result["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append({"scenario": name, "metric": "rps", "baseline": reference["rps"], "current": result["rps"]})
+        if result["errors"] > reference.get("errors", 0):
+            regressions.append({"scenario": name, "metric": "errors", "baseline": reference.get("errors", 0),
+                                "current": result["errors"]})
+    before, after = baseline.get("rss_mb_peak"), current.get("rss_mb_peak")
+    if before and after and after > before * (1 + tolerance):
+        regressions.append({"scenario": "*", "metric": "rss_mb_peak", "baseline": before, "current": after})
+    return regressions
+
+
+def _delta(before, after) -> str:
+    if not before:
+        return ""
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+def format_report(current: dict, baseline: dict = None) -> str:
+    header = f"{'scenario':<22}{'req':>6}{'err':>5}{'p50 ms':>10}{'p99 ms':>10}{'rps':>9}{'rss MB':>9}"
+    if baseline:
+        header += f"{'Δp50':>8}{'Δp99':>8}{'Δrps':>8}"
+    lines = [header, "-" * len(header)]
+    for name, r in current["scenarios"].items():
+        line = (f"{name:<22}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                f"{r['rps']:>9.1f}{r['rss_mb']:>9.1f}")
+        reference = (baseline or {}).get("scenarios", {}).get(name)
+        if reference:
+            line += (f"{_delta(reference['p50_ms'], r['p50_ms']):>8}{_delta(reference['p99_ms'], r['p99_ms']):>8}"
+                     f"{_delta(reference['rps'], r['rps']):>8}")
+        lines.append(line)
+    lines.append(f"RSS peak: {current['rss_mb_peak']} MB")
+    return "\n".join(lines)
+
+
+# ==================== APPLICATION ====================
+
+def load_app(args):
+    """Configure la base puis importe le serveur (database.py lit DB_NAME à l'import)"""
+    from bench.seed import ensure_bench_database
+
+    os.environ["DB_NAME"] = args.db_name
+    if args.mongo_url:
+        os.environ["MONGO_URL"] = args.mongo_url
+    ensure_bench_database(args.db_name)
+
+    import database
+    if args.mongo == "memory":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mongo memory nécessite mongomock-motor (pip install mongomock-motor)")
+        database.mongo_client = AsyncMongoMockClient()
+        database.db = database.get_database()
+        database.devis_db = database.get_database(database.DEVIS_DB_NAME)
+
+    import server
+    return server, database.db
+
+
+async def drive(client, scenario: Scenario, dataset, tokens, requests: int, concurrency: int, seed_value: int) -> dict:
+    rng = random.Random(f"{seed_value}-{scenario.name}")
+    calls = [scenario.build(dataset, tokens, rng) for _ in range(max(1, int(requests * scenario.weight)))]
+    latencies, errors = [], 0
+    queue = iter(calls)
+
+    async def worker():
+        nonlocal errors
+        for path, kwargs in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, path, **kwargs)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    import httpx
+    from bench import fakes, seed
+
+    server, db = load_app(args)
+    import routes.photofind
+
+    print(f"Seeding {args.db_name} (scale {args.scale})...")
+    started = time.perf_counter()
+    dataset = await seed.seed(db, server.UPLOADS_DIR, scale=args.scale, seed_value=args.seed)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    fakes.install_fake_llm()
+    routes.photofind.get_rekognition_client = lambda: fakes.FakeRekognition(dataset.faces)
+    tokens = {
+        "clients": [server.create_token(client_id, "client") for client_id in dataset.client_ids[:200]],
+        "zip_client": server.create_token(dataset.zip_gallery[0], "client"),
+    }
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios.split(",")]
+    results = {}
+    peak = rss_mb()
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for scenario in selected:
+                # Échauffement (caches, pools) non mesuré
+                await drive(client, scenario, dataset, tokens, max(1, args.concurrency), args.concurrency, args.seed)
+                results[scenario.name] = await drive(
+                    client, scenario, dataset, tokens, args.requests, args.concurrency, args.seed
+                )
+                peak = max(peak, results[scenario.name]["rss_mb"])
+                print(f"  {scenario.name}: p50 {results[scenario.name]['p50_ms']} ms, "
+                      f"p99 {results[scenario.name]['p99_ms']} ms, {results[scenario.name]['rps']} req/s")
+    finally:
+        await server.app.router.shutdown()
+        seed.cleanup_files(server.UPLOADS_DIR)
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "mongo": args.mongo,
+            "scale": args.scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "scenarios": results,
+        "rss_mb_peak": peak,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de performance CREATIVINDUSTRY")
+    parser.add_argument("--mongo", choices=["local", "memory"], default="local")
+    parser.add_argument("--mongo-url", default=None, help="MONGO_URL (par défaut celle de .env)")
+    parser.add_argument("--db-name", default="creativindustry_bench")
+    parser.add_argument("--scale", type=float, default=1.0, help="Fraction des volumes de production simulés")
+    parser.add_argument("--requests", type=int, default=500, help="Requêtes par scénario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", default="", help="Liste séparée par des virgules (tous par défaut)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Écart toléré avant de signaler une régression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    current = asyncio.run(run(args))
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    result_path = RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    result_path.write_text(json.dumps(current, indent=2))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    print()
+    print(format_report(current, baseline))
+    print(f"\nResults: {result_path}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(current, indent=2))
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+    if baseline is None:
+        print("No baseline to compare against (--save-baseline to create one)")
+        return 0
+
+    regressions = compare(current, baseline, args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']}")
+    if not regressions:
+        print(f"No regression beyond {args.tolerance:.0%}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Jeu de données du banc de performance
+Volumes réalistes (à l'échelle 1) : 10 000 clients, 100 000 photos de galerie, 50 000 messages de chat,
+événements PhotoFind de plusieurs milliers de photos. `scale` réduit tout proportionnellement (ex. 0.05 en CI).
+
+Les fichiers image sont partagés : un petit nombre de fichiers bench-*.jpg est écrit dans uploads/galleries
+et référencé par toutes les photos, puis supprimé par cleanup_files().
+"""
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+BASE_VOLUMES = {
+    "clients": 10_000,
+    "gallery_photos": 100_000,
+    "photos_per_gallery": 100,
+    "chat_messages": 50_000,
+    "photofind_events": 4,
+    "photofind_photos_per_event": 5_000,
+}
+IMAGE_FILES = 40
+IMAGE_SIZE = 256 * 1024
+INSERT_BATCH = 2_000
+
+SEEDED_COLLECTIONS = [
+    "clients", "galleries", "gallery_purchases", "chat_messages", "user_activity",
+    "photofind_events", "photofind_photos", "site_content", "services", "portfolio",
+]
+
+
+@dataclass
+class Dataset:
+    """Identifiants utilisés par les scénarios"""
+    client_ids: list = field(default_factory=list)
+    gallery_ids: list = field(default_factory=list)
+    zip_gallery: tuple = None                    # (client_id, gallery_id) avec achat HD
+    image_files: list = field(default_factory=list)
+    photofind_events: dict = field(default_factory=dict)   # event_id -> collection_id
+    faces: dict = field(default_factory=dict)              # collection_id -> [photo_id]
+    chat_sessions: list = field(default_factory=list)
+
+
+def volumes(scale: float) -> dict:
+    scaled = {key: max(1, int(value * scale)) for key, value in BASE_VOLUMES.items()}
+    scaled["photos_per_gallery"] = BASE_VOLUMES["photos_per_gallery"]
+    return scaled
+
+
+def _iso(days_ago: float = 0) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+
+
+async def _insert(collection, docs: list):
+    for start in range(0, len(docs), INSERT_BATCH):
+        await collection.insert_many(docs[start:start + INSERT_BATCH], ordered=False)
+
+
+def write_image_files(uploads_dir: Path, count: int = IMAGE_FILES) -> list:
+    galleries_dir = uploads_dir / "galleries"
+    galleries_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(42)
+    names = []
+    for i in range(count):
+        name = f"bench-{i:03d}.jpg"
+        path = galleries_dir / name
+        if not path.exists() or path.stat().st_size != IMAGE_SIZE:
+            path.write_bytes(b"\xff\xd8\xff\xe0" + rng.randbytes(IMAGE_SIZE - 4))
+        names.append(name)
+    return names
+
+
+def cleanup_files(uploads_dir: Path):
+    for path in (uploads_dir / "galleries").glob("bench-*.jpg"):
+        path.unlink(missing_ok=True)
+
+
+async def seed(db, uploads_dir: Path, scale: float = 1.0, seed_value: int = 42) -> Dataset:
+    """Vide les collections du banc puis les remplit ; renvoie les identifiants utiles aux scénarios"""
+    rng = random.Random(seed_value)
+    sizes = volumes(scale)
+    data = Dataset(image_files=write_image_files(uploads_dir))
+
+    for name in SEEDED_COLLECTIONS:
+        await db[name].delete_many({})
+
+    # Contenu public
+    await db.site_content.insert_one({
+        "id": "main", "hero_title": "CREATIVINDUSTRY", "hero_subtitle": "Mariage, podcast, plateau TV",
+        "updated_at": _iso()
+    })
+    await _insert(db.services, [
+        {"id": str(uuid.uuid4()), "name": f"Formule {i}", "category": ["wedding", "podcast", "tv_set"][i % 3],
+         "description": "Prestation complète " * 5, "price": 500 + i * 100, "features": ["a", "b", "c"],
+         "is_active": True, "created_at": _iso(i)}
+        for i in range(12)
+    ])
+    await _insert(db.portfolio, [
+        {"id": str(uuid.uuid4()), "title": f"Projet {i}", "media_type": "photo", "category": "wedding",
+         "media_url": f"/uploads/galleries/{data.image_files[i % len(data.image_files)]}",
+         "is_featured": i % 5 == 0, "is_active": True, "created_at": _iso(i)}
+        for i in range(300)
+    ])
+
+    # Clients
+    clients = []
+    for i in range(sizes["clients"]):
+        client_id = str(uuid.uuid4())
+        clients.append({
+            "id": client_id, "email": f"client{i}@bench.test", "name": f"Client {i}",
+            "phone": f"06{i:08d}", "password": "x", "created_at": _iso(rng.uniform(0, 700)),
+            "expires_at": _iso(-rng.uniform(30, 300))
+        })
+        data.client_ids.append(client_id)
+    await _insert(db.clients, clients)
+
+    # Galeries (photos embarquées dans le document galerie, comme en production)
+    galleries = []
+    photo_count = 0
+    while photo_count < sizes["gallery_photos"]:
+        count = min(sizes["photos_per_gallery"], sizes["gallery_photos"] - photo_count)
+        gallery_id = str(uuid.uuid4())
+        galleries.append({
+            "id": gallery_id, "client_id": rng.choice(data.client_ids), "name": f"Galerie {len(galleries)}",
+            "is_published": True, "created_at": _iso(rng.uniform(0, 365)),
+            "photos": [
+                {"id": str(uuid.uuid4()), "filename": name,
+                 "url": f"/uploads/galleries/{name}", "uploaded_at": _iso()}
+                for name in (data.image_files[(photo_count + k) % len(data.image_files)] for k in range(count))
+            ]
+        })
+        data.gallery_ids.append(gallery_id)
+        photo_count += count
+    await _insert(db.galleries, galleries)
+
+    zip_gallery = galleries[0]
+    zip_gallery_photos = [{"id": str(uuid.uuid4()), "filename": name, "url": f"/uploads/galleries/{name}"}
+                          for name in data.image_files]
+    await db.galleries.update_one({"id": zip_gallery["id"]}, {"$set": {"photos": zip_gallery_photos}})
+    await db.gallery_purchases.insert_one({
+        "id": str(uuid.uuid4()), "gallery_id": zip_gallery["id"], "client_id": zip_gallery["client_id"],
+        "option": "hd_download", "status": "completed", "created_at": _iso()
+    })
+    data.zip_gallery = (zip_gallery["client_id"], zip_gallery["id"])
+
+    # Chat (chatbot public + conversations client/admin)
+    messages = []
+    sessions = [str(uuid.uuid4()) for _ in range(max(1, sizes["chat_messages"] // 20))]
+    data.chat_sessions = sessions[:50]
+    for i in range(sizes["chat_messages"]):
+        if i % 2:
+            messages.append({
+                "id": str(uuid.uuid4()), "session_id": rng.choice(sessions),
+                "role": "user" if i % 4 == 1 else "assistant", "content": "Bonjour, quels sont vos tarifs ?",
+                "created_at": _iso(rng.uniform(0, 90))
+            })
+        else:
+            client_id = rng.choice(data.client_ids[:500])
+            messages.append({
+                "id": str(uuid.uuid4()), "conversation_id": f"client_{client_id}", "sender_id": client_id,
+                "sender_type": rng.choice(["client", "admin"]), "content": "Merci pour les photos !",
+                "read": rng.random() < 0.7, "created_at": _iso(rng.uniform(0, 90))
+            })
+    await _insert(db.chat_messages, messages)
+
+    # PhotoFind
+    for e in range(sizes["photofind_events"]):
+        event_id = str(uuid.uuid4())
+        collection_id = f"bench_{event_id[:8]}"
+        await db.photofind_events.insert_one({
+            "id": event_id, "name": f"Événement {e}", "collection_id": collection_id,
+            "price_per_photo": 5.0, "price_pack_5": 20.0, "price_pack_10": 35.0, "price_all": 50.0,
+            "photos_count": sizes["photofind_photos_per_event"], "is_active": True, "created_at": _iso(e)
+        })
+        photos = [
+            {"id": str(uuid.uuid4()), "event_id": event_id, "filename": f"{p}.jpg",
+             "url": f"/uploads/photofind/{event_id}/{p}.jpg", "faces_count": 2, "face_ids": [],
+             "created_at": _iso()}
+            for p in range(sizes["photofind_photos_per_event"])
+        ]
+        await _insert(db.photofind_photos, photos)
+        data.photofind_events[event_id] = collection_id
+        data.faces[collection_id] = [photo["id"] for photo in photos]
+
+    return data
+
+
+def ensure_bench_database(db_name: str):
+    """Le seed vide des collections : refuser toute base qui n'est pas dédiée au banc"""
+    if not db_name.endswith("_bench") and os.environ.get("BENCH_ALLOW_ANY_DB") != "1":
+        raise SystemExit(f"Refus de seeder '{db_name}' : utilisez une base se terminant par _bench")
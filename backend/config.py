@@ -4,7 +4,8 @@ Configuration centrale pour l'application CREATIVINDUSTRY
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+
+from database import mongo_client, db  # pool partagé (voir database.py), ré-exporté pour les routes
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -13,9 +14,6 @@ load_dotenv(ROOT_DIR / '.env')
 MONGO_URL = os.environ['MONGO_URL']
 DB_NAME = os.environ['DB_NAME']
 
-mongo_client = AsyncIOMotorClient(MONGO_URL)
-db = mongo_client[DB_NAME]
-
 # JWT
 SECRET_KEY = os.environ.get('JWT_SECRET', 'creativindustry-secret-key-2024')
 ALGORITHM = "HS256"
@@ -54,3 +52,23 @@ UPLOADS_DIR.mkdir(exist_ok=True)
 (UPLOADS_DIR / "social_media").mkdir(exist_ok=True)
 (UPLOADS_DIR / "archives").mkdir(exist_ok=True)
 (UPLOADS_DIR / "chat").mkdir(exist_ok=True)
+
+__all__ = [
+    'mongo_client',
+    'db',
+    'ROOT_DIR',
+    'MONGO_URL',
+    'DB_NAME',
+    'SECRET_KEY',
+    'ALGORITHM',
+    'SMTP_HOST',
+    'SMTP_PORT',
+    'SMTP_EMAIL',
+    'SMTP_PASSWORD',
+    'PAYPAL_CLIENT_ID',
+    'PAYPAL_SECRET',
+    'PAYPAL_MODE',
+    'SITE_URL',
+    'EMERGENT_LLM_KEY',
+    'UPLOADS_DIR'
+]
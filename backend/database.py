@@ -0,0 +1,195 @@
+"""
+Connexion MongoDB partagée pour l'application CREATIVINDUSTRY
+- Un seul AsyncIOMotorClient (donc un seul pool) par processus, pour les routes et les jobs
+- Taille du pool et timeouts configurables par variables d'environnement (à dimensionner par worker)
+- Bases nommées servies depuis le même pool (base principale, creativindustry_devis, ...)
+- Statistiques d'utilisation du pool via un ConnectionPoolListener
+- Commandes Mongo attribuées à la requête HTTP en cours via un CommandListener (metrics.py)
+- Numéro de version par collection incrémenté à chaque écriture (write_tracker), pour invalider
+  les caches en mémoire (tableaux de bord) sans toucher aux routes qui écrivent
+"""
+import os
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from metrics import mongo_command_listener
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'test_database')
+DEVIS_DB_NAME = os.environ.get('DEVIS_DB_NAME', 'creativindustry_devis')
+
+# Pool (valeurs par processus : avec N workers uvicorn, le serveur voit N x MONGO_MAX_POOL_SIZE connexions)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 0)) or None
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 0)) or None
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Compte les connexions ouvertes / empruntées (appelé depuis les threads du driver)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.created = 0
+        self.closed = 0
+        self.pool_clears = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open = max(0, self.open - 1)
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # Événements non utilisés (requis par l'interface)
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "open_connections": self.open,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "connections_created": self.created,
+                "connections_closed": self.closed,
+                "pool_clears": self.pool_clears
+            }
+
+
+pool_monitor = PoolMonitor()
+
+
+class CollectionWriteTracker(monitoring.CommandListener):
+    """Version par collection, incrémentée au début et à la fin de chaque écriture
+    (un calcul lancé pendant l'écriture ne peut donc pas rester en cache). Propre au processus."""
+
+    WRITE_COMMANDS = ("insert", "update", "delete", "findAndModify")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._pending = {}
+
+    def _bump(self, collection: str):
+        with self._lock:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+
+    def started(self, event):
+        if event.command_name not in self.WRITE_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if isinstance(collection, str):
+            self._pending[(event.connection_id, event.request_id)] = collection
+            self._bump(collection)
+
+    def _finish(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection:
+            self._bump(collection)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def versions(self, *collections) -> tuple:
+        with self._lock:
+            return tuple(self._versions.get(name, 0) for name in collections)
+
+
+write_tracker = CollectionWriteTracker()
+
+mongo_client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[pool_monitor, mongo_command_listener, write_tracker]
+)
+
+
+def get_database(name: str = None):
+    """Base nommée servie par le pool partagé (base principale par défaut)"""
+    return mongo_client[name or DB_NAME]
+
+
+db = get_database()
+devis_db = get_database(DEVIS_DB_NAME)
+
+
+def pool_stats() -> dict:
+    """Configuration et utilisation du pool de connexions de ce processus"""
+    stats = pool_monitor.snapshot()
+    stats["utilization"] = round(stats["in_use"] / MONGO_MAX_POOL_SIZE, 3) if MONGO_MAX_POOL_SIZE else None
+    stats["pid"] = os.getpid()
+    stats["config"] = {
+        "max_pool_size": MONGO_MAX_POOL_SIZE,
+        "min_pool_size": MONGO_MIN_POOL_SIZE,
+        "max_idle_time_ms": MONGO_MAX_IDLE_TIME_MS,
+        "connect_timeout_ms": MONGO_CONNECT_TIMEOUT_MS,
+        "server_selection_timeout_ms": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socket_timeout_ms": MONGO_SOCKET_TIMEOUT_MS,
+        "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS
+    }
+    return stats
+
+
+def close_mongo_client():
+    """Ferme le pool (arrêt du serveur)"""
+    mongo_client.close()
@@ -0,0 +1,224 @@
+"""
+Surveillance de la boucle d'événements asyncio
+- Mesure du retard de la boucle (lag) : une tâche se réveille toutes les LOOP_MONITOR_INTERVAL_MS
+  et mesure son retard par rapport à l'heure prévue
+- Détection des blocages : un thread de surveillance capture la pile du thread de la boucle dès qu'elle
+  ne répond plus depuis LOOP_BLOCK_THRESHOLD_MS, l'attribue à la route en cours et journalise la trace
+- Classement des pires blocages par route et emplacement dans le code (GET /api/admin/metrics/blocking)
+
+Modes (LOOP_MONITOR) :
+- off        : désactivé
+- production : lag + détection des blocages (par défaut, un thread qui se réveille quelques fois par seconde)
+- debug      : idem + mode debug asyncio (slow_callback_duration, coroutines non attendues)
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import metrics
+
+LOOP_MONITOR = os.environ.get("LOOP_MONITOR", "production").lower()
+LOOP_MONITOR_INTERVAL_MS = float(os.environ.get("LOOP_MONITOR_INTERVAL_MS", 50))
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", 200))
+MAX_OFFENDERS = 200
+STACK_LIMIT = 25
+
+APP_DIR = str(Path(__file__).parent)
+# Instrumentation elle-même : jamais désignée comme responsable d'un blocage
+IGNORED_FILES = {os.path.abspath(__file__), os.path.abspath(metrics.__file__)}
+
+logger = logging.getLogger("loop_monitor")
+
+
+def _app_location(frame) -> str:
+    """Emplacement le plus profond de la pile situé dans le code de l'application (hors bibliothèques)"""
+    location = None
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        here = f"{os.path.basename(filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        if fallback is None:
+            fallback = here
+        if location is None and filename.startswith(APP_DIR) and "site-packages" not in filename \
+                and filename not in IGNORED_FILES:
+            location = here
+        frame = frame.f_back
+    return location or fallback or "unknown"
+
+
+class LoopMonitor:
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._open_block = None          # (heartbeat, key) du blocage en cours, signalé par le thread de surveillance
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.lag_last = 0.0
+            self.lag_max = 0.0
+            self.lag_total = 0.0
+            self.samples = 0
+            self.blocks = 0
+            self.blocked_seconds = 0.0
+            self.offenders = {}          # (route, location) -> stats
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, loop: asyncio.AbstractEventLoop = None):
+        if self.running:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._sample_lag())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ---- boucle : mesure du retard ----
+
+    async def _sample_lag(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self._record_lag(lag)
+
+    def _record_lag(self, lag: float):
+        with self._lock:
+            self.lag_last = lag
+            self.lag_max = max(self.lag_max, lag)
+            self.lag_total += lag
+            self.samples += 1
+            if lag < self.threshold:
+                return
+            self.blocks += 1
+            self.blocked_seconds += lag
+            if self._open_block is not None:
+                # Blocage déjà signalé (et compté) par le thread de surveillance : on complète sa durée
+                entry = self._offender(self._open_block[1], None)
+                self._open_block = None
+            else:
+                entry = self._offender((metrics.BACKGROUND_ROUTE, "unknown"), None)
+                entry["count"] += 1
+            entry["total_seconds"] += lag
+            entry["max_seconds"] = max(entry["max_seconds"], lag)
+
+    def _offender(self, key, stack):
+        entry = self.offenders.get(key)
+        if entry is None:
+            if len(self.offenders) >= MAX_OFFENDERS:
+                smallest = min(self.offenders, key=lambda k: self.offenders[k]["total_seconds"])
+                del self.offenders[smallest]
+            entry = self.offenders[key] = {
+                "route": key[0], "location": key[1], "count": 0,
+                "total_seconds": 0.0, "max_seconds": 0.0, "stack": stack
+            }
+        elif stack:
+            entry["stack"] = stack
+        return entry
+
+    # ---- thread de surveillance : capture de la pile bloquante ----
+
+    def _watch(self):
+        check_every = max(self.threshold / 2, 0.01)
+        reported_beat = None
+        while not self._stop.wait(check_every):
+            beat = self._heartbeat
+            if time.monotonic() - beat < self.threshold + self.interval or beat == reported_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_beat = beat
+            self.report_block(frame, beat)
+
+    def report_block(self, frame, beat=None):
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        route = metrics.route_for_task(task)
+        location = _app_location(frame)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+        with self._lock:
+            self._open_block = (beat, (route, location))
+            self._offender((route, location), stack)["count"] += 1
+        logger.warning(
+            f"Event loop blocked > {self.threshold * 1000:.0f} ms by {location} (route {route})\n{stack}"
+        )
+
+    # ---- rapports ----
+
+    def worst_offenders(self, limit: int = 20) -> list:
+        with self._lock:
+            entries = [dict(entry) for entry in self.offenders.values()]
+        entries.sort(key=lambda e: e["total_seconds"], reverse=True)
+        for entry in entries:
+            entry["total_seconds"] = round(entry["total_seconds"], 3)
+            entry["max_seconds"] = round(entry["max_seconds"], 3)
+        return entries[:limit]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "mode": LOOP_MONITOR,
+                "running": self.running,
+                "threshold_ms": self.threshold * 1000,
+                "lag_last_ms": round(self.lag_last * 1000, 2),
+                "lag_max_ms": round(self.lag_max * 1000, 2),
+                "lag_avg_ms": round(self.lag_total / self.samples * 1000, 2) if self.samples else 0.0,
+                "blocks": self.blocks,
+                "blocked_seconds": round(self.blocked_seconds, 3)
+            }
+
+    def prometheus_gauges(self) -> dict:
+        with self._lock:
+            return {
+                "event_loop_lag_seconds": ("Last measured event loop lag", f"{self.lag_last:.6f}"),
+                "event_loop_lag_max_seconds": ("Worst event loop lag since start", f"{self.lag_max:.6f}"),
+                "event_loop_blocks_total": (f"Event loop stalls longer than {self.threshold * 1000:.0f} ms", self.blocks),
+                "event_loop_blocked_seconds_total": ("Time the event loop spent blocked", f"{self.blocked_seconds:.6f}"),
+            }
+
+
+loop_monitor = LoopMonitor()
+
+
+def start_loop_monitor():
+    """Démarre la surveillance selon LOOP_MONITOR (appelé au démarrage du serveur)"""
+    if LOOP_MONITOR == "off":
+        return
+    loop = asyncio.get_running_loop()
+    if LOOP_MONITOR == "debug":
+        loop.set_debug(True)
+        loop.slow_callback_duration = LOOP_BLOCK_THRESHOLD_MS / 1000
+    loop_monitor.start(loop)
+    logger.info(f"Event loop monitor started ({LOOP_MONITOR}, threshold {LOOP_BLOCK_THRESHOLD_MS:.0f} ms)")
+
+
+def stop_loop_monitor():
+    loop_monitor.stop()
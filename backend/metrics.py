@@ -0,0 +1,338 @@
+"""
+Instrumentation des performances de l'API CREATIVINDUSTRY
+- Middleware ASGI : histogramme de latence et requêtes en cours par route (gabarit FastAPI, ex. /api/galleries/{gallery_id})
+- CommandListener pymongo : nombre et durée des commandes Mongo attribués à la requête HTTP en cours (détection N+1),
+  journalisation des requêtes Mongo lentes
+- Export au format texte Prometheus (GET /api/admin/metrics)
+- En-tête Server-Timing optionnel (SERVER_TIMING_HEADER=1)
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, defaultdict
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_SLOW_MS = float(os.environ.get("MONGO_SLOW_MS", 100))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "0").lower() in ("1", "true", "yes")
+ROUTE_CACHE_SIZE = 4096
+
+UNMATCHED_ROUTE = "unmatched"
+BACKGROUND_ROUTE = "background"
+
+logger = logging.getLogger("metrics")
+
+
+class RequestStats:
+    """Compteurs d'une requête HTTP (partagés avec les threads Motor via contextvars)"""
+
+    __slots__ = ("route", "mongo_commands", "mongo_seconds", "_lock")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_mongo(self, seconds: float):
+        with self._lock:
+            self.mongo_commands += 1
+            self.mongo_seconds += seconds
+
+
+_current_request = contextvars.ContextVar("current_request_stats", default=None)
+
+
+# Tâche asyncio -> route, lisible depuis un autre thread (détecteur de blocage, loop_monitor.py)
+_task_routes = weakref.WeakKeyDictionary()
+
+
+def current_route() -> str:
+    stats = _current_request.get()
+    return stats.route if stats else BACKGROUND_ROUTE
+
+
+def route_for_task(task) -> str:
+    if task is None:
+        return BACKGROUND_ROUTE
+    try:
+        return _task_routes.get(task, BACKGROUND_ROUTE)
+    except RuntimeError:
+        # Dictionnaire modifié pendant la lecture par le thread de la boucle
+        return BACKGROUND_ROUTE
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.latency = defaultdict(Histogram)            # (method, route) -> Histogram
+        self.responses = defaultdict(int)                # (method, route, status) -> count
+        self.in_flight = defaultdict(int)                # (method, route) -> count
+        self.request_mongo_commands = defaultdict(int)   # (method, route) -> commands
+        self.request_mongo_seconds = defaultdict(float)  # (method, route) -> seconds
+        self.request_mongo_max = defaultdict(int)        # (method, route) -> max commands in one request
+        self.mongo_commands = defaultdict(int)           # (command, route) -> count
+        self.mongo_seconds = defaultdict(float)          # (command, route) -> seconds
+        self.mongo_failures = defaultdict(int)           # (command, route) -> count
+        self.mongo_slow = defaultdict(int)               # (command, route) -> count
+
+    def request_started(self, method: str, route: str):
+        with self._lock:
+            self.in_flight[(method, route)] += 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            self.in_flight[key] -= 1
+            self.latency[key].observe(seconds)
+            self.responses[(method, route, str(status))] += 1
+            self.request_mongo_commands[key] += stats.mongo_commands
+            self.request_mongo_seconds[key] += stats.mongo_seconds
+            self.request_mongo_max[key] = max(self.request_mongo_max[key], stats.mongo_commands)
+
+    def mongo_command(self, command: str, route: str, seconds: float, failed: bool = False, slow: bool = False):
+        key = (command, route)
+        with self._lock:
+            self.mongo_commands[key] += 1
+            self.mongo_seconds[key] += seconds
+            if failed:
+                self.mongo_failures[key] += 1
+            if slow:
+                self.mongo_slow[key] += 1
+
+    def reset(self):
+        self.__init__()
+
+    # ---- Prometheus text format ----
+
+    def render_prometheus(self, extra_gauges: dict = None) -> str:
+        with self._lock:
+            latency = {k: (list(h.buckets), h.count, h.total) for k, h in self.latency.items()}
+            responses = dict(self.responses)
+            in_flight = dict(self.in_flight)
+            req_mongo = dict(self.request_mongo_commands)
+            req_mongo_s = dict(self.request_mongo_seconds)
+            req_mongo_max = dict(self.request_mongo_max)
+            mongo = dict(self.mongo_commands)
+            mongo_s = dict(self.mongo_seconds)
+            mongo_failed = dict(self.mongo_failures)
+            mongo_slow = dict(self.mongo_slow)
+
+        lines = [
+            "# HELP process_uptime_seconds Seconds since metrics collection started",
+            "# TYPE process_uptime_seconds gauge",
+            f"process_uptime_seconds {time.time() - self.started_at:.3f}",
+            "# HELP http_requests_in_flight Requests currently being processed",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for (method, route), value in sorted(in_flight.items()):
+            lines.append(f"http_requests_in_flight{_labels(method=method, route=route)} {value}")
+
+        lines += ["# HELP http_requests_total Completed requests by status",
+                  "# TYPE http_requests_total counter"]
+        for (method, route, status), value in sorted(responses.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {value}")
+
+        lines += ["# HELP http_request_duration_seconds Request latency",
+                  "# TYPE http_request_duration_seconds histogram"]
+        for (method, route), (buckets, count, total) in sorted(latency.items()):
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+            lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, route=route, le='+Inf')} {count}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(method=method, route=route)} {total:.6f}")
+            lines.append(f"http_request_duration_seconds_count{_labels(method=method, route=route)} {count}")
+
+        lines += ["# HELP http_request_mongo_commands_total Mongo commands issued while serving the route",
+                  "# TYPE http_request_mongo_commands_total counter"]
+        for (method, route), value in sorted(req_mongo.items()):
+            lines.append(f"http_request_mongo_commands_total{_labels(method=method, route=route)} {value}")
+        lines += ["# HELP http_request_mongo_seconds_total Time spent in Mongo while serving the route",
+                  "# TYPE http_request_mongo_seconds_total counter"]
+        for (method, route), value in sorted(req_mongo_s.items()):
+            lines.append(f"http_request_mongo_seconds_total{_labels(method=method, route=route)} {value:.6f}")
+        lines += ["# HELP http_request_mongo_commands_max Most Mongo commands seen in a single request (N+1 indicator)",
+                  "# TYPE http_request_mongo_commands_max gauge"]
+        for (method, route), value in sorted(req_mongo_max.items()):
+            lines.append(f"http_request_mongo_commands_max{_labels(method=method, route=route)} {value}")
+
+        lines += ["# HELP mongo_commands_total Mongo commands by command name and originating route",
+                  "# TYPE mongo_commands_total counter"]
+        for (command, route), value in sorted(mongo.items()):
+            lines.append(f"mongo_commands_total{_labels(command=command, route=route)} {value}")
+        lines += ["# HELP mongo_command_seconds_total Mongo command time by command name and originating route",
+                  "# TYPE mongo_command_seconds_total counter"]
+        for (command, route), value in sorted(mongo_s.items()):
+            lines.append(f"mongo_command_seconds_total{_labels(command=command, route=route)} {value:.6f}")
+        lines += ["# HELP mongo_command_failures_total Failed Mongo commands",
+                  "# TYPE mongo_command_failures_total counter"]
+        for (command, route), value in sorted(mongo_failed.items()):
+            lines.append(f"mongo_command_failures_total{_labels(command=command, route=route)} {value}")
+        lines += [f"# HELP mongo_slow_commands_total Mongo commands slower than {MONGO_SLOW_MS:g} ms",
+                  "# TYPE mongo_slow_commands_total counter"]
+        for (command, route), value in sorted(mongo_slow.items()):
+            lines.append(f"mongo_slow_commands_total{_labels(command=command, route=route)} {value}")
+
+        for name, (help_text, value) in (extra_gauges or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+registry = MetricsRegistry()
+
+
+# ==================== MONGO COMMAND MONITORING ====================
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Attribue chaque commande Mongo à la requête HTTP en cours et journalise les commandes lentes"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                _current_request.get(),
+                collection if isinstance(collection, str) else None
+            )
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            stats, collection = self._pending.pop((event.connection_id, event.request_id), (None, None))
+        if stats is None:
+            stats = _current_request.get()
+        seconds = event.duration_micros / 1_000_000
+        route = stats.route if stats else BACKGROUND_ROUTE
+        slow = seconds * 1000 >= MONGO_SLOW_MS
+        if stats:
+            stats.add_mongo(seconds)
+        registry.mongo_command(event.command_name, route, seconds, failed=failed, slow=slow)
+        if slow:
+            logger.warning(
+                f"Slow Mongo command: {event.command_name} {event.database_name}.{collection or '?'} "
+                f"{seconds * 1000:.1f} ms (route {route})"
+            )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+# ==================== HTTP MIDDLEWARE ====================
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, requêtes en cours et commandes Mongo par route"""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING_HEADER):
+        self.app = app
+        self.server_timing = server_timing
+        self._route_cache = OrderedDict()
+
+    def _resolve_route(self, scope) -> str:
+        """Gabarit de la route (ex. /api/galleries/{gallery_id}), mis en cache par (méthode, chemin)"""
+        cache_key = (scope["method"], scope["path"])
+        route = self._route_cache.get(cache_key)
+        if route is not None:
+            self._route_cache.move_to_end(cache_key)
+            return route
+        route = UNMATCHED_ROUTE
+        app = scope.get("app")
+        if app is not None:
+            from starlette.routing import Match
+            partial = None
+            for candidate in app.router.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = getattr(candidate, "path", UNMATCHED_ROUTE)
+                    break
+                if match == Match.PARTIAL and partial is None:
+                    partial = getattr(candidate, "path", UNMATCHED_ROUTE)
+            else:
+                route = partial or UNMATCHED_ROUTE
+        self._route_cache[cache_key] = route
+        if len(self._route_cache) > ROUTE_CACHE_SIZE:
+            self._route_cache.popitem(last=False)
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._resolve_route(scope)
+        stats = RequestStats(route)
+        token = _current_request.set(stats)
+        task = asyncio.current_task()
+        if task is not None:
+            _task_routes[task] = route
+        status_holder = {"status": 500}
+        start = time.perf_counter()
+        registry.request_started(method, route)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                if self.server_timing:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    header = (
+                        f'app;dur={elapsed_ms:.1f}, '
+                        f'mongo;dur={stats.mongo_seconds * 1000:.1f};desc="{stats.mongo_commands} commands"'
+                    )
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            registry.request_finished(method, route, status_holder["status"], seconds, stats)
+            _current_request.reset(token)
+            if task is not None:
+                _task_routes.pop(task, None)
+            if seconds * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    f"Slow request: {method} {route} {seconds * 1000:.0f} ms, "
+                    f"{stats.mongo_commands} Mongo commands ({stats.mongo_seconds * 1000:.0f} ms)"
+                )
@@ -8,7 +8,16 @@ Installation:
 2. python dnp_print_service.py
 
 Ce service écoute sur le port 5555 et imprime directement sur l'imprimante DNP
-sans afficher de boîte de dialogue.
+sans afficher de boîte de dialogue. Les lots passent par une file d'impression
+persistante (voir print_queue.py).
+
+Variables d'environnement:
+- DNP_PRINT_BACKEND: "windows" (défaut) ou "file" pour tester sous Linux
+- DNP_PRINT_SINK_DIR: dossier de sortie du backend "file"
+- DNP_PRINT_SPOOL_DIR: dossier de spool (base SQLite + images téléchargées)
+- DNP_PREFETCH_WORKERS: nombre de téléchargements simultanés (défaut: 3)
+- DNP_MAX_ATTEMPTS: nombre de tentatives par travail (défaut: 3)
+- DNP_JOB_RETENTION_DAYS: durée de conservation des travaux terminés (défaut: 7)
 """
 
 import os
@@ -23,9 +32,18 @@ import requests
 from PIL import Image
 import logging
 
+from print_queue import PrintQueue, create_backend
+
 # Configuration
 PORT = 5555
 DNP_PRINTER_NAME = "DNP DS820"  # Nom de l'imprimante dans Windows
+PRINT_BACKEND = os.environ.get("DNP_PRINT_BACKEND", "windows")
+PRINT_SINK_DIR = os.environ.get("DNP_PRINT_SINK_DIR", os.path.join(tempfile.gettempdir(), "dnp_print_sink"))
+PRINT_SPOOL_DIR = os.environ.get("DNP_PRINT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "dnp_print_spool"))
+PREFETCH_WORKERS = int(os.environ.get("DNP_PREFETCH_WORKERS", 3))
+MAX_ATTEMPTS = int(os.environ.get("DNP_MAX_ATTEMPTS", 3))
+JOB_RETENTION_DAYS = float(os.environ.get("DNP_JOB_RETENTION_DAYS", 7))
+BATCH_TIMEOUT = 110  # Secondes d'attente max pour un lot synchrone (le kiosque coupe à 120s)
 
 app = Flask(__name__)
 CORS(app)
@@ -121,13 +139,36 @@ def print_image_fallback(image_path, printer_name, copies=1):
 def download_image(url):
     """Télécharge une image depuis une URL"""
     try:
-        response = requests.get(url, timeout=30)
+        response = http_session.get(url, timeout=30)
         response.raise_for_status()
         return BytesIO(response.content)
     except Exception as e:
         logger.error(f"Erreur de téléchargement: {e}")
         return None
 
+def prepare_image(url, dest_path):
+    """Télécharge une image et l'enregistre en JPEG dans le spool (lève une exception en cas d'échec)"""
+    response = http_session.get(url, timeout=30)
+    response.raise_for_status()
+    img = Image.open(BytesIO(response.content))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.save(dest_path, 'JPEG', quality=95)
+    return True
+
+# Session HTTP partagée (connexions réutilisées entre les téléchargements)
+http_session = requests.Session()
+
+printer_backend = create_backend(PRINT_BACKEND, print_func=print_image_windows, sink_dir=PRINT_SINK_DIR)
+print_queue = PrintQueue(
+    PRINT_SPOOL_DIR,
+    printer_backend,
+    prepare_image,
+    prefetch_workers=PREFETCH_WORKERS,
+    max_attempts=MAX_ATTEMPTS,
+    retention=JOB_RETENTION_DAYS * 86400
+)
+
 @app.route('/health', methods=['GET'])
 def health():
     """Endpoint de santé pour vérifier si le service est actif"""
@@ -136,6 +177,7 @@ def health():
         "status": "ok",
         "service": "DNP Print Service",
         "printer": printer_name,
+        "backend": printer_backend.describe(),
         "port": PORT
     })
 
@@ -209,7 +251,7 @@ def print_photo():
         logger.info(f"Impression de {image_path} sur {printer_name} ({copies} copie(s))")
         
         # Imprimer
-        success = print_image_windows(image_path, printer_name, copies)
+        success = printer_backend.print_file(image_path, printer_name, copies)
         
         # Nettoyer le fichier temporaire
         if temp_file:
@@ -234,7 +276,7 @@ def print_photo():
 @app.route('/print-batch', methods=['POST'])
 def print_batch():
     """
-    Imprime plusieurs photos en batch
+    Imprime plusieurs photos en batch via la file d'impression
     
     Body JSON:
     {
@@ -242,48 +284,46 @@ def print_batch():
             {"url": "https://...", "copies": 1},
             {"url": "https://...", "copies": 2}
         ],
-        "printer": "DNP DS820"  // optionnel
+        "printer": "DNP DS820",  // optionnel
+        "wait": true             // optionnel, false pour retourner immédiatement les job_ids
     }
     """
     try:
         data = request.json
         images = data.get('images', [])
         printer_name = data.get('printer') or get_printer_name()
+        wait = data.get('wait', True)
         
         if not images:
             return jsonify({"error": "Liste d'images vide"}), 400
+        if not all(isinstance(image, dict) and image.get('url') for image in images):
+            return jsonify({"error": "Chaque image doit avoir une URL"}), 400
         
-        results = []
-        for i, img_data in enumerate(images):
-            url = img_data.get('url')
-            copies = img_data.get('copies', 1)
-            
-            logger.info(f"Impression {i+1}/{len(images)}: {url}")
-            
-            image_data = download_image(url)
-            if not image_data:
-                results.append({"url": url, "success": False, "error": "Téléchargement échoué"})
-                continue
-            
-            temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-            img = Image.open(image_data)
-            img.save(temp_file.name, 'JPEG', quality=95)
-            
-            success = print_image_windows(temp_file.name, printer_name, copies)
-            
-            try:
-                os.unlink(temp_file.name)
-            except:
-                pass
-            
-            results.append({"url": url, "success": success, "copies": copies})
-            
-            # Petit délai entre les impressions
-            time.sleep(0.5)
+        batch_id, job_ids = print_queue.submit_batch(images, printer_name)
+        logger.info(f"Lot {batch_id}: {len(job_ids)} travail(aux) ajouté(s) à la file")
+        
+        if not wait:
+            return jsonify({
+                "success": True,
+                "batch_id": batch_id,
+                "job_ids": job_ids,
+                "total": len(job_ids)
+            }), 202
+        
+        jobs = print_queue.wait(job_ids, timeout=BATCH_TIMEOUT)
+        results = [{
+            "job_id": job["id"],
+            "url": job["url"],
+            "success": job["status"] == "done",
+            "status": job["status"],
+            "copies": job["copies"],
+            "error": job["error"]
+        } for job in jobs]
         
         successful = sum(1 for r in results if r.get('success'))
         return jsonify({
             "success": True,
+            "batch_id": batch_id,
             "total": len(images),
             "printed": successful,
             "results": results
@@ -293,18 +333,44 @@ def print_batch():
         logger.error(f"Erreur batch: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/queue', methods=['GET'])
+def queue_status():
+    """État de la file d'impression et débit (impressions/minute)"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(print_queue.status(recent=limit))
+
+@app.route('/queue/<job_id>', methods=['GET'])
+def queue_job(job_id):
+    """Détail d'un travail d'impression"""
+    job = print_queue.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Travail introuvable"}), 404
+    return jsonify(job)
+
+@app.route('/queue/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Relance un travail échoué sans renvoyer tout le lot"""
+    if not print_queue.retry(job_id):
+        return jsonify({"error": "Travail introuvable ou non échoué"}), 400
+    return jsonify({"success": True, "job_id": job_id})
+
 if __name__ == '__main__':
     print("=" * 60)
     print("DNP Direct Print Service")
     print("=" * 60)
     print(f"Service démarré sur http://localhost:{PORT}")
     print(f"Imprimante: {get_printer_name()}")
+    print(f"Backend: {printer_backend.describe()}")
+    print(f"Spool: {PRINT_SPOOL_DIR}")
     print("")
     print("Endpoints:")
     print(f"  GET  http://localhost:{PORT}/health   - Vérifier le service")
     print(f"  GET  http://localhost:{PORT}/printers - Lister les imprimantes")
     print(f"  POST http://localhost:{PORT}/print    - Imprimer une photo")
     print(f"  POST http://localhost:{PORT}/print-batch - Imprimer plusieurs photos")
+    print(f"  GET  http://localhost:{PORT}/queue    - État de la file d'impression")
+    print(f"  POST http://localhost:{PORT}/queue/<job_id>/retry - Relancer un travail")
     print("=" * 60)
     
+    print_queue.start()
     app.run(host='127.0.0.1', port=PORT, debug=False)
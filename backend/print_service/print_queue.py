@@ -0,0 +1,421 @@
+"""
+File d'impression persistante pour le DNP Print Service
+
+- Les travaux sont enregistrés dans une base SQLite du dossier de spool et
+  survivent à un redémarrage du service.
+- Les téléchargements sont préchargés en parallèle pendant que l'imprimante
+  travaille, l'impression reste strictement séquentielle.
+- Chaque travail a son identifiant, son nombre de tentatives et peut être
+  relancé individuellement. Un téléchargement échoué est reprogrammé après un
+  délai croissant, sans occuper un thread de téléchargement pendant l'attente.
+- Les travaux terminés sont purgés de la base (et du spool) après
+  `retention` secondes.
+- Le backend d'impression est interchangeable : Windows (DNP) en production,
+  dossier de sortie ("file sink") pour tester sous Linux.
+
+Ce module n'utilise que la bibliothèque standard.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'un travail
+STATUS_QUEUED = "queued"
+STATUS_DOWNLOADING = "downloading"
+STATUS_READY = "ready"
+STATUS_PRINTING = "printing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+FINAL_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+# Fenêtre (secondes) utilisée pour calculer le débit en impressions/minute
+THROUGHPUT_WINDOW = 300
+
+# Intervalle (secondes) entre deux purges des travaux terminés
+PRUNE_INTERVAL = 3600
+
+
+# ==================== BACKENDS ====================
+
+class PrinterBackend:
+    """Interface d'un backend d'impression"""
+    name = "base"
+
+    def print_file(self, image_path, printer_name, copies=1):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.name
+
+
+class WindowsPrinterBackend(PrinterBackend):
+    """Impression via l'API Windows (fonction fournie par le service)"""
+    name = "windows"
+
+    def __init__(self, print_func):
+        self._print_func = print_func
+
+    def print_file(self, image_path, printer_name, copies=1):
+        return bool(self._print_func(image_path, printer_name, copies))
+
+
+class FileSinkBackend(PrinterBackend):
+    """Copie chaque impression dans un dossier - pour les tests sous Linux"""
+    name = "file"
+
+    def __init__(self, sink_dir, delay=0.0):
+        self.sink_dir = sink_dir
+        self.delay = delay
+        os.makedirs(sink_dir, exist_ok=True)
+
+    def print_file(self, image_path, printer_name, copies=1):
+        base = os.path.splitext(os.path.basename(image_path))[0]
+        ext = os.path.splitext(image_path)[1] or ".jpg"
+        for copy_index in range(copies):
+            if self.delay:
+                time.sleep(self.delay)
+            shutil.copyfile(image_path, os.path.join(self.sink_dir, f"{base}_{copy_index + 1}{ext}"))
+        return True
+
+    def describe(self):
+        return f"{self.name}:{self.sink_dir}"
+
+
+def create_backend(name, print_func=None, sink_dir=None, delay=0.0):
+    """Instancie le backend demandé ("windows" ou "file")"""
+    if name == "file":
+        return FileSinkBackend(sink_dir or os.path.join(os.getcwd(), "print_sink"), delay=delay)
+    if name == "windows":
+        if print_func is None:
+            raise ValueError("Le backend windows nécessite une fonction d'impression")
+        return WindowsPrinterBackend(print_func)
+    raise ValueError(f"Backend d'impression inconnu: {name}")
+
+
+# ==================== FILE D'IMPRESSION ====================
+
+class PrintQueue:
+    """
+    File d'impression persistante.
+
+    `prepare_func(url, dest_path)` télécharge l'image et l'écrit en JPEG dans
+    `dest_path`. Elle retourne True en cas de succès ou lève une exception.
+    """
+
+    def __init__(self, spool_dir, backend, prepare_func, prefetch_workers=3,
+                 max_attempts=3, retry_delay=2.0, retention=7 * 86400):
+        self.spool_dir = spool_dir
+        self.backend = backend
+        self.prepare_func = prepare_func
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.prefetch_workers = prefetch_workers
+        self.retention = retention
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(spool_dir, "queue.db"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+        self._cond = threading.Condition()
+        self._printed = deque()
+        self._executor = None
+        self._printer_thread = None
+        self._stopping = False
+        self._started_at = None
+        self._retry_timers = set()
+        self._pruned_at = 0
+
+    # ---------- Persistance ----------
+
+    def _init_db(self):
+        with self._db_lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    batch_id TEXT,
+                    url TEXT NOT NULL,
+                    copies INTEGER NOT NULL DEFAULT 1,
+                    printer TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    spool_path TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    printed_at REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, seq)")
+            self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def _fetchall(self, sql, params=()):
+        with self._db_lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get_job(self, job_id):
+        rows = self._fetchall("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    # ---------- Cycle de vie ----------
+
+    def start(self):
+        """Démarre les threads et reprend les travaux interrompus"""
+        if self._printer_thread is not None:
+            return
+        self._stopping = False
+        self._started_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=self.prefetch_workers, thread_name_prefix="print-prefetch")
+
+        # Historique du débit
+        since = time.time() - THROUGHPUT_WINDOW
+        for row in self._fetchall("SELECT printed_at FROM jobs WHERE printed_at >= ? ORDER BY printed_at", (since,)):
+            self._printed.append(row["printed_at"])
+
+        # Reprise : un travail interrompu pendant l'impression repart de "ready",
+        # un téléchargement interrompu est relancé
+        for job in self._fetchall("SELECT * FROM jobs WHERE status NOT IN (?, ?) ORDER BY seq", FINAL_STATUSES):
+            if job["status"] in (STATUS_READY, STATUS_PRINTING) and job["spool_path"] and os.path.exists(job["spool_path"]):
+                self._update(job["id"], status=STATUS_READY)
+            else:
+                self._update(job["id"], status=STATUS_QUEUED)
+                self._executor.submit(self._prefetch, job["id"])
+
+        self._printer_thread = threading.Thread(target=self._printer_loop, name="print-worker", daemon=True)
+        self._printer_thread.start()
+        logger.info(f"File d'impression démarrée (backend: {self.backend.describe()})")
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        with self._cond:
+            self._cond.notify_all()
+        if self._printer_thread:
+            self._printer_thread.join(timeout)
+            self._printer_thread = None
+        with self._cond:
+            timers, self._retry_timers = self._retry_timers, set()
+        for timer in timers:
+            timer.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # ---------- Soumission ----------
+
+    def _insert_jobs(self, images, printer, batch_id):
+        """Enregistre les travaux en une seule transaction : tout le lot ou rien"""
+        invalid = [index for index, image in enumerate(images) if not image.get("url")]
+        if invalid:
+            raise ValueError(f"URL manquante pour les images {invalid}")
+        self.start()
+        now = time.time()
+        rows = [
+            (str(uuid.uuid4()), batch_id, image["url"], int(image.get("copies") or 1), printer, STATUS_QUEUED, now, now)
+            for image in images
+        ]
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO jobs (id, batch_id, url, copies, printer, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        job_ids = [row[0] for row in rows]
+        for job_id in job_ids:
+            self._executor.submit(self._prefetch, job_id)
+        return job_ids
+
+    def submit(self, url, copies=1, printer=None, batch_id=None):
+        """Ajoute un travail et lance son téléchargement immédiatement"""
+        return self._insert_jobs([{"url": url, "copies": copies}], printer, batch_id)[0]
+
+    def submit_batch(self, images, printer=None):
+        """Ajoute plusieurs travaux partageant un même batch_id.
+        Lève ValueError, sans rien ajouter, si une image n'a pas d'URL."""
+        batch_id = str(uuid.uuid4())
+        return batch_id, self._insert_jobs(images, printer, batch_id)
+
+    def retry(self, job_id):
+        """Relance un travail échoué (compteur de tentatives remis à zéro)"""
+        job = self.get_job(job_id)
+        if not job or job["status"] != STATUS_FAILED:
+            return False
+        self.start()
+        if job["spool_path"] and os.path.exists(job["spool_path"]):
+            self._update(job_id, status=STATUS_READY, attempts=0, error=None)
+            with self._cond:
+                self._cond.notify_all()
+        else:
+            self._update(job_id, status=STATUS_QUEUED, attempts=0, error=None)
+            self._executor.submit(self._prefetch, job_id)
+        return True
+
+    def wait(self, job_ids, timeout=120):
+        """Attend que tous les travaux soient terminés (ou le délai écoulé)"""
+        deadline = time.time() + timeout
+        placeholders = ", ".join("?" for _ in job_ids)
+        while True:
+            jobs = self._fetchall(f"SELECT * FROM jobs WHERE id IN ({placeholders}) ORDER BY seq", tuple(job_ids))
+            if all(job["status"] in FINAL_STATUSES for job in jobs) or time.time() >= deadline:
+                return jobs
+            with self._cond:
+                self._cond.wait(0.5)
+
+    # ---------- Téléchargement ----------
+
+    def _schedule_retry(self, job_id, delay):
+        """Relance le téléchargement après `delay` secondes ; le thread appelant est libéré aussitôt"""
+        def resubmit():
+            with self._cond:
+                self._retry_timers.discard(timer)
+            executor = self._executor
+            if executor is not None and not self._stopping:
+                executor.submit(self._prefetch, job_id)
+
+        timer = threading.Timer(delay, resubmit)
+        timer.daemon = True
+        with self._cond:
+            self._retry_timers.add(timer)
+        timer.start()
+
+    def _prefetch(self, job_id):
+        job = self.get_job(job_id)
+        if not job or job["status"] != STATUS_QUEUED:
+            return
+        spool_path = os.path.join(self.spool_dir, f"{job_id}.jpg")
+        self._update(job_id, status=STATUS_DOWNLOADING)
+        try:
+            if not self.prepare_func(job["url"], spool_path):
+                raise RuntimeError("Téléchargement échoué")
+            self._update(job_id, status=STATUS_READY, spool_path=spool_path, error=None)
+            with self._cond:
+                self._cond.notify_all()
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            logger.warning(f"Téléchargement {job_id} échoué (tentative {attempts}/{self.max_attempts}): {e}")
+            if attempts < self.max_attempts and not self._stopping:
+                self._update(job_id, status=STATUS_QUEUED, attempts=attempts, error=str(e))
+                self._schedule_retry(job_id, self.retry_delay * attempts)
+            else:
+                self._update(job_id, status=STATUS_FAILED, attempts=attempts, error=str(e))
+                with self._cond:
+                    self._cond.notify_all()
+
+    # ---------- Impression ----------
+
+    def _next_ready(self):
+        rows = self._fetchall("SELECT * FROM jobs WHERE status = ? ORDER BY seq LIMIT 1", (STATUS_READY,))
+        return rows[0] if rows else None
+
+    def prune(self, now=None):
+        """Supprime les travaux terminés depuis plus de `retention` secondes (et leur image en spool)"""
+        cutoff = (now or time.time()) - self.retention
+        placeholders = ", ".join("?" for _ in FINAL_STATUSES)
+        old = self._fetchall(
+            f"SELECT id, spool_path FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+            (*FINAL_STATUSES, cutoff)
+        )
+        for job in old:
+            if job["spool_path"]:
+                try:
+                    os.unlink(job["spool_path"])
+                except OSError:
+                    pass
+        if old:
+            self._execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINAL_STATUSES, cutoff)
+            )
+            logger.info(f"{len(old)} travail(aux) terminé(s) purgé(s) de la file")
+        return len(old)
+
+    def _printer_loop(self):
+        while not self._stopping:
+            if time.time() - self._pruned_at >= PRUNE_INTERVAL:
+                self._pruned_at = time.time()
+                try:
+                    self.prune()
+                except sqlite3.Error as e:
+                    logger.warning(f"Purge de la file échouée: {e}")
+            job = self._next_ready()
+            if not job:
+                with self._cond:
+                    self._cond.wait(1.0)
+                continue
+
+            self._update(job["id"], status=STATUS_PRINTING)
+            try:
+                success = self.backend.print_file(job["spool_path"], job["printer"], job["copies"])
+                error = None if success else "Échec de l'impression"
+            except Exception as e:
+                success, error = False, str(e)
+
+            if success:
+                printed_at = time.time()
+                self._update(job["id"], status=STATUS_DONE, printed_at=printed_at, error=None)
+                self._printed.append(printed_at)
+                try:
+                    os.unlink(job["spool_path"])
+                except OSError:
+                    pass
+            else:
+                attempts = job["attempts"] + 1
+                logger.warning(f"Impression {job['id']} échouée (tentative {attempts}/{self.max_attempts}): {error}")
+                status = STATUS_READY if attempts < self.max_attempts else STATUS_FAILED
+                self._update(job["id"], status=status, attempts=attempts, error=error)
+                if status == STATUS_READY:
+                    time.sleep(self.retry_delay)
+
+            with self._cond:
+                self._cond.notify_all()
+
+    # ---------- Statistiques ----------
+
+    def prints_per_minute(self):
+        cutoff = time.time() - THROUGHPUT_WINDOW
+        while self._printed and self._printed[0] < cutoff:
+            self._printed.popleft()
+        if not self._printed:
+            return 0.0
+        # Juste après le démarrage, la fenêtre n'est pas encore pleine
+        elapsed = time.time() - min(self._printed[0], self._started_at or self._printed[0])
+        window = max(min(THROUGHPUT_WINDOW, elapsed), 60)
+        return round(len(self._printed) * 60 / window, 2)
+
+    def status(self, recent=20):
+        counts = {row["status"]: row["count"] for row in self._fetchall(
+            "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+        )}
+        jobs = self._fetchall(
+            "SELECT id, batch_id, url, copies, status, attempts, error, created_at, printed_at "
+            "FROM jobs ORDER BY seq DESC LIMIT ?", (recent,)
+        )
+        return {
+            "backend": self.backend.describe(),
+            "pending": sum(counts.get(s, 0) for s in (STATUS_QUEUED, STATUS_DOWNLOADING, STATUS_READY, STATUS_PRINTING)),
+            "counts": counts,
+            "prints_per_minute": self.prints_per_minute(),
+            "jobs": jobs
+        }
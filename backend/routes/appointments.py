@@ -13,23 +13,18 @@ import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
 
 # Import SMS service
 from services.sms_service import send_appointment_reminder_sms
+from services.executors import run_io
 
 # Configuration
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'test_database')
 SMTP_HOST = os.environ.get('SMTP_HOST', '')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
 SMTP_EMAIL = os.environ.get('SMTP_EMAIL', '')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 
-# Database connection
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
-
 # Router
 router = APIRouter(tags=["Appointments"])
 
@@ -359,7 +354,7 @@ async def create_appointment(data: AppointmentCreate):
     
     # Send confirmation email to client
     try:
-        send_appointment_request_email(
+        await run_io(send_appointment_request_email,
             client_email=data.client_email,
             client_name=data.client_name,
             appointment_type=type_label,
@@ -372,7 +367,7 @@ async def create_appointment(data: AppointmentCreate):
     
     # Send notification to admin
     try:
-        send_admin_appointment_notification(
+        await run_io(send_admin_appointment_notification,
             appointment_id=appointment.id,
             client_name=data.client_name,
             client_email=data.client_email,
@@ -420,7 +415,7 @@ async def update_appointment(appointment_id: str, data: AppointmentAdminUpdate,
     
     if data.status == "confirmed":
         try:
-            send_appointment_confirmed_email(
+            await run_io(send_appointment_confirmed_email,
                 client_email=appointment["client_email"],
                 client_name=appointment["client_name"],
                 appointment_type=type_label,
@@ -434,7 +429,7 @@ async def update_appointment(appointment_id: str, data: AppointmentAdminUpdate,
     
     elif data.status == "refused":
         try:
-            send_appointment_refused_email(
+            await run_io(send_appointment_refused_email,
                 client_email=appointment["client_email"],
                 client_name=appointment["client_name"],
                 appointment_type=type_label,
@@ -452,7 +447,7 @@ async def update_appointment(appointment_id: str, data: AppointmentAdminUpdate,
         update_data["new_proposed_time"] = data.new_proposed_time
         
         try:
-            send_appointment_reschedule_email(
+            await run_io(send_appointment_reschedule_email,
                 client_email=appointment["client_email"],
                 client_name=appointment["client_name"],
                 appointment_type=type_label,
@@ -508,7 +503,7 @@ async def confirm_rescheduled_appointment(appointment_id: str, token: str):
     
     type_label = appointment.get("appointment_type_label", appointment.get("appointment_type"))
     try:
-        send_appointment_confirmed_email(
+        await run_io(send_appointment_confirmed_email,
             client_email=appointment["client_email"],
             client_name=appointment["client_name"],
             appointment_type=type_label,
@@ -566,7 +561,7 @@ async def send_appointment_reminders(admin: dict = Depends(lambda: _get_current_
             continue
         
         # Send SMS reminder
-        success = send_appointment_reminder_sms(
+        success = await run_io(send_appointment_reminder_sms,
             client_phone=client_phone,
             client_name=client_name,
             appointment_date=appointment_date,
@@ -635,7 +630,7 @@ async def send_single_reminder(appointment_id: str, admin: dict = Depends(lambda
     if not client_phone:
         raise HTTPException(status_code=400, detail="No phone number for this appointment")
     
-    success = send_appointment_reminder_sms(
+    success = await run_io(send_appointment_reminder_sms,
         client_phone=client_phone,
         client_name=appointment.get("client_name", ""),
         appointment_date=appointment.get("proposed_date", ""),
@@ -2,7 +2,6 @@
 Routes d'authentification et gestion des clients
 """
 import uuid
-import shutil
 import logging
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
@@ -16,6 +15,7 @@ from dependencies import (
     get_current_client, security
 )
 from models.schemas import ClientCreate, ClientResponse
+from services.uploads import save_upload, MAX_IMAGE_SIZE
 
 router = APIRouter(tags=["Clients"])
 
@@ -175,15 +175,15 @@ async def upload_client_photo(
         raise HTTPException(status_code=400, detail="Type de fichier non supporté. Utilisez JPG, PNG ou WEBP.")
     
     client_folder = UPLOADS_DIR / "clients" / client["id"]
-    client_folder.mkdir(exist_ok=True, parents=True)
     
     file_ext = Path(file.filename).suffix.lower()
     photo_filename = f"profile{file_ext}"
     file_path = client_folder / photo_filename
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload(file, file_path, max_size=MAX_IMAGE_SIZE, allowed_types=ALLOWED_IMAGE_TYPES)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'upload: {str(e)}")
     
@@ -10,20 +10,20 @@ import uuid
 import random
 import string
 from datetime import datetime, timedelta
-from motor.motor_asyncio import AsyncIOMotorClient
+from pathlib import Path
 from dotenv import load_dotenv
+from database import db as shared_db
+from services.executors import run_io
+from services.uploads import save_upload, MAX_DOCUMENT_SIZE
 import base64
 
 load_dotenv()
 
 router = APIRouter(prefix="/contracts", tags=["Contracts"])
 
-# Database connection
+# Database connection (shared pool, see database.py)
 def get_db():
-    mongo_url = os.environ.get('MONGO_URL')
-    db_name = os.environ.get('DB_NAME', 'creativindustry')
-    client = AsyncIOMotorClient(mongo_url)
-    return client[db_name]
+    return shared_db
 
 # Models
 class ContractField(BaseModel):
@@ -81,19 +81,17 @@ async def upload_contract_pdf(file: UploadFile = File(...)):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un PDF")
     
-    # Create uploads directory if not exists
+    # Uploads directory
     upload_dir = "/app/backend/uploads/contracts"
-    os.makedirs(upload_dir, exist_ok=True)
     
     # Generate unique filename
     file_id = str(uuid.uuid4())
     filename = f"{file_id}.pdf"
     filepath = os.path.join(upload_dir, filename)
     
-    # Save file
-    content = await file.read()
-    with open(filepath, 'wb') as f:
-        f.write(content)
+    # Save file (streamed, must really be a PDF)
+    await save_upload(file, Path(filepath), max_size=MAX_DOCUMENT_SIZE, allowed_types=["application/pdf"],
+                      allowed_extensions=[".pdf"])
     
     # Return URL (relative path)
     return {
@@ -202,7 +200,7 @@ async def send_contract_to_client(request: SendContractRequest):
     # Send email notification to client
     try:
         from services.email_service import send_email
-        await send_email(
+        await run_io(send_email,
             to_email=client.get("email"),
             subject="📋 Nouveau contrat à signer - CREATIVINDUSTRY",
             html_content=f"""
@@ -308,7 +306,7 @@ async def request_signature_otp(contract_id: str):
     # Send OTP by email
     try:
         from services.email_service import send_email
-        await send_email(
+        await run_io(send_email,
             to_email=contract.get("client_email"),
             subject="🔐 Code de signature - CREATIVINDUSTRY",
             html_content=f"""
@@ -362,7 +360,7 @@ async def sign_contract(contract_id: str, request: SignContractRequest):
     try:
         from services.email_service import send_email
         admin_email = os.environ.get('SMTP_EMAIL', 'contact@creativindustry.com')
-        await send_email(
+        await run_io(send_email,
             to_email=admin_email,
             subject=f"✅ Contrat signé - {contract.get('client_name')}",
             html_content=f"""
@@ -5,6 +5,7 @@ Gestion du matériel et des déplacements
 
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Body
 from fastapi.security import HTTPBearer
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
@@ -12,17 +13,16 @@ import uuid
 import os
 import logging
 from pathlib import Path
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+
+from services import equipment_availability, dashboard_stats, search_index
+from services.pdf_service import render_pdf, render_pdf_file
+from services.executors import run_io
+from services.uploads import save_upload, IMAGE_TYPES, DOCUMENT_TYPES, MAX_DOCUMENT_SIZE
 
 # Configuration
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'test_database')
 SITE_URL = os.environ.get("SITE_URL", "https://creativindustry.com")
 
-# Database connection
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
-
 router = APIRouter(tags=["Equipment"])
 
 # Upload directory for invoices
@@ -78,6 +78,15 @@ class Equipment(BaseModel):
     notes: Optional[str] = None
     quantity: Optional[int] = 1
 
+# Fields indexed by the equipment search (services/search_index.py)
+EQUIPMENT_SEARCH_FIELDS = ("name", "brand", "model", "serial_number")
+
+def equipment_search_keys(item) -> dict:
+    """Normalized search keys for an equipment document or payload"""
+    if isinstance(item, dict):
+        return search_index.search_keys(*(item.get(field) for field in EQUIPMENT_SEARCH_FIELDS))
+    return search_index.search_keys(*(getattr(item, field) for field in EQUIPMENT_SEARCH_FIELDS))
+
 class DeploymentItem(BaseModel):
     equipment_id: str
     quantity: int = 1
@@ -90,12 +99,22 @@ class Deployment(BaseModel):
     notes: Optional[str] = None
     equipment_ids: List[str] = []  # Legacy support
     equipment_items: Optional[List[DeploymentItem]] = None  # New format with quantities
+    force: bool = False  # Save even if some equipment is already booked on these dates
 
 class DeploymentItemStatus(BaseModel):
     equipment_id: str
     status: str  # checked_out, returned, lost, forgotten, stolen, damaged
     notes: Optional[str] = None
 
+# ==================== SEARCH INDEX ====================
+
+async def ensure_search_indexes():
+    """Prefix/trigram indexes for the equipment search, and search keys for items created before them"""
+    await search_index.ensure_indexes(db.equipment)
+    updated = await search_index.backfill(db.equipment, EQUIPMENT_SEARCH_FIELDS)
+    if updated:
+        logging.info(f"Equipment search keys added to {updated} item(s)")
+
 # ==================== EQUIPMENT CATEGORIES ====================
 
 @router.get("/equipment/categories")
@@ -146,30 +165,8 @@ async def delete_equipment_category(category_id: str, current_user: dict = Depen
 
 @router.get("/equipment/stats")
 async def get_equipment_stats(current_user: dict = Depends(get_current_user)):
-    """Get equipment statistics"""
-    total = await db.equipment.count_documents({})
-    available = await db.equipment.count_documents({"is_available": True})
-    in_deployment = await db.equipment.count_documents({"is_available": False})
-    
-    # By condition
-    conditions = {}
-    for cond in ["neuf", "bon", "usé", "à_réparer", "hors_service"]:
-        conditions[cond] = await db.equipment.count_documents({"condition": cond})
-    
-    # Active deployments
-    active_deployments = await db.deployments.count_documents({"status": {"$in": ["planned", "in_progress"]}})
-    
-    # Unresolved reminders
-    unresolved_reminders = await db.equipment_reminders.count_documents({"resolved": False})
-    
-    return {
-        "total_equipment": total,
-        "available": available,
-        "in_deployment": in_deployment,
-        "by_condition": conditions,
-        "active_deployments": active_deployments,
-        "unresolved_reminders": unresolved_reminders
-    }
+    """Get equipment statistics (one aggregation per collection, cached until the next write)"""
+    return await dashboard_stats.equipment_stats()
 
 @router.get("/equipment/reminders")
 async def get_equipment_reminders(current_user: dict = Depends(get_current_user)):
@@ -221,6 +218,64 @@ async def resolve_reminder(reminder_id: str, current_user: dict = Depends(get_cu
     
     return {"message": "Rappel résolu"}
 
+# ==================== AVAILABILITY ====================
+
+class AvailabilityCheck(BaseModel):
+    start_date: str
+    end_date: Optional[str] = None
+    equipment_items: List[DeploymentItem] = []
+    deployment_id: Optional[str] = None  # Deployment being edited (its own bookings are ignored)
+
+def item_quantities(items) -> dict:
+    """Requested quantity per equipment id"""
+    quantities = {}
+    for item in items:
+        equipment_id = item["equipment_id"] if isinstance(item, dict) else item.equipment_id
+        quantity = item.get("quantity", 1) if isinstance(item, dict) else item.quantity
+        quantities[equipment_id] = quantities.get(equipment_id, 0) + (quantity or 1)
+    return quantities
+
+async def check_conflicts(quantities: dict, start_date, end_date, exclude_deployment_id: str = None,
+                          force: bool = False, open_ended: Optional[bool] = None) -> list:
+    """Conflicts for a booking; raises 409 with the details unless force is set"""
+    try:
+        conflicts = await equipment_availability.find_conflicts(
+            db, quantities, start_date, end_date, exclude_deployment_id=exclude_deployment_id,
+            open_ended=open_ended
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if conflicts and not force:
+        raise HTTPException(status_code=409, detail={
+            "message": "Matériel déjà réservé sur cette période",
+            "conflicts": conflicts
+        })
+    return conflicts
+
+@router.get("/equipment/availability")
+async def get_equipment_availability(
+    start_date: str,
+    end_date: Optional[str] = None,
+    category_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Free quantity of every equipment item between start_date and end_date"""
+    try:
+        return await equipment_availability.availability_between(
+            db, start_date, end_date, {"category_id": category_id} if category_id else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/deployments/check-availability")
+async def check_deployment_availability(data: AvailabilityCheck, current_user: dict = Depends(get_current_user)):
+    """Check a planned deployment against existing bookings without saving it"""
+    conflicts = await check_conflicts(
+        item_quantities(data.equipment_items), data.start_date, data.end_date,
+        exclude_deployment_id=data.deployment_id, force=True
+    )
+    return {"available": not conflicts, "conflicts": conflicts}
+
 @router.get("/equipment")
 async def get_equipment_list(
     category_id: Optional[str] = None,
@@ -235,15 +290,14 @@ async def get_equipment_list(
         query["category_id"] = category_id
     if condition:
         query["condition"] = condition
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"brand": {"$regex": search, "$options": "i"}},
-            {"model": {"$regex": search, "$options": "i"}},
-            {"serial_number": {"$regex": search, "$options": "i"}}
-        ]
+    search_filter = search_index.search_filter(search) if search else None
+    if search_filter:
+        query.update(search_filter)
     
     equipment = await db.equipment.find(query, {"_id": 0}).sort("name", 1).to_list(1000)
+    if search_filter:
+        equipment = [item for item in equipment if search_index.matches(item, search)]
+    equipment = search_index.strip_search_fields(equipment)
     
     # Add category info
     categories = {c["id"]: c for c in await db.equipment_categories.find({}, {"_id": 0}).to_list(100)}
@@ -256,7 +310,7 @@ async def get_equipment_list(
 @router.get("/equipment/{equipment_id}")
 async def get_equipment(equipment_id: str, current_user: dict = Depends(get_current_user)):
     """Get a single equipment item"""
-    equipment = await db.equipment.find_one({"id": equipment_id}, {"_id": 0})
+    equipment = await db.equipment.find_one({"id": equipment_id}, {"_id": 0, **search_index.HIDDEN_SEARCH_FIELDS})
     if not equipment:
         raise HTTPException(status_code=404, detail="Équipement non trouvé")
     
@@ -283,6 +337,7 @@ async def create_equipment(data: Equipment, current_user: dict = Depends(get_cur
         "condition": data.condition,
         "notes": data.notes,
         "quantity": data.quantity,
+        **equipment_search_keys(data),
         "invoice_url": None,
         "is_available": True,
         "current_deployment_id": None,
@@ -307,6 +362,7 @@ async def update_equipment(equipment_id: str, data: Equipment, current_user: dic
         "condition": data.condition,
         "notes": data.notes,
         "quantity": data.quantity,
+        **equipment_search_keys(data),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
@@ -336,7 +392,7 @@ async def delete_equipment(equipment_id: str, current_user: dict = Depends(get_c
 @router.get("/equipment-trash")
 async def get_equipment_trash(current_user: dict = Depends(get_current_user)):
     """Get all trashed equipment"""
-    items = await db.equipment_trash.find({}, {"_id": 0}).sort("deleted_at", -1).to_list(500)
+    items = await db.equipment_trash.find({}, {"_id": 0, **search_index.HIDDEN_SEARCH_FIELDS}).sort("deleted_at", -1).to_list(500)
     return items
 
 @router.post("/equipment-trash/{equipment_id}/restore")
@@ -350,6 +406,7 @@ async def restore_equipment(equipment_id: str, current_user: dict = Depends(get_
     item.pop("deleted_at", None)
     item.pop("deleted_by", None)
     item.pop("deleted_by_name", None)
+    item.update(equipment_search_keys(item))
     
     await db.equipment.insert_one(item)
     await db.equipment_trash.delete_one({"id": equipment_id})
@@ -375,13 +432,10 @@ async def upload_equipment_invoice(
         raise HTTPException(status_code=404, detail="Équipement non trouvé")
     
     # Save file
-    file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'pdf'
+    file_ext = Path(file.filename).suffix.lstrip('.') or 'pdf'
     filename = f"invoice_{equipment_id}_{uuid.uuid4().hex[:8]}.{file_ext}"
-    filepath = EQUIPMENT_DIR / filename
-    
-    content = await file.read()
-    with open(filepath, 'wb') as f:
-        f.write(content)
+    await save_upload(file, EQUIPMENT_DIR / filename, max_size=MAX_DOCUMENT_SIZE,
+                      allowed_types=IMAGE_TYPES + DOCUMENT_TYPES)
     
     invoice_url = f"/uploads/equipment/{filename}"
     
@@ -416,7 +470,9 @@ async def get_deployment(deployment_id: str, current_user: dict = Depends(get_cu
     
     # Get equipment details
     equipment_ids = [item["equipment_id"] for item in deployment.get("items", [])]
-    equipment_list = await db.equipment.find({"id": {"$in": equipment_ids}}, {"_id": 0}).to_list(100)
+    equipment_list = await db.equipment.find(
+        {"id": {"$in": equipment_ids}}, {"_id": 0, **search_index.HIDDEN_SEARCH_FIELDS}
+    ).to_list(100)
     equipment_map = {e["id"]: e for e in equipment_list}
     
     # Merge equipment info with status
@@ -461,6 +517,8 @@ async def create_deployment(data: Deployment, current_user: dict = Depends(get_c
                 "notes": None
             })
     
+    conflicts = await check_conflicts(item_quantities(items), data.start_date, data.end_date, force=data.force)
+    
     deployment = {
         "id": deployment_id,
         "name": data.name,
@@ -475,8 +533,9 @@ async def create_deployment(data: Deployment, current_user: dict = Depends(get_c
     }
     
     await db.deployments.insert_one(deployment)
+    await equipment_availability.refresh_deployment(db, deployment_id)
     
-    return {"id": deployment_id, "message": "Déplacement créé"}
+    return {"id": deployment_id, "message": "Déplacement créé", "conflicts": conflicts}
 
 class DeploymentUpdate(BaseModel):
     name: Optional[str] = None
@@ -485,6 +544,7 @@ class DeploymentUpdate(BaseModel):
     end_date: Optional[str] = None
     notes: Optional[str] = None
     equipment_items: Optional[List[DeploymentItem]] = None
+    force: bool = False
 
 @router.put("/deployments/{deployment_id}")
 async def update_deployment(deployment_id: str, data: DeploymentUpdate, current_user: dict = Depends(get_current_user)):
@@ -534,9 +594,20 @@ async def update_deployment(deployment_id: str, data: DeploymentUpdate, current_
         
         update_data["items"] = new_items
     
+    # Re-check bookings when the dates or the equipment change
+    conflicts = []
+    booked = {**deployment, **update_data}
+    if {"start_date", "end_date", "items"} & update_data.keys():
+        conflicts = await check_conflicts(
+            equipment_availability.reserved_items(booked), booked.get("start_date"), booked.get("end_date"),
+            exclude_deployment_id=deployment_id, force=data.force,
+            open_ended=booked.get("status") == "in_progress"
+        )
+    
     await db.deployments.update_one({"id": deployment_id}, {"$set": update_data})
+    await equipment_availability.refresh_deployment(db, deployment_id)
     
-    return {"message": "Déplacement mis à jour"}
+    return {"message": "Déplacement mis à jour", "conflicts": conflicts}
 
 @router.post("/deployments/{deployment_id}/start")
 async def start_deployment(deployment_id: str, current_user: dict = Depends(get_current_user)):
@@ -550,6 +621,7 @@ async def start_deployment(deployment_id: str, current_user: dict = Depends(get_
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Déplacement non trouvé")
+    await equipment_availability.refresh_deployment(db, deployment_id)
     
     return {"message": "Déplacement démarré"}
 
@@ -607,6 +679,7 @@ async def validate_deployment_return(
             {"id": deployment_id},
             {"$set": {"status": "completed", "completed_at": now}}
         )
+    await equipment_availability.refresh_deployment(db, deployment_id)
     
     # Create reminders for lost/forgotten/damaged items
     for item in items_to_remind:
@@ -634,6 +707,7 @@ async def delete_deployment(deployment_id: str, current_user: dict = Depends(get
         raise HTTPException(status_code=404, detail="Déplacement non trouvé")
     
     await db.deployments.delete_one({"id": deployment_id})
+    await equipment_availability.refresh_deployment(db, deployment_id)
     return {"message": "Déplacement supprimé"}
 
 # ==================== SIGNATURE ====================
@@ -691,212 +765,48 @@ async def save_signature(deployment_id: str, data: SignatureData, current_user:
 
 @router.post("/deployments/check-reminders")
 async def check_deployment_reminders(current_user: dict = Depends(require_admin)):
-    """Check for deployments needing reminders and send notifications"""
-    from services.email_service import send_email
-    
-    today = datetime.now(timezone.utc).date()
-    tomorrow = today + timedelta(days=1)
-    
-    # Find deployments ending tomorrow (reminder)
-    deployments_ending = await db.deployments.find({
-        "status": {"$in": ["planned", "in_progress"]},
-        "end_date": tomorrow.isoformat()
-    }, {"_id": 0}).to_list(100)
-    
-    # Find overdue deployments (past end_date, not completed)
-    deployments_overdue = await db.deployments.find({
-        "status": {"$in": ["planned", "in_progress"]},
-        "end_date": {"$lt": today.isoformat()}
-    }, {"_id": 0}).to_list(100)
-    
-    reminders_sent = 0
-    
-    # Get admin emails
-    admins = await db.admins.find({"role": "complet"}, {"_id": 0, "email": 1}).to_list(10)
-    admin_emails = [a["email"] for a in admins if a.get("email")]
-    
-    # Send reminder for deployments ending tomorrow
-    for dep in deployments_ending:
-        for email in admin_emails:
-            try:
-                await send_email(
-                    to_email=email,
-                    subject=f"📦 Rappel: Retour matériel demain - {dep.get('name')}",
-                    html_content=f"""
-                    <h2>Rappel de retour matériel</h2>
-                    <p>Le déplacement <strong>{dep.get('name')}</strong> se termine demain ({dep.get('end_date')}).</p>
-                    <p>Lieu: {dep.get('location', 'Non spécifié')}</p>
-                    <p>Pensez à valider le retour du matériel sur l'application.</p>
-                    <p><a href="{SITE_URL}/admin/equipment">Accéder à la gestion du matériel</a></p>
-                    """
-                )
-                reminders_sent += 1
-            except Exception as e:
-                logging.error(f"Erreur envoi email: {e}")
-    
-    # Send alert for overdue deployments
-    for dep in deployments_overdue:
-        # Check if already alerted today
-        last_alert = dep.get("last_overdue_alert")
-        if last_alert and last_alert[:10] == today.isoformat():
-            continue
-            
-        for email in admin_emails:
-            try:
-                await send_email(
-                    to_email=email,
-                    subject=f"⚠️ ALERTE: Matériel non retourné - {dep.get('name')}",
-                    html_content=f"""
-                    <h2 style="color: red;">⚠️ Matériel non retourné</h2>
-                    <p>Le déplacement <strong>{dep.get('name')}</strong> devait se terminer le {dep.get('end_date')}.</p>
-                    <p>Le matériel n'a pas encore été retourné.</p>
-                    <p>Lieu: {dep.get('location', 'Non spécifié')}</p>
-                    <p><strong>Veuillez vérifier le statut du matériel immédiatement.</strong></p>
-                    <p><a href="{SITE_URL}/admin/equipment">Accéder à la gestion du matériel</a></p>
-                    """
-                )
-                reminders_sent += 1
-            except Exception as e:
-                logging.error(f"Erreur envoi email: {e}")
-        
-        # Mark as alerted today
-        await db.deployments.update_one(
-            {"id": dep["id"]},
-            {"$set": {"last_overdue_alert": today.isoformat()}}
-        )
-    
-    return {
-        "message": "Vérification terminée",
-        "reminders_sent": reminders_sent,
-        "ending_tomorrow": len(deployments_ending),
-        "overdue": len(deployments_overdue)
-    }
+    """Send deployment return reminders now (normally run by the scheduler at 9h)"""
+    from services.scheduler_service import run_job, send_equipment_return_reminders
+    
+    # Same job as the scheduled run: deployments already reminded are skipped
+    result = await run_job("daily_equipment_reminders", send_equipment_return_reminders)
+    if result is None:
+        return {"message": "Vérification déjà en cours", "reminders_sent": 0, "ending_tomorrow": 0, "overdue": 0}
+    return {"message": "Vérification terminée", **result}
 
 # ==================== PDF GENERATION ====================
 
+# Only the fields printed on the checklist, so the PDF cache key ignores availability changes
+PDF_EQUIPMENT_FIELDS = {"_id": 0, "id": 1, "name": 1, "brand": 1, "model": 1, "category_id": 1}
+
 @router.get("/deployments/{deployment_id}/pdf")
 async def generate_deployment_pdf(deployment_id: str, current_user: dict = Depends(get_current_user)):
     """Generate PDF for deployment checklist"""
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-    from reportlab.pdfgen import canvas
-    from io import BytesIO
-    from fastapi.responses import StreamingResponse
-    
     deployment = await db.deployments.find_one({"id": deployment_id}, {"_id": 0})
     if not deployment:
         raise HTTPException(status_code=404, detail="Déplacement non trouvé")
     
     # Get equipment details
     equipment_ids = [item["equipment_id"] for item in deployment.get("items", [])]
-    equipment_list = await db.equipment.find({"id": {"$in": equipment_ids}}, {"_id": 0}).to_list(100)
+    equipment_list = await db.equipment.find({"id": {"$in": equipment_ids}}, PDF_EQUIPMENT_FIELDS).to_list(100)
     equipment_map = {e["id"]: e for e in equipment_list}
     
     # Get categories
-    categories = {c["id"]: c for c in await db.equipment_categories.find({}, {"_id": 0}).to_list(100)}
-    
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20)
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Heading2'], fontSize=14, spaceAfter=10)
-    
-    elements = []
-    
-    # Title
-    elements.append(Paragraph("Fiche de Déplacement", title_style))
-    elements.append(Paragraph(f"<b>{deployment.get('name', 'Sans nom')}</b>", subtitle_style))
-    
-    # Info
-    info_data = [
-        ["Lieu:", deployment.get('location', '-')],
-        ["Date de départ:", deployment.get('start_date', '-')],
-        ["Date de retour:", deployment.get('end_date', '-')],
-    ]
-    if deployment.get('notes'):
-        info_data.append(["Notes:", deployment.get('notes')])
-    
-    info_table = Table(info_data, colWidths=[4*cm, 12*cm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 20))
-    
-    # Equipment table
-    elements.append(Paragraph("Liste du Matériel", subtitle_style))
-    
-    table_data = [["☐", "Qté", "Équipement", "Marque/Modèle", "Catégorie"]]
-    
-    for item in deployment.get("items", []):
-        eq = equipment_map.get(item["equipment_id"], {})
-        cat = categories.get(eq.get("category_id"), {})
-        
-        brand_model = f"{eq.get('brand', '')} {eq.get('model', '')}".strip() or "-"
-        quantity = item.get("quantity", 1)
-        
-        table_data.append([
-            "☐",
-            str(quantity),
-            eq.get("name", "Unknown"),
-            brand_model,
-            cat.get("name", "-")
-        ])
-    
-    eq_table = Table(table_data, colWidths=[1*cm, 1.2*cm, 5*cm, 4*cm, 3.5*cm])
-    eq_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.2, 0.2)),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'CENTER'),  # Center quantity column
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.Color(0.95, 0.95, 0.95)),
-        ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.7, 0.7, 0.7)),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-    ]))
-    elements.append(eq_table)
-    elements.append(Spacer(1, 30))
-    
-    # Signature section
-    elements.append(Paragraph("Validation", subtitle_style))
-    
-    sig_data = [
-        ["Départ", "Retour"],
-        ["Date: _________________", "Date: _________________"],
-        ["Signature:", "Signature:"],
-        ["", ""],
-        ["", ""],
-    ]
-    sig_table = Table(sig_data, colWidths=[8*cm, 8*cm])
-    sig_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-        ('BOX', (0, 0), (0, -1), 1, colors.black),
-        ('BOX', (1, 0), (1, -1), 1, colors.black),
-    ]))
-    elements.append(sig_table)
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
+    categories = {c["id"]: c for c in await db.equipment_categories.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)}
+    
+    pdf_path = await render_pdf_file(
+        "deployment_checklist",
+        deployment=deployment,
+        equipment_map=equipment_map,
+        categories=categories,
+        with_validation=True
+    )
     
     filename = f"deplacement_{deployment.get('name', deployment_id)[:20]}_{deployment.get('start_date', '')}.pdf"
     filename = filename.replace(' ', '_').replace('/', '-')
     
-    return StreamingResponse(
-        buffer,
+    return FileResponse(
+        str(pdf_path),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -911,12 +821,6 @@ class SendPdfEmail(BaseModel):
 async def send_deployment_pdf_email(deployment_id: str, data: SendPdfEmail, current_user: dict = Depends(get_current_user)):
     """Generate and send deployment PDF by email"""
     from services.email_service import send_email_with_attachment
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from io import BytesIO
     
     deployment = await db.deployments.find_one({"id": deployment_id}, {"_id": 0})
     if not deployment:
@@ -924,59 +828,18 @@ async def send_deployment_pdf_email(deployment_id: str, data: SendPdfEmail, curr
     
     # Get equipment details
     equipment_ids = [item["equipment_id"] for item in deployment.get("items", [])]
-    equipment_list = await db.equipment.find({"id": {"$in": equipment_ids}}, {"_id": 0}).to_list(100)
+    equipment_list = await db.equipment.find({"id": {"$in": equipment_ids}}, PDF_EQUIPMENT_FIELDS).to_list(100)
     equipment_map = {e["id"]: e for e in equipment_list}
-    categories = {c["id"]: c for c in await db.equipment_categories.find({}, {"_id": 0}).to_list(100)}
+    categories = {c["id"]: c for c in await db.equipment_categories.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(100)}
     
     # Build PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20)
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Heading2'], fontSize=14, spaceAfter=10)
-    elements = []
-    
-    elements.append(Paragraph("Fiche de Déplacement", title_style))
-    elements.append(Paragraph(f"<b>{deployment.get('name', 'Sans nom')}</b>", subtitle_style))
-    
-    info_data = [
-        ["Lieu:", deployment.get('location', '-')],
-        ["Date de départ:", deployment.get('start_date', '-')],
-        ["Date de retour:", deployment.get('end_date', '-')],
-    ]
-    if deployment.get('notes'):
-        info_data.append(["Notes:", deployment.get('notes')])
-    
-    info_table = Table(info_data, colWidths=[4*cm, 12*cm])
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 20))
-    
-    elements.append(Paragraph("Liste du Matériel", subtitle_style))
-    table_data = [["Qté", "Équipement", "Marque/Modèle", "Catégorie"]]
-    for item in deployment.get("items", []):
-        eq = equipment_map.get(item["equipment_id"], {})
-        cat = categories.get(eq.get("category_id"), {})
-        brand_model = f"{eq.get('brand', '')} {eq.get('model', '')}".strip() or "-"
-        table_data.append([str(item.get("quantity", 1)), eq.get("name", "?"), brand_model, cat.get("name", "-")])
-    
-    eq_table = Table(table_data, colWidths=[1.2*cm, 6*cm, 5*cm, 3.5*cm])
-    eq_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.2, 0.2)),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.7, 0.7, 0.7)),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-    ]))
-    elements.append(eq_table)
-    
-    doc.build(elements)
-    pdf_bytes = buffer.getvalue()
+    pdf_bytes = await render_pdf(
+        "deployment_checklist",
+        deployment=deployment,
+        equipment_map=equipment_map,
+        categories=categories,
+        with_validation=False
+    )
     
     filename = f"deplacement_{deployment.get('name', deployment_id)[:20]}_{deployment.get('start_date', '')}.pdf"
     filename = filename.replace(' ', '_').replace('/', '-')
@@ -995,7 +858,7 @@ async def send_deployment_pdf_email(deployment_id: str, data: SendPdfEmail, curr
     </div>
     """
     
-    result = send_email_with_attachment(
+    result = await run_io(send_email_with_attachment,
         to_email=data.email,
         subject=f"Checklist matériel — {deployment.get('name')}",
         html_content=email_html,
@@ -1119,7 +982,7 @@ async def create_loss_ticket(data: LossTicketCreate, current_user: dict = Depend
     """
     
     try:
-        await send_email(
+        await run_io(send_email,
             to_email=NOTIFICATION_EMAIL,
             subject=f"⚠️ MATÉRIEL {issue_label}: {data.equipment_name}",
             html_content=email_html
@@ -1248,7 +1111,7 @@ async def send_ticket_reminder(ticket_id: str, current_user: dict = Depends(get_
     """
     
     try:
-        await send_email(
+        await run_io(send_email,
             to_email=NOTIFICATION_EMAIL,
             subject=f"🔔 RAPPEL - Matériel {issue_labels.get(ticket.get('issue_type'), '')}: {ticket.get('equipment_name')}",
             html_content=email_html
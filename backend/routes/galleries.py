@@ -5,7 +5,7 @@ Refactorisé depuis server.py - Mars 2026
 
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 from datetime import datetime, timezone
@@ -15,8 +15,11 @@ import logging
 import os
 import io
 import zipfile
-import qrcode
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services.executors import run_io, run_cpu
+from services.file_delivery import deliver_file
+from services.signed_media import photo_urls
+from services.uploads import save_upload, IMAGE_TYPES, AUDIO_TYPES, MAX_IMAGE_SIZE, MAX_AUDIO_SIZE
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -24,17 +27,11 @@ from email.mime.multipart import MIMEMultipart
 security = HTTPBearer()
 
 # Configuration
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'test_database')
 SMTP_HOST = os.environ.get('SMTP_HOST', '')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
 SMTP_EMAIL = os.environ.get('SMTP_EMAIL', '')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 
-# Database connection
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
-
 # Uploads directory
 ROOT_DIR = Path(__file__).parent.parent
 UPLOADS_DIR = ROOT_DIR / "uploads"
@@ -180,17 +177,16 @@ async def upload_gallery_photos(gallery_id: str, files: List[UploadFile] = File(
     uploaded = []
     for file in files:
         photo_id = str(uuid.uuid4())
-        filename = f"{gallery_id}_{photo_id}_{file.filename}"
-        filepath = GALLERIES_DIR / filename
-        
-        content = await file.read()
-        with open(filepath, "wb") as f:
-            f.write(content)
+        filename = f"{gallery_id}_{photo_id}_{Path(file.filename).name}"
+        stored = await save_upload(file, GALLERIES_DIR / filename,
+                                   max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES)
         
         photo = {
             "id": photo_id,
             "url": f"/uploads/galleries/{filename}",
             "filename": filename,
+            "size": stored.size,
+            "sha256": stored.sha256,
             "uploaded_at": datetime.now(timezone.utc).isoformat()
         }
         uploaded.append(photo)
@@ -264,6 +260,10 @@ async def upload_gallery_music(gallery_id: str, file: UploadFile = File(...), ad
     gallery_folder = GALLERIES_DIR / gallery_id
     gallery_folder.mkdir(exist_ok=True)
     
+    # Save new music (the old one is kept if the upload is rejected)
+    music_filename = f"music_{str(uuid.uuid4())[:8]}_{Path(file.filename).name}"
+    await save_upload(file, gallery_folder / music_filename, max_size=MAX_AUDIO_SIZE, allowed_types=AUDIO_TYPES)
+    
     # Delete old music if exists
     old_music = gallery.get("music_url")
     if old_music:
@@ -271,13 +271,6 @@ async def upload_gallery_music(gallery_id: str, file: UploadFile = File(...), ad
         if old_path.exists():
             old_path.unlink()
     
-    # Save new music
-    music_filename = f"music_{uuid.uuid4()[:8]}_{file.filename}"
-    music_path = gallery_folder / music_filename
-    content = await file.read()
-    with open(music_path, "wb") as f:
-        f.write(content)
-    
     music_url = f"/uploads/galleries/{gallery_id}/{music_filename}"
     
     await db.galleries.update_one(
@@ -341,11 +334,13 @@ async def download_selection_zip(gallery_id: str, admin: dict = Depends(get_admi
     
     # Create ZIP
     zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for photo in photos:
-            filepath = GALLERIES_DIR / photo["filename"]
-            if filepath.exists():
-                zf.write(filepath, photo["filename"])
+    def build_zip():
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for photo in photos:
+                filepath = GALLERIES_DIR / photo["filename"]
+                if filepath.exists():
+                    zf.write(filepath, photo["filename"])
+    await run_cpu(build_zip)
     
     zip_buffer.seek(0)
     
@@ -361,6 +356,7 @@ async def download_selection_zip(gallery_id: str, admin: dict = Depends(get_admi
 @router.get("/admin/galleries/{gallery_id}/qrcode-3d")
 async def get_gallery_qrcode_3d(gallery_id: str, admin: dict = Depends(get_admin_auth)):
     """Generate QR code for 3D gallery view"""
+    import qrcode
     gallery = await db.galleries.find_one({"id": gallery_id})
     if not gallery:
         raise HTTPException(status_code=404, detail="Galerie non trouvée")
@@ -397,6 +393,21 @@ async def get_gallery_3d_info(gallery_id: str, admin: dict = Depends(get_admin_a
         "photo_count": len(gallery.get("photos", []))
     }
 
+# ==================== SIGNED URLS ====================
+
+HD_OPTIONS = ["hd_download", "pack_complete"]
+
+def sign_gallery_photos(gallery: dict, hd: bool = False) -> dict:
+    """Attach signed URLs to each photo (thumb/web, plus the HD download when purchased)
+    so the browser fetches images without any per-image authorization query"""
+    for photo in gallery.get("photos", []):
+        photo["signed_urls"] = photo_urls(
+            f"galleries/{Path(photo['filename']).name}",
+            sha256=photo.get("sha256"),
+            download=photo["filename"] if hd else None
+        )
+    return gallery
+
 # ==================== CLIENT ROUTES ====================
 
 @router.get("/client/galleries", response_model=List[dict])
@@ -432,7 +443,14 @@ async def get_client_gallery(gallery_id: str, client: dict = Depends(get_client_
     )
     gallery["selection"] = selection
     
-    return gallery
+    has_hd = await db.gallery_purchases.count_documents({
+        "gallery_id": gallery_id,
+        "client_id": client["id"],
+        "status": "completed",
+        "option": {"$in": HD_OPTIONS}
+    }, limit=1)
+    
+    return sign_gallery_photos(gallery, hd=bool(has_hd))
 
 @router.post("/client/galleries/{gallery_id}/selection", response_model=dict)
 async def update_photo_selection(gallery_id: str, photo_ids: List[str], client: dict = Depends(get_client_auth)):
@@ -484,7 +502,7 @@ async def validate_selection(gallery_id: str, client: dict = Depends(get_client_
     # Notify admin
     admin = await db.admins.find_one({}, {"_id": 0, "email": 1})
     if admin and SMTP_EMAIL:
-        send_selection_notification_email(
+        await run_io(send_selection_notification_email,
             admin.get("email", SMTP_EMAIL),
             client.get("name", "Client"),
             gallery.get("name", "Galerie"),
@@ -508,7 +526,7 @@ async def get_public_gallery(gallery_id: str):
     client = await db.clients.find_one({"id": gallery["client_id"]}, {"_id": 0, "name": 1})
     gallery["client_name"] = client.get("name") if client else "Client"
     
-    return gallery
+    return sign_gallery_photos(gallery)
 
 @router.get("/public/galleries/{gallery_id}/image/{photo_id}")
 async def get_gallery_image(gallery_id: str, photo_id: str):
@@ -525,7 +543,7 @@ async def get_gallery_image(gallery_id: str, photo_id: str):
     if not filepath.exists():
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(filepath)
+    return deliver_file(filepath)
 
 @router.get("/public/galleries/{gallery_id}/photos/{photo_id}/download")
 async def download_gallery_photo(gallery_id: str, photo_id: str):
@@ -542,9 +560,8 @@ async def download_gallery_photo(gallery_id: str, photo_id: str):
     if not filepath.exists():
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(
+    return deliver_file(
         filepath,
         media_type="image/jpeg",
-        filename=photo["filename"],
-        headers={"Content-Disposition": f"attachment; filename={photo['filename']}"}
+        filename=photo["filename"]
     )
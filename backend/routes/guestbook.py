@@ -20,6 +20,9 @@ from utils.dependencies import (
     db, security, verify_token, 
     get_current_admin, get_current_client, create_token
 )
+from services.executors import run_io, run_ffmpeg
+from services.uploads import save_upload, MAX_AUDIO_SIZE, MAX_VIDEO_SIZE
+from services import guestbook_media
 
 # Create router
 router = APIRouter(tags=["Guestbook"])
@@ -176,7 +179,7 @@ async def delete_guestbook(guestbook_id: str, credentials: HTTPAuthorizationCred
     # Delete media files
     guestbook_folder = GUESTBOOK_DIR / guestbook_id
     if guestbook_folder.exists():
-        shutil.rmtree(guestbook_folder)
+        await run_io(shutil.rmtree, guestbook_folder)
     
     # Delete messages and guestbook
     await db.guestbook_messages.delete_many({"guestbook_id": guestbook_id})
@@ -211,11 +214,12 @@ async def delete_guestbook_message_admin(message_id: str, credentials: HTTPAutho
     if not message:
         raise HTTPException(status_code=404, detail="Message non trouvé")
     
-    # Delete media file if exists
+    # Delete media file (and its normalized copy / poster) if exists
     if message.get("media_url"):
         media_path = UPLOADS_DIR / message["media_url"].lstrip("/uploads/")
-        if media_path.exists():
-            media_path.unlink()
+        for path in [media_path, *guestbook_media.derived_paths(UPLOADS_DIR, message)]:
+            if path.exists():
+                path.unlink()
     
     await db.guestbook_messages.delete_one({"id": message_id})
     
@@ -273,18 +277,17 @@ async def get_public_guestbook(guestbook_id: str):
 
 
 @router.get("/public/guestbooks/{guestbook_id}/messages")
-async def get_public_guestbook_messages(guestbook_id: str):
-    """Get approved messages for a public guestbook"""
-    guestbook = await db.guestbooks.find_one({"id": guestbook_id})
+async def get_public_guestbook_messages(guestbook_id: str, cursor: Optional[str] = None, limit: int = 20):
+    """Get approved messages for a public guestbook, newest first, one page at a time.
+    Media messages carry a poster, a short preview clip and waveform peaks; originals load on demand."""
+    guestbook = await db.guestbooks.find_one({"id": guestbook_id}, {"_id": 0, "id": 1})
     if not guestbook:
         raise HTTPException(status_code=404, detail="Livre d'or non trouvé")
     
-    messages = await db.guestbook_messages.find(
-        {"guestbook_id": guestbook_id, "is_approved": True},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    
-    return messages
+    try:
+        return await guestbook_media.feed_page(db, guestbook_id, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
 
 
 @router.post("/public/guestbooks/{guestbook_id}/messages/text")
@@ -337,6 +340,9 @@ async def post_media_message(
     if not guestbook.get("is_active", True):
         raise HTTPException(status_code=403, detail="Ce livre d'or n'est plus actif")
     
+    if message_type not in ("audio", "video"):
+        raise HTTPException(status_code=400, detail="Type de message invalide")
+    
     if message_type == "video" and not guestbook.get("allow_video", True):
         raise HTTPException(status_code=403, detail="Les vidéos ne sont pas autorisées")
     
@@ -360,17 +366,18 @@ async def post_media_message(
     if message_type == "audio" and file.content_type not in allowed_audio:
         raise HTTPException(status_code=400, detail="Format audio non supporté")
     
-    # Save file
+    # Save file (streamed; size and real content type checked while writing)
     guestbook_folder = GUESTBOOK_DIR / guestbook_id
-    guestbook_folder.mkdir(exist_ok=True)
     
     message_id = str(uuid.uuid4())
     file_ext = Path(file.filename).suffix.lower() or (".webm" if "webm" in file.content_type else ".mp4")
     media_filename = f"{message_id}{file_ext}"
     file_path = guestbook_folder / media_filename
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    if message_type == "video":
+        await save_upload(file, file_path, max_size=MAX_VIDEO_SIZE, allowed_types=allowed_video)
+    else:
+        await save_upload(file, file_path, max_size=MAX_AUDIO_SIZE, allowed_types=allowed_audio)
     
     media_url = f"/uploads/guestbooks/{guestbook_id}/{media_filename}"
     
@@ -382,12 +389,16 @@ async def post_media_message(
         "media_url": media_url,
         "duration": duration,
         "is_approved": not guestbook.get("require_approval", True),
+        "media_status": "pending",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.guestbook_messages.insert_one(message)
     message.pop("_id", None)
     
+    # Normalized copy and poster are produced in the background
+    guestbook_media.enqueue(db, UPLOADS_DIR, message_id)
+    
     return {"success": True, "message": message, "needs_approval": guestbook.get("require_approval", True)}
 
 
@@ -476,11 +487,12 @@ async def delete_guestbook_message_client(message_id: str, client: dict = Depend
     if not guestbook:
         raise HTTPException(status_code=403, detail="Accès non autorisé")
     
-    # Delete media file if exists
+    # Delete media file (and its normalized copy / poster) if exists
     if message.get("media_url"):
         media_path = UPLOADS_DIR / message["media_url"].lstrip("/uploads/")
-        if media_path.exists():
-            media_path.unlink()
+        for path in [media_path, *guestbook_media.derived_paths(UPLOADS_DIR, message)]:
+            if path.exists():
+                path.unlink()
     
     await db.guestbook_messages.delete_one({"id": message_id})
     
@@ -513,13 +525,10 @@ async def generate_guestbook_montage(
     if not messages:
         raise HTTPException(status_code=400, detail="Aucune vidéo approuvée à monter")
     
-    # Collect video files
-    video_files = []
-    for msg in messages:
-        if msg.get("media_url"):
-            video_path = UPLOADS_DIR / msg["media_url"].lstrip("/uploads/")
-            if video_path.exists():
-                video_files.append(str(video_path))
+    # Collect video files: normalized clips when they all share the current profile (stream copy),
+    # otherwise the original uploads (full re-encode) while the missing clips are normalized in the background
+    await guestbook_media.enqueue_unready(db, UPLOADS_DIR, messages)
+    video_files, stream_copy = guestbook_media.montage_sources(UPLOADS_DIR, messages)
     
     if not video_files:
         raise HTTPException(status_code=400, detail="Aucun fichier vidéo trouvé")
@@ -534,22 +543,17 @@ async def generate_guestbook_montage(
     try:
         # Create a temporary file list for FFmpeg concat
         with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            for vf in video_files:
-                f.write(f"file '{vf}'\n")
+            f.write(guestbook_media.concat_list(video_files))
             concat_file = f.name
         
         # Step 1: Concatenate all videos
         temp_concat = str(montage_dir / f"temp_concat_{montage_id}.mp4")
-        concat_cmd = [
-            "ffmpeg", "-y", "-f", "concat", "-safe", "0",
-            "-i", concat_file,
-            "-c:v", "libx264", "-preset", "fast",
-            "-c:a", "aac", "-b:a", "128k",
-            "-movflags", "+faststart",
-            temp_concat
-        ]
+        if stream_copy:
+            concat_cmd = guestbook_media.concat_copy_command(concat_file, temp_concat)
+        else:
+            concat_cmd = guestbook_media.concat_reencode_command(concat_file, temp_concat)
         
-        result = subprocess.run(concat_cmd, capture_output=True, text=True, timeout=300)
+        result = await run_ffmpeg(subprocess.run, concat_cmd, capture_output=True, text=True, timeout=300)
         if result.returncode != 0:
             logging.error(f"FFmpeg concat error: {result.stderr}")
             raise HTTPException(status_code=500, detail="Erreur lors de la concaténation des vidéos")
@@ -577,7 +581,7 @@ async def generate_guestbook_montage(
                     "-movflags", "+faststart",
                     str(output_file)
                 ]
-                result = subprocess.run(music_cmd, capture_output=True, text=True, timeout=300)
+                result = await run_ffmpeg(subprocess.run, music_cmd, capture_output=True, text=True, timeout=300)
                 if result.returncode != 0:
                     logging.error(f"FFmpeg music error: {result.stderr}")
                     shutil.move(temp_concat, str(output_file))
@@ -598,6 +602,7 @@ async def generate_guestbook_montage(
             "client_id": client["id"],
             "video_count": len(video_files),
             "has_music": bool(music_url),
+            "stream_copy": stream_copy,
             "file_path": f"/uploads/guestbooks/{guestbook_id}/montages/montage_{montage_id}.mp4",
             "created_at": datetime.now(timezone.utc).isoformat()
         }
@@ -0,0 +1,35 @@
+"""
+Routes de diffusion des médias par URL signée
+Aucune requête base de données : l'autorisation est portée par la signature (services/signed_media.py)
+"""
+
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import time
+from services.executors import run_cpu
+from services.file_delivery import deliver_file
+from services.signed_media import SIZES, verify_media_signature, resolve_media_path, resized_path
+
+router = APIRouter(tags=["Media"])
+
+# ==================== SIGNED MEDIA ====================
+
+@router.get("/media/{size}/{path:path}")
+async def get_signed_media(size: str, path: str, exp: int, sig: str,
+                           dl: Optional[str] = None, h: Optional[str] = None):
+    """Serve a gallery / PhotoFind file from a signed, expiring URL"""
+    now = time.time()
+    if not verify_media_signature(size, path, exp, sig, download=dl, sha256=h, now=now):
+        raise HTTPException(status_code=403, detail="Lien expiré ou invalide")
+
+    filepath = resolve_media_path(path)
+    if filepath is None or not filepath.is_file():
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+
+    if SIZES[size]:
+        filepath = await run_cpu(resized_path, filepath, size, h)
+
+    # The URL only changes when the signing window rolls over: let the browser keep it until then
+    headers = {"Cache-Control": f"private, max-age={max(int(exp - now), 0)}"}
+    media_type = "image/jpeg" if filepath.suffix.lower() in (".jpg", ".jpeg") else None
+    return deliver_file(filepath, filename=dl, media_type=media_type, headers=headers)
@@ -6,23 +6,18 @@ import uuid
 import logging
 import jwt
 from datetime import datetime, timezone, timedelta
-from io import BytesIO
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.security import HTTPAuthorizationCredentials
-from fastapi.responses import Response
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import Optional
 
 import paypalrestsdk
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 
 from config import db, PAYPAL_CLIENT_ID, PAYPAL_SECRET, PAYPAL_MODE, SITE_URL, SECRET_KEY, ALGORITHM, SMTP_EMAIL, SMTP_PASSWORD
 from dependencies import get_current_admin, get_current_client, security
+from services.pdf_service import render_pdf_file
+from services.executors import run_io
 
 router = APIRouter(tags=["PayPal"])
 
@@ -247,7 +242,7 @@ async def execute_paypal_payment(payment_id: str, payer_id: str):
             </html>
             """
             try:
-                send_email(payment_record["client_email"], "Paiement confirmé - CREATIVINDUSTRY", html_content)
+                await run_io(send_email, payment_record["client_email"], "Paiement confirmé - CREATIVINDUSTRY", html_content)
             except Exception as e:
                 logging.error(f"Failed to send payment confirmation email: {e}")
         
@@ -364,95 +359,12 @@ async def download_renewal_invoice_pdf(invoice_id: str, credentials: HTTPAuthori
     if not invoice:
         raise HTTPException(status_code=404, detail="Facture non trouvée")
     
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+    pdf_path = await render_pdf_file("renewal_invoice", client_id=invoice.get("client_id"), invoice=invoice)
     
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#D4AF37'), alignment=TA_CENTER)
-    normal_style = styles['Normal']
-    
-    content = []
-    
-    content.append(Paragraph("CREATIVINDUSTRY", title_style))
-    content.append(Paragraph("L'Industrie Créative", ParagraphStyle('Sub', parent=styles['Normal'], alignment=TA_CENTER, textColor=colors.gray)))
-    content.append(Spacer(1, 30))
-    
-    content.append(Paragraph(f"FACTURE N° {invoice.get('invoice_number', 'N/A')}", ParagraphStyle('InvTitle', parent=styles['Heading2'], fontSize=16)))
-    content.append(Spacer(1, 10))
-    
-    created_at = invoice.get('created_at', '')
-    if created_at:
-        try:
-            date_obj = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            formatted_date = date_obj.strftime("%d/%m/%Y")
-        except:
-            formatted_date = created_at[:10]
-    else:
-        formatted_date = "N/A"
-    content.append(Paragraph(f"Date : {formatted_date}", normal_style))
-    content.append(Spacer(1, 20))
-    
-    content.append(Paragraph("<b>Client :</b>", normal_style))
-    content.append(Paragraph(f"{invoice.get('client_name', 'N/A')}", normal_style))
-    content.append(Paragraph(f"{invoice.get('client_email', 'N/A')}", normal_style))
-    content.append(Spacer(1, 30))
-    
-    data = [
-        ['Description', 'Quantité', 'Prix HT', 'TVA', 'Total TTC'],
-        [
-            f"Renouvellement accès - {invoice.get('plan_label', 'N/A')}\n({invoice.get('days', 0)} jours)",
-            '1',
-            f"{invoice.get('amount_ht', 0):.2f} €",
-            f"{invoice.get('tva', 0):.2f} €",
-            f"{invoice.get('amount_ttc', 0):.2f} €"
-        ]
-    ]
-    
-    table = Table(data, colWidths=[8*cm, 2*cm, 2.5*cm, 2.5*cm, 2.5*cm])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D4AF37')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f5f5f5')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-    ]))
-    content.append(table)
-    content.append(Spacer(1, 20))
-    
-    totals_data = [
-        ['', 'Total HT :', f"{invoice.get('amount_ht', 0):.2f} €"],
-        ['', 'TVA (20%) :', f"{invoice.get('tva', 0):.2f} €"],
-        ['', 'Total TTC :', f"{invoice.get('amount_ttc', 0):.2f} €"],
-    ]
-    totals_table = Table(totals_data, colWidths=[10*cm, 4*cm, 3*cm])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (1, 2), (-1, 2), 'Helvetica-Bold'),
-        ('FONTSIZE', (1, 2), (-1, 2), 12),
-        ('TEXTCOLOR', (2, 2), (2, 2), colors.HexColor('#D4AF37')),
-    ]))
-    content.append(totals_table)
-    content.append(Spacer(1, 30))
-    
-    content.append(Paragraph(f"<b>Mode de paiement :</b> {invoice.get('payment_method', 'PayPal')}", normal_style))
-    content.append(Paragraph(f"<b>Statut :</b> Payée", ParagraphStyle('Paid', parent=normal_style, textColor=colors.green)))
-    content.append(Spacer(1, 40))
-    
-    content.append(Paragraph("Merci pour votre confiance !", ParagraphStyle('Footer', parent=normal_style, alignment=TA_CENTER, textColor=colors.gray)))
-    
-    doc.build(content)
-    buffer.seek(0)
-    
-    return Response(
-        content=buffer.getvalue(),
+    return FileResponse(
+        str(pdf_path),
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=Facture_{invoice.get('invoice_number', 'N-A')}.pdf"}
+        filename=f"Facture_{invoice.get('invoice_number', 'N-A')}.pdf"
     )
 
 
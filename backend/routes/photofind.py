@@ -4,7 +4,7 @@ Refactorisé depuis server.py - Mars 2026
 """
 
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Body
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 from typing import List, Optional
@@ -15,15 +15,16 @@ import logging
 import os
 import io
 import zipfile
-import qrcode
-import requests
-import boto3
-from botocore.exceptions import ClientError
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+
+from services import photofind_analytics, media_store
+from services.payment_gateway import get_paypal, get_stripe, PaymentGatewayError, PaymentAuthError
+from services.executors import run_io, run_cpu
+from services.file_delivery import deliver_file
+from services.signed_media import photo_urls
+from services.uploads import save_upload, read_upload, IMAGE_TYPES, MAX_IMAGE_SIZE
 
 # Configuration
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'test_database')
 AWS_ACCESS_KEY = os.environ.get('AWS_ACCESS_KEY_ID', '')
 AWS_SECRET_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
 AWS_REGION = os.environ.get('AWS_REGION', 'eu-west-3')
@@ -33,9 +34,15 @@ PAYPAL_CLIENT_SECRET = os.environ.get('PAYPAL_CLIENT_SECRET', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', '')
 
-# Database connection
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+
+def kiosk_paypal():
+    """PayPal gateway for kiosk orders (live API, token cached across requests)"""
+    return get_paypal(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET, mode="live")
+
+
+def download_paypal():
+    """PayPal gateway for download-page payments (uses PAYPAL_SECRET like the main site)"""
+    return get_paypal(os.environ.get("PAYPAL_CLIENT_ID", ""), os.environ.get("PAYPAL_SECRET", ""), mode="live")
 
 # Uploads directory
 ROOT_DIR = Path(__file__).parent.parent
@@ -48,8 +55,12 @@ router = APIRouter(tags=["PhotoFind"])
 
 # ==================== AWS REKOGNITION ====================
 
+# Limit of the Rekognition API for images sent inline (Image.Bytes)
+REKOGNITION_MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
 def get_rekognition_client():
     """Get AWS Rekognition client"""
+    import boto3
     return boto3.client(
         'rekognition',
         region_name=AWS_REGION,
@@ -57,6 +68,17 @@ def get_rekognition_client():
         aws_secret_access_key=AWS_SECRET_KEY
     )
 
+
+def index_faces_from_file(rekognition, collection_id: str, path: Path, photo_id: str) -> dict:
+    """Index the faces of a stored photo (blocking: run in the io pool)"""
+    with open(path, "rb") as f:
+        return rekognition.index_faces(
+            CollectionId=collection_id,
+            Image={'Bytes': f.read()},
+            ExternalImageId=photo_id,
+            DetectionAttributes=['ALL']
+        )
+
 # ==================== MODELS ====================
 
 class PhotoFindEventCreate(BaseModel):
@@ -222,6 +244,8 @@ def send_purchase_email(email: str, download_url: str, photo_count: int):
 @router.post("/admin/photofind/events")
 async def create_photofind_event(data: PhotoFindEventCreate, admin: dict = Depends(require_admin)):
     """Create a new PhotoFind event with its own face collection"""
+    from botocore.exceptions import ClientError
+    import qrcode
     
     if not AWS_ACCESS_KEY or not AWS_SECRET_KEY:
         raise HTTPException(
@@ -235,7 +259,7 @@ async def create_photofind_event(data: PhotoFindEventCreate, admin: dict = Depen
     # Create Rekognition collection for this event
     try:
         rekognition = get_rekognition_client()
-        rekognition.create_collection(CollectionId=collection_id)
+        await run_io(rekognition.create_collection, CollectionId=collection_id)
         logging.info(f"Created Rekognition collection: {collection_id}")
     except ClientError as e:
         error_code = e.response['Error']['Code']
@@ -282,7 +306,7 @@ async def create_photofind_event(data: PhotoFindEventCreate, admin: dict = Depen
     qr_img = qr.make_image(fill_color="black", back_color="white")
     
     qr_path = event_folder / "qr_code.png"
-    qr_img.save(str(qr_path))
+    await run_io(media_store.replace_file, qr_path, lambda tmp: qr_img.save(str(tmp)))
     
     event["qr_code_url"] = f"/uploads/photofind/{event_id}/qr_code.png"
     event["public_url"] = public_url
@@ -323,6 +347,7 @@ async def update_photofind_event(event_id: str, data: PhotoFindEventUpdate, admi
 @router.delete("/admin/photofind/events/{event_id}")
 async def delete_photofind_event(event_id: str, admin: dict = Depends(require_admin)):
     """Delete a PhotoFind event and its collection"""
+    from botocore.exceptions import ClientError
     event = await db.photofind_events.find_one({"id": event_id})
     if not event:
         raise HTTPException(status_code=404, detail="Événement non trouvé")
@@ -330,7 +355,7 @@ async def delete_photofind_event(event_id: str, admin: dict = Depends(require_ad
     # Delete Rekognition collection
     try:
         rekognition = get_rekognition_client()
-        rekognition.delete_collection(CollectionId=event["collection_id"])
+        await run_io(rekognition.delete_collection, CollectionId=event["collection_id"])
     except ClientError as e:
         logging.error(f"Failed to delete collection: {e}")
     
@@ -362,21 +387,18 @@ async def upload_photofind_photos(
     
     for file in files:
         photo_id = str(uuid.uuid4())
-        filename = f"{photo_id}_{file.filename}"
+        filename = f"{photo_id}_{Path(file.filename).name}"
         filepath = event_folder / filename
         
-        # Save file
-        content = await file.read()
-        with open(filepath, "wb") as f:
-            f.write(content)
+        # Save file (streamed to disk, never fully held by the event loop)
+        stored = await save_upload(file, filepath, max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES)
         
-        # Index faces in Rekognition
+        # Index faces in Rekognition (the worker thread reads the file it sends)
         try:
-            response = rekognition.index_faces(
-                CollectionId=event["collection_id"],
-                Image={'Bytes': content},
-                ExternalImageId=photo_id,
-                DetectionAttributes=['ALL']
+            response = await run_io(index_faces_from_file, rekognition,
+                collection_id=event["collection_id"],
+                path=filepath,
+                photo_id=photo_id
             )
             
             face_count = len(response.get('FaceRecords', []))
@@ -389,6 +411,8 @@ async def upload_photofind_photos(
                 "url": f"/uploads/photofind/{event_id}/{filename}",
                 "faces_count": face_count,
                 "face_ids": [f['Face']['FaceId'] for f in response.get('FaceRecords', [])],
+                "size": stored.size,
+                "sha256": stored.sha256,
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
             
@@ -406,6 +430,8 @@ async def upload_photofind_photos(
                 "url": f"/uploads/photofind/{event_id}/{filename}",
                 "faces_count": 0,
                 "face_ids": [],
+                "size": stored.size,
+                "sha256": stored.sha256,
                 "created_at": datetime.now(timezone.utc).isoformat(),
                 "indexing_error": str(e)
             }
@@ -440,7 +466,7 @@ async def delete_photofind_photo(photo_id: str, admin: dict = Depends(require_ad
     if photo.get("face_ids") and event:
         try:
             rekognition = get_rekognition_client()
-            rekognition.delete_faces(
+            await run_io(rekognition.delete_faces,
                 CollectionId=event["collection_id"],
                 FaceIds=photo["face_ids"]
             )
@@ -530,15 +556,10 @@ async def add_event_frame(
         raise HTTPException(status_code=404, detail="Événement non trouvé")
     
     frame_id = str(uuid.uuid4())
-    filename = f"frame_{frame_id}_{file.filename}"
+    filename = f"frame_{frame_id}_{Path(file.filename).name}"
     
     event_folder = PHOTOFIND_DIR / event_id / "frames"
-    event_folder.mkdir(parents=True, exist_ok=True)
-    
-    filepath = event_folder / filename
-    content = await file.read()
-    with open(filepath, "wb") as f:
-        f.write(content)
+    await save_upload(file, event_folder / filename, max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES)
     
     frame_doc = {
         "id": frame_id,
@@ -581,27 +602,14 @@ async def update_event_pricing(event_id: str, data: dict = Body(...), admin: dic
 
 @router.get("/admin/photofind/events/{event_id}/kiosk-stats")
 async def get_kiosk_stats(event_id: str, admin: dict = Depends(require_admin)):
-    """Get kiosk statistics for an event"""
-    purchases = await db.photofind_kiosk_purchases.find(
-        {"event_id": event_id}, {"_id": 0}
-    ).to_list(1000)
-    
-    prints = await db.photofind_print_logs.find(
-        {"event_id": event_id}, {"_id": 0}
-    ).to_list(1000)
-    
-    total_revenue = sum(p.get("amount", 0) for p in purchases)
-    total_photos_sold = sum(len(p.get("photo_ids", [])) for p in purchases)
-    total_printed = sum(p.get("count", 0) for p in prints)
-    
-    return {
-        "total_purchases": len(purchases),
-        "total_revenue": total_revenue,
-        "total_photos_sold": total_photos_sold,
-        "total_printed": total_printed,
-        "recent_purchases": purchases[:10],
-        "recent_prints": prints[:10]
-    }
+    """Get kiosk statistics for an event (precomputed counters)"""
+    return await photofind_analytics.get_event_stats(db, event_id)
+
+@router.post("/admin/photofind/events/{event_id}/kiosk-stats/rebuild")
+async def rebuild_kiosk_stats(event_id: str, admin: dict = Depends(require_admin)):
+    """Recompute kiosk statistics for an event from raw purchases and print logs"""
+    await photofind_analytics.rebuild_event_stats(db, event_id)
+    return await photofind_analytics.get_event_stats(db, event_id)
 
 # ==================== PUBLIC ROUTES ====================
 
@@ -624,15 +632,16 @@ async def get_public_event(event_id: str):
 @router.post("/public/photofind/{event_id}/search")
 async def search_photos_by_face(event_id: str, file: UploadFile = File(...)):
     """Search for photos containing a face using AWS Rekognition"""
+    from botocore.exceptions import ClientError
     event = await db.photofind_events.find_one({"id": event_id, "is_active": True})
     if not event:
         raise HTTPException(status_code=404, detail="Événement non trouvé ou inactif")
     
-    content = await file.read()
+    content = await read_upload(file, max_size=REKOGNITION_MAX_IMAGE_BYTES, allowed_types=IMAGE_TYPES)
     
     try:
         rekognition = get_rekognition_client()
-        response = rekognition.search_faces_by_image(
+        response = await run_io(rekognition.search_faces_by_image,
             CollectionId=event["collection_id"],
             Image={'Bytes': content},
             MaxFaces=100,
@@ -652,6 +661,8 @@ async def search_photos_by_face(event_id: str, file: UploadFile = File(...)):
             {"id": {"$in": list(matched_photo_ids)}},
             {"_id": 0}
         ).to_list(100)
+        for photo in photos:
+            photo["signed_urls"] = photo_urls(f"photofind/{event_id}/{photo['filename']}", sha256=photo.get("sha256"))
         
         return {"photos": photos, "count": len(photos)}
         
@@ -702,67 +713,151 @@ async def create_photofind_purchase(event_id: str, data: dict = Body(...)):
     
     return purchase
 
-@router.get("/public/photofind/download/{purchase_id}")
-async def download_purchased_photos(purchase_id: str, token: str):
-    """Download purchased photos - returns info for the download page"""
-    # Check in photofind_purchases first
-    purchase = await db.photofind_purchases.find_one({
-        "id": purchase_id,
-        "download_token": token
-    })
-    
-    # Also check kiosk_purchases if not found
-    if not purchase:
-        purchase = await db.photofind_kiosk_purchases.find_one({
-            "id": purchase_id,
-            "download_token": token
-        })
-    
-    if not purchase:
-        raise HTTPException(status_code=404, detail="Achat non trouvé ou lien invalide")
-    
-    # Get event info
-    event = await db.photofind_events.find_one({"id": purchase["event_id"]})
-    event_name = event.get("name", "PhotoFind") if event else "PhotoFind"
-    
-    # Build photo list with URLs
-    photo_list = []
-    for photo_id in purchase.get("photo_ids", []):
-        # Check if it's an uploaded photo
+# ==================== PURCHASE RESOLUTION ====================
+
+PURCHASE_COLLECTIONS = ("photofind_purchases", "photofind_kiosk_purchases")
+ACTUAL_PAID_METHODS = ["stripe", "paypal", "cash_confirmed", "card"]
+
+async def find_purchase(purchase_id: str, token: str):
+    """Find a purchase in both purchase collections with a single round trip.
+    Returns (purchase, collection_name) or (None, None)."""
+    query = {"id": purchase_id, "download_token": token}
+    pipeline = [
+        {"$match": query},
+        {"$addFields": {"_collection": PURCHASE_COLLECTIONS[0]}},
+        {"$unionWith": {
+            "coll": PURCHASE_COLLECTIONS[1],
+            "pipeline": [{"$match": query}, {"$addFields": {"_collection": PURCHASE_COLLECTIONS[1]}}]
+        }},
+        {"$limit": 1}
+    ]
+    results = await db[PURCHASE_COLLECTIONS[0]].aggregate(pipeline).to_list(1)
+    if not results:
+        return None, None
+    purchase = results[0]
+    return purchase, purchase.pop("_collection")
+
+async def ensure_purchase_indexes():
+    """Indexes used by purchase lookups and batched photo resolution"""
+    for name in PURCHASE_COLLECTIONS:
+        await db[name].create_index([("id", 1), ("download_token", 1)])
+    await db.photofind_photos.create_index("id")
+    await db.photofind_upload_sessions.create_index("session_id")
+
+def is_purchase_paid(purchase: dict) -> bool:
+    """A purchase is paid if it has paid_at or was paid with an actual payment method"""
+    return bool(purchase.get("paid_at")) or purchase.get("payment_method", "") in ACTUAL_PAID_METHODS
+
+def cached_purchase_manifest(purchase: dict) -> Optional[List[dict]]:
+    """The manifest cached on the purchase, or None when missing or stale.
+    Stale: built for other photo ids, or before event photos carried their sha256."""
+    manifest = purchase.get("photo_manifest")
+    if manifest is None or purchase.get("photo_manifest_ids") != purchase.get("photo_ids", []):
+        return None
+    if any("sha256" not in p for p in manifest if not p["id"].startswith("upload_")):
+        return None
+    return manifest
+
+def is_manifest_complete(purchase: dict, manifest: List[dict]) -> bool:
+    """Every purchased photo was resolved (a photo missing now may still be restored)"""
+    return len(manifest) == len(purchase.get("photo_ids", []))
+
+async def resolve_purchase_photos(purchase: dict) -> List[dict]:
+    """Resolve purchased photo ids into a manifest [{id, filename, url, path, sha256}].
+    Uses the manifest cached on the purchase when still valid, otherwise two $in queries
+    (event photos and upload sessions). `path` is relative to PHOTOFIND_DIR."""
+    photo_ids = purchase.get("photo_ids", [])
+    manifest = cached_purchase_manifest(purchase)
+    if manifest is not None:
+        return manifest
+    
+    event_id = purchase["event_id"]
+    session_ids = [pid.replace("upload_", "", 1) for pid in photo_ids if pid.startswith("upload_")]
+    regular_ids = [pid for pid in photo_ids if not pid.startswith("upload_")]
+    
+    photos = {}
+    if regular_ids:
+        async for photo in db.photofind_photos.find(
+            {"id": {"$in": regular_ids}}, {"_id": 0, "id": 1, "filename": 1, "url": 1, "sha256": 1}
+        ):
+            photos[photo["id"]] = photo
+    
+    sessions = {}
+    if session_ids:
+        async for session in db.photofind_upload_sessions.find(
+            {"session_id": {"$in": session_ids}}, {"_id": 0, "session_id": 1, "photo_url": 1, "photo_filename": 1}
+        ):
+            sessions[session["session_id"]] = session
+    
+    # Keep the purchase order
+    manifest = []
+    for photo_id in photo_ids:
         if photo_id.startswith("upload_"):
-            # Uploaded photo - get from session or directly use the stored URL
-            session_id = photo_id.replace("upload_", "")
-            session = await db.photofind_upload_sessions.find_one({"session_id": session_id})
+            session_id = photo_id.replace("upload_", "", 1)
+            session = sessions.get(session_id)
             if session and session.get("photo_url"):
-                photo_list.append({
+                filename = session.get("photo_filename")
+                manifest.append({
                     "id": photo_id,
-                    "filename": session.get("photo_filename", f"photo_{session_id}.jpg"),
-                    "url": session["photo_url"]
+                    "filename": filename or f"photo_{session_id}.jpg",
+                    "url": session["photo_url"],
+                    "path": f"{event_id}/uploads/{filename}" if filename else None
                 })
         else:
-            # Regular photo from event
-            photo = await db.photofind_photos.find_one({"id": photo_id})
+            photo = photos.get(photo_id)
             if photo:
-                photo_list.append({
+                manifest.append({
                     "id": photo["id"],
                     "filename": photo["filename"],
-                    "url": photo.get("url") or f"/uploads/photofind/{purchase['event_id']}/{photo['filename']}"
+                    "url": photo.get("url") or f"/uploads/photofind/{event_id}/{photo['filename']}",
+                    "path": f"{event_id}/{photo['filename']}",
+                    "sha256": photo.get("sha256")
                 })
+    return manifest
+
+async def cache_purchase_manifest(purchase: dict, collection_name: str, manifest: List[dict]):
+    """Store the resolved manifest on a paid purchase so later views cost no photo lookups.
+    Only a complete manifest is stored: missing photos are looked up again on the next view."""
+    if cached_purchase_manifest(purchase) is not None or not is_manifest_complete(purchase, manifest):
+        return
+    await db[collection_name].update_one(
+        {"id": purchase["id"]},
+        {"$set": {"photo_manifest": manifest, "photo_manifest_ids": purchase.get("photo_ids", [])}}
+    )
+
+@router.get("/public/photofind/download/{purchase_id}")
+async def download_purchased_photos(purchase_id: str, token: str):
+    """Download purchased photos - returns info for the download page"""
+    purchase, collection_name = await find_purchase(purchase_id, token)
+    
+    if not purchase:
+        raise HTTPException(status_code=404, detail="Achat non trouvé ou lien invalide")
+    
+    # Get event info
+    event = await db.photofind_events.find_one({"id": purchase["event_id"]}, {"_id": 0, "name": 1})
+    event_name = event.get("name", "PhotoFind") if event else "PhotoFind"
     
     # Determine actual payment status
     # If payment_method is "kiosk", "pay_later", "email", or "pending" and no paid_at, it's not paid
-    payment_method = purchase.get("payment_method", "")
-    paid_at = purchase.get("paid_at")
-    
     # Consider as paid only if:
     # 1. Has paid_at timestamp OR
     # 2. payment_method is one of the actual payment methods (stripe, paypal, cash with confirmation)
-    actual_paid_methods = ["stripe", "paypal", "cash_confirmed", "card"]
+    payment_method = purchase.get("payment_method", "")
+    effective_status = "completed" if is_purchase_paid(purchase) else "pending"
     
-    if paid_at or payment_method in actual_paid_methods:
-        effective_status = "completed"
-    else:
-        effective_status = "pending"
+    # Build photo list with URLs
+    manifest = await resolve_purchase_photos(purchase)
+    if effective_status == "completed":
+        await cache_purchase_manifest(purchase, collection_name, manifest)
+    paid = effective_status == "completed"
+    photo_list = [{
+        "id": p["id"],
+        "filename": p["filename"],
+        "url": p["url"],
+        # Signed once here: the page then loads every photo without further lookups
+        "signed_urls": photo_urls(f"photofind/{p['path']}", sha256=p.get("sha256"),
+                                  download=p["filename"] if paid else None) if p.get("path") else None
+    } for p in manifest]
     
     return {
         "purchase_id": purchase_id,
@@ -778,48 +873,28 @@ async def download_purchased_photos(purchase_id: str, token: str):
 @router.get("/public/photofind/download/{purchase_id}/zip")
 async def download_photos_as_zip(purchase_id: str, token: str):
     """Download all purchased photos as a zip file"""
-    purchase = await db.photofind_purchases.find_one({
-        "id": purchase_id,
-        "download_token": token
-    })
-    
-    if not purchase:
-        # Also check kiosk purchases
-        purchase = await db.photofind_kiosk_purchases.find_one({
-            "id": purchase_id,
-            "download_token": token
-        })
+    purchase, collection_name = await find_purchase(purchase_id, token)
     
     if not purchase:
         raise HTTPException(status_code=404, detail="Achat non trouvé ou lien invalide")
     
     # Check if payment is actually completed
-    payment_method = purchase.get("payment_method", "")
-    paid_at = purchase.get("paid_at")
-    actual_paid_methods = ["stripe", "paypal", "cash_confirmed", "card"]
-    
-    if not paid_at and payment_method not in actual_paid_methods:
+    if not is_purchase_paid(purchase):
         raise HTTPException(status_code=402, detail="Paiement requis avant téléchargement")
     
+    manifest = await resolve_purchase_photos(purchase)
+    await cache_purchase_manifest(purchase, collection_name, manifest)
+    
     zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for photo_id in purchase.get("photo_ids", []):
-            # Check if it's an uploaded photo
-            if photo_id.startswith("upload_"):
-                session_id = photo_id.replace("upload_", "")
-                session = await db.photofind_upload_sessions.find_one({"session_id": session_id})
-                if session and session.get("photo_filename"):
-                    # Uploaded photos are in the uploads subfolder
-                    filepath = PHOTOFIND_DIR / purchase["event_id"] / "uploads" / session["photo_filename"]
-                    if filepath.exists():
-                        zf.write(filepath, session["photo_filename"])
-            else:
-                # Regular photo
-                photo = await db.photofind_photos.find_one({"id": photo_id})
-                if photo:
-                    filepath = PHOTOFIND_DIR / purchase["event_id"] / photo["filename"]
-                    if filepath.exists():
-                        zf.write(filepath, photo["filename"])
+    def build_zip():
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for photo in manifest:
+                if not photo.get("path"):
+                    continue
+                filepath = PHOTOFIND_DIR / photo["path"]
+                if filepath.exists():
+                    zf.write(filepath, photo["filename"])
+    await run_cpu(build_zip)
     
     zip_buffer.seek(0)
     return StreamingResponse(
@@ -839,46 +914,36 @@ async def create_download_payment(purchase_id: str, data: dict = Body(...)):
     return_url = data.get("return_url")
     
     # Find the purchase
-    purchase = await db.photofind_purchases.find_one({
-        "id": purchase_id,
-        "download_token": token
-    })
-    
-    if not purchase:
-        purchase = await db.photofind_kiosk_purchases.find_one({
-            "id": purchase_id,
-            "download_token": token
-        })
+    purchase, collection_name = await find_purchase(purchase_id, token)
     
     if not purchase:
         raise HTTPException(status_code=404, detail="Achat non trouvé")
     
     # Check if already actually paid (same logic as download info)
-    stored_payment_method = purchase.get("payment_method", "")
-    paid_at = purchase.get("paid_at")
-    actual_paid_methods = ["stripe", "paypal", "cash_confirmed", "card"]
-    
-    if paid_at or stored_payment_method in actual_paid_methods:
+    if is_purchase_paid(purchase):
         raise HTTPException(status_code=400, detail="Cet achat a déjà été payé")
     
     amount = purchase.get("amount", 0)
     
     if payment_method_req == "stripe":
         # Create Stripe payment intent
-        import stripe
-        stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+        stripe = get_stripe(os.environ.get("STRIPE_SECRET_KEY", ""))
         
-        if not stripe.api_key:
+        if not stripe.configured:
             raise HTTPException(status_code=500, detail="Configuration Stripe manquante")
         
-        intent = stripe.PaymentIntent.create(
-            amount=int(amount * 100),  # Stripe uses cents
-            currency="eur",
-            metadata={
-                "purchase_id": purchase_id,
-                "type": "photofind_download"
-            }
-        )
+        try:
+            intent = await stripe.create_payment_intent(
+                amount=int(amount * 100),  # Stripe uses cents
+                currency="eur",
+                metadata={
+                    "purchase_id": purchase_id,
+                    "type": "photofind_download"
+                }
+            )
+        except PaymentGatewayError as e:
+            logging.error(f"Stripe error: {e}")
+            raise HTTPException(status_code=500, detail="Erreur Stripe")
         
         return {
             "client_secret": intent.client_secret,
@@ -887,32 +952,13 @@ async def create_download_payment(purchase_id: str, data: dict = Body(...)):
         
     elif payment_method_req == "paypal":
         # Create PayPal order
-        paypal_client_id = os.environ.get("PAYPAL_CLIENT_ID")
-        paypal_secret = os.environ.get("PAYPAL_SECRET")
+        paypal = download_paypal()
         
-        if not paypal_client_id or not paypal_secret:
+        if not paypal.configured:
             raise HTTPException(status_code=500, detail="Configuration PayPal manquante")
         
-        # Get access token
-        auth_response = requests.post(
-            "https://api-m.paypal.com/v1/oauth2/token",
-            auth=(paypal_client_id, paypal_secret),
-            data={"grant_type": "client_credentials"}
-        )
-        
-        if auth_response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Erreur authentification PayPal")
-        
-        access_token = auth_response.json()["access_token"]
-        
-        # Create order
-        order_response = requests.post(
-            "https://api-m.paypal.com/v2/checkout/orders",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json={
+        try:
+            order_data = await paypal.create_order({
                 "intent": "CAPTURE",
                 "purchase_units": [{
                     "amount": {
@@ -925,26 +971,17 @@ async def create_download_payment(purchase_id: str, data: dict = Body(...)):
                     "return_url": f"{return_url}&paypal_order_id={{order_id}}".replace("{order_id}", ""),
                     "cancel_url": return_url
                 }
-            }
-        )
-        
-        if order_response.status_code != 201:
-            raise HTTPException(status_code=500, detail="Erreur création commande PayPal")
-        
-        order_data = order_response.json()
+            })
+        except PaymentGatewayError as e:
+            raise HTTPException(status_code=500, detail=e.message)
         
         # Get approval URL
-        approval_url = None
-        for link in order_data.get("links", []):
-            if link.get("rel") == "approve":
-                approval_url = link.get("href")
-                break
+        approval_url = paypal.approval_url(order_data)
         
         # Add order_id to return URL
         if approval_url:
             # Store PayPal order ID in purchase
-            collection = db.photofind_purchases if await db.photofind_purchases.find_one({"id": purchase_id}) else db.photofind_kiosk_purchases
-            await collection.update_one(
+            await db[collection_name].update_one(
                 {"id": purchase_id},
                 {"$set": {"paypal_order_id": order_data["id"]}}
             )
@@ -964,60 +1001,39 @@ async def confirm_download_payment(purchase_id: str, data: dict = Body(...)):
     payment_method = data.get("payment_method")
     
     # Find the purchase
-    purchase = await db.photofind_purchases.find_one({
-        "id": purchase_id,
-        "download_token": token
-    })
-    collection = db.photofind_purchases
-    
-    if not purchase:
-        purchase = await db.photofind_kiosk_purchases.find_one({
-            "id": purchase_id,
-            "download_token": token
-        })
-        collection = db.photofind_kiosk_purchases
+    purchase, collection_name = await find_purchase(purchase_id, token)
     
     if not purchase:
         raise HTTPException(status_code=404, detail="Achat non trouvé")
     
-    if payment_method == "paypal":
-        # Capture PayPal payment
-        paypal_client_id = os.environ.get("PAYPAL_CLIENT_ID")
-        paypal_secret = os.environ.get("PAYPAL_SECRET")
-        
-        # Get access token
-        auth_response = requests.post(
-            "https://api-m.paypal.com/v1/oauth2/token",
-            auth=(paypal_client_id, paypal_secret),
-            data={"grant_type": "client_credentials"}
-        )
-        
-        if auth_response.status_code == 200:
-            access_token = auth_response.json()["access_token"]
-            
-            # Capture order
-            capture_response = requests.post(
-                f"https://api-m.paypal.com/v2/checkout/orders/{payment_id}/capture",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
-                }
-            )
-            
-            if capture_response.status_code not in [200, 201]:
-                logging.error(f"PayPal capture error: {capture_response.text}")
-                raise HTTPException(status_code=500, detail="Erreur capture PayPal")
+    collection = db[collection_name]
     
-    # Update purchase status to completed
-    await collection.update_one(
-        {"id": purchase_id},
-        {"$set": {
-            "status": "completed",
-            "paid_at": datetime.now(timezone.utc).isoformat(),
-            "payment_id": payment_id,
-            "payment_method": payment_method
-        }}
-    )
+    if payment_method == "paypal":
+        # Capture PayPal payment (idempotent: a retried confirmation does not capture twice)
+        paypal = download_paypal()
+        if not paypal.configured:
+            raise HTTPException(status_code=500, detail="Configuration PayPal manquante")
+        try:
+            await paypal.capture_order(payment_id)
+        except PaymentGatewayError as e:
+            logging.error(f"PayPal capture error: {e.details or e.message}")
+            raise HTTPException(status_code=500, detail="Erreur capture PayPal")
+    
+    # Move revenue to the actual payment method in kiosk stats
+    if collection_name == "photofind_kiosk_purchases" and payment_method and not purchase.get("paid_at"):
+        await photofind_analytics.record_payment_method_change(db, purchase, payment_method)
+    
+    # Update purchase status to completed and cache the resolved photo manifest
+    manifest = await resolve_purchase_photos(purchase)
+    update = {
+        "status": "completed",
+        "paid_at": datetime.now(timezone.utc).isoformat(),
+        "payment_id": payment_id,
+        "payment_method": payment_method
+    }
+    if is_manifest_complete(purchase, manifest):
+        update.update({"photo_manifest": manifest, "photo_manifest_ids": purchase.get("photo_ids", [])})
+    await collection.update_one({"id": purchase_id}, {"$set": update})
     
     # Send email with download link if email exists
     if purchase.get("email") and purchase.get("download_url"):
@@ -1044,7 +1060,7 @@ async def get_photo(event_id: str, photo_id: str):
     if not filepath.exists():
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(filepath, media_type="image/jpeg")
+    return deliver_file(filepath, media_type="image/jpeg")
 
 @router.post("/public/photofind/{event_id}/kiosk-purchase")
 async def create_kiosk_purchase(event_id: str, data: KioskPurchaseData):
@@ -1079,6 +1095,7 @@ async def create_kiosk_purchase(event_id: str, data: KioskPurchaseData):
     }
     
     await db.photofind_kiosk_purchases.insert_one(purchase)
+    await photofind_analytics.record_purchase(db, purchase)
     
     # Send email with download link (for pay later, they will pay on the download page)
     try:
@@ -1175,6 +1192,7 @@ async def validate_cash_payment_code(event_id: str, data: dict = Body(...)):
     }
     
     await db.photofind_kiosk_purchases.insert_one(purchase)
+    await photofind_analytics.record_purchase(db, purchase)
     
     return {"valid": True, "message": "Code validé - impression autorisée", "purchase_id": purchase_id}
 
@@ -1310,6 +1328,7 @@ async def log_kiosk_print(event_id: str, data: KioskPrintLog):
     }
     
     await db.photofind_print_logs.insert_one(log_entry)
+    await photofind_analytics.record_print(db, log_entry)
     del log_entry["_id"]
     
     return log_entry
@@ -1327,27 +1346,14 @@ async def get_public_event_frames(event_id: str):
 @router.post("/public/photofind/{event_id}/create-paypal-order")
 async def create_paypal_order(event_id: str, data: KioskPayPalOrderRequest):
     """Create a PayPal order for kiosk payment"""
-    import requests
-    
     event = await db.photofind_events.find_one({"id": event_id, "is_active": True})
     if not event:
         raise HTTPException(status_code=404, detail="Événement non trouvé")
     
-    if not PAYPAL_CLIENT_ID or not PAYPAL_CLIENT_SECRET:
+    paypal = kiosk_paypal()
+    if not paypal.configured:
         raise HTTPException(status_code=500, detail="PayPal non configuré")
     
-    # Get PayPal access token
-    auth_response = requests.post(
-        "https://api-m.paypal.com/v1/oauth2/token",
-        auth=(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET),
-        data={"grant_type": "client_credentials"}
-    )
-    
-    if auth_response.status_code != 200:
-        raise HTTPException(status_code=500, detail="Erreur authentification PayPal")
-    
-    access_token = auth_response.json()["access_token"]
-    
     # Create order with application context for redirect
     order_payload = {
         "intent": "CAPTURE",
@@ -1369,31 +1375,19 @@ async def create_paypal_order(event_id: str, data: KioskPayPalOrderRequest):
             "user_action": "PAY_NOW"
         }
     
-    order_response = requests.post(
-        "https://api-m.paypal.com/v2/checkout/orders",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        },
-        json=order_payload
-    )
-    
-    if order_response.status_code != 201:
-        logging.error(f"PayPal order creation error: {order_response.text}")
-        raise HTTPException(status_code=500, detail="Erreur création commande PayPal")
-    
-    order_data = order_response.json()
+    # The pending order id doubles as the PayPal idempotency key
+    pending_order_id = str(uuid.uuid4())
+    try:
+        order_data = await paypal.create_order(order_payload, request_id=pending_order_id)
+    except PaymentGatewayError as e:
+        raise HTTPException(status_code=500, detail=e.message)
     
     # Get approval URL
-    approval_url = None
-    for link in order_data.get("links", []):
-        if link.get("rel") == "approve":
-            approval_url = link.get("href")
-            break
+    approval_url = paypal.approval_url(order_data)
     
     # Store pending order
     pending_order = {
-        "id": str(uuid.uuid4()),
+        "id": pending_order_id,
         "paypal_order_id": order_data["id"],
         "event_id": event_id,
         "photo_ids": data.photo_ids,
@@ -1415,61 +1409,38 @@ async def create_paypal_order(event_id: str, data: KioskPayPalOrderRequest):
 @router.get("/public/photofind/{event_id}/check-payment/{order_id}")
 async def check_paypal_payment(event_id: str, order_id: str):
     """Check PayPal payment status"""
-    import requests
-    
-    if not PAYPAL_CLIENT_ID or not PAYPAL_CLIENT_SECRET:
+    paypal = kiosk_paypal()
+    if not paypal.configured:
         raise HTTPException(status_code=500, detail="PayPal non configuré")
     
-    auth_response = requests.post(
-        "https://api-m.paypal.com/v1/oauth2/token",
-        auth=(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET),
-        data={"grant_type": "client_credentials"}
-    )
-    
-    if auth_response.status_code != 200:
-        raise HTTPException(status_code=500, detail="Erreur authentification PayPal")
-    
-    access_token = auth_response.json()["access_token"]
-    
-    order_response = requests.get(
-        f"https://api-m.paypal.com/v2/checkout/orders/{order_id}",
-        headers={"Authorization": f"Bearer {access_token}"}
-    )
-    
-    if order_response.status_code != 200:
+    try:
+        order_data = await paypal.get_order(order_id)
+    except PaymentAuthError as e:
+        raise HTTPException(status_code=500, detail=e.message)
+    except PaymentGatewayError:
         return {"status": "error", "message": "Commande non trouvée"}
     
-    order_data = order_response.json()
     return {"status": order_data.get("status", "UNKNOWN")}
 
 @router.post("/public/photofind/{event_id}/capture-paypal-order")
 async def capture_paypal_order(event_id: str, data: KioskCapturePayPalRequest):
     """Capture a PayPal order after approval"""
-    import requests
-    
-    if not PAYPAL_CLIENT_ID or not PAYPAL_CLIENT_SECRET:
+    paypal = kiosk_paypal()
+    if not paypal.configured:
         raise HTTPException(status_code=500, detail="PayPal non configuré")
     
-    auth_response = requests.post(
-        "https://api-m.paypal.com/v1/oauth2/token",
-        auth=(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET),
-        data={"grant_type": "client_credentials"}
+    # Already captured (kiosk retried the request): return the existing purchase
+    pending = await db.photofind_pending_orders.find_one(
+        {"paypal_order_id": data.order_id}, {"_id": 0, "status": 1, "purchase_id": 1}
     )
+    if pending and pending.get("status") == "completed" and pending.get("purchase_id"):
+        existing = await db.photofind_kiosk_purchases.find_one({"id": pending["purchase_id"]}, {"_id": 0})
+        if existing:
+            return existing
     
-    if auth_response.status_code != 200:
-        raise HTTPException(status_code=500, detail="Erreur authentification PayPal")
-    
-    access_token = auth_response.json()["access_token"]
-    
-    capture_response = requests.post(
-        f"https://api-m.paypal.com/v2/checkout/orders/{data.order_id}/capture",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-    )
-    
-    if capture_response.status_code != 201:
+    try:
+        await paypal.capture_order(data.order_id)
+    except PaymentGatewayError:
         raise HTTPException(status_code=500, detail="Erreur capture paiement PayPal")
     
     # Create completed purchase
@@ -1494,6 +1465,7 @@ async def capture_paypal_order(event_id: str, data: KioskCapturePayPalRequest):
     }
     
     await db.photofind_kiosk_purchases.insert_one(purchase)
+    await photofind_analytics.record_purchase(db, purchase)
     
     # Update pending order
     await db.photofind_pending_orders.update_one(
@@ -1515,19 +1487,16 @@ async def capture_paypal_order(event_id: str, data: KioskCapturePayPalRequest):
 @router.post("/public/photofind/{event_id}/create-stripe-payment")
 async def create_stripe_payment(event_id: str, data: KioskStripePaymentIntent):
     """Create a Stripe payment intent for kiosk"""
-    import stripe
-    
     event = await db.photofind_events.find_one({"id": event_id, "is_active": True})
     if not event:
         raise HTTPException(status_code=404, detail="Événement non trouvé")
     
-    if not STRIPE_SECRET_KEY:
+    stripe = get_stripe(STRIPE_SECRET_KEY)
+    if not stripe.configured:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = STRIPE_SECRET_KEY
-    
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe.create_payment_intent(
             amount=int(data.amount * 100),  # Convert to cents
             currency="eur",
             metadata={
@@ -1550,19 +1519,24 @@ async def create_stripe_payment(event_id: str, data: KioskStripePaymentIntent):
 @router.post("/public/photofind/{event_id}/confirm-stripe-payment")
 async def confirm_stripe_payment(event_id: str, data: dict = Body(...)):
     """Confirm Stripe payment and create purchase"""
-    import stripe
-    
     payment_intent_id = data.get("payment_intent_id")
     if not payment_intent_id:
         raise HTTPException(status_code=400, detail="payment_intent_id requis")
     
-    if not STRIPE_SECRET_KEY:
+    stripe = get_stripe(STRIPE_SECRET_KEY)
+    if not stripe.configured:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = STRIPE_SECRET_KEY
+    # Idempotent: a repeated confirmation returns the purchase already created for this intent
+    existing = await db.photofind_kiosk_purchases.find_one(
+        {"stripe_payment_intent_id": payment_intent_id, "event_id": event_id}, {"_id": 0}
+    )
+    if existing:
+        existing["success"] = True
+        return existing
     
     try:
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        intent = await stripe.retrieve_payment_intent(payment_intent_id)
         
         if intent.status != "succeeded":
             raise HTTPException(status_code=400, detail="Paiement non confirmé")
@@ -1593,6 +1567,7 @@ async def confirm_stripe_payment(event_id: str, data: dict = Body(...)):
         }
         
         await db.photofind_kiosk_purchases.insert_one(purchase)
+        await photofind_analytics.record_purchase(db, purchase)
         
         # Send email (log detailed info for debugging)
         logging.info(f"Stripe payment confirmed - attempting to send email to: '{email}' for {len(photo_ids)} photos")
@@ -1611,10 +1586,13 @@ async def confirm_stripe_payment(event_id: str, data: dict = Body(...)):
     except HTTPException:
         # Re-raise HTTPException as-is (don't wrap in 500)
         raise
-    except stripe.error.InvalidRequestError as e:
-        # Invalid payment intent ID
-        logging.error(f"Stripe invalid request error: {e}")
-        raise HTTPException(status_code=400, detail="Payment intent invalide")
+    except PaymentGatewayError as e:
+        if e.status_code in (400, 404):
+            # Invalid payment intent ID
+            logging.error(f"Stripe invalid request error: {e}")
+            raise HTTPException(status_code=400, detail="Payment intent invalide")
+        logging.error(f"Stripe confirmation error: {e}")
+        raise HTTPException(status_code=500, detail="Erreur confirmation paiement")
     except Exception as e:
         logging.error(f"Stripe confirmation error: {e}")
         raise HTTPException(status_code=500, detail="Erreur confirmation paiement")
@@ -1709,21 +1687,12 @@ async def upload_photo_to_session(
     if session["status"] != "waiting":
         raise HTTPException(status_code=400, detail="Une photo a déjà été uploadée")
     
-    # Vérifier le type de fichier
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="Fichier image requis")
-    
-    # Sauvegarder le fichier
+    # Sauvegarder le fichier (type et taille vérifiés pendant l'écriture)
     upload_dir = PHOTOFIND_DIR / event_id / "uploads"
-    upload_dir.mkdir(parents=True, exist_ok=True)
     
-    file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
+    file_ext = Path(file.filename).suffix.lstrip('.') or 'jpg'
     filename = f"upload_{session_id}_{uuid.uuid4().hex[:8]}.{file_ext}"
-    file_path = upload_dir / filename
-    
-    content = await file.read()
-    with open(file_path, 'wb') as f:
-        f.write(content)
+    await save_upload(file, upload_dir / filename, max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES)
     
     # URL de la photo (sans /api car les fichiers statiques sont montés sur /uploads)
     photo_url = f"/uploads/photofind/{event_id}/uploads/{filename}"
@@ -14,13 +14,11 @@ import os
 import logging
 import shutil
 from pathlib import Path
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import db
+from services.executors import run_io, run_ffmpeg
+from services.file_delivery import offload_response
+from services.uploads import save_upload, IMAGE_TYPES, MAX_IMAGE_SIZE, MAX_VIDEO_SIZE
 
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'test_database')
-
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
 
 router = APIRouter(tags=["VIP Videos"])
 
@@ -156,35 +154,34 @@ async def upload_video_chunk(
     current_user: dict = Depends(get_current_user)
 ):
     """Upload a video chunk"""
+    if Path(upload_id).name != upload_id or upload_id in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="upload_id invalide")
     chunk_dir = VIDEOS_DIR / "chunks" / upload_id
-    chunk_dir.mkdir(parents=True, exist_ok=True)
     
     chunk_path = chunk_dir / f"chunk_{chunk_index:05d}"
-    content = await chunk.read()
-    with open(chunk_path, 'wb') as f:
-        f.write(content)
+    await save_upload(chunk, chunk_path, max_size=MAX_VIDEO_SIZE, dedupe=False)
     
     # Check if all chunks uploaded
     existing_chunks = list(chunk_dir.glob("chunk_*"))
     
     if len(existing_chunks) >= total_chunks:
-        # Assemble the video
+        # Assemble the video (disk to disk, off the event loop)
         video_id = str(uuid.uuid4())
-        ext = filename.rsplit('.', 1)[-1] if '.' in filename else 'mp4'
+        ext = Path(filename).suffix.lstrip('.') or 'mp4'
         video_filename = f"{video_id}.{ext}"
         video_path = VIDEOS_DIR / video_filename
         
-        with open(video_path, 'wb') as outfile:
-            for i in range(total_chunks):
-                cp = chunk_dir / f"chunk_{i:05d}"
-                if cp.exists():
-                    with open(cp, 'rb') as infile:
-                        shutil.copyfileobj(infile, outfile)
-        
-        # Clean up chunks
-        shutil.rmtree(chunk_dir, ignore_errors=True)
+        def assemble():
+            with open(video_path, 'wb') as outfile:
+                for i in range(total_chunks):
+                    cp = chunk_dir / f"chunk_{i:05d}"
+                    if cp.exists():
+                        with open(cp, 'rb') as infile:
+                            shutil.copyfileobj(infile, outfile)
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+            return video_path.stat().st_size
         
-        file_size = video_path.stat().st_size
+        file_size = await run_io(assemble)
         
         # Parse client_ids
         cids = [c.strip() for c in client_ids.split(",") if c.strip()] if client_ids else []
@@ -209,7 +206,7 @@ async def upload_video_chunk(
         # Try to generate thumbnail
         try:
             thumb_path = THUMBNAILS_DIR / f"{video_id}.jpg"
-            os.system(f'ffmpeg -i "{video_path}" -ss 00:00:02 -vframes 1 -vf scale=640:-1 "{thumb_path}" -y 2>/dev/null')
+            await run_ffmpeg(os.system, f'ffmpeg -i "{video_path}" -ss 00:00:02 -vframes 1 -vf scale=640:-1 "{thumb_path}" -y 2>/dev/null')
             if thumb_path.exists():
                 await db.vip_videos.update_one(
                     {"id": video_id},
@@ -237,13 +234,9 @@ async def upload_thumbnail(video_id: str, file: UploadFile = File(...), current_
     if not video:
         raise HTTPException(status_code=404, detail="Vidéo non trouvée")
     
-    ext = file.filename.rsplit('.', 1)[-1] if '.' in file.filename else 'jpg'
+    ext = Path(file.filename).suffix.lstrip('.') or 'jpg'
     thumb_filename = f"{video_id}.{ext}"
-    thumb_path = THUMBNAILS_DIR / thumb_filename
-    
-    content = await file.read()
-    with open(thumb_path, 'wb') as f:
-        f.write(content)
+    await save_upload(file, THUMBNAILS_DIR / thumb_filename, max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES)
     
     await db.vip_videos.update_one({"id": video_id}, {"$set": {"thumbnail": thumb_filename}})
     return {"message": "Miniature mise à jour"}
@@ -316,6 +309,13 @@ async def stream_video(video_id: str, request: Request):
     # Handle range requests for video seeking
     range_header = request.headers.get("range")
     
+    # Front web server delivery: it handles ranges itself (sendfile)
+    offloaded = offload_response(video_path, media_type=content_type)
+    if offloaded is not None:
+        if not range_header:
+            await db.vip_videos.update_one({"id": video_id}, {"$inc": {"views": 1}})
+        return offloaded
+    
     if range_header:
         range_str = range_header.replace("bytes=", "")
         start_str, end_str = range_str.split("-")
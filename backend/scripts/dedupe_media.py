@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Migration : déduplique les médias existants (uploads/) avec des liens physiques.
+
+Chaque fichier est rattaché au stockage adressé par contenu (uploads/.blobs) ; les copies
+identiques (même SHA-256) deviennent des liens vers un seul blob. Les URLs ne changent pas.
+Idempotent : peut être relancé, les fichiers déjà liés sont ignorés.
+
+Exécuter avec:
+    python scripts/dedupe_media.py --dry-run          # rapport sans rien modifier
+    python scripts/dedupe_media.py                    # tous les dossiers médias
+    python scripts/dedupe_media.py galleries photofind
+    python scripts/dedupe_media.py --gc               # supprime ensuite les blobs sans référence
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from services import media_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Déduplication des médias par liens physiques")
+    parser.add_argument("dirs", nargs="*", help=f"Sous-dossiers de uploads/ (défaut : {', '.join(media_store.MEDIA_DIRS)})")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--gc", action="store_true", help="Supprimer les blobs sans référence après la migration")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = media_store.dedupe_tree(dirs=args.dirs or None, dry_run=args.dry_run)
+    result = {"dry_run": args.dry_run, **report.as_dict(), "seconds": round(time.perf_counter() - started, 1)}
+    if args.gc and not args.dry_run:
+        result["gc"] = media_store.collect_garbage(min_age_seconds=0)
+    result["store"] = media_store.store_stats()
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    prefix = "[simulation] " if args.dry_run else ""
+    print(f"\n{prefix}{report.deduplicated} copies remplacées par un lien, "
+          f"{report.bytes_saved / (1024 * 1024):.1f} Mo libérés sur {report.bytes_scanned / (1024 * 1024):.1f} Mo analysés")
+
+
+if __name__ == "__main__":
+    main()
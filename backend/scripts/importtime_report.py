@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Rapport du temps d'import du backend (python -X importtime).
+
+Importe `server` dans un processus neuf et affiche les modules les plus coûteux
+(temps cumulé et temps propre) ainsi que le total par paquet de premier niveau.
+Les dépendances lourdes (reportlab, boto3, emergentintegrations, qrcode...) sont
+importées à la demande : elles ne doivent pas apparaître ici.
+
+Exécuter avec:
+    python scripts/importtime_report.py                  # top 25
+    python scripts/importtime_report.py --top 50
+    python scripts/importtime_report.py --budget-ms 3000 # code retour 1 si dépassé
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$")
+
+
+def measure(module: str = "server") -> str:
+    """Lance `python -X importtime -c "import <module>"` et renvoie la sortie brute (stderr)"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        tail = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"import {module} a échoué:\n" + "\n".join(tail[-20:]))
+    return result.stderr
+
+
+def parse(output: str) -> list:
+    """Une entrée par module : (nom, self_us, cumulative_us, profondeur)"""
+    entries = []
+    for line in output.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def summarize(entries: list, top: int = 25) -> dict:
+    """Total, modules les plus lents et temps propre agrégé par paquet de premier niveau"""
+    packages = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        packages[name.split(".")[0]] += self_us
+    return {
+        "total_ms": sum(cumulative for _, _, cumulative, depth in entries if depth == 0) / 1000,
+        "modules": len(entries),
+        "by_cumulative": sorted(entries, key=lambda e: e[2], reverse=True)[:top],
+        "by_self": sorted(entries, key=lambda e: e[1], reverse=True)[:top],
+        "by_package": sorted(packages.items(), key=lambda p: p[1], reverse=True)[:top],
+    }
+
+
+def format_report(summary: dict) -> str:
+    lines = [f"Import de server : {summary['total_ms']:.0f} ms, {summary['modules']} modules", ""]
+    lines.append(f"{'cumulé ms':>10} {'propre ms':>10}  module")
+    for name, self_us, cumulative_us, depth in summary["by_cumulative"]:
+        lines.append(f"{cumulative_us / 1000:>10.1f} {self_us / 1000:>10.1f}  {'  ' * depth}{name}")
+    lines += ["", f"{'propre ms':>10}  module"]
+    for name, self_us, _, _ in summary["by_self"]:
+        lines.append(f"{self_us / 1000:>10.1f}  {name}")
+    lines += ["", f"{'propre ms':>10}  paquet"]
+    for package, self_us in summary["by_package"]:
+        lines.append(f"{self_us / 1000:>10.1f}  {package}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps d'import du backend")
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    summary = summarize(parse(measure(args.module)), top=args.top)
+    print(format_report(summary))
+    if args.budget_ms is not None and summary["total_ms"] > args.budget_ms:
+        print(f"\nBudget dépassé : {summary['total_ms']:.0f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script pour recalculer les statistiques PhotoFind pré-calculées (photofind_event_stats)
+depuis les collections brutes photofind_kiosk_purchases et photofind_print_logs.
+
+Exécuter avec:
+    python scripts/rebuild_photofind_stats.py            # tous les événements
+    python scripts/rebuild_photofind_stats.py <event_id> # un seul événement
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from services.photofind_analytics import ensure_indexes, rebuild_event_stats, rebuild_all_event_stats
+
+# Configuration - Modifier si nécessaire
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'creativindustry')
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+
+    await ensure_indexes(db)
+
+    if len(sys.argv) > 1:
+        stats = await rebuild_event_stats(db, sys.argv[1])
+        print(f"✓ {sys.argv[1]}: {stats['total_purchases']} achats, {stats['total_revenue']:.2f} €, {stats['total_printed']} impressions")
+    else:
+        count = await rebuild_all_event_stats(db)
+        print(f"✓ Statistiques recalculées pour {count} événement(s)")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,14 +8,12 @@ load_dotenv(ROOT_DIR / '.env')
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request, Header, BackgroundTasks, Body
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 import shutil
 import zipfile
-import io
 import secrets
 import base64
 import subprocess
@@ -25,21 +23,12 @@ import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
-import pyotp
-import qrcode
 from io import BytesIO
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 
 # Import models early to avoid circular imports
 from models.schemas import AdminCreate, AdminUpdate, AdminResponse
@@ -48,10 +37,11 @@ from models.schemas import AdminCreate, AdminUpdate, AdminResponse
 from routes.guestbook import router as guestbook_router
 from routes.contracts import router as contracts_router
 from routes.appointments import router as appointments_router, set_admin_dependency as set_appointments_admin
-from routes.photofind import router as photofind_router, set_admin_dependency as set_photofind_admin
+from routes.photofind import router as photofind_router, set_admin_dependency as set_photofind_admin, ensure_purchase_indexes as ensure_photofind_purchase_indexes
 from routes.galleries import router as galleries_router, set_admin_dependency as set_galleries_admin, set_client_dependency as set_galleries_client
-from routes.equipment import router as equipment_router, set_admin_dependency as set_equipment_admin
+from routes.equipment import router as equipment_router, set_admin_dependency as set_equipment_admin, ensure_search_indexes as ensure_equipment_search_indexes
 from routes.videos import router as videos_router, set_admin_dependency as set_videos_admin
+from routes.media import router as media_router
 
 # Import SMS service
 from services.sms_service import (
@@ -61,7 +51,17 @@ from services.sms_service import (
     send_new_file_sms,
     send_test_sms
 )
-from services.scheduler_service import start_scheduler, stop_scheduler
+from services.scheduler_service import start_scheduler, stop_scheduler, run_job, send_task_reminders
+from services import scheduler_service
+from services import photofind_analytics, client_lifecycle, media_store, equipment_availability, dashboard_stats, search_index, task_reminders, story_views, news_likes, chatbot, guestbook_media
+import database
+import metrics
+from services.pdf_service import render_pdf, render_pdf_file
+from services.payment_gateway import get_paypal, get_stripe, PaymentGatewayError, close_payment_gateways
+from services.executors import run_io, run_cpu, run_ffmpeg, executor_stats, shutdown_executors
+from services.file_delivery import deliver_file
+from services.uploads import save_upload, MAX_IMAGE_SIZE, MAX_AUDIO_SIZE, MAX_VIDEO_SIZE, MAX_DOCUMENT_SIZE, IMAGE_TYPES, VIDEO_TYPES, AUDIO_TYPES
+import loop_monitor
 
 # Create uploads directory
 UPLOADS_DIR = ROOT_DIR / "uploads"
@@ -79,9 +79,8 @@ UPLOADS_DIR.mkdir(exist_ok=True)
 # News/Actualités folder
 (UPLOADS_DIR / "news").mkdir(exist_ok=True)
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Shared MongoDB pool (one per process, see database.py)
+db = database.db
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -90,7 +89,6 @@ security_optional = HTTPBearer(auto_error=False)
 
 SECRET_KEY = os.environ.get('JWT_SECRET', 'creativindustry-secret-key-2024')
 ALGORITHM = "HS256"
-EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', '')
 
 # SMTP Configuration
 SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.ionos.fr')
@@ -284,7 +282,7 @@ async def send_client_progress_email(client: dict, task: dict, new_status: str):
     """
     
     try:
-        result = send_email(client_email, subject, html_content)
+        result = await run_io(send_email, client_email, subject, html_content)
         if result:
             logging.info(f"Progress email sent to client {client_email} for task {task.get('id')}")
         return result
@@ -355,7 +353,7 @@ async def send_newsletter_notification(media_type: str, title: str, media_url: s
             </html>
             """
             
-            send_email(subscriber['email'], f"{emoji} {type_label} : {title} - CREATIVINDUSTRY", html_content)
+            await run_io(send_email, subscriber['email'], f"{emoji} {type_label} : {title} - CREATIVINDUSTRY", html_content)
             logging.info(f"Newsletter sent to {subscriber['email']}")
             
         except Exception as e:
@@ -396,121 +394,6 @@ def send_email_with_attachment(to_email: str, subject: str, html_content: str, a
         logging.error(f"Failed to send email with attachment: {str(e)}")
         return False
 
-def generate_quote_pdf(quote_data: dict, options_details: list) -> bytes:
-    """Generate a professional PDF quote"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#d4af37'), alignment=TA_CENTER, spaceAfter=20)
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=12, textColor=colors.HexColor('#666666'), alignment=TA_CENTER, spaceAfter=30)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#d4af37'), spaceBefore=20, spaceAfter=10)
-    normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=11, spaceAfter=5)
-    
-    elements = []
-    
-    # Header
-    elements.append(Paragraph("CREATIVINDUSTRY France", title_style))
-    elements.append(Paragraph("Devis Mariage", subtitle_style))
-    elements.append(Spacer(1, 20))
-    
-    # Quote reference
-    ref_date = datetime.now().strftime("%d/%m/%Y")
-    quote_id = quote_data.get('id', '')[:8].upper()
-    elements.append(Paragraph(f"<b>Référence:</b> #{quote_id} | <b>Date:</b> {ref_date}", normal_style))
-    elements.append(Spacer(1, 20))
-    
-    # Client info section
-    elements.append(Paragraph("Informations Client", heading_style))
-    
-    client_data = [
-        ["Nom:", quote_data.get('client_name', '')],
-        ["Email:", quote_data.get('client_email', '')],
-        ["Téléphone:", quote_data.get('client_phone', '')],
-        ["Date du mariage:", quote_data.get('event_date', '')],
-        ["Lieu:", quote_data.get('event_location', '') or 'Non précisé'],
-    ]
-    
-    client_table = Table(client_data, colWidths=[4*cm, 12*cm])
-    client_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#666666')),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
-    elements.append(client_table)
-    elements.append(Spacer(1, 20))
-    
-    # Prestations section
-    elements.append(Paragraph("Prestations Sélectionnées", heading_style))
-    
-    # Table header
-    prestations_data = [["Prestation", "Prix"]]
-    
-    # Group by category
-    categories = {'coverage': '📸 Couverture', 'extras': '✨ Options', 'editing': '🎬 Livrables', 'other': 'Autres'}
-    options_by_cat = {}
-    for opt in options_details:
-        cat = opt.get('category', 'other')
-        if cat not in options_by_cat:
-            options_by_cat[cat] = []
-        options_by_cat[cat].append(opt)
-    
-    for cat, cat_label in categories.items():
-        if cat in options_by_cat:
-            prestations_data.append([cat_label, ""])
-            for opt in options_by_cat[cat]:
-                prestations_data.append([f"   {opt['name']}", f"{opt['price']} €"])
-    
-    # Total
-    total = sum(opt['price'] for opt in options_details)
-    prestations_data.append(["TOTAL", f"{total} €"])
-    
-    prestations_table = Table(prestations_data, colWidths=[12*cm, 4*cm])
-    prestations_table.setStyle(TableStyle([
-        # Header
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#d4af37')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        # Body
-        ('FONTSIZE', (0, 1), (-1, -2), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
-        # Category rows (bold)
-        ('FONTNAME', (0, 1), (0, -2), 'Helvetica-Bold'),
-        ('TEXTCOLOR', (0, 1), (0, -2), colors.HexColor('#d4af37')),
-        # Total row
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#d4af37')),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.black),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 14),
-    ]))
-    elements.append(prestations_table)
-    elements.append(Spacer(1, 30))
-    
-    # Message if any
-    if quote_data.get('message'):
-        elements.append(Paragraph("Message du Client", heading_style))
-        elements.append(Paragraph(f"<i>\"{quote_data['message']}\"</i>", normal_style))
-        elements.append(Spacer(1, 20))
-    
-    # Footer
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=9, textColor=colors.HexColor('#888888'), alignment=TA_CENTER, spaceBefore=30)
-    elements.append(Paragraph("─" * 50, footer_style))
-    elements.append(Paragraph("CREATIVINDUSTRY France", footer_style))
-    elements.append(Paragraph("contact@creativindustry.com | communication@creativindustry.com", footer_style))
-    elements.append(Paragraph(f"Devis valable 30 jours à compter du {ref_date}", footer_style))
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.read()
-
 def send_file_notification_email(client_email: str, client_name: str, file_title: str, file_type: str, file_url: str):
     """Send notification email when a file is added to client space"""
     
@@ -1192,15 +1075,6 @@ class PortfolioItemUpdate(BaseModel):
 
 # ==================== STORY VIEWS MODELS ====================
 
-class StoryView(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    story_id: str
-    viewer_type: str  # "client" or "anonymous"
-    viewer_id: Optional[str] = None  # Client ID if logged in
-    viewer_name: Optional[str] = None  # Client name if logged in
-    viewed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    ip_hash: Optional[str] = None  # Hashed IP for anonymous deduplication
-
 class StoryViewStats(BaseModel):
     total_views: int
     unique_views: int
@@ -1696,6 +1570,7 @@ class SelectionUpdate(BaseModel):
 
 # MFA Helper Functions
 def generate_mfa_secret():
+    import pyotp
     return pyotp.random_base32()
 
 def generate_backup_codes(count=8):
@@ -1704,11 +1579,14 @@ def generate_backup_codes(count=8):
 
 def verify_totp(secret: str, code: str) -> bool:
     """Verify a TOTP code"""
+    import pyotp
     totp = pyotp.TOTP(secret)
     return totp.verify(code, valid_window=1)  # Allow 30 seconds window
 
 def generate_qr_code(secret: str, email: str) -> str:
     """Generate QR code for authenticator app"""
+    import pyotp
+    import qrcode
     totp = pyotp.TOTP(secret)
     uri = totp.provisioning_uri(name=email, issuer_name="CREATIVINDUSTRY France")
     
@@ -2359,9 +2237,8 @@ async def upload_client_photo(
     if file.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Type de fichier non supporté. Utilisez JPG, PNG ou WEBP.")
     
-    # Create client folder
+    # Client folder
     client_folder = UPLOADS_DIR / "clients" / client["id"]
-    client_folder.mkdir(exist_ok=True, parents=True)
     
     # Save file
     file_ext = Path(file.filename).suffix.lower()
@@ -2369,8 +2246,9 @@ async def upload_client_photo(
     file_path = client_folder / photo_filename
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload(file, file_path, max_size=MAX_IMAGE_SIZE, allowed_types=ALLOWED_IMAGE_TYPES)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'upload: {str(e)}")
     
@@ -2496,7 +2374,7 @@ async def request_account_extension(client: dict = Depends(get_current_client)):
         admin_emails = [a["email"] for a in await db.admins.find({}, {"email": 1}).to_list(10)]
         
         for admin_email in admin_emails:
-            await send_email(
+            await run_io(send_email,
                 to_email=admin_email,
                 subject=f"Nouvelle demande d'extension - {full_client.get('name')}",
                 html_content=f"""
@@ -2593,7 +2471,7 @@ async def validate_extension_payment(order_id: str, admin: dict = Depends(get_cu
     
     # Send confirmation email to client
     try:
-        await send_email(
+        await run_io(send_email,
             to_email=client.get("email"),
             subject="Extension de compte validée - CREATIVINDUSTRY",
             html_content=f"""
@@ -2635,98 +2513,61 @@ ARCHIVES_DIR = UPLOADS_DIR / "archives"
 ARCHIVES_DIR.mkdir(exist_ok=True)
 
 
+# Temps d'attente max d'un job dans la requête HTTP avant de répondre "en cours"
+LIFECYCLE_INLINE_WAIT = float(os.environ.get("LIFECYCLE_INLINE_WAIT", "20"))
+
+
 @api_router.post("/admin/cleanup-expired-accounts")
 async def cleanup_expired_accounts(admin: dict = Depends(get_current_admin)):
-    """Archive and cleanup expired client accounts"""
+    """Archive and cleanup expired client accounts (background job, resumable)"""
+    active = await client_lifecycle.find_active_job(db, "archive")
+    if active:
+        return {
+            "success": True,
+            "job_id": active["id"],
+            "status": active["status"],
+            "archived_count": len(active.get("done_ids", [])),
+            "message": f"Archivage déjà en cours ({active.get('processed', 0)}/{active.get('total', 0)})"
+        }
     
-    now = datetime.now(timezone.utc)
-    archived_count = 0
-    errors = []
+    client_ids = await client_lifecycle.find_expired_client_ids(db)
+    if not client_ids:
+        return {"success": True, "archived_count": 0, "errors": None, "message": "0 compte(s) expiré(s) archivé(s)"}
     
-    # Find expired clients
-    all_clients = await db.clients.find({}, {"_id": 0}).to_list(1000)
+    job = await client_lifecycle.create_job(db, UPLOADS_DIR, "archive", client_ids, started_by=admin.get("email"))
+    job = await client_lifecycle.wait_for_job(db, job["id"], LIFECYCLE_INLINE_WAIT)
+    archived_count = len(job.get("done_ids", []))
     
-    for client in all_clients:
-        expires_at = client.get("expires_at")
-        if not expires_at:
-            continue
-        
-        try:
-            expiry_date = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-            if expiry_date > now:
-                continue  # Not expired yet
-        except:
-            continue
-        
-        client_id = client["id"]
-        client_name = client.get("name", "unknown").replace(" ", "_")
-        client_email = client.get("email", "unknown")
-        
-        try:
-            # 1. Archive client files
-            archive_folder = ARCHIVES_DIR / f"archive_{client_name}_{client_id[:8]}"
-            archive_folder.mkdir(exist_ok=True)
-            
-            # Move client files to archive
-            file_types = ["music", "documents", "photos", "videos"]
-            for file_type in file_types:
-                src_folder = UPLOADS_DIR / "client_transfers" / file_type / client_id
-                if src_folder.exists():
-                    dest_folder = archive_folder / file_type
-                    dest_folder.mkdir(exist_ok=True)
-                    for file in src_folder.iterdir():
-                        shutil.move(str(file), str(dest_folder / file.name))
-                    src_folder.rmdir()
-            
-            # Archive client uploads
-            client_uploads = UPLOADS_DIR / "clients" / client_id
-            if client_uploads.exists():
-                dest_folder = archive_folder / "uploads"
-                shutil.move(str(client_uploads), str(dest_folder))
-            
-            # 2. Create archive metadata
-            archive_metadata = {
-                "client_id": client_id,
-                "client_name": client.get("name"),
-                "client_email": client_email,
-                "archived_at": now.isoformat(),
-                "original_expires_at": expires_at
-            }
-            with open(archive_folder / "metadata.json", "w") as f:
-                json.dump(archive_metadata, f, indent=2)
-            
-            # 3. Delete database records but keep client in archives collection
-            await db.archived_clients.insert_one({
-                **client,
-                "archived_at": now.isoformat(),
-                "archive_path": str(archive_folder)
-            })
-            
-            # Delete from main collections
-            await db.client_transfers.delete_many({"client_id": client_id})
-            await db.client_files.delete_many({"client_id": client_id})
-            await db.client_devis.delete_many({"client_id": client_id})
-            await db.client_invoices.delete_many({"client_id": client_id})
-            await db.client_payments.delete_many({"client_id": client_id})
-            await db.chat_messages.delete_many({"conversation_id": f"client_{client_id}"})
-            await db.extension_orders.delete_many({"client_id": client_id})
-            await db.clients.delete_one({"id": client_id})
-            
-            archived_count += 1
-            logging.info(f"Archived expired client: {client_email} to {archive_folder}")
-            
-        except Exception as e:
-            errors.append(f"Error archiving {client_email}: {str(e)}")
-            logging.error(f"Error archiving client {client_email}: {e}")
+    if job["status"] in ("pending", "running"):
+        message = f"Archivage de {job['total']} compte(s) expiré(s) en cours ({job['processed']}/{job['total']})"
+    else:
+        message = f"{archived_count} compte(s) expiré(s) archivé(s)"
     
     return {
         "success": True,
+        "job_id": job["id"],
+        "status": job["status"],
         "archived_count": archived_count,
-        "errors": errors if errors else None,
-        "message": f"{archived_count} compte(s) expiré(s) archivé(s)"
+        "errors": job.get("errors") or None,
+        "message": message
     }
 
 
+@api_router.get("/admin/lifecycle-jobs")
+async def list_lifecycle_jobs(admin: dict = Depends(get_current_admin)):
+    """Recent archive/delete jobs"""
+    return await client_lifecycle.list_jobs(db)
+
+
+@api_router.get("/admin/lifecycle-jobs/{job_id}")
+async def get_lifecycle_job(job_id: str, admin: dict = Depends(get_current_admin)):
+    """Progress of an archive/delete job"""
+    job = await client_lifecycle.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    return job
+
+
 @api_router.get("/admin/archived-clients")
 async def get_archived_clients(admin: dict = Depends(get_current_admin)):
     """Get list of archived clients"""
@@ -2879,7 +2720,7 @@ async def create_client_file(data: ClientFileCreate, admin: dict = Depends(get_c
     
     # Send email notification to client
     try:
-        send_file_notification_email(
+        await run_io(send_file_notification_email,
             client_email=client_data["email"],
             client_name=client_data["name"],
             file_title=data.title,
@@ -2984,87 +2825,32 @@ async def delete_client_completely(client_id: str, admin: dict = Depends(get_cur
     """Delete a client and ALL their data including files on server"""
     
     # Check if client exists
-    client = await db.clients.find_one({"id": client_id})
+    client = await db.clients.find_one({"id": client_id}, {"_id": 0, "email": 1, "name": 1})
     if not client:
         raise HTTPException(status_code=404, detail="Client non trouvé")
     
     client_email = client.get("email", "unknown")
     client_name = client.get("name", "unknown")
-    deleted_files_count = 0
     
-    # 1. Delete client files from filesystem
-    file_types = ["music", "documents", "photos", "videos"]
-    for file_type in file_types:
-        client_folder = UPLOADS_DIR / "client_transfers" / file_type / client_id
-        if client_folder.exists():
-            import shutil
-            try:
-                shutil.rmtree(client_folder)
-                logging.info(f"Deleted folder: {client_folder}")
-            except Exception as e:
-                logging.error(f"Error deleting folder {client_folder}: {e}")
-    
-    # 2. Delete client uploads folder
-    client_uploads_folder = UPLOADS_DIR / "clients" / client_id
-    if client_uploads_folder.exists():
-        import shutil
-        try:
-            shutil.rmtree(client_uploads_folder)
-            logging.info(f"Deleted client uploads folder: {client_uploads_folder}")
-        except Exception as e:
-            logging.error(f"Error deleting client uploads: {e}")
-    
-    # 3. Delete all database records related to client
-    # Client transfers
-    result = await db.client_transfers.delete_many({"client_id": client_id})
-    deleted_files_count += result.deleted_count
-    
-    # Client files (uploaded by admin)
-    result = await db.client_files.delete_many({"client_id": client_id})
-    deleted_files_count += result.deleted_count
-    
-    # Client devis
-    await db.client_devis.delete_many({"client_id": client_id})
-    
-    # Client invoices
-    await db.client_invoices.delete_many({"client_id": client_id})
-    
-    # Client payments
-    await db.client_payments.delete_many({"client_id": client_id})
-    
-    # Chat messages
-    await db.chat_messages.delete_many({"conversation_id": f"client_{client_id}"})
-    
-    # File downloads history
-    await db.file_downloads.delete_many({"client_id": client_id})
-    
-    # User activity
-    await db.user_activity.delete_many({"user_id": client_id})
-    
-    # Gallery selections
-    await db.gallery_selections.delete_many({"client_id": client_id})
-    
-    # Galleries created for this client
-    galleries = await db.galleries.find({"client_id": client_id}).to_list(100)
-    for gallery in galleries:
-        # Delete gallery photos from filesystem
-        gallery_folder = UPLOADS_DIR / "galleries" / gallery.get("id", "")
-        if gallery_folder.exists():
-            import shutil
-            try:
-                shutil.rmtree(gallery_folder)
-            except:
-                pass
-    await db.galleries.delete_many({"client_id": client_id})
-    
-    # 4. Finally delete the client record
-    await db.clients.delete_one({"id": client_id})
-    
-    logging.info(f"Client deleted: {client_email} ({client_name}) by admin {admin.get('email')}. Files deleted: {deleted_files_count}")
+    # Files and records are removed by a lifecycle job (thread pool + bulk deletes)
+    job = await client_lifecycle.create_job(db, UPLOADS_DIR, "delete", [client_id], started_by=admin.get("email"))
+    job = await client_lifecycle.wait_for_job(db, job["id"], LIFECYCLE_INLINE_WAIT)
+    counts = job.get("counts", {})
+    deleted_files_count = counts.get("client_transfers", 0) + counts.get("client_files", 0)
+    
+    if job["status"] == "completed" and not job.get("failed_ids"):
+        logging.info(f"Client deleted: {client_email} ({client_name}) by admin {admin.get('email')}. Files deleted: {deleted_files_count}")
+        message = f"Client {client_name} supprimé avec succès"
+    elif job["status"] in ("pending", "running"):
+        message = f"Suppression du client {client_name} en cours"
+    else:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la suppression : {'; '.join(job.get('errors', []))}")
     
     return {
         "success": True,
-        "message": f"Client {client_name} supprimé avec succès",
+        "message": message,
+        "job_id": job["id"],
+        "status": job["status"],
         "details": {
             "client_email": client_email,
             "files_deleted": deleted_files_count
@@ -3171,19 +2957,15 @@ async def get_client_expiration(
 
 # ==================== PAYPAL INTEGRATION ====================
 
-import paypalrestsdk
-
 # PayPal Configuration
 PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID', '')
 PAYPAL_SECRET = os.environ.get('PAYPAL_SECRET', '')
 PAYPAL_MODE = os.environ.get('PAYPAL_MODE', 'sandbox')  # 'sandbox' or 'live'
 
-# Configure PayPal SDK
-paypalrestsdk.configure({
-    "mode": PAYPAL_MODE,
-    "client_id": PAYPAL_CLIENT_ID,
-    "client_secret": PAYPAL_SECRET
-})
+
+def site_paypal():
+    """Async PayPal gateway for renewals, devis/invoices, bookings and guestbooks (token cached)"""
+    return get_paypal(PAYPAL_CLIENT_ID, PAYPAL_SECRET, PAYPAL_MODE)
 
 # PayPal Plans (prices TTC with 20% TVA)
 PAYPAL_PLANS = {
@@ -3216,7 +2998,7 @@ async def create_paypal_order(data: PayPalOrderCreate):
     plan = PAYPAL_PLANS[data.plan]
     
     # Create PayPal payment
-    payment = paypalrestsdk.Payment({
+    payment = await site_paypal().create_payment({
         "intent": "sale",
         "payer": {
             "payment_method": "paypal"
@@ -3244,7 +3026,7 @@ async def create_paypal_order(data: PayPalOrderCreate):
         "note_to_payer": f"Renouvellement compte CREATIVINDUSTRY pour {client['email']}"
     })
     
-    if payment.create():
+    if payment.ok:
         # Store pending payment in database
         payment_record = {
             "id": str(uuid.uuid4()),
@@ -3262,11 +3044,7 @@ async def create_paypal_order(data: PayPalOrderCreate):
         await db.paypal_payments.insert_one(payment_record)
         
         # Get approval URL
-        approval_url = None
-        for link in payment.links:
-            if link.rel == "approval_url":
-                approval_url = link.href
-                break
+        approval_url = payment.approval_url
         
         return {
             "success": True,
@@ -3291,9 +3069,9 @@ async def execute_paypal_payment(payment_id: str, payer_id: str):
         raise HTTPException(status_code=400, detail="Ce paiement a déjà été traité")
     
     # Execute the payment
-    payment = paypalrestsdk.Payment.find(payment_id)
+    payment = await site_paypal().execute_payment(payment_id, payer_id)
     
-    if payment.execute({"payer_id": payer_id}):
+    if payment.ok:
         # Payment successful - activate the account
         new_expires_at = (datetime.now(timezone.utc) + timedelta(days=payment_record["days"])).isoformat()
         
@@ -3369,7 +3147,7 @@ async def execute_paypal_payment(payment_id: str, payer_id: str):
             </html>
             """
             try:
-                send_email(payment_record["client_email"], "✅ Paiement confirmé - CREATIVINDUSTRY", html_content)
+                await run_io(send_email, payment_record["client_email"], "✅ Paiement confirmé - CREATIVINDUSTRY", html_content)
             except Exception as e:
                 logging.error(f"Failed to send payment confirmation email: {e}")
         
@@ -3482,14 +3260,6 @@ async def get_paypal_payments(admin: dict = Depends(get_current_admin)):
 @api_router.get("/admin/renewal-invoice/{invoice_id}/pdf")
 async def download_renewal_invoice_pdf(invoice_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Generate and download a renewal invoice as PDF"""
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib.enums import TA_CENTER, TA_RIGHT
-    from io import BytesIO
-    
     # Verify admin access
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
@@ -3505,105 +3275,12 @@ async def download_renewal_invoice_pdf(invoice_id: str, credentials: HTTPAuthori
     if not invoice:
         raise HTTPException(status_code=404, detail="Facture non trouvée")
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#D4AF37'), alignment=TA_CENTER)
-    normal_style = styles['Normal']
-    
-    content = []
-    
-    # Header
-    content.append(Paragraph("CREATIVINDUSTRY", title_style))
-    content.append(Paragraph("L'Industrie Créative", ParagraphStyle('Sub', parent=styles['Normal'], alignment=TA_CENTER, textColor=colors.gray)))
-    content.append(Spacer(1, 30))
+    pdf_path = await render_pdf_file("renewal_invoice", client_id=invoice.get("client_id"), invoice=invoice)
     
-    # Invoice title
-    content.append(Paragraph(f"FACTURE N° {invoice.get('invoice_number', 'N/A')}", ParagraphStyle('InvTitle', parent=styles['Heading2'], fontSize=16)))
-    content.append(Spacer(1, 10))
-    
-    # Date
-    created_at = invoice.get('created_at', '')
-    if created_at:
-        try:
-            date_obj = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            formatted_date = date_obj.strftime("%d/%m/%Y")
-        except:
-            formatted_date = created_at[:10]
-    else:
-        formatted_date = "N/A"
-    content.append(Paragraph(f"Date : {formatted_date}", normal_style))
-    content.append(Spacer(1, 20))
-    
-    # Client info
-    content.append(Paragraph("<b>Client :</b>", normal_style))
-    content.append(Paragraph(f"{invoice.get('client_name', 'N/A')}", normal_style))
-    content.append(Paragraph(f"{invoice.get('client_email', 'N/A')}", normal_style))
-    content.append(Spacer(1, 30))
-    
-    # Invoice details table
-    data = [
-        ['Description', 'Quantité', 'Prix HT', 'TVA', 'Total TTC'],
-        [
-            f"Renouvellement accès - {invoice.get('plan_label', 'N/A')}\n({invoice.get('days', 0)} jours)",
-            '1',
-            f"{invoice.get('amount_ht', 0):.2f} €",
-            f"{invoice.get('tva', 0):.2f} €",
-            f"{invoice.get('amount_ttc', 0):.2f} €"
-        ]
-    ]
-    
-    table = Table(data, colWidths=[8*cm, 2*cm, 2.5*cm, 2.5*cm, 2.5*cm])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D4AF37')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f5f5f5')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
-    ]))
-    content.append(table)
-    content.append(Spacer(1, 20))
-    
-    # Totals
-    totals_data = [
-        ['', 'Total HT :', f"{invoice.get('amount_ht', 0):.2f} €"],
-        ['', 'TVA (20%) :', f"{invoice.get('tva', 0):.2f} €"],
-        ['', 'Total TTC :', f"{invoice.get('amount_ttc', 0):.2f} €"],
-    ]
-    totals_table = Table(totals_data, colWidths=[10*cm, 4*cm, 3*cm])
-    totals_table.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (1, 2), (-1, 2), 'Helvetica-Bold'),
-        ('FONTSIZE', (1, 2), (-1, 2), 12),
-        ('TEXTCOLOR', (2, 2), (2, 2), colors.HexColor('#D4AF37')),
-    ]))
-    content.append(totals_table)
-    content.append(Spacer(1, 30))
-    
-    # Payment info
-    content.append(Paragraph(f"<b>Mode de paiement :</b> {invoice.get('payment_method', 'PayPal')}", normal_style))
-    content.append(Paragraph(f"<b>Statut :</b> Payée ✓", ParagraphStyle('Paid', parent=normal_style, textColor=colors.green)))
-    content.append(Spacer(1, 40))
-    
-    # Footer
-    content.append(Paragraph("Merci pour votre confiance !", ParagraphStyle('Footer', parent=normal_style, alignment=TA_CENTER, textColor=colors.gray)))
-    content.append(Paragraph("CREATIVINDUSTRY - L'Industrie Créative", ParagraphStyle('Footer2', parent=normal_style, alignment=TA_CENTER, textColor=colors.gray, fontSize=8)))
-    
-    doc.build(content)
-    buffer.seek(0)
-    
-    return Response(
-        content=buffer.getvalue(),
+    return FileResponse(
+        str(pdf_path),
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=Facture_{invoice.get('invoice_number', 'N-A')}.pdf"}
+        filename=f"Facture_{invoice.get('invoice_number', 'N-A')}.pdf"
     )
 
 
@@ -3679,7 +3356,7 @@ async def create_devis_paypal_payment(data: DevisPaymentCreate, client: dict = D
     # Create PayPal payment
     site_url = os.environ.get('SITE_URL', 'https://creativindustry.com')
     
-    payment = paypalrestsdk.Payment({
+    payment = await site_paypal().create_payment({
         "intent": "sale",
         "payer": {
             "payment_method": "paypal"
@@ -3706,7 +3383,7 @@ async def create_devis_paypal_payment(data: DevisPaymentCreate, client: dict = D
         }]
     })
     
-    if payment.create():
+    if payment.ok:
         # Store pending payment
         payment_record = {
             "id": str(uuid.uuid4()),
@@ -3726,11 +3403,7 @@ async def create_devis_paypal_payment(data: DevisPaymentCreate, client: dict = D
         await db.devis_paypal_payments.insert_one(payment_record)
         
         # Get approval URL
-        approval_url = None
-        for link in payment.links:
-            if link.rel == "approval_url":
-                approval_url = link.href
-                break
+        approval_url = payment.approval_url
         
         return {
             "success": True,
@@ -3758,9 +3431,9 @@ async def execute_devis_paypal_payment(payment_id: str, payer_id: str, client: d
         raise HTTPException(status_code=400, detail="Ce paiement a déjà été traité")
     
     # Execute the payment
-    payment = paypalrestsdk.Payment.find(payment_id)
+    payment = await site_paypal().execute_payment(payment_id, payer_id)
     
-    if payment.execute({"payer_id": payer_id}):
+    if payment.ok:
         # Payment successful
         now = datetime.now(timezone.utc).isoformat()
         
@@ -3853,7 +3526,7 @@ async def execute_devis_paypal_payment(payment_id: str, payer_id: str, client: d
             </html>
             """
             try:
-                send_email(payment_record["client_email"], f"✅ Paiement confirmé - {payment_record['doc_title']}", html_content)
+                await run_io(send_email, payment_record["client_email"], f"✅ Paiement confirmé - {payment_record['doc_title']}", html_content)
             except Exception as e:
                 logging.error(f"Failed to send payment confirmation email: {e}")
         
@@ -3877,7 +3550,7 @@ async def execute_devis_paypal_payment(payment_id: str, payer_id: str, client: d
             </html>
             """
             try:
-                send_email(SMTP_EMAIL, f"💰 Paiement reçu - {payment_record['client_name']}", admin_html)
+                await run_io(send_email, SMTP_EMAIL, f"💰 Paiement reçu - {payment_record['client_name']}", admin_html)
             except:
                 pass
         
@@ -3927,7 +3600,7 @@ async def create_service_stripe_payment(data: ServicePaymentCreate):
     if not stripe_secret:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = stripe_secret
+    stripe = get_stripe(stripe_secret)
     
     if data.amount <= 0:
         raise HTTPException(status_code=400, detail="Montant invalide")
@@ -3935,7 +3608,7 @@ async def create_service_stripe_payment(data: ServicePaymentCreate):
     amount_ttc = round(data.amount, 2)
     
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe.create_payment_intent(
             amount=int(amount_ttc * 100),
             currency="eur",
             metadata={
@@ -3970,7 +3643,7 @@ async def create_service_stripe_payment(data: ServicePaymentCreate):
             "client_secret": intent.client_secret,
             "amount": amount_ttc
         }
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         logging.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur Stripe: {str(e)}")
 
@@ -3981,14 +3654,14 @@ async def confirm_service_stripe_payment(payment_id: str = Body(...), payment_in
     if not stripe_secret:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = stripe_secret
+    stripe = get_stripe(stripe_secret)
     
     payment = await db.stripe_payments.find_one({"id": payment_id})
     if not payment:
         raise HTTPException(status_code=404, detail="Paiement non trouvé")
     
     try:
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        intent = await stripe.retrieve_payment_intent(payment_intent_id)
         
         if intent.status == "succeeded":
             await db.stripe_payments.update_one(
@@ -4016,7 +3689,7 @@ async def confirm_service_stripe_payment(payment_id: str = Body(...), payment_in
         else:
             return {"success": False, "message": f"Paiement non confirmé: {intent.status}"}
             
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         logging.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur Stripe: {str(e)}")
 
@@ -4036,7 +3709,7 @@ async def create_service_paypal_payment(data: ServicePaymentCreate):
     site_url = os.environ.get('SITE_URL', 'https://creativindustry.com')
     
     # Create PayPal payment
-    payment = paypalrestsdk.Payment({
+    payment = await site_paypal().create_payment({
         "intent": "sale",
         "payer": {
             "payment_method": "paypal"
@@ -4063,7 +3736,7 @@ async def create_service_paypal_payment(data: ServicePaymentCreate):
         }]
     })
     
-    if payment.create():
+    if payment.ok:
         # Store pending payment
         payment_record = {
             "id": str(uuid.uuid4()),
@@ -4083,11 +3756,7 @@ async def create_service_paypal_payment(data: ServicePaymentCreate):
         await db.service_paypal_payments.insert_one(payment_record)
         
         # Get approval URL
-        approval_url = None
-        for link in payment.links:
-            if link.rel == "approval_url":
-                approval_url = link.href
-                break
+        approval_url = payment.approval_url
         
         return {
             "success": True,
@@ -4115,9 +3784,9 @@ async def execute_service_paypal_payment(payment_id: str, payer_id: str):
         return {"success": True, "message": "Paiement déjà traité", "already_processed": True}
     
     # Execute the payment
-    payment = paypalrestsdk.Payment.find(payment_id)
+    payment = await site_paypal().execute_payment(payment_id, payer_id)
     
-    if payment.execute({"payer_id": payer_id}):
+    if payment.ok:
         now = datetime.now(timezone.utc).isoformat()
         
         # Update payment record
@@ -4188,7 +3857,7 @@ async def execute_service_paypal_payment(payment_id: str, payer_id: str):
             </html>
             """
             try:
-                send_email(payment_record["client_email"], f"✅ Acompte confirmé - {payment_record['service_name']}", html_content)
+                await run_io(send_email, payment_record["client_email"], f"✅ Acompte confirmé - {payment_record['service_name']}", html_content)
             except Exception as e:
                 logging.error(f"Failed to send service payment confirmation: {e}")
         
@@ -4213,7 +3882,7 @@ async def execute_service_paypal_payment(payment_id: str, payer_id: str):
             </html>
             """
             try:
-                send_email(SMTP_EMAIL, f"💰 Acompte reçu - {payment_record['client_name']} - {payment_record['service_name']}", admin_html)
+                await run_io(send_email, SMTP_EMAIL, f"💰 Acompte reçu - {payment_record['client_name']} - {payment_record['service_name']}", admin_html)
             except:
                 pass
         
@@ -4304,7 +3973,7 @@ async def create_renewal_request(data: RenewalRequest):
         </html>
         """
         try:
-            send_email(SMTP_EMAIL, f"💳 Renouvellement: {client['name']} - {plan['price']}€", html_content)
+            await run_io(send_email, SMTP_EMAIL, f"💳 Renouvellement: {client['name']} - {plan['price']}€", html_content)
         except Exception as e:
             logging.error(f"Failed to send renewal notification: {e}")
     
@@ -4395,7 +4064,7 @@ async def approve_renewal_request(
         </html>
         """
         try:
-            send_email(request["client_email"], "✅ Votre compte CREATIVINDUSTRY est réactivé !", html_content)
+            await run_io(send_email, request["client_email"], "✅ Votre compte CREATIVINDUSTRY est réactivé !", html_content)
         except Exception as e:
             logging.error(f"Failed to send renewal confirmation: {e}")
     
@@ -4456,19 +4125,17 @@ async def upload_client_document(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Seuls les fichiers PDF sont acceptés")
     
-    # Create upload directory
+    # Upload directory
     doc_folder = UPLOADS_DIR / "client_documents" / client_id
-    doc_folder.mkdir(parents=True, exist_ok=True)
     
     # Generate unique filename
     doc_id = str(uuid.uuid4())
     safe_filename = f"{document_type}_{doc_id}.pdf"
     file_path = doc_folder / safe_filename
     
-    # Save file
-    content = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # Save file (streamed, must really be a PDF)
+    await save_upload(file, file_path, max_size=MAX_DOCUMENT_SIZE, allowed_types=["application/pdf"],
+                      allowed_extensions=[".pdf"])
     
     # Create document record
     document = {
@@ -4569,8 +4236,8 @@ async def download_client_document(document_id: str, client: dict = Depends(get_
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(
-        path=str(file_path),
+    return deliver_file(
+        file_path,
         filename=document.get("filename", f"{document['document_type']}_{document_id}.pdf"),
         media_type="application/pdf"
     )
@@ -4652,7 +4319,7 @@ async def add_external_file_link(
             </p>
         </div>
         """
-        send_email(client.get("email"), f"Nouveau fichier disponible : {title}", html_content)
+        await run_io(send_email, client.get("email"), f"Nouveau fichier disponible : {title}", html_content)
     except Exception as e:
         logging.error(f"Failed to send notification email: {e}")
     
@@ -4889,8 +4556,10 @@ async def upload_portfolio_file(
     
     # Save file
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload(file, file_path, max_size=MAX_FILE_SIZE,
+                          allowed_types=ALLOWED_IMAGE_TYPES + ALLOWED_VIDEO_TYPES)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'upload: {str(e)}")
     
@@ -4917,9 +4586,8 @@ async def upload_content_image(
     if content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Type de fichier non supporté. Utilisez JPG, PNG, WEBP ou GIF.")
     
-    # Create content folder if not exists
+    # Content folder
     content_folder = UPLOADS_DIR / "content"
-    content_folder.mkdir(exist_ok=True)
     
     # Generate unique filename
     file_ext = Path(file.filename).suffix.lower()
@@ -4928,8 +4596,9 @@ async def upload_content_image(
     
     # Save file
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload(file, file_path, max_size=MAX_IMAGE_SIZE, allowed_types=ALLOWED_IMAGE_TYPES)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'upload: {str(e)}")
     
@@ -4967,9 +4636,8 @@ async def upload_client_file(
     if not (is_allowed_by_ext or is_allowed_by_type):
         raise HTTPException(status_code=400, detail="Type de fichier non supporté. Utilisez JPG, PNG, WEBP, GIF, MP4, WEBM, MOV, ZIP, RAR ou PDF.")
     
-    # Create client folder if not exists
+    # Client folder
     client_folder = UPLOADS_DIR / "clients" / client_id
-    client_folder.mkdir(exist_ok=True)
     
     # Generate unique filename
     unique_filename = f"{uuid.uuid4()}{file_ext}"
@@ -4977,8 +4645,9 @@ async def upload_client_file(
     
     # Save file
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await save_upload(file, file_path, max_size=MAX_FILE_SIZE)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'upload: {str(e)}")
     
@@ -5007,7 +4676,7 @@ async def upload_client_file(
     
     # Send notification email
     try:
-        send_file_notification_email(
+        await run_io(send_file_notification_email,
             client_email=client_data["email"],
             client_name=client_data["name"],
             file_title=title,
@@ -5070,67 +4739,26 @@ async def update_bank_details(data: BankDetails, admin: dict = Depends(get_curre
 
 @api_router.post("/chat")
 async def chat_with_bot(data: ChatRequest):
-    try:
-        # Get chat history for this session
-        history = await db.chat_messages.find({"session_id": data.session_id}, {"_id": 0}).sort("created_at", 1).to_list(50)
-        
-        # Build messages for context
-        messages_for_llm = []
-        for msg in history[-10:]:  # Last 10 messages for context
-            messages_for_llm.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Initialize chat
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=data.session_id,
-            system_message="""Tu es l'assistant virtuel de CREATIVINDUSTRY France, un studio de production créative spécialisé dans :
-- La photographie et vidéographie de mariage
-- Les studios podcast
-- Les plateaux TV
-
-Tu dois répondre en français de manière professionnelle et chaleureuse. 
-Tu aides les visiteurs à :
-- Comprendre nos services et tarifs
-- Les orienter vers la bonne formule
-- Répondre aux questions sur le processus de réservation
-- Donner des informations sur le studio
-
-Services principaux :
-- Mariages : Formules de 1500€ à 4500€ (Essentielle, Complète, Premium)
-- Podcast : Location studio de 150€/h à 700€/jour
-- Plateau TV : De 800€ à 3500€ selon les besoins
-
-Si tu ne sais pas répondre à une question spécifique, invite le visiteur à nous contacter directement ou à demander un devis personnalisé."""
-        ).with_model("openai", "gpt-4o")
-        
-        # Save user message
-        user_msg = {
-            "id": str(uuid.uuid4()),
-            "session_id": data.session_id,
-            "role": "user",
-            "content": data.message,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.chat_messages.insert_one(user_msg)
-        
-        # Get response from AI
-        user_message = UserMessage(text=data.message)
-        response = await chat.send_message(user_message)
-        
-        # Save assistant message
-        assistant_msg = {
-            "id": str(uuid.uuid4()),
-            "session_id": data.session_id,
-            "role": "assistant",
-            "content": response,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.chat_messages.insert_one(assistant_msg)
-        
-        return {"response": response, "session_id": data.session_id}
-    except Exception as e:
-        logging.error(f"Chat error: {str(e)}")
-        return {"response": "Désolé, je rencontre un problème technique. Veuillez nous contacter directement au +33 1 23 45 67 89 ou par email à contact@creativindustry.fr", "session_id": data.session_id}
+    """Chatbot reply in one JSON response (see /chat/stream for the streamed version)"""
+    response = chatbot.FALLBACK_MESSAGE
+    async for event in chatbot.chatbot.reply(db, data.session_id, data.message):
+        if event.get("done"):
+            response = event["response"]
+    return {"response": response, "session_id": data.session_id}
+
+@api_router.post("/chat/stream")
+async def chat_with_bot_stream(data: ChatRequest):
+    """Chatbot reply streamed as Server-Sent Events: "message" events carry text deltas,
+    the final "done" event carries the full response"""
+    async def events():
+        async for event in chatbot.chatbot.reply(db, data.session_id, data.message):
+            yield chatbot.sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.get("/chat/{session_id}/history")
 async def get_chat_history(session_id: str):
@@ -5226,7 +4854,7 @@ async def create_booking(data: BookingCreate):
     
     # Send confirmation email to client with bank details
     try:
-        send_booking_confirmation_email(
+        await run_io(send_booking_confirmation_email,
             client_email=data.client_email,
             client_name=data.client_name,
             service_name=service["name"],
@@ -5241,7 +4869,7 @@ async def create_booking(data: BookingCreate):
     
     # Send notification to admin
     try:
-        send_admin_booking_notification(
+        await run_io(send_admin_booking_notification,
             booking_id=booking.id,
             client_name=data.client_name,
             client_email=data.client_email,
@@ -5367,11 +4995,12 @@ async def create_wedding_quote(data: WeddingQuoteCreate):
         'client_phone': data.client_phone,
         'event_date': data.event_date,
         'event_location': data.event_location,
-        'message': data.message
+        'message': data.message,
+        'date': datetime.now().strftime("%d/%m/%Y")
     }
     
     try:
-        pdf_data = generate_quote_pdf(quote_data, options_details)
+        pdf_data = await render_pdf("wedding_quote", cache=False, quote_data=quote_data, options_details=options_details)
         pdf_filename = f"Devis_Mariage_{data.client_name.replace(' ', '_')}_{quote.id[:8].upper()}.pdf"
     except Exception as e:
         logging.error(f"Error generating PDF: {e}")
@@ -5438,7 +5067,7 @@ async def create_wedding_quote(data: WeddingQuoteCreate):
     for admin_email in admin_emails:
         try:
             if pdf_data:
-                send_email_with_attachment(
+                await run_io(send_email_with_attachment,
                     admin_email, 
                     f"💒 Nouveau Devis Mariage - {data.client_name} ({total_price}€)", 
                     html_content,
@@ -5446,7 +5075,7 @@ async def create_wedding_quote(data: WeddingQuoteCreate):
                     pdf_filename
                 )
             else:
-                send_email(admin_email, f"💒 Nouveau Devis Mariage - {data.client_name} ({total_price}€)", html_content)
+                await run_io(send_email, admin_email, f"💒 Nouveau Devis Mariage - {data.client_name} ({total_price}€)", html_content)
         except Exception as e:
             logging.error(f"Error sending email to {admin_email}: {e}")
     
@@ -5504,7 +5133,7 @@ async def create_wedding_quote(data: WeddingQuoteCreate):
     
     try:
         if pdf_data:
-            send_email_with_attachment(
+            await run_io(send_email_with_attachment,
                 data.client_email,
                 f"💒 Votre Devis Mariage - CREATIVINDUSTRY ({total_price}€)",
                 client_html,
@@ -5512,7 +5141,7 @@ async def create_wedding_quote(data: WeddingQuoteCreate):
                 pdf_filename
             )
         else:
-            send_email(data.client_email, f"💒 Votre Devis Mariage - CREATIVINDUSTRY ({total_price}€)", client_html)
+            await run_io(send_email, data.client_email, f"💒 Votre Devis Mariage - CREATIVINDUSTRY ({total_price}€)", client_html)
         logging.info(f"Quote confirmation sent to client: {data.client_email}")
     except Exception as e:
         logging.error(f"Error sending quote to client {data.client_email}: {e}")
@@ -5595,133 +5224,53 @@ async def delete_portfolio_item(item_id: str, admin: dict = Depends(get_current_
     result = await db.portfolio.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Item not found")
-    # Also delete associated views
-    await db.story_views.delete_many({"story_id": item_id})
+    # Also delete associated views and counters
+    await story_views.delete_story(db, item_id)
     return {"message": "Item deleted"}
 
 # ==================== STORY VIEWS ROUTES ====================
 
 @api_router.post("/stories/{story_id}/view")
 async def record_story_view(story_id: str, request: Request, client_token: Optional[str] = None):
-    """Record a view for a story - works for both clients and anonymous visitors"""
-    import hashlib
-    
+    """Record a view for a story - works for both clients and anonymous visitors.
+    One view per viewer (client, or hashed IP) per day, counted with atomic counters."""
     # Check if story exists
-    story = await db.portfolio.find_one({"id": story_id, "media_type": "story"})
+    story = await db.portfolio.find_one({"id": story_id, "media_type": "story"}, {"_id": 1})
     if not story:
         raise HTTPException(status_code=404, detail="Story not found")
     
     # Get client info if token provided
-    viewer_type = "anonymous"
     viewer_id = None
     viewer_name = None
     
     if client_token:
         try:
-            payload = jwt.decode(client_token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            client = await db.clients.find_one({"id": payload.get("sub")}, {"_id": 0})
+            payload = jwt.decode(client_token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
+            payload = {}
+        if payload.get("type") == "client":
+            client = await db.clients.find_one({"id": payload.get("sub")}, {"_id": 0, "id": 1, "name": 1, "email": 1})
             if client:
-                viewer_type = "client"
                 viewer_id = client["id"]
                 viewer_name = client.get("name", client.get("email", "Client"))
-        except:
-            pass
     
-    # Create IP hash for anonymous deduplication
     client_ip = request.client.host if request.client else "unknown"
-    ip_hash = hashlib.sha256(f"{client_ip}{story_id}".encode()).hexdigest()[:16]
-    
-    # Check if this viewer already viewed this story (within last 24h)
-    twenty_four_hours_ago = (datetime.now(timezone.utc) - timedelta(hours=24)).isoformat()
-    
-    if viewer_type == "client":
-        existing = await db.story_views.find_one({
-            "story_id": story_id,
-            "viewer_id": viewer_id,
-            "viewed_at": {"$gte": twenty_four_hours_ago}
-        })
-    else:
-        existing = await db.story_views.find_one({
-            "story_id": story_id,
-            "ip_hash": ip_hash,
-            "viewed_at": {"$gte": twenty_four_hours_ago}
-        })
+    new_view = await story_views.record_view(db, story_id, viewer_id, viewer_name, client_ip)
     
-    if existing:
+    if not new_view:
         return {"message": "View already recorded", "new_view": False}
-    
-    # Record the view
-    view = StoryView(
-        story_id=story_id,
-        viewer_type=viewer_type,
-        viewer_id=viewer_id,
-        viewer_name=viewer_name,
-        ip_hash=ip_hash if viewer_type == "anonymous" else None
-    )
-    
-    view_doc = view.model_dump()
-    view_doc['viewed_at'] = view_doc['viewed_at'].isoformat()
-    await db.story_views.insert_one(view_doc)
-    
     return {"message": "View recorded", "new_view": True}
 
 @api_router.get("/stories/{story_id}/views")
 async def get_story_views(story_id: str, admin: dict = Depends(get_current_admin)):
     """Get view statistics for a story (admin only)"""
-    views = await db.story_views.find({"story_id": story_id}, {"_id": 0}).to_list(1000)
-    
-    total_views = len(views)
-    
-    # Get unique views (by viewer_id for clients, by ip_hash for anonymous)
-    unique_client_ids = set()
-    unique_ip_hashes = set()
-    client_views = []
-    
-    for view in views:
-        if view.get("viewer_type") == "client":
-            if view.get("viewer_id") not in unique_client_ids:
-                unique_client_ids.add(view.get("viewer_id"))
-                client_views.append({
-                    "name": view.get("viewer_name", "Client"),
-                    "viewed_at": view.get("viewed_at")
-                })
-        else:
-            if view.get("ip_hash"):
-                unique_ip_hashes.add(view.get("ip_hash"))
-    
-    return {
-        "total_views": total_views,
-        "unique_views": len(unique_client_ids) + len(unique_ip_hashes),
-        "client_views": client_views,
-        "anonymous_views": len(unique_ip_hashes)
-    }
+    return await story_views.get_story_stats(db, story_id)
 
 @api_router.get("/admin/stories/all-views")
 async def get_all_stories_views(admin: dict = Depends(get_current_admin)):
-    """Get view counts for all stories"""
-    stories = await db.portfolio.find({"media_type": "story"}, {"_id": 0, "id": 1, "title": 1}).to_list(100)
-    
-    result = {}
-    for story in stories:
-        views = await db.story_views.find({"story_id": story["id"]}, {"_id": 0}).to_list(1000)
-        
-        unique_client_ids = set()
-        unique_ip_hashes = set()
-        
-        for view in views:
-            if view.get("viewer_type") == "client":
-                unique_client_ids.add(view.get("viewer_id"))
-            else:
-                if view.get("ip_hash"):
-                    unique_ip_hashes.add(view.get("ip_hash"))
-        
-        result[story["id"]] = {
-            "total": len(views),
-            "clients": len(unique_client_ids),
-            "anonymous": len(unique_ip_hashes)
-        }
-    
-    return result
+    """Get view counts for all stories (precomputed counters)"""
+    stories = await db.portfolio.find({"media_type": "story"}, {"_id": 0, "id": 1}).to_list(100)
+    return await story_views.get_all_stats(db, [story["id"] for story in stories])
 
 # ==================== BACKUP ROUTE ====================
 
@@ -5774,22 +5323,23 @@ async def create_backup(options: BackupOptions = None, admin: dict = Depends(get
         zip_path = UPLOADS_DIR / zip_filename
         
         # Use ZIP_STORED (no compression) for speed - files are already compressed (jpg, mp4, etc)
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
-            # Add database exports (small files, compress these)
-            for json_file in db_backup_dir.glob("*.json"):
-                zipf.write(json_file, f"database/{json_file.name}")
+        def write_backup_zip():
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+                # Add database exports (small files, compress these)
+                for json_file in db_backup_dir.glob("*.json"):
+                    zipf.write(json_file, f"database/{json_file.name}")
             
-            # Add uploaded files without compression (already compressed media)
-            for upload_subdir in ["portfolio", "galleries", "clients"]:
-                upload_path = UPLOADS_DIR / upload_subdir
-                if upload_path.exists():
-                    for file in upload_path.rglob("*"):
-                        if file.is_file():
-                            arcname = f"uploads/{upload_subdir}/{file.relative_to(upload_path)}"
-                            zipf.write(file, arcname)
+                # Add uploaded files without compression (already compressed media)
+                for upload_subdir in ["portfolio", "galleries", "clients"]:
+                    upload_path = UPLOADS_DIR / upload_subdir
+                    if upload_path.exists():
+                        for file in upload_path.rglob("*"):
+                            if file.is_file():
+                                arcname = f"uploads/{upload_subdir}/{file.relative_to(upload_path)}"
+                                zipf.write(file, arcname)
             
-            # Add a readme file
-            readme_content = f"""
+                # Add a readme file
+                readme_content = f"""
 CREATIVINDUSTRY France - Sauvegarde du {datetime.now().strftime("%d/%m/%Y à %H:%M")}
 
 CONTENU DE LA SAUVEGARDE :
@@ -5822,9 +5372,9 @@ RESTAURATION :
 Pour toute question : infos@creativindustry.com
 """
             
-            # Add code source if requested (for full migration)
-            if include_code:
-                readme_content += """
+                # Add code source if requested (for full migration)
+                if include_code:
+                    readme_content += """
 
 CODE SOURCE INCLUS :
 ====================
@@ -5862,54 +5412,54 @@ INSTALLATION SUR NOUVEAU SERVEUR :
    sudo systemctl restart creativindustry
 """
                 
-                # Get the base path dynamically (works for both /app and /var/www/creativindustry)
-                backend_base = Path(__file__).parent
-                base_path = backend_base.parent
+                    # Get the base path dynamically (works for both /app and /var/www/creativindustry)
+                    backend_base = Path(__file__).parent
+                    base_path = backend_base.parent
                 
-                # Add backend code (excluding venv, __pycache__, uploads)
-                if backend_base.exists():
-                    for file in backend_base.rglob("*"):
-                        if file.is_file():
-                            try:
-                                rel_path = file.relative_to(backend_base)
-                                # Skip venv, __pycache__, uploads, .env (sensitive)
-                                skip_dirs = ["venv", "__pycache__", "uploads", ".git", "backup"]
-                                if not any(part in str(rel_path) for part in skip_dirs):
-                                    if file.name != ".env":  # Don't include .env (contains secrets)
-                                        zipf.write(file, f"backend/{rel_path}")
-                            except Exception as e:
-                                logging.warning(f"Skipping file {file}: {e}")
+                    # Add backend code (excluding venv, __pycache__, uploads)
+                    if backend_base.exists():
+                        for file in backend_base.rglob("*"):
+                            if file.is_file():
+                                try:
+                                    rel_path = file.relative_to(backend_base)
+                                    # Skip venv, __pycache__, uploads, .env (sensitive)
+                                    skip_dirs = ["venv", "__pycache__", "uploads", ".git", "backup"]
+                                    if not any(part in str(rel_path) for part in skip_dirs):
+                                        if file.name != ".env":  # Don't include .env (contains secrets)
+                                            zipf.write(file, f"backend/{rel_path}")
+                                except Exception as e:
+                                    logging.warning(f"Skipping file {file}: {e}")
                 
-                # Add frontend build (not source, just the build)
-                frontend_build = base_path / "frontend" / "build"
-                if frontend_build.exists():
-                    for file in frontend_build.rglob("*"):
-                        if file.is_file():
-                            try:
-                                rel_path = file.relative_to(frontend_build)
-                                zipf.write(file, f"frontend/build/{rel_path}")
-                            except Exception as e:
-                                logging.warning(f"Skipping file {file}: {e}")
+                    # Add frontend build (not source, just the build)
+                    frontend_build = base_path / "frontend" / "build"
+                    if frontend_build.exists():
+                        for file in frontend_build.rglob("*"):
+                            if file.is_file():
+                                try:
+                                    rel_path = file.relative_to(frontend_build)
+                                    zipf.write(file, f"frontend/build/{rel_path}")
+                                except Exception as e:
+                                    logging.warning(f"Skipping file {file}: {e}")
                 
-                # Add important config files
-                for config_name in ["package.json", "tailwind.config.js"]:
-                    config_path = base_path / "frontend" / config_name
-                    if config_path.exists():
-                        try:
-                            zipf.write(config_path, config_name)
-                        except:
-                            pass
+                    # Add important config files
+                    for config_name in ["package.json", "tailwind.config.js"]:
+                        config_path = base_path / "frontend" / config_name
+                        if config_path.exists():
+                            try:
+                                zipf.write(config_path, config_name)
+                            except:
+                                pass
                 
-                for doc_name in ["GUIDE_IONOS.md", "README.md"]:
-                    doc_path = base_path / doc_name
-                    if doc_path.exists():
-                        try:
-                            zipf.write(doc_path, doc_name)
-                        except:
-                            pass
+                    for doc_name in ["GUIDE_IONOS.md", "README.md"]:
+                        doc_path = base_path / doc_name
+                        if doc_path.exists():
+                            try:
+                                zipf.write(doc_path, doc_name)
+                            except:
+                                pass
                 
-                # Create .env.example template
-                env_example = """# CREATIVINDUSTRY - Configuration
+                    # Create .env.example template
+                    env_example = """# CREATIVINDUSTRY - Configuration
 # Copier ce fichier vers .env et remplir les valeurs
 
 # MongoDB
@@ -5933,12 +5483,13 @@ PAYPAL_MODE=sandbox
 # URL du site
 SITE_URL=https://votredomaine.com
 """
-                zipf.writestr("backend/.env.example", env_example)
+                    zipf.writestr("backend/.env.example", env_example)
             
-            zipf.writestr("README.txt", readme_content)
+                zipf.writestr("README.txt", readme_content)
+        await run_io(write_backup_zip)
         
         # Clean up temp directory
-        shutil.rmtree(backup_dir)
+        await run_io(shutil.rmtree, backup_dir)
         
         # Get file size
         file_size = zip_path.stat().st_size
@@ -5960,7 +5511,7 @@ SITE_URL=https://votredomaine.com
     except Exception as e:
         # Clean up on error
         if backup_dir.exists():
-            shutil.rmtree(backup_dir)
+            await run_io(shutil.rmtree, backup_dir)
         logging.error(f"Backup error: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la sauvegarde: {str(e)}")
 
@@ -6015,8 +5566,8 @@ async def download_backup(filename: str, admin: dict = Depends(get_current_admin
     if not zip_path.exists():
         raise HTTPException(status_code=404, detail="Fichier de sauvegarde non trouvé. Créez d'abord une nouvelle sauvegarde.")
     
-    return FileResponse(
-        path=zip_path,
+    return deliver_file(
+        zip_path,
         filename=filename,
         media_type="application/zip"
     )
@@ -6061,21 +5612,23 @@ async def create_backup_legacy(admin: dict = Depends(get_current_admin)):
         zip_path = UPLOADS_DIR / zip_filename
         
         # Use ZIP_STORED for speed
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
-            for json_file in db_backup_dir.glob("*.json"):
-                zipf.write(json_file, f"database/{json_file.name}")
+        def write_backup_zip():
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+                for json_file in db_backup_dir.glob("*.json"):
+                    zipf.write(json_file, f"database/{json_file.name}")
             
-            for upload_subdir in ["portfolio", "galleries", "clients"]:
-                upload_path = UPLOADS_DIR / upload_subdir
-                if upload_path.exists():
-                    for file in upload_path.rglob("*"):
-                        if file.is_file():
-                            arcname = f"uploads/{upload_subdir}/{file.relative_to(upload_path)}"
-                            zipf.write(file, arcname)
+                for upload_subdir in ["portfolio", "galleries", "clients"]:
+                    upload_path = UPLOADS_DIR / upload_subdir
+                    if upload_path.exists():
+                        for file in upload_path.rglob("*"):
+                            if file.is_file():
+                                arcname = f"uploads/{upload_subdir}/{file.relative_to(upload_path)}"
+                                zipf.write(file, arcname)
             
-            zipf.writestr("README.txt", f"CREATIVINDUSTRY Backup - {datetime.now().strftime('%d/%m/%Y')}")
+                zipf.writestr("README.txt", f"CREATIVINDUSTRY Backup - {datetime.now().strftime('%d/%m/%Y')}")
+        await run_io(write_backup_zip)
         
-        shutil.rmtree(backup_dir)
+        await run_io(shutil.rmtree, backup_dir)
         
         return FileResponse(
             path=zip_path,
@@ -6085,7 +5638,7 @@ async def create_backup_legacy(admin: dict = Depends(get_current_admin)):
         
     except Exception as e:
         if backup_dir.exists():
-            shutil.rmtree(backup_dir)
+            await run_io(shutil.rmtree, backup_dir)
         logging.error(f"Backup error: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la sauvegarde: {str(e)}")
 
@@ -6093,21 +5646,8 @@ async def create_backup_legacy(admin: dict = Depends(get_current_admin)):
 
 @api_router.get("/stats")
 async def get_stats(admin: dict = Depends(get_current_admin)):
-    total_bookings = await db.bookings.count_documents({})
-    pending_bookings = await db.bookings.count_documents({"status": "pending"})
-    confirmed_bookings = await db.bookings.count_documents({"status": "confirmed"})
-    unread_messages = await db.contacts.count_documents({"is_read": False})
-    total_services = await db.services.count_documents({"is_active": True})
-    pending_quotes = await db.wedding_quotes.count_documents({"status": "pending"})
-    
-    return {
-        "total_bookings": total_bookings,
-        "pending_bookings": pending_bookings,
-        "confirmed_bookings": confirmed_bookings,
-        "unread_messages": unread_messages,
-        "total_services": total_services,
-        "pending_quotes": pending_quotes
-    }
+    """Admin home counters: one $facet aggregation per collection, cached until the next write"""
+    return await dashboard_stats.admin_stats()
 
 @api_router.get("/admin/storage-stats")
 async def get_storage_stats(admin: dict = Depends(get_current_admin)):
@@ -6174,6 +5714,55 @@ async def get_storage_stats(admin: dict = Depends(get_current_admin)):
         "chart_data": chart_data
     }
 
+
+@api_router.get("/admin/db/pool-stats")
+async def get_db_pool_stats(admin: dict = Depends(get_current_admin)):
+    """MongoDB connection pool utilization for this worker process"""
+    return database.pool_stats()
+
+
+@api_router.get("/admin/metrics", response_class=PlainTextResponse)
+async def get_metrics(admin: dict = Depends(get_current_admin)):
+    """Per-route latency, in-flight requests and Mongo commands (Prometheus text format)"""
+    pool = database.pool_monitor.snapshot()
+    gauges = {
+        "mongo_pool_open_connections": ("Open MongoDB connections", pool["open_connections"]),
+        "mongo_pool_in_use": ("MongoDB connections checked out", pool["in_use"]),
+        "mongo_pool_checkout_failures": ("Failed MongoDB connection checkouts", pool["checkout_failures"]),
+    }
+    gauges.update(loop_monitor.loop_monitor.prometheus_gauges())
+    for name, stats in executor_stats().items():
+        gauges[f"executor_{name}_pending"] = (f"Tasks submitted to the {name} executor and not finished", stats["pending"])
+    return PlainTextResponse(metrics.registry.render_prometheus(gauges), media_type="text/plain; version=0.0.4")
+
+
+@api_router.get("/admin/metrics/blocking")
+async def get_blocking_report(limit: int = 20, admin: dict = Depends(get_current_admin)):
+    """Event loop lag and the worst blocking call sites by route"""
+    return {
+        "loop": loop_monitor.loop_monitor.snapshot(),
+        "executors": executor_stats(),
+        "worst_offenders": loop_monitor.loop_monitor.worst_offenders(limit)
+    }
+
+
+@api_router.get("/admin/scheduler/runs")
+async def get_scheduler_runs(job_id: Optional[str] = None, limit: int = 50, admin: dict = Depends(get_current_admin)):
+    """Scheduled job history (durations, status) and the worker currently holding the scheduler lease"""
+    lease = await db.scheduler_leases.find_one({"_id": "scheduler"})
+    return {
+        "leader": lease.get("owner") if lease else None,
+        "leader_expires_at": lease.get("expires_at") if lease else None,
+        "this_worker": scheduler_service.WORKER_ID,
+        "runs": await scheduler_service.recent_runs(job_id, min(limit, 500))
+    }
+
+
+@api_router.get("/admin/media/store-stats")
+async def get_media_store_stats(admin: dict = Depends(get_current_admin)):
+    """Content-addressed media store: blobs, physical vs logical size, space saved by dedup"""
+    return await run_io(media_store.store_stats)
+
 def format_file_size(size_bytes):
     """Format bytes to human readable string"""
     if size_bytes == 0:
@@ -6187,9 +5776,6 @@ def format_file_size(size_bytes):
 
 # ==================== PHOTOFIND - RECONNAISSANCE FACIALE ====================
 
-import boto3
-from botocore.exceptions import ClientError
-
 # AWS Rekognition configuration
 AWS_ACCESS_KEY = os.environ.get('AWS_ACCESS_KEY_ID', '')
 AWS_SECRET_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY', '')
@@ -6201,6 +5787,7 @@ PHOTOFIND_DIR.mkdir(exist_ok=True)
 
 def get_rekognition_client():
     """Get AWS Rekognition client"""
+    import boto3
     return boto3.client(
         'rekognition',
         region_name=AWS_REGION,
@@ -6534,7 +6121,7 @@ async def create_client_from_devis(data: IntegrationCreateClient):
         """
         
         try:
-            send_email(data.email, "🎉 Votre espace client CREATIVINDUSTRY est prêt !", html_content)
+            await run_io(send_email, data.email, "🎉 Votre espace client CREATIVINDUSTRY est prêt !", html_content)
         except Exception as e:
             logging.error(f"Failed to send welcome email to {data.email}: {e}")
         
@@ -6604,9 +6191,8 @@ async def sync_invoice_from_devis_site(data: IntegrationSyncInvoice):
         try:
             pdf_bytes = base64.b64decode(data.pdf_data)
             pdf_filename = f"facture_{data.invoice_number.replace('/', '_')}_{client['id']}.pdf"
-            pdf_path = UPLOADS_DIR / "client_transfers" / "documents" / pdf_filename
-            with open(pdf_path, 'wb') as f:
-                f.write(pdf_bytes)
+            # Re-synced invoices keep their name: never write through a deduplicated file
+            await run_io(media_store.write_file, UPLOADS_DIR / "client_transfers" / "documents" / pdf_filename, pdf_bytes)
             pdf_path = f"/uploads/client_transfers/documents/{pdf_filename}"
         except Exception as e:
             logging.error(f"Failed to save invoice PDF: {e}")
@@ -6651,7 +6237,7 @@ async def sync_invoice_from_devis_site(data: IntegrationSyncInvoice):
     """
     
     try:
-        send_email(data.client_email, f"🧾 Facture N°{data.invoice_number} - CREATIVINDUSTRY", html_content)
+        await run_io(send_email, data.client_email, f"🧾 Facture N°{data.invoice_number} - CREATIVINDUSTRY", html_content)
     except Exception as e:
         logging.error(f"Failed to send invoice notification: {e}")
     
@@ -6726,15 +6312,8 @@ async def upload_client_transfer(
     safe_filename = f"{file_id}{file_ext}"
     file_path = client_folder / safe_filename
     
-    total_size = 0
-    with open(file_path, "wb") as f:
-        while chunk := await file.read(1024 * 1024):  # Read 1MB at a time
-            total_size += len(chunk)
-            if total_size > MAX_SIZE:
-                f.close()
-                file_path.unlink()  # Delete partial file
-                raise HTTPException(status_code=400, detail="Fichier trop volumineux. Maximum 5GB.")
-            f.write(chunk)
+    stored = await save_upload(file, file_path, max_size=MAX_SIZE)
+    total_size = stored.size
     
     # Store in database
     file_record = {
@@ -6841,15 +6420,8 @@ async def admin_upload_file_to_client(
     safe_filename = f"{file_id}{file_ext}"
     file_path = client_folder / safe_filename
     
-    total_size = 0
-    with open(file_path, "wb") as f:
-        while chunk := await file.read(1024 * 1024):  # Read 1MB at a time
-            total_size += len(chunk)
-            if total_size > MAX_SIZE:
-                f.close()
-                file_path.unlink()  # Delete partial file
-                raise HTTPException(status_code=400, detail="Fichier trop volumineux. Maximum 10GB.")
-            f.write(chunk)
+    stored = await save_upload(file, file_path, max_size=MAX_SIZE)
+    total_size = stored.size
     
     # Store in database
     file_record = {
@@ -6890,7 +6462,7 @@ async def admin_upload_file_to_client(
     """
     
     try:
-        send_email(client.get("email"), f"📁 Nouveau fichier - {file.filename}", html_content)
+        await run_io(send_email, client.get("email"), f"📁 Nouveau fichier - {file.filename}", html_content)
     except Exception as e:
         logging.error(f"Failed to send file notification: {e}")
     
@@ -6945,6 +6517,13 @@ async def admin_delete_client_transfer(file_id: str, admin: dict = Depends(get_c
     return {"success": True, "message": "Fichier supprimé"}
 
 
+async def ensure_client_lookup_indexes():
+    """Collated indexes for the case-insensitive email / name lookups below"""
+    await db.appointments.create_index("client_email", collation=search_index.CASE_INSENSITIVE)
+    await database.devis_db.invoices.create_index("client_email", collation=search_index.CASE_INSENSITIVE)
+    await database.devis_db.invoices.create_index("client_name", collation=search_index.CASE_INSENSITIVE)
+
+
 # ==================== CLIENT APPOINTMENTS ENDPOINTS ====================
 
 @api_router.get("/client/appointments")
@@ -6953,8 +6532,9 @@ async def get_client_appointments(client: dict = Depends(get_current_client)):
     client_email = client.get("email", "").lower()
     
     appointments = await db.appointments.find(
-        {"client_email": {"$regex": f"^{client_email}$", "$options": "i"}},
-        {"_id": 0}
+        {"client_email": client_email},
+        {"_id": 0},
+        collation=search_index.CASE_INSENSITIVE
     ).sort("created_at", -1).to_list(50)
     
     # Convert datetime strings if needed
@@ -6979,8 +6559,9 @@ async def respond_to_reschedule(appointment_id: str, data: dict, client: dict =
     client_email = client.get("email", "").lower()
     
     appointment = await db.appointments.find_one(
-        {"id": appointment_id, "client_email": {"$regex": f"^{client_email}$", "$options": "i"}},
-        {"_id": 0}
+        {"id": appointment_id, "client_email": client_email},
+        {"_id": 0},
+        collation=search_index.CASE_INSENSITIVE
     )
     
     if not appointment:
@@ -7046,33 +6627,25 @@ async def get_client_payments(client: dict = Depends(get_current_client)):
     
     total_devis = sum(d.get("total_amount", 0) for d in devis)
     
-    # Also get invoices from creativindustry_devis database
-    # Create a separate connection to access the devis database
-    mongo_base_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-    # Remove database name from URL if present to connect to base MongoDB
-    if '/' in mongo_base_url.split('://')[-1]:
-        base_parts = mongo_base_url.rsplit('/', 1)
-        if '?' in base_parts[-1]:
-            # URL has database name and query params
-            mongo_base_url = base_parts[0] + '/?' + base_parts[-1].split('?')[1]
-        else:
-            mongo_base_url = base_parts[0]
-    
-    devis_client = AsyncIOMotorClient(mongo_base_url)
-    devis_db = devis_client["creativindustry_devis"]
+    # Also get invoices from creativindustry_devis database (same pool)
+    devis_db = database.devis_db
     
     # Find invoices by client email or name (using correct field names)
     client_email = client.get("email", "").lower()
     client_name = client.get("name", "")
     
-    # Search in invoices collection with correct field names
-    invoices_cursor = devis_db.invoices.find({
-        "$or": [
-            {"client_email": {"$regex": client_email, "$options": "i"}},
-            {"client_name": {"$regex": f"^{client_name}$", "$options": "i"}}
-        ]
-    })
-    invoices = await invoices_cursor.to_list(50)
+    # Case-insensitive equality served by collated indexes (no regex on user data)
+    invoice_match = [{"client_email": client_email}] if client_email else []
+    if client_name:
+        invoice_match.append({"client_name": client_name})
+    invoices = []
+    if invoice_match:
+        invoices_cursor = devis_db.invoices.find(
+            {"$or": invoice_match},
+            {"_id": 0, "total_ttc": 1, "total": 1, "acompte": 1, "reste_a_payer": 1, "resteAPayer": 1},
+            collation=search_index.CASE_INSENSITIVE
+        )
+        invoices = await invoices_cursor.to_list(50)
     
     # Use correct field names: total_ttc, acompte, reste_a_payer
     total_invoices = sum(inv.get("total_ttc", inv.get("total", 0)) for inv in invoices)
@@ -7278,7 +6851,7 @@ async def send_manual_newsletter(data: ManualNewsletterRequest, admin: dict = De
             </html>
             """
             
-            send_email(subscriber["email"], data.subject, html_content)
+            await run_io(send_email, subscriber["email"], data.subject, html_content)
             sent_count += 1
             
         except Exception as e:
@@ -7317,7 +6890,7 @@ async def get_deployment_status(admin: dict = Depends(get_current_admin)):
     """Get current deployment status including git info"""
     try:
         # Get current commit
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'log', '--oneline', '-1'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7327,7 +6900,7 @@ async def get_deployment_status(admin: dict = Depends(get_current_admin)):
         current_commit = result.stdout.strip() if result.returncode == 0 else "Inconnu"
         
         # Get last 10 commits for rollback options
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'log', '--oneline', '-10'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7345,7 +6918,7 @@ async def get_deployment_status(admin: dict = Depends(get_current_admin)):
                     })
         
         # Get current branch
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'branch', '--show-current'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7355,8 +6928,8 @@ async def get_deployment_status(admin: dict = Depends(get_current_admin)):
         branch = result.stdout.strip() if result.returncode == 0 else "main"
         
         # Check if there are updates available
-        subprocess.run(['git', 'fetch', 'origin'], cwd=PROJECT_PATH, capture_output=True, timeout=30)
-        result = subprocess.run(
+        await run_io(subprocess.run, ['git', 'fetch', 'origin'], cwd=PROJECT_PATH, capture_output=True, timeout=30)
+        result = await run_io(subprocess.run,
             ['git', 'rev-list', '--count', f'{branch}..origin/{branch}'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7388,7 +6961,7 @@ async def trigger_deployment_update(admin: dict = Depends(get_current_admin)):
         
         # Step 1: Git fetch and reset
         logs.append("📥 Récupération du code...")
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'fetch', 'origin'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7396,7 +6969,7 @@ async def trigger_deployment_update(admin: dict = Depends(get_current_admin)):
             timeout=60
         )
         
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'reset', '--hard', 'origin/main'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7410,7 +6983,7 @@ async def trigger_deployment_update(admin: dict = Depends(get_current_admin)):
         # Step 2: Build frontend
         logs.append("🔨 Compilation du frontend...")
         frontend_path = os.path.join(PROJECT_PATH, 'frontend')
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['npm', 'run', 'build'],
             cwd=frontend_path,
             capture_output=True,
@@ -7423,7 +6996,7 @@ async def trigger_deployment_update(admin: dict = Depends(get_current_admin)):
         
         # Step 3: Restart service
         logs.append("🔄 Redémarrage du service...")
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['sudo', 'systemctl', 'restart', 'creativindustry'],
             capture_output=True,
             text=True,
@@ -7435,7 +7008,7 @@ async def trigger_deployment_update(admin: dict = Depends(get_current_admin)):
             logs.append("✅ Service redémarré")
         
         # Get new commit info
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'log', '--oneline', '-1'],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7490,7 +7063,7 @@ async def trigger_deployment_rollback(data: RollbackRequest, admin: dict = Depen
         
         # Step 1: Git checkout to specific commit
         logs.append(f"⏪ Retour à la version {data.commit_hash}...")
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['git', 'checkout', data.commit_hash],
             cwd=PROJECT_PATH,
             capture_output=True,
@@ -7504,7 +7077,7 @@ async def trigger_deployment_rollback(data: RollbackRequest, admin: dict = Depen
         # Step 2: Build frontend
         logs.append("🔨 Compilation du frontend...")
         frontend_path = os.path.join(PROJECT_PATH, 'frontend')
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['npm', 'run', 'build'],
             cwd=frontend_path,
             capture_output=True,
@@ -7517,7 +7090,7 @@ async def trigger_deployment_rollback(data: RollbackRequest, admin: dict = Depen
         
         # Step 3: Restart service
         logs.append("🔄 Redémarrage du service...")
-        result = subprocess.run(
+        result = await run_io(subprocess.run,
             ['sudo', 'systemctl', 'restart', 'creativindustry'],
             capture_output=True,
             text=True,
@@ -7580,100 +7153,13 @@ async def download_devis_pdf(devis_id: str, client: dict = Depends(get_current_c
     if not devis:
         raise HTTPException(status_code=404, detail="Devis non trouvé")
     
-    # Company info
-    company_info = {
-        "name": "CREATIVINDUSTRY FRANCE",
-        "legal": "SASU au capital de 101 €",
-        "rcs": "RCS Paris 100 871 425",
-        "siret": "SIRET : 100 871 425",
-        "tva": "TVA intracommunautaire : FR7501100871425",
-        "address": "60 rue François 1er, 75008 Paris",
-        "email": "contact@creativindustry.com",
-        "phone": ""
-    }
-    
-    # Generate PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=1.5*cm, bottomMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=22, textColor=colors.HexColor('#d4af37'), alignment=TA_CENTER, spaceAfter=5)
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=16, textColor=colors.HexColor('#d4af37'), alignment=TA_CENTER, spaceAfter=15)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#d4af37'), spaceBefore=20, spaceAfter=10)
-    normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=11, spaceAfter=5)
-    small_style = ParagraphStyle('Small', parent=styles['Normal'], fontSize=8, textColor=colors.HexColor('#666666'), spaceAfter=2)
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.HexColor('#888888'), alignment=TA_CENTER, spaceBefore=20)
-    
-    elements = []
-    
-    # Header with company info
-    elements.append(Paragraph(company_info["name"], title_style))
-    elements.append(Paragraph("DEVIS", subtitle_style))
-    elements.append(Spacer(1, 10))
-    
-    # Company details (left side info)
-    elements.append(Paragraph(company_info["legal"], small_style))
-    elements.append(Paragraph(company_info["rcs"], small_style))
-    elements.append(Paragraph(company_info["siret"], small_style))
-    elements.append(Paragraph(company_info["tva"], small_style))
-    elements.append(Paragraph(f"Siège social : {company_info['address']}", small_style))
-    elements.append(Paragraph(f"Email : {company_info['email']}", small_style))
-    elements.append(Spacer(1, 20))
-    
-    # Devis info
-    elements.append(Paragraph("─" * 60, normal_style))
-    elements.append(Paragraph(f"<b>Référence Devis :</b> DEV-{devis.get('devis_id', '')[:8].upper()}", normal_style))
-    elements.append(Paragraph(f"<b>Date d'émission :</b> {devis.get('synced_at', '')[:10] if devis.get('synced_at') else 'N/A'}", normal_style))
-    elements.append(Paragraph(f"<b>Client :</b> {client.get('name', 'N/A')}", normal_style))
-    elements.append(Paragraph("─" * 60, normal_style))
-    elements.append(Spacer(1, 15))
-    
-    # Event info
-    if devis.get('event_type'):
-        elements.append(Paragraph(f"<b>Type d'événement :</b> {devis.get('event_type')}", normal_style))
-    if devis.get('event_date'):
-        elements.append(Paragraph(f"<b>Date de l'événement :</b> {devis.get('event_date')}", normal_style))
-    
-    # Devis details if available
-    devis_data = devis.get('devis_data', {})
-    if devis_data and isinstance(devis_data, dict):
-        elements.append(Spacer(1, 15))
-        elements.append(Paragraph("Détails de la prestation", heading_style))
-        for key, value in devis_data.items():
-            if key not in ['_id', 'id']:
-                elements.append(Paragraph(f"• {key} : {value}", normal_style))
-    
-    elements.append(Spacer(1, 25))
-    
-    # Calculate TVA 20%
-    total_ttc = float(devis.get('total_amount', 0))
-    total_ht = round(total_ttc / 1.20, 2)
-    tva_amount = round(total_ttc - total_ht, 2)
-    
-    # Totals with TVA breakdown
-    elements.append(Paragraph("─" * 60, normal_style))
-    elements.append(Paragraph(f"<b>Total HT :</b> {total_ht:.2f} €", normal_style))
-    elements.append(Paragraph(f"<b>TVA (20%) :</b> {tva_amount:.2f} €", normal_style))
-    elements.append(Spacer(1, 10))
-    elements.append(Paragraph(f"<b>TOTAL TTC :</b> {total_ttc:.2f} €", ParagraphStyle('Total', parent=styles['Heading1'], fontSize=18, textColor=colors.HexColor('#d4af37'))))
-    elements.append(Paragraph("─" * 60, normal_style))
-    
-    # Legal footer
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("Conditions de paiement : 30% à la commande, solde à la livraison", footer_style))
-    elements.append(Paragraph("Validité du devis : 30 jours", footer_style))
-    elements.append(Spacer(1, 15))
-    elements.append(Paragraph(f"{company_info['name']} - {company_info['legal']}", footer_style))
-    elements.append(Paragraph(f"{company_info['siret']} - {company_info['tva']}", footer_style))
-    elements.append(Paragraph(f"{company_info['address']}", footer_style))
-    
-    doc.build(elements)
-    buffer.seek(0)
+    pdf_path = await render_pdf_file("client_devis", client_id=client["id"], devis=devis,
+                                     client_name=client.get('name', 'N/A'))
     
-    return StreamingResponse(
-        buffer,
+    return FileResponse(
+        str(pdf_path),
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=Devis_{devis_id[:8].upper()}.pdf"}
+        filename=f"Devis_{devis_id[:8].upper()}.pdf"
     )
 
 
@@ -7685,100 +7171,20 @@ async def download_invoice_pdf(invoice_id: str, client: dict = Depends(get_curre
     if not invoice:
         raise HTTPException(status_code=404, detail="Facture non trouvée")
     
+    filename = f"Facture_{invoice.get('invoice_number', invoice_id[:8])}.pdf"
+    
     # Check if we have a stored PDF file
     pdf_path = invoice.get('pdf_path')
     if pdf_path:
         full_path = UPLOADS_DIR / pdf_path.lstrip('/uploads/')
         if full_path.exists():
-            return FileResponse(
-                str(full_path),
-                media_type="application/pdf",
-                filename=f"Facture_{invoice.get('invoice_number', invoice_id[:8])}.pdf"
-            )
-    
-    # Company info
-    company_info = {
-        "name": "CREATIVINDUSTRY FRANCE",
-        "legal": "SASU au capital de 101 €",
-        "rcs": "RCS Paris 100 871 425",
-        "siret": "SIRET : 100 871 425",
-        "tva": "TVA intracommunautaire : FR7501100871425",
-        "address": "60 rue François 1er, 75008 Paris",
-        "email": "contact@creativindustry.com",
-        "phone": ""
-    }
+            return deliver_file(full_path, media_type="application/pdf", filename=filename)
     
     # Generate PDF if no stored file
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=1.5*cm, bottomMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=22, textColor=colors.HexColor('#d4af37'), alignment=TA_CENTER, spaceAfter=5)
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Normal'], fontSize=16, textColor=colors.HexColor('#d4af37'), alignment=TA_CENTER, spaceAfter=15)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#d4af37'), spaceBefore=20, spaceAfter=10)
-    normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=11, spaceAfter=5)
-    small_style = ParagraphStyle('Small', parent=styles['Normal'], fontSize=8, textColor=colors.HexColor('#666666'), spaceAfter=2)
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, textColor=colors.HexColor('#888888'), alignment=TA_CENTER, spaceBefore=20)
-    
-    elements = []
-    
-    # Header with company info
-    elements.append(Paragraph(company_info["name"], title_style))
-    elements.append(Paragraph("FACTURE", subtitle_style))
-    elements.append(Spacer(1, 10))
-    
-    # Company details
-    elements.append(Paragraph(company_info["legal"], small_style))
-    elements.append(Paragraph(company_info["rcs"], small_style))
-    elements.append(Paragraph(company_info["siret"], small_style))
-    elements.append(Paragraph(company_info["tva"], small_style))
-    elements.append(Paragraph(f"Siège social : {company_info['address']}", small_style))
-    elements.append(Paragraph(f"Email : {company_info['email']}", small_style))
-    elements.append(Spacer(1, 20))
-    
-    # Invoice info
-    elements.append(Paragraph("─" * 60, normal_style))
-    elements.append(Paragraph(f"<b>Numéro de facture :</b> {invoice.get('invoice_number', 'N/A')}", normal_style))
-    elements.append(Paragraph(f"<b>Date d'émission :</b> {invoice.get('invoice_date', 'N/A')}", normal_style))
-    elements.append(Paragraph(f"<b>Client :</b> {client.get('name', 'N/A')}", normal_style))
-    elements.append(Paragraph("─" * 60, normal_style))
-    elements.append(Spacer(1, 20))
-    
-    # Amount with TVA breakdown
-    total_ttc = float(invoice.get('amount', 0))
-    total_ht = round(total_ttc / 1.20, 2)
-    tva_amount = round(total_ttc - total_ht, 2)
-    
-    elements.append(Paragraph("Désignation", heading_style))
-    elements.append(Paragraph("Prestation de services audiovisuels", normal_style))
-    elements.append(Spacer(1, 20))
-    
-    # Totals with TVA
-    elements.append(Paragraph("─" * 60, normal_style))
-    elements.append(Paragraph(f"<b>Total HT :</b> {total_ht:.2f} €", normal_style))
-    elements.append(Paragraph(f"<b>TVA (20%) :</b> {tva_amount:.2f} €", normal_style))
-    elements.append(Spacer(1, 10))
-    elements.append(Paragraph(f"<b>TOTAL TTC :</b> {total_ttc:.2f} €", ParagraphStyle('Total', parent=styles['Heading1'], fontSize=18, textColor=colors.HexColor('#d4af37'))))
-    elements.append(Paragraph("─" * 60, normal_style))
-    
-    # Legal footer
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("Conditions de règlement : paiement à réception de facture", footer_style))
-    elements.append(Paragraph("En cas de retard de paiement, une pénalité de 3 fois le taux d'intérêt légal sera appliquée.", footer_style))
-    elements.append(Paragraph("Indemnité forfaitaire pour frais de recouvrement : 40 €", footer_style))
-    elements.append(Spacer(1, 15))
-    elements.append(Paragraph(f"{company_info['name']} - {company_info['legal']}", footer_style))
-    elements.append(Paragraph(f"{company_info['siret']} - {company_info['tva']}", footer_style))
-    elements.append(Paragraph(f"{company_info['address']}", footer_style))
-    
-    doc.build(elements)
-    buffer.seek(0)
+    pdf_path = await render_pdf_file("client_invoice", client_id=client["id"], invoice=invoice,
+                                     client_name=client.get('name', 'N/A'))
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=Facture_{invoice.get('invoice_number', invoice_id[:8])}.pdf"}
-    )
+    return FileResponse(str(pdf_path), media_type="application/pdf", filename=filename)
 
 
 # ==================== ADMIN DOWNLOAD CLIENT FILES AS ZIP ====================
@@ -7803,18 +7209,20 @@ async def download_client_files_zip(client_id: str, admin: dict = Depends(get_cu
     zip_path = UPLOADS_DIR / zip_filename
     
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
-            for file_record in files:
-                file_type = file_record.get('file_type', 'other')
-                stored_name = file_record.get('stored_name')
-                original_name = file_record.get('original_name', stored_name)
+        def write_client_zip():
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf:
+                for file_record in files:
+                    file_type = file_record.get('file_type', 'other')
+                    stored_name = file_record.get('stored_name')
+                    original_name = file_record.get('original_name', stored_name)
                 
-                file_path = UPLOADS_DIR / "client_transfers" / file_type / client_id / stored_name
+                    file_path = UPLOADS_DIR / "client_transfers" / file_type / client_id / stored_name
                 
-                if file_path.exists():
-                    # Add to ZIP with folder structure: type/original_filename
-                    arcname = f"{file_type}/{original_name}"
-                    zipf.write(file_path, arcname)
+                    if file_path.exists():
+                        # Add to ZIP with folder structure: type/original_filename
+                        arcname = f"{file_type}/{original_name}"
+                        zipf.write(file_path, arcname)
+        await run_io(write_client_zip)
         
         # Return file response
         return FileResponse(
@@ -7836,8 +7244,6 @@ from fastapi import WebSocket, WebSocketDisconnect
 from starlette.background import BackgroundTask
 from fastapi.responses import StreamingResponse
 from typing import Dict, Set
-import json
-import asyncio
 
 # Store active connections
 class ConnectionManager:
@@ -8158,15 +7564,8 @@ async def upload_chat_file(
     safe_filename = f"{file_id}{file_ext}"
     file_path = UPLOADS_DIR / "chat" / safe_filename
     
-    total_size = 0
-    with open(file_path, "wb") as f:
-        while chunk := await file.read(1024 * 1024):
-            total_size += len(chunk)
-            if total_size > MAX_SIZE:
-                f.close()
-                file_path.unlink()
-                raise HTTPException(status_code=400, detail="Fichier trop volumineux (max 50MB)")
-            f.write(chunk)
+    stored = await save_upload(file, file_path, max_size=MAX_SIZE)
+    total_size = stored.size
     
     # Determine message type
     message_type = "image" if file_ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp'] else "file"
@@ -8400,6 +7799,7 @@ async def create_task(data: TaskCreate, admin: dict = Depends(get_current_admin)
     }
     
     await db.tasks.insert_one(task_doc)
+    await task_reminders.sync_task(db, task_doc)
     
     logging.info(f"Task created: {data.title} by admin {admin.get('email')}")
     
@@ -8494,6 +7894,8 @@ async def update_task(task_id: str, data: TaskUpdate, admin: dict = Depends(get_
             logging.error(f"Failed to send task response email: {e}")
     
     updated_task = await db.tasks.find_one({"id": task_id}, {"_id": 0})
+    if "due_date" in update_data or "reminders" in update_data:
+        await task_reminders.sync_task(db, updated_task)
     return {"success": True, "task": updated_task}
 
 
@@ -8505,6 +7907,7 @@ async def delete_task(task_id: str, admin: dict = Depends(get_current_admin)):
         raise HTTPException(status_code=404, detail="Tâche non trouvée")
     
     await db.tasks.delete_one({"id": task_id})
+    await task_reminders.delete_task(db, task_id)
     
     logging.info(f"Task deleted: {task.get('title')} by admin {admin.get('email')}")
     
@@ -8536,40 +7939,8 @@ async def toggle_task_status(task_id: str, admin: dict = Depends(get_current_adm
 
 @api_router.get("/tasks/stats/overview")
 async def get_tasks_stats(admin: dict = Depends(get_current_admin)):
-    """Get task statistics"""
-    total = await db.tasks.count_documents({})
-    pending = await db.tasks.count_documents({"status": "pending"})
-    in_progress = await db.tasks.count_documents({"status": "in_progress"})
-    completed = await db.tasks.count_documents({"status": "completed"})
-    
-    # Get overdue tasks
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    overdue = await db.tasks.count_documents({
-        "status": {"$ne": "completed"},
-        "due_date": {"$lt": today}
-    })
-    
-    # Get tasks due today
-    due_today = await db.tasks.count_documents({
-        "status": {"$ne": "completed"},
-        "due_date": today
-    })
-    
-    # Get high priority pending
-    high_priority = await db.tasks.count_documents({
-        "status": {"$ne": "completed"},
-        "priority": "high"
-    })
-    
-    return {
-        "total": total,
-        "pending": pending,
-        "in_progress": in_progress,
-        "completed": completed,
-        "overdue": overdue,
-        "due_today": due_today,
-        "high_priority": high_priority
-    }
+    """Get task statistics (single aggregation, cached until the next task write)"""
+    return await dashboard_stats.tasks_stats()
 
 
 # Team user access to tasks (based on role)
@@ -8731,7 +8102,7 @@ async def update_client_project(client_id: str, data: dict, admin: dict = Depend
                         email_sent = await send_project_completed_email(client)
                         # Send SMS for completion
                         if client.get("phone"):
-                            sms_sent = send_project_completion_sms(client.get("phone"), client.get("name", "Client"))
+                            sms_sent = await run_io(send_project_completion_sms, client.get("phone"), client.get("name", "Client"))
                     else:
                         current_step_info = next((s for s in PROJECT_STEPS if s["step"] == new_step), None)
                         if current_step_info:
@@ -8743,26 +8114,26 @@ async def update_client_project(client_id: str, data: dict, admin: dict = Depend
                                 email_sent = await send_photo_selection_email(client, current_step_info, new_step, total_steps)
                                 # SMS for action required
                                 if client.get("phone"):
-                                    sms_sent = send_action_required_sms(client.get("phone"), client.get("name", "Client"), "Sélectionnez vos 40 photos préférées")
+                                    sms_sent = await run_io(send_action_required_sms, client.get("phone"), client.get("name", "Client"), "Sélectionnez vos 40 photos préférées")
                             elif step_type == "music_request":
                                 # Special email for music request
                                 email_sent = await send_music_request_email(client, current_step_info, new_step, total_steps)
                                 # SMS for action required
                                 if client.get("phone"):
-                                    sms_sent = send_action_required_sms(client.get("phone"), client.get("name", "Client"), "Envoyez-nous votre musique de mariage")
+                                    sms_sent = await run_io(send_action_required_sms, client.get("phone"), client.get("name", "Client"), "Envoyez-nous votre musique de mariage")
                             elif step_type == "delivery":
                                 # Delivery email with attachment
                                 email_sent = await send_delivery_email_with_attachment(client, current_step_info, new_step, total_steps)
                                 # SMS for delivery
                                 if client.get("phone"):
                                     progress_pct = int((new_step / total_steps) * 100) if total_steps > 0 else 100
-                                    sms_sent = send_project_status_sms(client.get("phone"), client.get("name", "Client"), step_label, "completed", progress_pct)
+                                    sms_sent = await run_io(send_project_status_sms, client.get("phone"), client.get("name", "Client"), step_label, "completed", progress_pct)
                             else:
                                 email_sent = await send_project_step_email(client, current_step_info, new_step, total_steps)
                                 # Send SMS for standard step update
                                 if client.get("phone"):
                                     progress_pct = int((new_step / total_steps) * 100) if total_steps > 0 else 0
-                                    sms_sent = send_project_status_sms(client.get("phone"), client.get("name", "Client"), step_label, "in_progress", progress_pct)
+                                    sms_sent = await run_io(send_project_status_sms, client.get("phone"), client.get("name", "Client"), step_label, "in_progress", progress_pct)
                 except Exception as e:
                     logging.error(f"Failed to send project step email: {e}")
         
@@ -8838,9 +8209,8 @@ async def upload_client_music(
     if music_file.content_type not in allowed_types and not music_file.filename.lower().endswith(('.mp3', '.wav')):
         raise HTTPException(status_code=400, detail="Format non supporté. Utilisez MP3 ou WAV.")
     
-    # Create client music folder
+    # Client music folder
     client_music_dir = UPLOADS_DIR / "client_music" / client["id"]
-    client_music_dir.mkdir(parents=True, exist_ok=True)
     
     # Generate filename
     file_ext = Path(music_file.filename).suffix.lower() or ".mp3"
@@ -8848,8 +8218,8 @@ async def upload_client_music(
     file_path = client_music_dir / safe_name
     
     # Save file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(music_file.file, buffer)
+    await save_upload(music_file, file_path, max_size=MAX_AUDIO_SIZE, allowed_types=AUDIO_TYPES,
+                      allowed_extensions=[".mp3", ".wav"])
     
     # Update project with music info
     music_url = f"/uploads/client_music/{client['id']}/{safe_name}"
@@ -8948,7 +8318,7 @@ async def send_project_step_email(client: dict, step_info: dict, current_step: i
     subject = f"📦 Étape {current_step}/{total_steps} : {step_info['label']} - CREATIVINDUSTRY"
     
     try:
-        result = send_email(client_email, subject, html_content)
+        result = await run_io(send_email, client_email, subject, html_content)
         if result:
             logging.info(f"Project step email sent to {client_email} - Step {current_step}")
         return result
@@ -9014,7 +8384,7 @@ async def send_project_completed_email(client: dict):
     subject = f"🎉 Votre projet est terminé ! - CREATIVINDUSTRY"
     
     try:
-        result = send_email(client_email, subject, html_content)
+        result = await run_io(send_email, client_email, subject, html_content)
         if result:
             logging.info(f"Project completed email sent to {client_email}")
         return result
@@ -9087,7 +8457,7 @@ async def send_photo_selection_email(client: dict, step_info: dict, current_step
     subject = f"📸 Sélectionnez vos 40 photos pour le montage - CREATIVINDUSTRY"
     
     try:
-        result = send_email(client_email, subject, html_content)
+        result = await run_io(send_email, client_email, subject, html_content)
         if result:
             logging.info(f"Photo selection email sent to {client_email}")
         return result
@@ -9159,7 +8529,7 @@ async def send_music_request_email(client: dict, step_info: dict, current_step:
     subject = f"🎵 Envoyez-nous votre musique de mariage - CREATIVINDUSTRY"
     
     try:
-        result = send_email(client_email, subject, html_content)
+        result = await run_io(send_email, client_email, subject, html_content)
         if result:
             logging.info(f"Music request email sent to {client_email}")
         return result
@@ -9182,90 +8552,12 @@ async def send_delivery_email_with_attachment(client: dict, step_info: dict, cur
     site_url = os.environ.get('SITE_URL', 'https://creativindustry.com')
     
     # Generate end-of-project letter PDF
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.colors import HexColor
-    import io
-    
-    # Create PDF
-    pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
-    width, height = A4
-    
-    # Header
-    c.setFillColor(HexColor("#D4AF37"))
-    c.rect(0, height - 100, width, 100, fill=True, stroke=False)
-    
-    c.setFillColor(HexColor("#000000"))
-    c.setFont("Helvetica-Bold", 24)
-    c.drawCentredString(width / 2, height - 60, "CREATIVINDUSTRY")
-    
-    c.setFont("Helvetica", 12)
-    c.drawCentredString(width / 2, height - 85, "Courrier de fin de projet")
-    
-    # Content
-    c.setFillColor(HexColor("#333333"))
-    y_position = height - 150
-    
-    c.setFont("Helvetica", 12)
-    c.drawString(50, y_position, f"Date : {datetime.now().strftime('%d/%m/%Y')}")
-    y_position -= 40
-    
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y_position, f"À l'attention de : {client_name}")
-    y_position -= 40
-    
-    c.setFont("Helvetica", 12)
-    lines = [
-        "Bonjour,",
-        "",
-        "Nous sommes heureux de vous livrer vos fichiers ce jour et espérons qu'ils vous",
-        "feront plaisir.",
-        "",
-        "Notre équipe a mis tout son savoir-faire en termes de qualité d'image et de prise",
-        "de vue afin que vous puissiez garder les plus belles images du plus beau jour",
-        "de votre vie.",
-        "",
-        "Pour tout problème (modification ou autre des images de votre mariage),",
-        "n'hésitez pas à nous contacter par email à l'adresse contact@creativindustry.com.",
-        "Nous ferons le point ensemble et apporterons des modifications si besoin.",
-        "",
-        "Par exemple : à 1H30 la vidéo a sauté ou à 2H la vidéo s'est arrêtée.",
-        "Ces indications permettront à notre équipe d'effectuer les modifications",
-        "nécessaires.",
-        "",
-        "Après nous avoir informé des problèmes rencontrés, vous recevrez une nouvelle",
-        "copie modifiée disponible en téléchargement via notre site sous une semaine.",
-        "",
-        "IMPORTANT : Nous n'interviendrons qu'une seule fois pour toute modification.",
-        "Passé le délai d'une semaine, la modification ne sera plus possible.",
-        "Nous vous remercions de bien vouloir regarder la vidéo du début à la fin",
-        "et de noter tout problème éventuel.",
-        "",
-        "Merci de votre confiance et nous espérons que le résultat sera à la hauteur",
-        "de vos attentes. Ce fut un plaisir de partager avec vous ce jour si important.",
-        "",
-        "Nous vous souhaitons un bon visionnage !",
-        "",
-        "",
-        "Cordialement,",
-        "L'équipe CREATIVINDUSTRY",
-    ]
-    
-    for line in lines:
-        c.drawString(50, y_position, line)
-        y_position -= 20
-    
-    # Footer
-    c.setFillColor(HexColor("#D4AF37"))
-    c.rect(0, 0, width, 40, fill=True, stroke=False)
-    c.setFillColor(HexColor("#000000"))
-    c.setFont("Helvetica", 10)
-    c.drawCentredString(width / 2, 15, "CREATIVINDUSTRY France - Votre partenaire audiovisuel")
-    
-    c.save()
-    pdf_buffer.seek(0)
-    pdf_content = pdf_buffer.getvalue()
+    pdf_content = await render_pdf(
+        "delivery_letter",
+        cache=False,
+        client_name=client_name,
+        date=datetime.now().strftime('%d/%m/%Y')
+    )
     
     html_content = f"""
     <html>
@@ -9317,7 +8609,7 @@ async def send_delivery_email_with_attachment(client: dict, step_info: dict, cur
     
     try:
         # Send email with attachment
-        result = send_email_with_attachment(
+        result = await run_io(send_email_with_attachment,
             client_email, 
             subject, 
             html_content, 
@@ -9420,7 +8712,7 @@ async def send_task_assignment_email(collaborator: dict, task: dict, assigner_na
     subject = f"📋 Nouvelle tâche : {task.get('title')} - CREATIVINDUSTRY"
     
     try:
-        result = send_email(collab_email, subject, html_content)
+        result = await run_io(send_email, collab_email, subject, html_content)
         if result:
             logging.info(f"Task assignment email sent to {collab_email}")
         return result
@@ -9497,7 +8789,7 @@ async def send_task_response_email(admin: dict, task: dict, responder_name: str,
     subject = f"{response_icon} {responder_name} a répondu : {task.get('title')}"
     
     try:
-        result = send_email(admin_email, subject, html_content)
+        result = await run_io(send_email, admin_email, subject, html_content)
         if result:
             logging.info(f"Task response email sent to {admin_email}")
         return result
@@ -9552,7 +8844,7 @@ async def send_team_chat_email(recipient: dict, sender_name: str, message_conten
     subject = f"💬 Message de {sender_name} - CREATIVINDUSTRY"
     
     try:
-        result = send_email(recipient_email, subject, html_content)
+        result = await run_io(send_email, recipient_email, subject, html_content)
         if result:
             logging.info(f"Team chat email sent to {recipient_email}")
         return result
@@ -9743,11 +9035,11 @@ async def get_online_users(admin: dict = Depends(get_current_admin)):
     return admins + clients
 
 
-# Task reminder check endpoint (to be called by cron)
+# Task reminder check endpoint (also runs hourly from the scheduler)
 
 @api_router.post("/tasks/check-reminders")
 async def check_task_reminders(request: Request):
-    """Check and send task reminders - called by cron job"""
+    """Check and send task reminders now (normally run by the scheduler)"""
     # Verify internal call or admin
     auth_header = request.headers.get("Authorization")
     internal_key = os.environ.get("INTERNAL_API_KEY", "")
@@ -9765,78 +9057,11 @@ async def check_task_reminders(request: Request):
         except:
             raise HTTPException(status_code=401, detail="Non autorisé")
     
-    today = datetime.now(timezone.utc).date()
-    reminders_sent = 0
-    
-    # Get all pending/in_progress tasks
-    tasks = await db.tasks.find(
-        {"status": {"$ne": "completed"}},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    for task in tasks:
-        task_due_date = datetime.strptime(task["due_date"], "%Y-%m-%d").date()
-        
-        for i, reminder in enumerate(task.get("reminders", [])):
-            if not reminder.get("enabled", True) or reminder.get("sent", False):
-                continue
-            
-            days_before = reminder.get("days_before", 1)
-            reminder_date = task_due_date - timedelta(days=days_before)
-            
-            if reminder_date == today:
-                # Send reminder emails to assigned users
-                for user_id in task.get("assigned_to", []):
-                    user = await db.team_users.find_one({"id": user_id}, {"_id": 0})
-                    if user and user.get("email"):
-                        # Prepare email
-                        days_text = "aujourd'hui" if days_before == 0 else f"dans {days_before} jour(s)" if days_before > 0 else f"depuis {-days_before} jour(s)"
-                        
-                        html_content = f"""
-                        <html>
-                        <body style="font-family: Arial, sans-serif; background-color: #1a1a1a; color: #ffffff; padding: 20px;">
-                            <div style="max-width: 600px; margin: 0 auto; background-color: #2a2a2a; padding: 30px; border-radius: 10px;">
-                                <h1 style="color: #D4AF37;">⏰ Rappel de tâche</h1>
-                                <p>Bonjour {user.get('name', '')},</p>
-                                <p>Ceci est un rappel pour la tâche suivante :</p>
-                                <div style="background-color: #3a3a3a; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                                    <h2 style="color: #D4AF37; margin-top: 0;">{task['title']}</h2>
-                                    <p><strong>Échéance :</strong> {task['due_date']} ({days_text})</p>
-                                    <p><strong>Priorité :</strong> {task['priority'].upper()}</p>
-                                    {f"<p><strong>Client :</strong> {task['client_name']}</p>" if task.get('client_name') else ""}
-                                    {f"<p>{task['description']}</p>" if task.get('description') else ""}
-                                </div>
-                                <p style="color: #888;">Connectez-vous à votre espace pour marquer cette tâche comme terminée.</p>
-                            </div>
-                        </body>
-                        </html>
-                        """
-                        
-                        try:
-                            send_email(user["email"], f"⏰ Rappel : {task['title']}", html_content)
-                            reminders_sent += 1
-                        except Exception as e:
-                            logging.error(f"Failed to send reminder to {user['email']}: {e}")
-                
-                # Also send to admin email
-                admin_email = os.environ.get("SMTP_EMAIL")
-                if admin_email:
-                    try:
-                        send_email(admin_email, f"⏰ Rappel de tâche : {task['title']}", html_content)
-                    except:
-                        pass
-                
-                # Mark reminder as sent
-                task["reminders"][i]["sent"] = True
-                task["reminders"][i]["last_sent_at"] = datetime.now(timezone.utc).isoformat()
-                
-                await db.tasks.update_one(
-                    {"id": task["id"]},
-                    {"$set": {"reminders": task["reminders"]}}
-                )
-    
-    logging.info(f"Task reminders checked: {reminders_sent} sent")
-    return {"success": True, "reminders_sent": reminders_sent}
+    # Same job as the hourly scheduled run: its lock prevents overlapping executions
+    result = await run_job("hourly_task_reminders", send_task_reminders)
+    if result is None:
+        return {"success": True, "reminders_sent": 0, "already_running": True}
+    return {"success": True, **result}
 
 
 # ==================== TESTIMONIAL ROUTES ====================
@@ -9914,7 +9139,7 @@ async def create_testimonial(
         </html>
         """
         try:
-            send_email(SMTP_EMAIL, "⭐ Nouveau témoignage à valider", html_content)
+            await run_io(send_email, SMTP_EMAIL, "⭐ Nouveau témoignage à valider", html_content)
         except Exception as e:
             logging.error(f"Failed to send testimonial notification: {e}")
     
@@ -10053,19 +9278,16 @@ async def upload_welcome_video(
     if video.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Format vidéo non supporté. Utilisez MP4, WebM, MOV ou AVI.")
     
-    # Create welcome directory if not exists
+    # Welcome directory
     welcome_dir = UPLOADS_DIR / "welcome"
-    welcome_dir.mkdir(exist_ok=True)
     
     # Generate unique filename
-    file_ext = video.filename.split(".")[-1] if "." in video.filename else "mp4"
+    file_ext = Path(video.filename).suffix.lstrip(".") or "mp4"
     filename = f"welcome_video_{uuid.uuid4().hex[:8]}.{file_ext}"
     file_path = welcome_dir / filename
     
     # Save file
-    with open(file_path, "wb") as buffer:
-        content = await video.read()
-        buffer.write(content)
+    await save_upload(video, file_path, max_size=MAX_VIDEO_SIZE, allowed_types=allowed_types)
     
     # Update popup config with video URL
     video_url = f"/uploads/welcome/{filename}"
@@ -10140,13 +9362,14 @@ async def create_news_post(
         raise HTTPException(status_code=400, detail="Format non supporté. Utilisez une image ou vidéo.")
     
     # Save file
-    file_ext = media.filename.split(".")[-1] if "." in media.filename else "jpg"
+    file_ext = Path(media.filename).suffix.lstrip(".") or "jpg"
     filename = f"news_{uuid.uuid4().hex[:12]}.{file_ext}"
     file_path = UPLOADS_DIR / "news" / filename
     
-    with open(file_path, "wb") as buffer:
-        content = await media.read()
-        buffer.write(content)
+    if media_type == "photo":
+        await save_upload(media, file_path, max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES)
+    else:
+        await save_upload(media, file_path, max_size=MAX_VIDEO_SIZE, allowed_types=VIDEO_TYPES)
     
     media_url = f"/uploads/news/{filename}"
     
@@ -10157,8 +9380,7 @@ async def create_news_post(
         "media_url": media_url,
         "media_type": media_type,
         "thumbnail_url": media_url if media_type == "photo" else None,
-        "likes": [],  # List of client_ids who liked
-        "likes_count": 0,
+        "likes_count": 0,  # Likes themselves are in news_likes
         "comments_count": 0,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
@@ -10168,17 +9390,34 @@ async def create_news_post(
     return {"success": True, "post_id": post_data["id"], "message": "Publication créée"}
 
 
+def news_client_id(authorization: Optional[str]) -> Optional[str]:
+    """Client id from an optional "Bearer" header (None for visitors and non-client tokens)"""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization.replace("Bearer ", ""), SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return None
+    if payload.get("type") != "client":
+        return None
+    return payload.get("client_id") or payload.get("sub")
+
+
 @api_router.get("/news", response_model=List[dict])
-async def get_news_posts():
-    """Get all news posts (public)"""
-    posts = await db.news_posts.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def get_news_posts(authorization: Optional[str] = Header(None)):
+    """Get all news posts (public); "liked" is set for the authenticated client"""
+    posts = await db.news_posts.find({}, {"_id": 0, "likes": 0}).sort("created_at", -1).to_list(100)
+    client_id = news_client_id(authorization)
+    liked = await news_likes.liked_post_ids(db, client_id, [post["id"] for post in posts])
+    for post in posts:
+        post["liked"] = post["id"] in liked
     return posts
 
 
 @api_router.get("/news/{post_id}")
 async def get_news_post(post_id: str):
     """Get a single news post with comments"""
-    post = await db.news_posts.find_one({"id": post_id}, {"_id": 0})
+    post = await db.news_posts.find_one({"id": post_id}, {"_id": 0, "likes": 0})
     if not post:
         raise HTTPException(status_code=404, detail="Publication non trouvée")
     
@@ -10213,9 +9452,10 @@ async def delete_news_post(
         if file_path.exists():
             file_path.unlink()
     
-    # Delete post and its comments
+    # Delete post, its comments and likes
     await db.news_posts.delete_one({"id": post_id})
     await db.news_comments.delete_many({"post_id": post_id})
+    await news_likes.delete_post(db, post_id)
     
     return {"success": True, "message": "Publication supprimée"}
 
@@ -10237,27 +9477,14 @@ async def toggle_like_news(
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    post = await db.news_posts.find_one({"id": post_id})
+    post = await db.news_posts.find_one({"id": post_id}, {"_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Publication non trouvée")
     
-    likes = post.get("likes", [])
+    # Insert or delete the like document, then $inc the counter
+    action, likes_count = await news_likes.toggle_like(db, post_id, client_id)
     
-    if client_id in likes:
-        # Unlike
-        likes.remove(client_id)
-        action = "unliked"
-    else:
-        # Like
-        likes.append(client_id)
-        action = "liked"
-    
-    await db.news_posts.update_one(
-        {"id": post_id},
-        {"$set": {"likes": likes, "likes_count": len(likes)}}
-    )
-    
-    return {"success": True, "action": action, "likes_count": len(likes)}
+    return {"success": True, "action": action, "likes_count": likes_count}
 
 
 @api_router.get("/news/{post_id}/liked")
@@ -10276,11 +9503,7 @@ async def check_if_liked(
     if not client_id:
         return {"liked": False}
     
-    post = await db.news_posts.find_one({"id": post_id}, {"likes": 1})
-    if not post:
-        return {"liked": False}
-    
-    return {"liked": client_id in post.get("likes", [])}
+    return {"liked": await news_likes.is_liked(db, post_id, client_id)}
 
 
 @api_router.post("/news/{post_id}/comment")
@@ -10290,7 +9513,7 @@ async def add_comment(
     authorization: Optional[str] = Header(None)
 ):
     """Add a comment to a news post (authenticated clients auto-approved, guests need validation)"""
-    post = await db.news_posts.find_one({"id": post_id})
+    post = await db.news_posts.find_one({"id": post_id}, {"_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Publication non trouvée")
     
@@ -10365,10 +9588,16 @@ async def get_pending_comments(
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
-    # Get post info for each comment
+    # Get post info for all comments in one query
+    post_ids = list({comment["post_id"] for comment in comments})
+    posts = {
+        post["id"]: {"caption": post.get("caption"), "media_url": post.get("media_url")}
+        for post in await db.news_posts.find(
+            {"id": {"$in": post_ids}}, {"_id": 0, "id": 1, "caption": 1, "media_url": 1}
+        ).to_list(len(post_ids))
+    }
     for comment in comments:
-        post = await db.news_posts.find_one({"id": comment["post_id"]}, {"_id": 0, "caption": 1, "media_url": 1})
-        comment["post_info"] = post
+        comment["post_info"] = posts.get(comment["post_id"])
     
     return comments
 
@@ -10388,20 +9617,20 @@ async def update_comment_status(
     if status not in ["approved", "rejected"]:
         raise HTTPException(status_code=400, detail="Statut invalide")
     
-    comment = await db.news_comments.find_one({"id": comment_id})
-    if not comment:
-        raise HTTPException(status_code=404, detail="Commentaire non trouvé")
-    
-    await db.news_comments.update_one(
+    # Previous status returned by the same atomic write: the count only moves on a real transition
+    comment = await db.news_comments.find_one_and_update(
         {"id": comment_id},
-        {"$set": {"status": status}}
+        {"$set": {"status": status}},
+        projection={"_id": 0, "post_id": 1, "status": 1}
     )
+    if not comment:
+        raise HTTPException(status_code=404, detail="Commentaire non trouvé")
     
-    # Update post comments count if approved
-    if status == "approved":
+    delta = (status == "approved") - (comment.get("status") == "approved")
+    if delta:
         await db.news_posts.update_one(
             {"id": comment["post_id"]},
-            {"$inc": {"comments_count": 1}}
+            {"$inc": {"comments_count": delta}}
         )
     
     return {"success": True, "message": f"Commentaire {status}"}
@@ -10418,7 +9647,10 @@ async def delete_comment(
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    comment = await db.news_comments.find_one({"id": comment_id})
+    comment = await db.news_comments.find_one_and_delete(
+        {"id": comment_id},
+        projection={"_id": 0, "post_id": 1, "status": 1}
+    )
     if not comment:
         raise HTTPException(status_code=404, detail="Commentaire non trouvé")
     
@@ -10429,8 +9661,6 @@ async def delete_comment(
             {"$inc": {"comments_count": -1}}
         )
     
-    await db.news_comments.delete_one({"id": comment_id})
-    
     return {"success": True, "message": "Commentaire supprimé"}
 
 
@@ -10560,7 +9790,7 @@ async def delete_guestbook(guestbook_id: str, credentials: HTTPAuthorizationCred
     # Delete media files
     guestbook_folder = GUESTBOOK_DIR / guestbook_id
     if guestbook_folder.exists():
-        shutil.rmtree(guestbook_folder)
+        await run_io(shutil.rmtree, guestbook_folder)
     
     # Delete messages and guestbook
     await db.guestbook_messages.delete_many({"guestbook_id": guestbook_id})
@@ -10595,11 +9825,12 @@ async def delete_guestbook_message(message_id: str, credentials: HTTPAuthorizati
     if not message:
         raise HTTPException(status_code=404, detail="Message non trouvé")
     
-    # Delete media file if exists
+    # Delete media file (and its normalized copy / poster) if exists
     if message.get("media_url"):
         media_path = UPLOADS_DIR / message["media_url"].lstrip("/uploads/")
-        if media_path.exists():
-            media_path.unlink()
+        for path in [media_path, *guestbook_media.derived_paths(UPLOADS_DIR, message)]:
+            if path.exists():
+                path.unlink()
     
     await db.guestbook_messages.delete_one({"id": message_id})
     
@@ -10633,19 +9864,17 @@ async def get_public_guestbook(guestbook_id: str):
 
 
 @api_router.get("/public/guestbooks/{guestbook_id}/messages")
-async def get_public_guestbook_messages(guestbook_id: str):
-    """Get approved messages for a public guestbook"""
-    guestbook = await db.guestbooks.find_one({"id": guestbook_id})
+async def get_public_guestbook_messages(guestbook_id: str, cursor: Optional[str] = None, limit: int = 20):
+    """Get approved messages for a public guestbook, newest first, one page at a time.
+    Media messages carry a poster, a short preview clip and waveform peaks; originals load on demand."""
+    guestbook = await db.guestbooks.find_one({"id": guestbook_id}, {"_id": 0, "id": 1})
     if not guestbook:
         raise HTTPException(status_code=404, detail="Livre d'or non trouvé")
     
-    # Get only approved messages
-    messages = await db.guestbook_messages.find(
-        {"guestbook_id": guestbook_id, "is_approved": True},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    
-    return messages
+    try:
+        return await guestbook_media.feed_page(db, guestbook_id, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
 
 
 @api_router.post("/public/guestbooks/{guestbook_id}/messages/text")
@@ -10698,6 +9927,9 @@ async def post_media_message(
     if not guestbook.get("is_active", True):
         raise HTTPException(status_code=403, detail="Ce livre d'or n'est plus actif")
     
+    if message_type not in ("audio", "video"):
+        raise HTTPException(status_code=400, detail="Type de message invalide")
+    
     if message_type == "video" and not guestbook.get("allow_video", True):
         raise HTTPException(status_code=403, detail="Les vidéos ne sont pas autorisées")
     
@@ -10721,17 +9953,18 @@ async def post_media_message(
     if message_type == "audio" and file.content_type not in allowed_audio:
         raise HTTPException(status_code=400, detail="Format audio non supporté")
     
-    # Save file
+    # Save file (streamed; size and real content type checked while writing)
     guestbook_folder = GUESTBOOK_DIR / guestbook_id
-    guestbook_folder.mkdir(exist_ok=True)
     
     message_id = str(uuid.uuid4())
     file_ext = Path(file.filename).suffix.lower() or (".webm" if "webm" in file.content_type else ".mp4")
     media_filename = f"{message_id}{file_ext}"
     file_path = guestbook_folder / media_filename
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    if message_type == "video":
+        await save_upload(file, file_path, max_size=MAX_VIDEO_SIZE, allowed_types=allowed_video)
+    else:
+        await save_upload(file, file_path, max_size=MAX_AUDIO_SIZE, allowed_types=allowed_audio)
     
     media_url = f"/uploads/guestbooks/{guestbook_id}/{media_filename}"
     
@@ -10743,12 +9976,16 @@ async def post_media_message(
         "media_url": media_url,
         "duration": duration,
         "is_approved": not guestbook.get("require_approval", True),
+        "media_status": "pending",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
     await db.guestbook_messages.insert_one(message)
     message.pop("_id", None)
     
+    # Normalized copy and poster are produced in the background
+    guestbook_media.enqueue(db, UPLOADS_DIR, message_id)
+    
     return {"success": True, "message": message, "needs_approval": guestbook.get("require_approval", True)}
 
 
@@ -10772,11 +10009,11 @@ async def purchase_guestbook_stripe(data: GuestbookPurchaseRequest, client: dict
     if not stripe_secret:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = stripe_secret
+    stripe = get_stripe(stripe_secret)
     guestbook_price = await get_guestbook_price()
     
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe.create_payment_intent(
             amount=int(guestbook_price * 100),
             currency="eur",
             metadata={
@@ -10807,7 +10044,7 @@ async def purchase_guestbook_stripe(data: GuestbookPurchaseRequest, client: dict
             "client_secret": intent.client_secret,
             "amount": guestbook_price
         }
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         logging.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur Stripe: {str(e)}")
 
@@ -10824,14 +10061,14 @@ async def confirm_guestbook_stripe_payment(
     if not stripe_secret:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = stripe_secret
+    stripe = get_stripe(stripe_secret)
     
     payment = await db.stripe_payments.find_one({"id": payment_id, "client_id": client["id"]})
     if not payment:
         raise HTTPException(status_code=404, detail="Paiement non trouvé")
     
     try:
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        intent = await stripe.retrieve_payment_intent(payment_intent_id)
         
         if intent.status == "succeeded":
             await db.stripe_payments.update_one(
@@ -10871,94 +10108,71 @@ async def confirm_guestbook_stripe_payment(
         else:
             return {"success": False, "message": f"Paiement non confirmé: {intent.status}"}
             
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         logging.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur Stripe: {str(e)}")
 
 @api_router.post("/client/guestbook/purchase-paypal")
 async def purchase_guestbook_paypal(data: GuestbookPurchaseRequest, client: dict = Depends(get_current_client)):
     """Create a PayPal payment for guestbook purchase"""
-    paypal_client_id = os.environ.get("PAYPAL_CLIENT_ID")
-    paypal_secret = os.environ.get("PAYPAL_CLIENT_SECRET")
+    paypal = get_paypal(os.environ.get("PAYPAL_CLIENT_ID", ""), os.environ.get("PAYPAL_CLIENT_SECRET", ""), PAYPAL_MODE)
     
-    if not paypal_client_id or not paypal_secret:
+    if not paypal.configured:
         raise HTTPException(status_code=500, detail="PayPal non configuré")
     
     try:
         guestbook_price = await get_guestbook_price()
         
-        # Get access token
-        auth = httpx.BasicAuth(paypal_client_id, paypal_secret)
-        async with httpx.AsyncClient() as http_client:
-            token_res = await http_client.post(
-                f"{PAYPAL_API_BASE}/v1/oauth2/token",
-                auth=auth,
-                data={"grant_type": "client_credentials"}
-            )
-            access_token = token_res.json().get("access_token")
-            
-            if not access_token:
-                raise HTTPException(status_code=500, detail="Erreur d'authentification PayPal")
-            
-            # Store pending purchase info
-            pending_id = str(uuid.uuid4())
-            await db.paypal_payments.insert_one({
-                "id": pending_id,
-                "type": "guestbook_purchase",
-                "client_id": client["id"],
-                "guestbook_name": data.name,
-                "event_date": data.event_date,
-                "amount": guestbook_price,
-                "status": "pending",
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
-            
-            # Determine return URLs
-            base_url = os.environ.get("FRONTEND_URL", "https://creativindustry.fr")
-            return_url = f"{base_url}/client?guestbook_payment_success=true&pending_id={pending_id}"
-            cancel_url = f"{base_url}/client?guestbook_payment_cancelled=true"
-            
-            # Create order
-            order_res = await http_client.post(
-                f"{PAYPAL_API_BASE}/v2/checkout/orders",
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    "Content-Type": "application/json"
+        # Store pending purchase info
+        pending_id = str(uuid.uuid4())
+        await db.paypal_payments.insert_one({
+            "id": pending_id,
+            "type": "guestbook_purchase",
+            "client_id": client["id"],
+            "guestbook_name": data.name,
+            "event_date": data.event_date,
+            "amount": guestbook_price,
+            "status": "pending",
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        
+        # Determine return URLs
+        base_url = os.environ.get("FRONTEND_URL", "https://creativindustry.fr")
+        return_url = f"{base_url}/client?guestbook_payment_success=true&pending_id={pending_id}"
+        cancel_url = f"{base_url}/client?guestbook_payment_cancelled=true"
+        
+        # Create order (the pending id is the idempotency key)
+        order_data = await paypal.create_order({
+            "intent": "CAPTURE",
+            "purchase_units": [{
+                "amount": {
+                    "currency_code": "EUR",
+                    "value": str(guestbook_price)
                 },
-                json={
-                    "intent": "CAPTURE",
-                    "purchase_units": [{
-                        "amount": {
-                            "currency_code": "EUR",
-                            "value": str(guestbook_price)
-                        },
-                        "description": f"Livre d'or - {data.name}"
-                    }],
-                    "application_context": {
-                        "return_url": return_url,
-                        "cancel_url": cancel_url,
-                        "brand_name": "CreativIndustry",
-                        "landing_page": "BILLING",
-                        "user_action": "PAY_NOW"
-                    }
-                }
-            )
-            
-            order_data = order_res.json()
-            approval_url = next(
-                (link["href"] for link in order_data.get("links", []) if link["rel"] == "approve"),
-                None
+                "description": f"Livre d'or - {data.name}"
+            }],
+            "application_context": {
+                "return_url": return_url,
+                "cancel_url": cancel_url,
+                "brand_name": "CreativIndustry",
+                "landing_page": "BILLING",
+                "user_action": "PAY_NOW"
+            }
+        }, request_id=pending_id)
+        
+        approval_url = paypal.approval_url(order_data)
+        
+        if approval_url:
+            await db.paypal_payments.update_one(
+                {"id": pending_id},
+                {"$set": {"paypal_order_id": order_data.get("id")}}
             )
+            return {"approval_url": approval_url, "pending_id": pending_id}
+        else:
+            raise HTTPException(status_code=500, detail="Erreur lors de la création de la commande PayPal")
             
-            if approval_url:
-                await db.paypal_payments.update_one(
-                    {"id": pending_id},
-                    {"$set": {"paypal_order_id": order_data.get("id")}}
-                )
-                return {"approval_url": approval_url, "pending_id": pending_id}
-            else:
-                raise HTTPException(status_code=500, detail="Erreur lors de la création de la commande PayPal")
-                
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"PayPal error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur PayPal: {str(e)}")
@@ -10975,62 +10189,73 @@ async def confirm_guestbook_paypal_payment(
     if not payment:
         raise HTTPException(status_code=404, detail="Paiement non trouvé")
     
-    paypal_client_id = os.environ.get("PAYPAL_CLIENT_ID")
-    paypal_secret = os.environ.get("PAYPAL_CLIENT_SECRET")
+    # Already confirmed (page reloaded, request retried): return the existing guestbook
+    if payment.get("guestbook_id"):
+        return {"success": True, "guestbook_id": payment["guestbook_id"], "message": "Livre d'or créé avec succès !"}
+    if payment.get("status") == "completed":
+        guestbook = await db.guestbooks.find_one({"payment_id": pending_id}, {"_id": 0, "id": 1})
+        if guestbook:
+            return {"success": True, "guestbook_id": guestbook["id"], "message": "Livre d'or créé avec succès !"}
+    
+    paypal = get_paypal(os.environ.get("PAYPAL_CLIENT_ID", ""), os.environ.get("PAYPAL_CLIENT_SECRET", ""), PAYPAL_MODE)
     
     try:
-        auth = httpx.BasicAuth(paypal_client_id, paypal_secret)
-        async with httpx.AsyncClient() as http_client:
-            token_res = await http_client.post(
-                f"{PAYPAL_API_BASE}/v1/oauth2/token",
-                auth=auth,
-                data={"grant_type": "client_credentials"}
-            )
-            access_token = token_res.json().get("access_token")
+        # Capture the payment (idempotent per order: a retried confirmation is not captured twice)
+        order_id = payment.get("paypal_order_id")
+        if order_id:
+            try:
+                capture_data = await paypal.capture_order(order_id)
+            except PaymentGatewayError as e:
+                logging.error(f"PayPal capture error: {e.details or e.message}")
+                capture_data = {}
             
-            # Capture the payment
-            order_id = payment.get("paypal_order_id")
-            if order_id:
-                capture_res = await http_client.post(
-                    f"{PAYPAL_API_BASE}/v2/checkout/orders/{order_id}/capture",
-                    headers={"Authorization": f"Bearer {access_token}"}
+            if capture_data.get("status") == "COMPLETED":
+                # Only the confirmation that records the guestbook id on the payment creates the
+                # guestbook: concurrent confirms all see COMPLETED from the idempotent capture
+                guestbook_id = str(uuid.uuid4())
+                claimed = await db.paypal_payments.update_one(
+                    {"id": pending_id, "guestbook_id": {"$exists": False}},
+                    {"$set": {
+                        "status": "completed",
+                        "completed_at": datetime.now(timezone.utc).isoformat(),
+                        "guestbook_id": guestbook_id
+                    }}
                 )
-                capture_data = capture_res.json()
-                
-                if capture_data.get("status") == "COMPLETED":
-                    await db.paypal_payments.update_one(
-                        {"id": pending_id},
-                        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
-                    )
-                    
-                    # Create the guestbook
-                    guestbook_id = str(uuid.uuid4())
-                    guestbook = {
-                        "id": guestbook_id,
-                        "client_id": client["id"],
-                        "client_name": client.get("company_name") or client.get("name", "Client"),
-                        "name": name,
-                        "event_date": event_date,
-                        "is_active": True,
-                        "allow_video": True,
-                        "allow_audio": True,
-                        "max_duration_video": 60,
-                        "max_duration_audio": 60,
-                        "payment_method": "PayPal",
-                        "payment_id": pending_id,
-                        "amount_paid": payment.get("amount", 200),
-                        "created_at": datetime.now(timezone.utc).isoformat()
-                    }
-                    await db.guestbooks.insert_one(guestbook)
-                    
-                    guestbook_folder = GUESTBOOK_DIR / guestbook_id
-                    guestbook_folder.mkdir(exist_ok=True)
-                    
+                if claimed.modified_count != 1:
+                    payment = await db.paypal_payments.find_one({"id": pending_id}, {"_id": 0, "guestbook_id": 1})
                     return {
                         "success": True,
-                        "guestbook_id": guestbook_id,
+                        "guestbook_id": payment.get("guestbook_id"),
                         "message": "Livre d'or créé avec succès !"
                     }
+            
+                # Create the guestbook
+                guestbook = {
+                    "id": guestbook_id,
+                    "client_id": client["id"],
+                    "client_name": client.get("company_name") or client.get("name", "Client"),
+                    "name": name,
+                    "event_date": event_date,
+                    "is_active": True,
+                    "allow_video": True,
+                    "allow_audio": True,
+                    "max_duration_video": 60,
+                    "max_duration_audio": 60,
+                    "payment_method": "PayPal",
+                    "payment_id": pending_id,
+                    "amount_paid": payment.get("amount", 200),
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                }
+                await db.guestbooks.insert_one(guestbook)
+            
+                guestbook_folder = GUESTBOOK_DIR / guestbook_id
+                guestbook_folder.mkdir(exist_ok=True)
+            
+                return {
+                    "success": True,
+                    "guestbook_id": guestbook_id,
+                    "message": "Livre d'or créé avec succès !"
+                }
         
         return {"success": False, "message": "Paiement non confirmé"}
         
@@ -11060,10 +10285,10 @@ async def create_direct_payment(data: DirectPaymentCreate, client: dict = Depend
     if data.amount <= 0:
         raise HTTPException(status_code=400, detail="Le montant doit être supérieur à 0")
     
-    stripe.api_key = stripe_secret
+    stripe = get_stripe(stripe_secret)
     
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe.create_payment_intent(
             amount=int(data.amount * 100),  # Convert to cents
             currency="eur",
             metadata={
@@ -11094,7 +10319,7 @@ async def create_direct_payment(data: DirectPaymentCreate, client: dict = Depend
             "client_secret": intent.client_secret,
             "amount": data.amount
         }
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         logging.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur Stripe: {str(e)}")
 
@@ -11105,11 +10330,11 @@ async def confirm_direct_payment(data: DirectPaymentConfirm, client: dict = Depe
     if not stripe_secret:
         raise HTTPException(status_code=500, detail="Stripe non configuré")
     
-    stripe.api_key = stripe_secret
+    stripe = get_stripe(stripe_secret)
     
     try:
         # Verify the payment intent
-        intent = stripe.PaymentIntent.retrieve(data.payment_intent_id)
+        intent = await stripe.retrieve_payment_intent(data.payment_intent_id)
         
         if intent.status == "succeeded":
             # Find the pending payment
@@ -11158,7 +10383,7 @@ async def confirm_direct_payment(data: DirectPaymentConfirm, client: dict = Depe
         
         return {"success": False, "message": "Paiement non confirmé"}
         
-    except stripe.error.StripeError as e:
+    except PaymentGatewayError as e:
         logging.error(f"Stripe error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur Stripe: {str(e)}")
 
@@ -11248,11 +10473,12 @@ async def client_delete_message(message_id: str, credentials: HTTPAuthorizationC
     if not guestbook:
         raise HTTPException(status_code=403, detail="Non autorisé")
     
-    # Delete media file if exists
+    # Delete media file (and its normalized copy / poster) if exists
     if message.get("media_url"):
         media_path = UPLOADS_DIR / message["media_url"].lstrip("/uploads/")
-        if media_path.exists():
-            media_path.unlink()
+        for path in [media_path, *guestbook_media.derived_paths(UPLOADS_DIR, message)]:
+            if path.exists():
+                path.unlink()
     
     await db.guestbook_messages.delete_one({"id": message_id})
     
@@ -11287,13 +10513,10 @@ async def generate_guestbook_montage(
     if not messages:
         raise HTTPException(status_code=400, detail="Aucune vidéo approuvée à monter")
     
-    # Collect video files
-    video_files = []
-    for msg in messages:
-        if msg.get("media_url"):
-            video_path = UPLOADS_DIR / msg["media_url"].lstrip("/uploads/")
-            if video_path.exists():
-                video_files.append(str(video_path))
+    # Collect video files: normalized clips when they all share the current profile (stream copy),
+    # otherwise the original uploads (full re-encode) while the missing clips are normalized in the background
+    await guestbook_media.enqueue_unready(db, UPLOADS_DIR, messages)
+    video_files, stream_copy = guestbook_media.montage_sources(UPLOADS_DIR, messages)
     
     if not video_files:
         raise HTTPException(status_code=400, detail="Aucun fichier vidéo trouvé")
@@ -11308,22 +10531,17 @@ async def generate_guestbook_montage(
     try:
         # Create a temporary file list for FFmpeg concat
         with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-            for vf in video_files:
-                f.write(f"file '{vf}'\n")
+            f.write(guestbook_media.concat_list(video_files))
             concat_file = f.name
         
         # Step 1: Concatenate all videos
         temp_concat = str(montage_dir / f"temp_concat_{montage_id}.mp4")
-        concat_cmd = [
-            "ffmpeg", "-y", "-f", "concat", "-safe", "0",
-            "-i", concat_file,
-            "-c:v", "libx264", "-preset", "fast",
-            "-c:a", "aac", "-b:a", "128k",
-            "-movflags", "+faststart",
-            temp_concat
-        ]
+        if stream_copy:
+            concat_cmd = guestbook_media.concat_copy_command(concat_file, temp_concat)
+        else:
+            concat_cmd = guestbook_media.concat_reencode_command(concat_file, temp_concat)
         
-        result = subprocess.run(concat_cmd, capture_output=True, text=True, timeout=300)
+        result = await run_ffmpeg(subprocess.run, concat_cmd, capture_output=True, text=True, timeout=300)
         if result.returncode != 0:
             logging.error(f"FFmpeg concat error: {result.stderr}")
             raise HTTPException(status_code=500, detail="Erreur lors de la concaténation des vidéos")
@@ -11354,7 +10572,7 @@ async def generate_guestbook_montage(
                     "-movflags", "+faststart",
                     str(output_file)
                 ]
-                result = subprocess.run(music_cmd, capture_output=True, text=True, timeout=300)
+                result = await run_ffmpeg(subprocess.run, music_cmd, capture_output=True, text=True, timeout=300)
                 if result.returncode != 0:
                     logging.error(f"FFmpeg music error: {result.stderr}")
                     # Fallback to video without music
@@ -11379,6 +10597,7 @@ async def generate_guestbook_montage(
             "client_id": client["id"],
             "video_count": len(video_files),
             "has_music": bool(music_url),
+            "stream_copy": stream_copy,
             "file_path": f"/uploads/guestbooks/{guestbook_id}/montages/montage_{montage_id}.mp4",
             "created_at": datetime.now(timezone.utc).isoformat()
         }
@@ -11622,7 +10841,7 @@ async def create_gallery_purchase(
     site_url = os.environ.get('SITE_URL', 'https://creativindustry.com')
     
     # Create PayPal payment
-    payment = paypalrestsdk.Payment({
+    payment = await site_paypal().create_payment({
         "intent": "sale",
         "payer": {"payment_method": "paypal"},
         "redirect_urls": {
@@ -11645,7 +10864,7 @@ async def create_gallery_purchase(
         "note_to_payer": f"Achat option galerie CREATIVINDUSTRY pour {client['email']}"
     })
     
-    if payment.create():
+    if payment.ok:
         # Store pending purchase
         purchase_record = {
             "id": str(uuid.uuid4()),
@@ -11663,11 +10882,7 @@ async def create_gallery_purchase(
         }
         await db.gallery_purchases.insert_one(purchase_record)
         
-        approval_url = None
-        for link in payment.links:
-            if link.rel == "approval_url":
-                approval_url = link.href
-                break
+        approval_url = payment.approval_url
         
         return {
             "success": True,
@@ -11702,9 +10917,9 @@ async def execute_gallery_payment(
         raise HTTPException(status_code=400, detail="Ce paiement a déjà été traité")
     
     # Execute PayPal payment
-    payment = paypalrestsdk.Payment.find(payment_id)
+    payment = await site_paypal().execute_payment(payment_id, payer_id)
     
-    if payment.execute({"payer_id": payer_id}):
+    if payment.ok:
         # Update purchase status
         await db.gallery_purchases.update_one(
             {"paypal_payment_id": payment_id},
@@ -11821,13 +11036,15 @@ async def download_gallery_hd(
     
     # Create ZIP in memory
     zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for photo in photos:
-            photo_url = photo.get("url", "")
-            file_path = UPLOADS_DIR / "galleries" / Path(photo_url).name
+    def build_hd_zip():
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for photo in photos:
+                photo_url = photo.get("url", "")
+                file_path = UPLOADS_DIR / "galleries" / Path(photo_url).name
             
-            if file_path.exists():
-                zip_file.write(file_path, photo.get("filename", file_path.name))
+                if file_path.exists():
+                    zip_file.write(file_path, photo.get("filename", file_path.name))
+    await run_cpu(build_hd_zip)
     
     zip_buffer.seek(0)
     gallery_name = gallery.get("name", "galerie").replace(" ", "_")
@@ -11880,8 +11097,8 @@ async def download_single_photo_hd(
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Fichier non trouvé")
     
-    return FileResponse(
-        path=str(file_path),
+    return deliver_file(
+        file_path,
         filename=photo.get("filename", file_path.name),
         media_type="image/jpeg"
     )
@@ -11944,7 +11161,7 @@ async def download_gallery_video(
                     "-q:v", "2",
                     str(resized_path)
                 ]
-                subprocess.run(resize_cmd, capture_output=True, timeout=30)
+                await run_ffmpeg(subprocess.run, resize_cmd, capture_output=True, timeout=30)
                 
                 if resized_path.exists():
                     valid_photos.append(resized_path)
@@ -11994,7 +11211,7 @@ async def download_gallery_video(
                 str(output_video)
             ]
         
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, timeout=300)
+        result = await run_ffmpeg(subprocess.run, ffmpeg_cmd, capture_output=True, timeout=300)
         
         if not output_video.exists():
             logging.error(f"FFmpeg error: {result.stderr.decode()}")
@@ -12168,9 +11385,10 @@ async def create_admin_slideshow(
         for i, photo in enumerate(photos):
             if photo.content_type and photo.content_type.startswith("image/"):
                 photo_path = temp_dir / f"photo_{i:04d}_orig.jpg"
-                with open(photo_path, "wb") as f:
-                    content = await photo.read()
-                    f.write(content)
+                try:
+                    await save_upload(photo, photo_path, max_size=MAX_IMAGE_SIZE, allowed_types=IMAGE_TYPES, dedupe=False)
+                except HTTPException:
+                    continue
                 
                 # Process photo: resize to 1920x1080 and apply effect
                 processed_path = temp_dir / f"photo_{i:04d}.jpg"
@@ -12187,7 +11405,7 @@ async def create_admin_slideshow(
                     "-q:v", "2",
                     str(processed_path)
                 ]
-                subprocess.run(resize_cmd, capture_output=True, timeout=30)
+                await run_ffmpeg(subprocess.run, resize_cmd, capture_output=True, timeout=30)
                 
                 if processed_path.exists():
                     valid_photos.append(processed_path)
@@ -12208,9 +11426,7 @@ async def create_admin_slideshow(
         music_path = None
         if music and music.filename:
             music_path = temp_dir / f"music{Path(music.filename).suffix}"
-            with open(music_path, "wb") as f:
-                content = await music.read()
-                f.write(content)
+            await save_upload(music, music_path, max_size=MAX_AUDIO_SIZE, dedupe=False)
         
         # Generate video
         video_duration = len(valid_photos) * duration
@@ -12239,7 +11455,7 @@ async def create_admin_slideshow(
                 str(output_video)
             ]
         
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, timeout=600)
+        result = await run_ffmpeg(subprocess.run, ffmpeg_cmd, capture_output=True, timeout=600)
         
         if not output_video.exists():
             logging.error(f"FFmpeg error: {result.stderr.decode()}")
@@ -12314,7 +11530,7 @@ async def send_sms_campaign(data: SMSCampaignRequest, admin: dict = Depends(get_
             no_phone += 1
             continue
         try:
-            success = send_sms(phone, data.message)
+            success = await run_io(send_sms, phone, data.message)
             if success:
                 sent += 1
             else:
@@ -12328,7 +11544,7 @@ async def send_sms_campaign(data: SMSCampaignRequest, admin: dict = Depends(get_
         for phone in data.extra_phones:
             if phone and phone.strip():
                 try:
-                    success = send_sms(phone.strip(), data.message)
+                    success = await run_io(send_sms, phone.strip(), data.message)
                     if success:
                         sent += 1
                     else:
@@ -12342,7 +11558,7 @@ async def send_sms_campaign(data: SMSCampaignRequest, admin: dict = Depends(get_
 @api_router.post("/admin/sms/test")
 async def test_sms_endpoint(data: SMSTestRequest, admin: dict = Depends(get_current_admin)):
     """Send a test SMS to verify Brevo configuration"""
-    result = send_test_sms(data.phone_number)
+    result = await run_io(send_test_sms, data.phone_number)
     return result
 
 @api_router.post("/admin/sms/send")
@@ -12350,7 +11566,7 @@ async def send_manual_sms(data: SMSManualRequest, admin: dict = Depends(get_curr
     """Send a manual SMS to a client"""
     from services.sms_service import send_sms
     
-    success = send_sms(data.phone_number, data.message)
+    success = await run_io(send_sms, data.phone_number, data.message)
     return {
         "success": success,
         "message": "SMS envoyé avec succès" if success else "Échec de l'envoi du SMS",
@@ -12370,7 +11586,7 @@ async def notify_client_sms(client_id: str, message: str = Body(..., embed=True)
     if not phone:
         raise HTTPException(status_code=400, detail="Ce client n'a pas de numéro de téléphone")
     
-    success = send_sms(phone, message)
+    success = await run_io(send_sms, phone, message)
     return {
         "success": success,
         "client_name": client.get("name"),
@@ -12399,6 +11615,7 @@ app.include_router(photofind_router, prefix="/api")
 app.include_router(galleries_router, prefix="/api")
 app.include_router(equipment_router, prefix="/api")
 app.include_router(videos_router, prefix="/api")
+app.include_router(media_router, prefix="/api")
 
 # Set admin dependency for modular routers
 set_appointments_admin(get_current_admin)
@@ -12419,6 +11636,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: times the whole request, including CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -12427,9 +11647,66 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    stop_scheduler()
-    client.close()
+    await stop_scheduler()
+    loop_monitor.stop_loop_monitor()
+    shutdown_executors()
+    await close_payment_gateways()
+    await chatbot.chatbot.close()
+    database.close_mongo_client()
 
 @app.on_event("startup")
 async def startup_event():
+    loop_monitor.start_loop_monitor()
+    try:
+        await scheduler_service.ensure_indexes()
+        await task_reminders.ensure_indexes(db)
+        backfilled = await task_reminders.backfill(db)
+        if backfilled:
+            logger.info(f"Materialized {backfilled} task reminder(s)")
+    except Exception as e:
+        logger.error(f"Scheduler indexes not created: {e}")
     start_scheduler()
+    try:
+        await photofind_analytics.ensure_indexes(db)
+        await ensure_photofind_purchase_indexes()
+    except Exception as e:
+        logger.error(f"PhotoFind indexes not created: {e}")
+    try:
+        await equipment_availability.ensure_indexes(db)
+        await equipment_availability.rebuild(db)
+    except Exception as e:
+        logger.error(f"Equipment availability index not built: {e}")
+    try:
+        await ensure_equipment_search_indexes()
+        await ensure_client_lookup_indexes()
+    except Exception as e:
+        logger.error(f"Search indexes not created: {e}")
+    try:
+        await story_views.ensure_indexes(db)
+        migrated = await story_views.migrate_legacy_views(db)
+        if migrated:
+            logger.info(f"Story view counters built for {migrated} stories")
+    except Exception as e:
+        logger.error(f"Story view counters not ready: {e}")
+    try:
+        await news_likes.ensure_indexes(db)
+        migrated = await news_likes.migrate_embedded_likes(db)
+        if migrated:
+            logger.info(f"Moved likes of {migrated} news post(s) to news_likes")
+    except Exception as e:
+        logger.error(f"News likes not migrated: {e}")
+    try:
+        await chatbot.ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Chat indexes not created: {e}")
+    try:
+        await guestbook_media.ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Guestbook media indexes not created: {e}")
+    try:
+        await client_lifecycle.ensure_indexes(db)
+        resumed = await client_lifecycle.resume_pending_jobs(db, UPLOADS_DIR)
+        if resumed:
+            logger.info(f"Resuming {resumed} client lifecycle job(s)")
+    except Exception as e:
+        logger.error(f"Client lifecycle jobs not resumed: {e}")
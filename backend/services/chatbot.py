@@ -0,0 +1,293 @@
+"""
+Assistant virtuel du site (chatbot public)
+- Réponse diffusée au fil de l'eau (SSE, /chat/stream) : les premiers mots s'affichent sans attendre la fin
+- Historique : seuls les CHATBOT_HISTORY_MESSAGES derniers messages de la session sont lus
+  (index session_id + created_at), au lieu de charger 50 messages pour en garder 10
+- Fournisseurs (CHATBOT_PROVIDER) :
+  "openai" : API compatible OpenAI en streaming (CHATBOT_API_KEY / CHATBOT_API_BASE / CHATBOT_MODEL),
+             un seul client httpx partagé (connexions keep-alive réutilisées)
+  "emergent" : emergentintegrations (EMERGENT_LLM_KEY) ; réponse en un bloc, un objet LlmChat
+             réutilisé par session (prompt système construit une seule fois par session)
+  "stub" : réponses locales déterministes, sans réseau (développement, tests)
+  "auto" (défaut) : openai si CHATBOT_API_KEY, sinon emergent si EMERGENT_LLM_KEY, sinon stub
+- Cache des questions fréquentes (tarifs, formules, réservation) : question reconnue par similarité
+  (trigrammes, indice de Jaccard >= CHATBOT_FAQ_SIMILARITY) -> réponse immédiate. Seules les réponses
+  rédigées de la FAQ y figurent : une réponse du modèle n'est jamais resservie à un autre visiteur
+- Erreur du fournisseur ou de la base : message de repli, jamais d'erreur 500 ni de flux interrompu
+"""
+
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from services.search_index import normalize, trigrams
+
+PROVIDER = os.environ.get("CHATBOT_PROVIDER", "auto").lower()
+API_KEY = os.environ.get("CHATBOT_API_KEY", "")
+API_BASE = os.environ.get("CHATBOT_API_BASE", "https://api.openai.com/v1").rstrip("/")
+MODEL = os.environ.get("CHATBOT_MODEL", "gpt-4o")
+EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY", "")
+HTTP_TIMEOUT = float(os.environ.get("CHATBOT_HTTP_TIMEOUT", "60"))
+
+HISTORY_MESSAGES = int(os.environ.get("CHATBOT_HISTORY_MESSAGES", "10"))
+FAQ_SIMILARITY = float(os.environ.get("CHATBOT_FAQ_SIMILARITY", "0.6"))
+# Objets de session gardés en mémoire (fournisseur emergent)
+MAX_SESSIONS = int(os.environ.get("CHATBOT_MAX_SESSIONS", "500"))
+
+SYSTEM_PROMPT = """Tu es l'assistant virtuel de CREATIVINDUSTRY France, un studio de production créative spécialisé dans :
+- La photographie et vidéographie de mariage
+- Les studios podcast
+- Les plateaux TV
+
+Tu dois répondre en français de manière professionnelle et chaleureuse.
+Tu aides les visiteurs à :
+- Comprendre nos services et tarifs
+- Les orienter vers la bonne formule
+- Répondre aux questions sur le processus de réservation
+- Donner des informations sur le studio
+
+Services principaux :
+- Mariages : Formules de 1500€ à 4500€ (Essentielle, Complète, Premium)
+- Podcast : Location studio de 150€/h à 700€/jour
+- Plateau TV : De 800€ à 3500€ selon les besoins
+
+Si tu ne sais pas répondre à une question spécifique, invite le visiteur à nous contacter directement ou à demander un devis personnalisé."""
+
+FALLBACK_MESSAGE = ("Désolé, je rencontre un problème technique. Veuillez nous contacter directement au "
+                    "+33 1 23 45 67 89 ou par email à contact@creativindustry.fr")
+
+# Questions fréquentes : (formulations, réponse)
+FAQ = [
+    (["quels sont vos tarifs", "combien ca coute", "quels sont vos prix", "combien coutent vos prestations"],
+     "Nos tarifs dépendent de la prestation : mariages de 1500€ à 4500€ selon la formule (Essentielle, "
+     "Complète, Premium), studio podcast de 150€/h à 700€/jour, plateau TV de 800€ à 3500€ selon vos besoins. "
+     "Pour un chiffrage précis, n'hésitez pas à demander un devis personnalisé !"),
+    (["quel est le prix d un mariage", "combien coute un mariage", "tarif mariage", "prix photographe mariage"],
+     "Nos formules mariage vont de 1500€ à 4500€ : Essentielle, Complète et Premium, selon la durée de "
+     "couverture et les livrables (photo, vidéo). Demandez un devis personnalisé pour votre date !"),
+    (["quelles sont vos formules", "quelle formule choisir", "quelles formules mariage proposez vous"],
+     "Pour les mariages, nous proposons trois formules : Essentielle, Complète et Premium (de 1500€ à 4500€). "
+     "Dites-moi ce qui compte le plus pour vous (photo, vidéo, durée de la journée) et je vous oriente !"),
+    (["combien coute le studio podcast", "tarif studio podcast", "prix location studio podcast"],
+     "Le studio podcast se loue de 150€/h à 700€/jour, équipement et accompagnement technique compris."),
+    (["tarif plateau tv", "combien coute un plateau tv", "prix plateau tv"],
+     "Nos plateaux TV vont de 800€ à 3500€ selon la configuration (caméras, régie, équipe). "
+     "Un devis personnalisé vous donnera le tarif exact."),
+    (["comment reserver", "comment faire une reservation", "comment prendre rendez vous", "reserver une date"],
+     "Pour réserver, choisissez votre prestation sur le site et demandez un devis ou un rendez-vous : "
+     "nous revenons vers vous rapidement pour confirmer la date. Vous pouvez aussi nous appeler au +33 1 23 45 67 89."),
+]
+
+
+def _grams(text: str) -> frozenset:
+    """Trigrammes de la question normalisée (accents, casse et ponctuation ignorés)"""
+    normalized = f" {normalize(text)} "
+    return frozenset(trigrams(normalized))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class AnswerCache:
+    """Réponses de la FAQ indexées par les trigrammes de chaque formulation ;
+    une question proche donne la même réponse. Contenu figé : rien n'y est ajouté à l'exécution."""
+
+    def __init__(self, threshold: float = None, faq=FAQ):
+        self.threshold = FAQ_SIMILARITY if threshold is None else threshold
+        self._faq = [(_grams(q), answer) for questions, answer in faq for q in questions]
+
+    def lookup(self, question: str) -> Optional[str]:
+        grams = _grams(question)
+        best, best_score = None, self.threshold
+        for key, answer in self._faq:
+            score = similarity(grams, key)
+            if score >= best_score:
+                best, best_score = answer, score
+        return best
+
+
+# ==================== FOURNISSEURS ====================
+
+class StubProvider:
+    """Réponse locale, diffusée mot par mot (aucun appel réseau)"""
+
+    name = "stub"
+
+    async def stream(self, session_id: str, history: list, message: str) -> AsyncIterator[str]:
+        reply = (f"Merci pour votre message ({len(history)} message(s) de contexte). "
+                 "Pour une réponse détaillée, contactez-nous ou demandez un devis personnalisé.")
+        for i, word in enumerate(reply.split(" ")):
+            yield word if i == 0 else f" {word}"
+
+
+class OpenAIProvider:
+    """API Chat Completions compatible OpenAI, en streaming"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, base_url: str = API_BASE, model: str = MODEL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self._client = None
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=HTTP_TIMEOUT)
+        return self._client
+
+    async def stream(self, session_id: str, history: list, message: str) -> AsyncIterator[str]:
+        payload = {
+            "model": self.model,
+            "stream": True,
+            "messages": [{"role": "system", "content": SYSTEM_PROMPT}, *history, {"role": "user", "content": message}]
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        async with self.client().stream("POST", f"{self.base_url}/chat/completions", json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class EmergentProvider:
+    """emergentintegrations : réponse complète en un bloc ; un LlmChat par session, réutilisé"""
+
+    name = "emergent"
+
+    def __init__(self, api_key: str, model: str = MODEL):
+        self.api_key = api_key
+        self.model = model
+        self._sessions = OrderedDict()
+
+    def _session(self, session_id: str):
+        from emergentintegrations.llm.chat import LlmChat
+
+        chat = self._sessions.get(session_id)
+        if chat is None:
+            chat = LlmChat(
+                api_key=self.api_key,
+                session_id=session_id,
+                system_message=SYSTEM_PROMPT
+            ).with_model("openai", self.model)
+            self._sessions[session_id] = chat
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > MAX_SESSIONS:
+            self._sessions.popitem(last=False)
+        return chat
+
+    async def stream(self, session_id: str, history: list, message: str) -> AsyncIterator[str]:
+        from emergentintegrations.llm.chat import UserMessage
+
+        # L'objet LlmChat de la session garde lui-même le fil de la conversation
+        chat = self._session(session_id)
+        yield await chat.send_message(UserMessage(text=message))
+
+
+def make_provider(name: str = None):
+    name = (name or PROVIDER).lower()
+    if name == "auto":
+        name = "openai" if API_KEY else "emergent" if EMERGENT_LLM_KEY else "stub"
+    if name == "openai":
+        return OpenAIProvider(API_KEY)
+    if name == "emergent":
+        return EmergentProvider(EMERGENT_LLM_KEY)
+    return StubProvider()
+
+
+# ==================== CONVERSATION ====================
+
+class Chatbot:
+    """Historique fenêtré, cache FAQ et fournisseur partagés par toutes les requêtes du processus"""
+
+    def __init__(self, provider=None, cache: AnswerCache = None):
+        self.provider = provider or make_provider()
+        self.cache = cache or AnswerCache()
+
+    async def history(self, db, session_id: str, limit: int = None) -> list:
+        """Les `limit` derniers messages de la session, du plus ancien au plus récent"""
+        messages = await db.chat_messages.find(
+            {"session_id": session_id}, {"_id": 0, "role": 1, "content": 1}
+        ).sort("created_at", -1).limit(limit or HISTORY_MESSAGES).to_list(limit or HISTORY_MESSAGES)
+        return [{"role": m["role"], "content": m["content"]} for m in reversed(messages)]
+
+    async def reply(self, db, session_id: str, message: str) -> AsyncIterator[dict]:
+        """Événements de la réponse : {"delta": texte}... puis {"done": True, "response", "cached"}.
+        Les deux messages sont enregistrés dans chat_messages."""
+        cached = self.cache.lookup(message)
+        parts = []
+        try:
+            history = await self.history(db, session_id)
+            await _save(db, session_id, "user", message)
+
+            if cached:
+                parts.append(cached)
+                yield {"delta": cached}
+                await _save(db, session_id, "assistant", cached)
+                yield {"done": True, "response": cached, "cached": True}
+                return
+
+            async for delta in self.provider.stream(session_id, history, message):
+                parts.append(delta)
+                yield {"delta": delta}
+            response = "".join(parts)
+            await _save(db, session_id, "assistant", response)
+        except Exception as e:
+            logging.error(f"Chat error: {str(e)}")
+            if not parts:
+                parts = [FALLBACK_MESSAGE]
+                yield {"delta": FALLBACK_MESSAGE}
+            response = "".join(parts)
+            yield {"done": True, "response": response, "cached": False, "error": True}
+            return
+
+        yield {"done": True, "response": response, "cached": False}
+
+    async def close(self):
+        close = getattr(self.provider, "close", None)
+        if close:
+            await close()
+
+
+async def _save(db, session_id: str, role: str, content: str):
+    await db.chat_messages.insert_one({
+        "id": str(uuid.uuid4()),
+        "session_id": session_id,
+        "role": role,
+        "content": content,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    })
+
+
+async def ensure_indexes(db):
+    await db.chat_messages.create_index([("session_id", 1), ("created_at", -1)])
+
+
+def sse(event: dict) -> str:
+    """Événement Server-Sent Events ("done" pour le dernier, "message" sinon)"""
+    name = "done" if event.get("done") else "message"
+    return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+chatbot = Chatbot()
@@ -0,0 +1,405 @@
+"""
+Cycle de vie des comptes clients (archivage des comptes expirés, suppression complète)
+- Les comptes expirés sont sélectionnés par une requête indexée sur expires_at
+- Le travail est découpé en lots et exécuté en tâche de fond (job persistant dans Mongo)
+- Déplacements / suppressions de fichiers dans le pool "io" partagé (services/executors.py)
+- Nettoyage base : une opération groupée ($in) par collection et par lot
+- Les PDF du client en cache (devis, factures) sont supprimés avec ses fichiers
+- Progression enregistrée après chaque lot : un job interrompu reprend là où il s'était arrêté
+- Un job "running" appartient au processus qui l'a pris (owner) tant que son bail (lease_until) est
+  renouvelé ; le bail est prolongé pendant l'exécution d'un lot, si long soit-il, et un autre worker
+  ne reprend le job qu'après son expiration
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from pymongo import ReplaceOne
+
+from services.executors import run_io
+from services.pdf_service import purge_client_pdfs
+
+JOBS_COLLECTION = "client_lifecycle_jobs"
+
+BATCH_SIZE = int(os.environ.get("LIFECYCLE_BATCH_SIZE", "25"))
+# Bail d'un job "running", renouvelé toutes les LEASE_SECONDS / 3 : expiré, le job est considéré interrompu
+LEASE_SECONDS = int(os.environ.get("LIFECYCLE_STALE_SECONDS", "300"))
+
+CLIENT_FILE_TYPES = ["music", "documents", "photos", "videos"]
+
+# Collections nettoyées pour chaque action : (collection, champ client)
+ARCHIVE_COLLECTIONS = [
+    ("client_transfers", "client_id"),
+    ("client_files", "client_id"),
+    ("client_devis", "client_id"),
+    ("client_invoices", "client_id"),
+    ("client_payments", "client_id"),
+    ("extension_orders", "client_id"),
+]
+DELETE_COLLECTIONS = [
+    ("client_transfers", "client_id"),
+    ("client_files", "client_id"),
+    ("client_devis", "client_id"),
+    ("client_invoices", "client_id"),
+    ("client_payments", "client_id"),
+    ("file_downloads", "client_id"),
+    ("user_activity", "user_id"),
+    ("gallery_selections", "client_id"),
+    ("galleries", "client_id"),
+]
+
+_running_tasks = {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def ensure_indexes(db):
+    """Index utilisés par la sélection des comptes expirés et le suivi des jobs"""
+    await db.clients.create_index("expires_at")
+    await db[JOBS_COLLECTION].create_index("id", unique=True)
+    await db[JOBS_COLLECTION].create_index([("status", 1), ("updated_at", 1)])
+    await db.archived_clients.create_index("id")
+
+
+async def find_expired_client_ids(db, now: datetime = None) -> list:
+    """IDs des clients dont expires_at est dépassé (chaînes ISO, comparaison lexicographique)"""
+    now_iso = (now or datetime.now(timezone.utc)).isoformat()
+    cursor = db.clients.find({"expires_at": {"$gt": "", "$lte": now_iso}}, {"_id": 0, "id": 1})
+    return [c["id"] async for c in cursor]
+
+
+# ==================== FILE OPERATIONS (thread pool) ====================
+
+def _move_contents(src: Path, dest: Path):
+    """Déplace le contenu de src dans dest (idempotent : ne fait rien si src n'existe plus)"""
+    if not src.exists():
+        return
+    if not dest.exists():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(src), str(dest))
+        return
+    for item in src.iterdir():
+        shutil.move(str(item), str(dest / item.name))
+    src.rmdir()
+
+
+def archive_folder_for(archives_dir: Path, client: dict) -> Path:
+    client_name = (client.get("name") or "unknown").replace(" ", "_")
+    return archives_dir / f"archive_{client_name}_{client['id'][:8]}"
+
+
+def archive_client_files(uploads_dir: Path, client: dict, archived_at: str) -> str:
+    """Déplace les fichiers d'un client vers uploads/archives et écrit metadata.json"""
+    client_id = client["id"]
+    archive_folder = archive_folder_for(uploads_dir / "archives", client)
+    archive_folder.mkdir(parents=True, exist_ok=True)
+
+    for file_type in CLIENT_FILE_TYPES:
+        _move_contents(uploads_dir / "client_transfers" / file_type / client_id, archive_folder / file_type)
+    _move_contents(uploads_dir / "clients" / client_id, archive_folder / "uploads")
+    purge_client_pdfs(client_id)
+
+    archive_metadata = {
+        "client_id": client_id,
+        "client_name": client.get("name"),
+        "client_email": client.get("email", "unknown"),
+        "archived_at": archived_at,
+        "original_expires_at": client.get("expires_at")
+    }
+    with open(archive_folder / "metadata.json", "w") as f:
+        json.dump(archive_metadata, f, indent=2)
+    return str(archive_folder)
+
+
+def delete_client_files(uploads_dir: Path, client_id: str, gallery_ids: list) -> int:
+    """Supprime les dossiers d'un client et de ses galeries, retourne le nombre de dossiers supprimés"""
+    folders = [uploads_dir / "client_transfers" / file_type / client_id for file_type in CLIENT_FILE_TYPES]
+    folders.append(uploads_dir / "clients" / client_id)
+    folders.extend(uploads_dir / "galleries" / gallery_id for gallery_id in gallery_ids if gallery_id)
+
+    removed = 0
+    for folder in folders:
+        if folder.exists():
+            shutil.rmtree(folder)
+            removed += 1
+            logging.info(f"Deleted folder: {folder}")
+    purge_client_pdfs(client_id)
+    return removed
+
+
+# ==================== BATCH PROCESSING ====================
+
+async def _archive_batch(db, uploads_dir: Path, client_ids: list, counts: dict) -> tuple:
+    """Archive un lot de clients, retourne (ids traités, erreurs)"""
+    archived_at = _now()
+    clients = await db.clients.find({"id": {"$in": client_ids}}, {"_id": 0}).to_list(len(client_ids))
+    found = {c["id"] for c in clients}
+    # Reprise : les clients déjà retirés de db.clients ont leur instantané dans archived_clients
+    missing = [cid for cid in client_ids if cid not in found]
+    if missing:
+        clients += await db.archived_clients.find({"id": {"$in": missing}}, {"_id": 0}).to_list(len(missing))
+
+    # 1. Instantané du compte avant toute opération destructive
+    snapshots = []
+    for client in clients:
+        snapshot = {k: v for k, v in client.items() if k not in ("archived_at", "archive_path")}
+        snapshot["archived_at"] = client.get("archived_at") or archived_at
+        snapshot["archive_path"] = str(archive_folder_for(uploads_dir / "archives", client))
+        snapshots.append(ReplaceOne({"id": client["id"]}, snapshot, upsert=True))
+    if snapshots:
+        await db.archived_clients.bulk_write(snapshots, ordered=False)
+
+    # 2. Fichiers, en parallèle dans le pool
+    results = await asyncio.gather(
+        *[run_io(archive_client_files, uploads_dir, client, archived_at) for client in clients],
+        return_exceptions=True
+    )
+    done, errors = [], []
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            errors.append(f"Error archiving {client.get('email', client['id'])}: {result}")
+            logging.error(f"Error archiving client {client['id']}: {result}")
+        else:
+            done.append(client["id"])
+            logging.info(f"Archived expired client: {client.get('email')} to {result}")
+
+    # 3. Base de données : une requête groupée par collection
+    if done:
+        await _delete_records(db, ARCHIVE_COLLECTIONS, done, counts)
+    # Clients introuvables partout : rien à faire, on les considère traités
+    done += [cid for cid in missing if cid not in {c["id"] for c in clients}]
+    return done, errors
+
+
+async def _delete_batch(db, uploads_dir: Path, client_ids: list, counts: dict) -> tuple:
+    """Supprime définitivement un lot de clients, retourne (ids traités, erreurs)"""
+    galleries = await db.galleries.find(
+        {"client_id": {"$in": client_ids}}, {"_id": 0, "id": 1, "client_id": 1}
+    ).to_list(None)
+    gallery_ids = {}
+    for gallery in galleries:
+        gallery_ids.setdefault(gallery["client_id"], []).append(gallery.get("id"))
+
+    results = await asyncio.gather(
+        *[run_io(delete_client_files, uploads_dir, cid, gallery_ids.get(cid, [])) for cid in client_ids],
+        return_exceptions=True
+    )
+    done, errors = [], []
+    for client_id, result in zip(client_ids, results):
+        if isinstance(result, Exception):
+            errors.append(f"Error deleting files of {client_id}: {result}")
+            logging.error(f"Error deleting files of client {client_id}: {result}")
+        else:
+            done.append(client_id)
+            counts["folders"] = counts.get("folders", 0) + result
+
+    if done:
+        await _delete_records(db, DELETE_COLLECTIONS, done, counts)
+    return done, errors
+
+
+async def _delete_records(db, collections: list, client_ids: list, counts: dict):
+    for name, field in collections:
+        result = await db[name].delete_many({field: {"$in": client_ids}})
+        counts[name] = counts.get(name, 0) + result.deleted_count
+    result = await db.chat_messages.delete_many(
+        {"conversation_id": {"$in": [f"client_{cid}" for cid in client_ids]}}
+    )
+    counts["chat_messages"] = counts.get("chat_messages", 0) + result.deleted_count
+    result = await db.clients.delete_many({"id": {"$in": client_ids}})
+    counts["clients"] = counts.get("clients", 0) + result.deleted_count
+
+
+BATCH_HANDLERS = {
+    "archive": _archive_batch,
+    "delete": _delete_batch,
+}
+
+
+# ==================== JOBS ====================
+
+async def create_job(db, uploads_dir: Path, action: str, client_ids: list, started_by: str = None) -> dict:
+    """Enregistre un job et lance son exécution en tâche de fond"""
+    if action not in BATCH_HANDLERS:
+        raise ValueError(f"Unknown lifecycle action: {action}")
+    now = _now()
+    job = {
+        "id": str(uuid.uuid4()),
+        "action": action,
+        "status": "pending",
+        "client_ids": list(client_ids),
+        "done_ids": [],
+        "failed_ids": [],
+        "errors": [],
+        "total": len(client_ids),
+        "processed": 0,
+        "counts": {},
+        "started_by": started_by,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None
+    }
+    await db[JOBS_COLLECTION].insert_one(job)
+    job.pop("_id", None)
+    start_job(db, uploads_dir, job["id"])
+    return job
+
+
+def start_job(db, uploads_dir: Path, job_id: str, resume: bool = False) -> asyncio.Task:
+    """Lance (ou retourne) la tâche d'exécution d'un job dans ce processus"""
+    task = _running_tasks.get(job_id)
+    if task is None or task.done():
+        task = asyncio.create_task(run_job(db, uploads_dir, job_id, resume=resume))
+        _running_tasks[job_id] = task
+        task.add_done_callback(lambda _t: _running_tasks.pop(job_id, None))
+    return task
+
+
+def _lease_until() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)).isoformat()
+
+
+async def _claim_job(db, job_id: str, owner: str):
+    """Passe le job en 'running' pour `owner` si personne d'autre ne le traite (reprise multi-process sûre)"""
+    now = datetime.now(timezone.utc)
+    stale = (now - timedelta(seconds=LEASE_SECONDS)).isoformat()
+    return await db[JOBS_COLLECTION].find_one_and_update(
+        {"id": job_id, "$or": [
+            {"status": "pending"},
+            {"status": "running", "lease_until": {"$lt": now.isoformat()}},
+            # Jobs pris avant l'introduction du bail
+            {"status": "running", "lease_until": {"$exists": False}, "updated_at": {"$lt": stale}}
+        ]},
+        {"$set": {"status": "running", "owner": owner, "lease_until": _lease_until(), "updated_at": _now()}},
+        projection={"_id": 0}
+    )
+
+
+async def _renew_lease(db, job_id: str, owner: str, lost: asyncio.Event):
+    """Prolonge le bail tant que le job tourne ; signale `lost` s'il a été repris ailleurs"""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        try:
+            result = await db[JOBS_COLLECTION].update_one(
+                {"id": job_id, "owner": owner, "status": "running"},
+                {"$set": {"lease_until": _lease_until()}}
+            )
+        except Exception as e:
+            logging.warning(f"Lifecycle job {job_id}: lease not renewed: {e}")
+            continue
+        if result.matched_count == 0:
+            lost.set()
+            return
+
+
+async def run_job(db, uploads_dir: Path, job_id: str, resume: bool = False):
+    """Exécute un job lot par lot en enregistrant la progression après chaque lot
+
+    En reprise, un job encore marqué 'running' est repris dès que son bail a expiré
+    (son ancien processus est arrêté : il ne le renouvelle plus).
+    """
+    owner = uuid.uuid4().hex
+    job = await _claim_job(db, job_id, owner)
+    while not job and resume:
+        current = await get_job(db, job_id)
+        if not current or current["status"] not in ("pending", "running"):
+            return
+        await asyncio.sleep(min(60, LEASE_SECONDS))
+        job = await _claim_job(db, job_id, owner)
+    if not job:
+        return
+    handler = BATCH_HANDLERS[job["action"]]
+    finished = set(job.get("done_ids", [])) | set(job.get("failed_ids", []))
+    remaining = [cid for cid in job["client_ids"] if cid not in finished]
+    lost = asyncio.Event()
+    heartbeat = asyncio.create_task(_renew_lease(db, job_id, owner, lost))
+
+    try:
+        for batch in _chunks(remaining, BATCH_SIZE):
+            if lost.is_set():
+                logging.warning(f"Lifecycle job {job_id}: lease lost, left to its new owner")
+                return
+            counts = {}
+            done, errors = await handler(db, uploads_dir, batch, counts)
+            failed = [cid for cid in batch if cid not in set(done)]
+            progress = await db[JOBS_COLLECTION].update_one(
+                {"id": job_id, "owner": owner},
+                {
+                    "$push": {
+                        "done_ids": {"$each": done},
+                        "failed_ids": {"$each": failed},
+                        "errors": {"$each": errors}
+                    },
+                    "$inc": {
+                        "processed": len(batch),
+                        **{f"counts.{name}": value for name, value in counts.items()}
+                    },
+                    "$set": {"updated_at": _now()}
+                }
+            )
+            if progress.matched_count == 0:
+                logging.warning(f"Lifecycle job {job_id}: lease lost, left to its new owner")
+                return
+        status = "completed"
+    except Exception as e:
+        logging.error(f"Lifecycle job {job_id} failed: {e}")
+        await db[JOBS_COLLECTION].update_one(
+            {"id": job_id, "owner": owner},
+            {"$push": {"errors": str(e)}, "$set": {"status": "failed", "updated_at": _now()}}
+        )
+        return
+    finally:
+        heartbeat.cancel()
+
+    await db[JOBS_COLLECTION].update_one(
+        {"id": job_id, "owner": owner},
+        {"$set": {"status": status, "updated_at": _now(), "finished_at": _now()}}
+    )
+    logging.info(f"Lifecycle job {job_id} ({job['action']}) completed: {len(remaining)} client(s)")
+
+
+async def wait_for_job(db, job_id: str, timeout: float) -> dict:
+    """Attend la fin d'un job au plus `timeout` secondes, puis retourne son état"""
+    task = _running_tasks.get(job_id)
+    if task is not None:
+        await asyncio.wait({task}, timeout=timeout)
+    return await get_job(db, job_id)
+
+
+async def get_job(db, job_id: str) -> dict:
+    return await db[JOBS_COLLECTION].find_one({"id": job_id}, {"_id": 0})
+
+
+async def list_jobs(db, limit: int = 20) -> list:
+    return await db[JOBS_COLLECTION].find(
+        {}, {"_id": 0, "client_ids": 0, "done_ids": 0, "failed_ids": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+
+
+async def find_active_job(db, action: str):
+    return await db[JOBS_COLLECTION].find_one(
+        {"action": action, "status": {"$in": ["pending", "running"]}}, {"_id": 0}
+    )
+
+
+async def resume_pending_jobs(db, uploads_dir: Path) -> int:
+    """Relance au démarrage les jobs interrompus (arrêt du serveur pendant un archivage)"""
+    jobs = await db[JOBS_COLLECTION].find(
+        {"status": {"$in": ["pending", "running"]}}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    for job in jobs:
+        start_job(db, uploads_dir, job["id"], resume=True)
+    return len(jobs)
@@ -0,0 +1,131 @@
+"""
+Tableaux de bord agrégés (accueil admin, matériel, tâches)
+- Chaque tableau de bord = une agrégation $facet par collection (tous les compteurs en un seul
+  passage), les collections étant interrogées en parallèle (asyncio.gather)
+- Résultat gardé en cache DASHBOARD_CACHE_SECONDS secondes, et invalidé dès qu'une écriture touche
+  une des collections utilisées (database.write_tracker, y compris les écritures hors de ces routes)
+- Le cache est propre au processus : avec plusieurs workers, un écart d'au plus la durée du cache
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+from database import db, write_tracker
+
+CACHE_SECONDS = float(os.environ.get("DASHBOARD_CACHE_SECONDS", "30"))
+
+EQUIPMENT_CONDITIONS = ["neuf", "bon", "usé", "à_réparer", "hors_service"]
+
+
+async def facet_counts(collection, facets: dict) -> dict:
+    """Compte les documents de chaque filtre de `facets` ({nom: filtre}) en une seule agrégation"""
+    pipeline = [{"$facet": {
+        name: [{"$match": query}, {"$count": "n"}] for name, query in facets.items()
+    }}]
+    rows = await collection.aggregate(pipeline).to_list(1)
+    row = rows[0] if rows else {}
+    return {name: row[name][0]["n"] if row.get(name) else 0 for name in facets}
+
+
+class DashboardCache:
+    """Cache (clé -> valeur) valide tant que le délai court et que les collections n'ont pas été modifiées"""
+
+    def __init__(self, ttl: float = None):
+        self.ttl = CACHE_SECONDS if ttl is None else ttl
+        self._entries = {}
+        self._locks = {}
+
+    def invalidate(self):
+        self._entries.clear()
+
+    async def get(self, key: str, collections: tuple, compute):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic() and entry[1] == write_tracker.versions(*collections):
+            return entry[2]
+        # Un seul calcul à la fois par tableau de bord : les requêtes simultanées attendent son résultat
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            versions = write_tracker.versions(*collections)
+            if entry and entry[0] > time.monotonic() and entry[1] == versions:
+                return entry[2]
+            value = await compute()
+            self._entries[key] = (time.monotonic() + self.ttl, versions, value)
+            return value
+
+
+cache = DashboardCache()
+
+
+# ==================== DASHBOARDS ====================
+
+async def _admin_stats() -> dict:
+    bookings, contacts, services, quotes = await asyncio.gather(
+        facet_counts(db.bookings, {
+            "total": {},
+            "pending": {"status": "pending"},
+            "confirmed": {"status": "confirmed"},
+        }),
+        facet_counts(db.contacts, {"unread": {"is_read": False}}),
+        facet_counts(db.services, {"active": {"is_active": True}}),
+        facet_counts(db.wedding_quotes, {"pending": {"status": "pending"}}),
+    )
+    return {
+        "total_bookings": bookings["total"],
+        "pending_bookings": bookings["pending"],
+        "confirmed_bookings": bookings["confirmed"],
+        "unread_messages": contacts["unread"],
+        "total_services": services["active"],
+        "pending_quotes": quotes["pending"]
+    }
+
+
+async def admin_stats() -> dict:
+    """Compteurs de l'accueil admin (/stats)"""
+    return await cache.get("admin", ("bookings", "contacts", "services", "wedding_quotes"), _admin_stats)
+
+
+async def _equipment_stats() -> dict:
+    equipment, deployments, reminders = await asyncio.gather(
+        facet_counts(db.equipment, {
+            "total": {},
+            "available": {"is_available": True},
+            "in_deployment": {"is_available": False},
+            **{f"condition:{condition}": {"condition": condition} for condition in EQUIPMENT_CONDITIONS},
+        }),
+        facet_counts(db.deployments, {"active": {"status": {"$in": ["planned", "in_progress"]}}}),
+        facet_counts(db.equipment_reminders, {"unresolved": {"resolved": False}}),
+    )
+    return {
+        "total_equipment": equipment["total"],
+        "available": equipment["available"],
+        "in_deployment": equipment["in_deployment"],
+        "by_condition": {condition: equipment[f"condition:{condition}"] for condition in EQUIPMENT_CONDITIONS},
+        "active_deployments": deployments["active"],
+        "unresolved_reminders": reminders["unresolved"]
+    }
+
+
+async def equipment_stats() -> dict:
+    """Statistiques du matériel (/equipment/stats)"""
+    return await cache.get("equipment", ("equipment", "deployments", "equipment_reminders"), _equipment_stats)
+
+
+async def tasks_stats() -> dict:
+    """Statistiques des tâches (/tasks/stats/overview) ; la clé de cache change avec la date du jour"""
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    open_tasks = {"status": {"$ne": "completed"}}
+
+    async def compute():
+        return await facet_counts(db.tasks, {
+            "total": {},
+            "pending": {"status": "pending"},
+            "in_progress": {"status": "in_progress"},
+            "completed": {"status": "completed"},
+            "overdue": {**open_tasks, "due_date": {"$lt": today}},
+            "due_today": {**open_tasks, "due_date": today},
+            "high_priority": {**open_tasks, "priority": "high"},
+        })
+
+    return await cache.get(f"tasks:{today}", ("tasks",), compute)
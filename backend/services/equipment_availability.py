@@ -0,0 +1,387 @@
+"""
+Disponibilité du matériel par période (déplacements planifiés et en cours)
+- Index en mémoire : pour chaque équipement, les réservations (déplacement, début, fin, quantité)
+  forment une fonction en escalier de la quantité réservée, stockée sur des bornes triées avec un
+  arbre de segments (maximum) : "quantité maximale réservée entre début et fin" en O(log n)
+- Reconstruit depuis la collection deployments au démarrage, puis tenu à jour par les routes
+  (création, modification, démarrage, retour, suppression)
+- Plusieurs workers uvicorn : chaque écriture incrémente un numéro de version dans Mongo
+  (availability_versions) ; avant chaque vérification, un worker dont l'index est d'une autre
+  version le reconstruit. Reconstruit aussi s'il a plus de AVAILABILITY_REBUILD_SECONDS
+  (modifications hors API)
+- Dates : "YYYY-MM-DD" (journée entière, date de fin incluse) ou ISO avec heure (instant exact)
+- Sans date de fin : un jour pour un déplacement planifié, ouvert jusqu'au retour s'il est en cours
+- Un article ne réserve plus rien une fois rendu (ou déclaré perdu, volé, endommagé)
+- Capacité d'un équipement : son champ quantity, 0 s'il est hors service ou à réparer
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+ACTIVE_STATUSES = ["planned", "in_progress"]
+RELEASED_RETURN_STATUSES = ("returned", "lost", "stolen", "damaged")
+UNAVAILABLE_CONDITIONS = ("hors_service", "à_réparer")
+REBUILD_SECONDS = int(os.environ.get("AVAILABILITY_REBUILD_SECONDS", "300"))
+
+VERSION_COLLECTION = "availability_versions"
+VERSION_ID = "deployments"
+
+OPEN_END = datetime.max.replace(tzinfo=timezone.utc)
+DEPLOYMENT_FIELDS = {"_id": 0, "id": 1, "name": 1, "status": 1, "start_date": 1, "end_date": 1, "items": 1}
+
+logger = logging.getLogger(__name__)
+
+
+def parse_date(value) -> Optional[datetime]:
+    """Datetime UTC d'une date ou d'un instant ISO (None si vide ou illisible)"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _is_date_only(value) -> bool:
+    return isinstance(value, str) and len(value) == 10
+
+
+def reservation_window(start_date, end_date, open_ended: bool = False):
+    """(début, fin exclue) d'une période ; None si la date de début est invalide"""
+    start = parse_date(start_date)
+    if start is None:
+        return None
+    end = parse_date(end_date)
+    if end is None:
+        end = OPEN_END if open_ended else start + timedelta(days=1)
+    elif _is_date_only(end_date):
+        end = end + timedelta(days=1)
+    if end <= start:
+        end = start + timedelta(days=1)
+    return start, end
+
+
+def reserved_items(deployment: dict) -> dict:
+    """Quantités encore réservées par un déplacement, par équipement"""
+    if deployment.get("status", "planned") not in ACTIVE_STATUSES:
+        return {}
+    quantities = {}
+    for item in deployment.get("items") or []:
+        if item.get("return_status") in RELEASED_RETURN_STATUSES:
+            continue
+        equipment_id = item.get("equipment_id")
+        if equipment_id:
+            quantities[equipment_id] = quantities.get(equipment_id, 0) + max(int(item.get("quantity") or 1), 0)
+    return quantities
+
+
+_EMPTY = (0, float("-inf"))
+
+
+def _combine(left: tuple, right: tuple) -> tuple:
+    return left[0] + right[0], max(left[1], left[0] + right[1])
+
+
+class ItemTimeline:
+    """Réservations d'un équipement : variations de quantité aux bornes triées + arbre de segments
+
+    Chaque feuille porte la variation de quantité réservée à une borne ; chaque nœud garde
+    (somme, plus grande somme préfixe) de ses feuilles. La quantité réservée sur [times[i], times[i + 1])
+    est la somme des variations 0..i : le maximum sur une période est une requête en O(log n), et
+    retirer un déplacement revient à deux mises à jour ponctuelles (début, fin).
+    """
+
+    def __init__(self):
+        self.reservations = {}   # deployment_id -> (start, end, quantity)
+        self._times = []
+        self._size = 0
+        self._tree = []
+
+    def set(self, deployment_id: str, start: datetime, end: datetime, quantity: int, rebuild: bool = True):
+        self.reservations[deployment_id] = (start, end, quantity)
+        if rebuild:
+            self.rebuild()
+
+    def discard(self, deployment_id: str):
+        if self.reservations.pop(deployment_id, None) is not None:
+            self.rebuild()
+
+    def rebuild(self):
+        deltas = {}
+        for start, end, quantity in self.reservations.values():
+            deltas[start] = deltas.get(start, 0) + quantity
+            deltas[end] = deltas.get(end, 0) - quantity
+        self._times = sorted(deltas)
+        size = 1
+        while size < len(self._times):
+            size *= 2
+        self._size = size
+        self._tree = [_EMPTY] * size + [(deltas[t], deltas[t]) for t in self._times] + [_EMPTY] * (size - len(self._times))
+        for i in range(size - 1, 0, -1):
+            self._tree[i] = _combine(self._tree[2 * i], self._tree[2 * i + 1])
+
+    def _add(self, position: int, amount: int):
+        """Mise à jour ponctuelle de la variation à une borne"""
+        i = position + self._size
+        total = self._tree[i][0] + amount
+        self._tree[i] = (total, total)
+        i //= 2
+        while i:
+            self._tree[i] = _combine(self._tree[2 * i], self._tree[2 * i + 1])
+            i //= 2
+
+    def _query(self, lo: int, hi: int) -> tuple:
+        """(somme, plus grande somme préfixe) des feuilles lo..hi (bornes incluses), dans l'ordre"""
+        left, right = _EMPTY, _EMPTY
+        lo += self._size
+        hi += self._size + 1
+        while lo < hi:
+            if lo & 1:
+                left = _combine(left, self._tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                right = _combine(self._tree[hi], right)
+            lo //= 2
+            hi //= 2
+        return _combine(left, right)
+
+    def peak(self, start: datetime, end: datetime) -> int:
+        """Quantité maximale réservée simultanément sur [start, end)"""
+        if not self._times:
+            return 0
+        lo = max(bisect_right(self._times, start) - 1, 0)
+        hi = bisect_left(self._times, end) - 1
+        if hi < lo:
+            return 0
+        before = self._query(0, lo - 1)[0] if lo else 0
+        return max(0, before + self._query(lo, hi)[1])
+
+    def peak_without(self, deployment_id: str, start: datetime, end: datetime) -> int:
+        """peak() sans les réservations d'un déplacement (modification de ce déplacement) :
+        ses deux bornes sont retirées de l'arbre le temps de la requête"""
+        reservation = self.reservations.get(deployment_id)
+        if reservation is None:
+            return self.peak(start, end)
+        r_start, r_end, quantity = reservation
+        first, last = bisect_left(self._times, r_start), bisect_left(self._times, r_end)
+        self._add(first, -quantity)
+        self._add(last, quantity)
+        try:
+            return self.peak(start, end)
+        finally:
+            self._add(first, quantity)
+            self._add(last, -quantity)
+
+    def overlapping(self, start: datetime, end: datetime, exclude: str = None) -> list:
+        return [
+            (deployment_id, quantity)
+            for deployment_id, (r_start, r_end, quantity) in self.reservations.items()
+            if deployment_id != exclude and r_start < end and r_end > start
+        ]
+
+
+class AvailabilityIndex:
+    """Index des réservations de tous les équipements"""
+
+    def __init__(self):
+        self.items = {}          # equipment_id -> ItemTimeline
+        self.deployments = {}    # deployment_id -> {"name", "start_date", "end_date", "status", "equipment_ids"}
+        self.loaded_at = None
+        self.version = None      # version Mongo des déplacements reflétée par l'index
+
+    def load(self, deployments, version: int = None):
+        self.items = {}
+        self.deployments = {}
+        for deployment in deployments:
+            self.upsert(deployment, rebuild=False)
+        for timeline in self.items.values():
+            timeline.rebuild()
+        self.loaded_at = time.monotonic()
+        self.version = version
+
+    def upsert(self, deployment: dict, rebuild: bool = True):
+        deployment_id = deployment["id"]
+        self.remove(deployment_id)
+        quantities = reserved_items(deployment)
+        window = reservation_window(deployment.get("start_date"), deployment.get("end_date"),
+                                    open_ended=deployment.get("status") == "in_progress")
+        if not quantities or window is None:
+            return
+        for equipment_id, quantity in quantities.items():
+            self.items.setdefault(equipment_id, ItemTimeline()).set(deployment_id, window[0], window[1], quantity,
+                                                                    rebuild=rebuild)
+        self.deployments[deployment_id] = {
+            "name": deployment.get("name"),
+            "start_date": deployment.get("start_date"),
+            "end_date": deployment.get("end_date"),
+            "status": deployment.get("status", "planned"),
+            "equipment_ids": list(quantities),
+        }
+
+    def remove(self, deployment_id: str):
+        meta = self.deployments.pop(deployment_id, None)
+        if not meta:
+            return
+        for equipment_id in meta["equipment_ids"]:
+            timeline = self.items.get(equipment_id)
+            if timeline:
+                timeline.discard(deployment_id)
+                if not timeline.reservations:
+                    del self.items[equipment_id]
+
+    def reserved(self, equipment_id: str, start: datetime, end: datetime, exclude: str = None) -> int:
+        timeline = self.items.get(equipment_id)
+        if timeline is None:
+            return 0
+        if exclude:
+            return timeline.peak_without(exclude, start, end)
+        return timeline.peak(start, end)
+
+    def conflicting_deployments(self, equipment_id: str, start: datetime, end: datetime, exclude: str = None) -> list:
+        timeline = self.items.get(equipment_id)
+        if timeline is None:
+            return []
+        return [
+            {"id": deployment_id, "quantity": quantity, **{k: v for k, v in self.deployments[deployment_id].items()
+                                                            if k != "equipment_ids"}}
+            for deployment_id, quantity in timeline.overlapping(start, end, exclude=exclude)
+        ]
+
+
+availability_index = AvailabilityIndex()
+_rebuild_lock = asyncio.Lock()
+
+
+def capacity_of(equipment: dict) -> int:
+    if equipment.get("condition") in UNAVAILABLE_CONDITIONS:
+        return 0
+    return max(int(equipment.get("quantity") or 1), 0)
+
+
+async def ensure_indexes(db):
+    """Index utilisés pour reconstruire l'index de disponibilité"""
+    await db.deployments.create_index([("status", 1), ("start_date", 1)])
+
+
+async def current_version(db) -> int:
+    doc = await db[VERSION_COLLECTION].find_one({"_id": VERSION_ID})
+    return (doc or {}).get("version", 0)
+
+
+async def bump_version(db) -> int:
+    """Signale aux autres workers qu'un déplacement a changé ; renvoie la nouvelle version"""
+    doc = await db[VERSION_COLLECTION].find_one_and_update(
+        {"_id": VERSION_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
+
+
+async def rebuild(db) -> int:
+    """Recharge toutes les réservations actives depuis Mongo ; renvoie le nombre de déplacements"""
+    async with _rebuild_lock:
+        # Version lue avant les déplacements : une écriture concurrente provoquera une nouvelle reconstruction
+        version = await current_version(db)
+        deployments = await db.deployments.find({"status": {"$in": ACTIVE_STATUSES}}, DEPLOYMENT_FIELDS).to_list(None)
+        availability_index.load(deployments, version=version)
+    logger.info(f"Equipment availability index rebuilt from {len(deployments)} active deployment(s)")
+    return len(deployments)
+
+
+async def ensure_loaded(db):
+    """Reconstruit l'index s'il est absent, trop ancien, ou si un autre worker a modifié un déplacement"""
+    loaded_at = availability_index.loaded_at
+    if (loaded_at is None or time.monotonic() - loaded_at > REBUILD_SECONDS
+            or await current_version(db) != availability_index.version):
+        await rebuild(db)
+
+
+async def refresh_deployment(db, deployment_id: str):
+    """Met l'index à jour après une écriture sur un déplacement (création, modification, suppression)"""
+    version = await bump_version(db)
+    deployment = await db.deployments.find_one({"id": deployment_id}, DEPLOYMENT_FIELDS)
+    if deployment:
+        availability_index.upsert(deployment)
+    else:
+        availability_index.remove(deployment_id)
+    # Seule cette écriture manquait à l'index : il reste à jour ; sinon il sera reconstruit
+    if availability_index.version is not None and availability_index.version == version - 1:
+        availability_index.version = version
+
+
+def _parse_window(start_date, end_date, open_ended: bool = False):
+    window = reservation_window(start_date, end_date, open_ended=open_ended)
+    if window is None:
+        raise ValueError(f"Date de début invalide: {start_date}")
+    return window
+
+
+async def find_conflicts(db, quantities: dict, start_date, end_date, exclude_deployment_id: str = None,
+                         open_ended: bool = None) -> list:
+    """Équipements demandés en quantité supérieure à ce qui est libre sur la période
+
+    open_ended : période sans date de fin ouverte jusqu'au retour (déplacement en cours), comme dans
+    l'index ; par défaut, déduit du statut du déplacement modifié."""
+    if not quantities:
+        return []
+    await ensure_loaded(db)
+    if open_ended is None:
+        meta = availability_index.deployments.get(exclude_deployment_id) if exclude_deployment_id else None
+        open_ended = bool(meta) and meta["status"] == "in_progress"
+    start, end = _parse_window(start_date, end_date, open_ended=open_ended)
+    equipment = await db.equipment.find(
+        {"id": {"$in": list(quantities)}}, {"_id": 0, "id": 1, "name": 1, "quantity": 1, "condition": 1}
+    ).to_list(None)
+    by_id = {e["id"]: e for e in equipment}
+
+    conflicts = []
+    for equipment_id, requested in quantities.items():
+        item = by_id.get(equipment_id)
+        if item is None:
+            continue
+        capacity = capacity_of(item)
+        reserved = availability_index.reserved(equipment_id, start, end, exclude=exclude_deployment_id)
+        available = max(capacity - reserved, 0)
+        if requested > available:
+            conflicts.append({
+                "equipment_id": equipment_id,
+                "equipment_name": item.get("name"),
+                "requested": requested,
+                "available": available,
+                "capacity": capacity,
+                "deployments": availability_index.conflicting_deployments(
+                    equipment_id, start, end, exclude=exclude_deployment_id),
+            })
+    return conflicts
+
+
+async def availability_between(db, start_date, end_date, query: dict = None) -> list:
+    """Quantité libre de chaque équipement sur la période"""
+    await ensure_loaded(db)
+    start, end = _parse_window(start_date, end_date)
+    equipment = await db.equipment.find(
+        query or {}, {"_id": 0, "id": 1, "name": 1, "category_id": 1, "quantity": 1, "condition": 1}
+    ).sort("name", 1).to_list(None)
+    result = []
+    for item in equipment:
+        capacity = capacity_of(item)
+        reserved = availability_index.reserved(item["id"], start, end)
+        result.append({
+            "equipment_id": item["id"],
+            "name": item.get("name"),
+            "category_id": item.get("category_id"),
+            "capacity": capacity,
+            "reserved": reserved,
+            "available": max(capacity - reserved, 0),
+            "overbooked": reserved > capacity,
+        })
+    return result
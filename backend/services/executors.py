@@ -0,0 +1,106 @@
+"""
+Registre partagé des pools d'exécution (threads / processus)
+Le code bloquant appelé depuis un handler async (SMTP, ffmpeg, boto3, zip, rmtree, ...) ne doit jamais
+tourner sur la boucle d'événements : il est délégué à un pool dimensionné selon sa nature.
+- io     : appels réseau et disque bloquants (smtplib, boto3, requests, shutil, git)
+- cpu    : calcul qui libère le GIL (zlib/zip, PIL, hachage), borné au nombre de cœurs
+- ffmpeg : processus ffmpeg, peu nombreux pour ne pas saturer le CPU et la RAM
+- ffmpeg_bg : processus ffmpeg des traitements de fond (normalisation du livre d'or), dans leur propre
+  file pour ne jamais faire attendre les ffmpeg lancés par une requête (montage, diaporama, vignettes)
+D'autres pools peuvent être enregistrés (register_executor), ex. le pool de processus PDF.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+IO_WORKERS = int(os.environ.get("EXECUTOR_IO_WORKERS", 32))
+CPU_WORKERS = int(os.environ.get("EXECUTOR_CPU_WORKERS", os.cpu_count() or 2))
+FFMPEG_WORKERS = int(os.environ.get("EXECUTOR_FFMPEG_WORKERS", 2))
+FFMPEG_BG_WORKERS = int(os.environ.get("EXECUTOR_FFMPEG_BG_WORKERS", 1))
+
+_factories = {
+    "io": lambda: ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io"),
+    "cpu": lambda: ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu"),
+    "ffmpeg": lambda: ThreadPoolExecutor(max_workers=FFMPEG_WORKERS, thread_name_prefix="ffmpeg"),
+    "ffmpeg_bg": lambda: ThreadPoolExecutor(max_workers=FFMPEG_BG_WORKERS, thread_name_prefix="ffmpeg_bg"),
+}
+_executors = {}
+_lock = threading.Lock()
+_pending = {}
+
+
+def register_executor(name: str, factory):
+    """Déclare un pool créé à la demande (factory sans argument renvoyant un Executor)"""
+    _factories[name] = factory
+
+
+def get_executor(name: str) -> Executor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(name)
+            if executor is None:
+                if name not in _factories:
+                    raise KeyError(f"Unknown executor: {name}")
+                executor = _executors[name] = _factories[name]()
+    return executor
+
+
+async def run_in(name: str, func, *args, **kwargs):
+    """Exécute func dans le pool `name` sans bloquer la boucle.
+    Le contexte (contextvars) est propagé aux pools de threads : les commandes Mongo et les
+    blocages restent attribués à la route appelante."""
+    executor = get_executor(name)
+    call = functools.partial(func, *args, **kwargs)
+    if isinstance(executor, ThreadPoolExecutor):
+        call = functools.partial(contextvars.copy_context().run, call)
+    _pending[name] = _pending.get(name, 0) + 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+    finally:
+        _pending[name] -= 1
+
+
+async def run_io(func, *args, **kwargs):
+    return await run_in("io", func, *args, **kwargs)
+
+
+async def run_cpu(func, *args, **kwargs):
+    return await run_in("cpu", func, *args, **kwargs)
+
+
+async def run_ffmpeg(func, *args, **kwargs):
+    return await run_in("ffmpeg", func, *args, **kwargs)
+
+
+async def run_ffmpeg_bg(func, *args, **kwargs):
+    return await run_in("ffmpeg_bg", func, *args, **kwargs)
+
+
+def shutdown_executor(name: str, wait: bool = False):
+    with _lock:
+        executor = _executors.pop(name, None)
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def shutdown_executors(wait: bool = False):
+    """Arrête tous les pools (arrêt du serveur)"""
+    for name in list(_executors):
+        shutdown_executor(name, wait=wait)
+
+
+def executor_stats() -> dict:
+    """Taille et occupation (tâches soumises non terminées) de chaque pool"""
+    stats = {}
+    for name in _factories:
+        executor = _executors.get(name)
+        stats[name] = {
+            "started": executor is not None,
+            "max_workers": getattr(executor, "_max_workers", None),
+            "pending": _pending.get(name, 0)
+        }
+    return stats
@@ -0,0 +1,76 @@
+"""
+Envoi des fichiers protégés (téléchargements HD, documents, images de galerie, vidéos, sauvegardes)
+La route fait l'autorisation ; l'envoi des octets dépend de FILE_DELIVERY :
+- python (défaut, développement) : FileResponse servie par uvicorn
+- nginx : réponse vide avec X-Accel-Redirect vers une location interne ; Nginx sert le fichier
+  (sendfile noyau, requêtes Range, reprise) et le worker uvicorn est libéré immédiatement
+- sendfile : en-tête X-Sendfile avec le chemin absolu (Apache mod_xsendfile, lighttpd)
+Seuls les fichiers situés sous FILE_DELIVERY_ROOT (uploads/) sont délégués ; les autres restent servis par Python.
+"""
+import mimetypes
+import os
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, Response
+
+ROOT_DIR = Path(__file__).parent.parent
+
+FILE_DELIVERY = os.environ.get("FILE_DELIVERY", "python").lower()
+DELIVERY_ROOT = Path(os.environ.get("FILE_DELIVERY_ROOT", ROOT_DIR / "uploads")).resolve()
+# Location Nginx "internal" dont l'alias pointe sur DELIVERY_ROOT
+ACCEL_PREFIX = "/" + os.environ.get("FILE_DELIVERY_ACCEL_PREFIX", "/_protected/").strip("/") + "/"
+
+OFFLOAD_MODES = ("nginx", "sendfile")
+
+
+def offload_enabled() -> bool:
+    return FILE_DELIVERY in OFFLOAD_MODES
+
+
+def content_disposition(filename: str, inline: bool = False) -> str:
+    disposition = "inline" if inline else "attachment"
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def _relative_to_root(path: Path) -> Optional[Path]:
+    try:
+        return path.resolve().relative_to(DELIVERY_ROOT)
+    except ValueError:
+        return None
+
+
+def offload_response(path: Path, filename: str = None, media_type: str = None, inline: bool = None,
+                     headers: dict = None) -> Optional[Response]:
+    """Réponse déléguée au serveur frontal, ou None si le mode Python est actif (ou le fichier hors racine).
+    inline=None : pièce jointe si un nom de fichier est fourni, affichage sinon (comme FileResponse)."""
+    if not offload_enabled():
+        return None
+    relative = _relative_to_root(Path(path))
+    if relative is None:
+        return None
+    response_headers = dict(headers or {})
+    response_headers["Content-Type"] = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+    if filename:
+        response_headers["Content-Disposition"] = content_disposition(filename, inline=bool(inline))
+    if FILE_DELIVERY == "nginx":
+        response_headers["X-Accel-Redirect"] = ACCEL_PREFIX + quote(relative.as_posix())
+    else:
+        response_headers["X-Sendfile"] = str(DELIVERY_ROOT / relative)
+    return Response(status_code=200, headers=response_headers)
+
+
+def deliver_file(path: Path, filename: str = None, media_type: str = None, inline: bool = None,
+                 headers: dict = None) -> Response:
+    """Réponse pour un fichier déjà autorisé : délégation au serveur frontal si activée, FileResponse sinon"""
+    response = offload_response(path, filename=filename, media_type=media_type, inline=inline, headers=headers)
+    if response is not None:
+        return response
+    kwargs = {"filename": filename, "media_type": media_type, "headers": headers}
+    if filename and inline:
+        kwargs["content_disposition_type"] = "inline"
+    return FileResponse(path, **kwargs)
@@ -0,0 +1,421 @@
+"""
+Normalisation des messages audio / vidéo du livre d'or
+- Chaque envoi est normalisé en tâche de fond, hors requête : une seule résolution, cadence et profil
+  de codec (H.264 High, yuv420p, AAC 48 kHz stéréo) pour toutes les vidéos, volume ramené à une
+  même sonie (loudnorm EBU R128), plus une image d'aperçu (poster) pour les vidéos
+- Pour l'affichage du livre d'or : un extrait court en bas débit (preview) et les crêtes de la forme
+  d'onde (waveform, tableau compact d'entiers 0-100) calculées une fois pour toutes
+- L'original est conservé ; les fichiers dérivés sont rangés à côté ({id}.norm.mp4 / {id}.norm.m4a,
+  {id}.poster.jpg, {id}.preview.mp4 / {id}.preview.m4a) et référencés sur le message
+- État sur le message : media_status pending → processing → ready / failed, avec le profil appliqué
+  (normalized_profile) pour savoir si les clips sont encore compatibles après un changement de réglages
+- Montage : si tous les clips sont "ready" avec le profil courant, ils sont assemblés par le
+  démultiplexeur concat en copie de flux (-c copy), sans réencodage ; sinon la requête n'attend pas :
+  les originaux sont réencodés et les clips manquants sont normalisés en tâche de fond
+- Processus ffmpeg / ffprobe dans le pool de fond "ffmpeg_bg" (services/executors.py) : une rafale
+  d'envois ne retarde pas les ffmpeg des requêtes (montage, diaporama, vignettes) du pool "ffmpeg"
+- Les messages restés en attente (redémarrage, ou antérieurs à la normalisation) sont repris un par un
+  par un job du scheduler, exécuté par le seul leader (services/scheduler_service.py)
+- Fil public paginé par curseur (created_at, id) : pas de saut d'offset, pages stables pendant les ajouts
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import subprocess
+import sys
+from array import array
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from services import media_store
+from services.executors import run_cpu, run_ffmpeg_bg, run_io
+
+COLLECTION = "guestbook_messages"
+
+VIDEO_WIDTH = int(os.environ.get("GUESTBOOK_VIDEO_WIDTH", "1280"))
+VIDEO_HEIGHT = int(os.environ.get("GUESTBOOK_VIDEO_HEIGHT", "720"))
+VIDEO_FPS = int(os.environ.get("GUESTBOOK_VIDEO_FPS", "30"))
+VIDEO_CRF = int(os.environ.get("GUESTBOOK_VIDEO_CRF", "21"))
+AUDIO_RATE = 48000
+AUDIO_BITRATE = "128k"
+LOUDNESS = os.environ.get("GUESTBOOK_LOUDNORM", "I=-16:TP=-1.5:LRA=11")
+PREVIEW_SECONDS = int(os.environ.get("GUESTBOOK_PREVIEW_SECONDS", "6"))
+PREVIEW_WIDTH = 480
+WAVEFORM_POINTS = int(os.environ.get("GUESTBOOK_WAVEFORM_POINTS", "64"))
+WAVEFORM_RATE = 8000
+NORMALIZE_TIMEOUT = int(os.environ.get("GUESTBOOK_NORMALIZE_TIMEOUT", "600"))
+# Un message resté "processing" plus longtemps a perdu son processus : il peut être repris
+STALE_AFTER_SECONDS = NORMALIZE_TIMEOUT * 2
+# Base de temps commune des pistes vidéo : indispensable à la concaténation en copie de flux
+VIDEO_TIMESCALE = 15360
+
+# Identifie les réglages appliqués ; un clip normalisé avec un autre profil n'est plus concaténable tel quel
+PROFILE = f"h264-high-{VIDEO_WIDTH}x{VIDEO_HEIGHT}-{VIDEO_FPS}fps-aac{AUDIO_RATE // 1000}k"
+
+_running_tasks = {}
+# Reprise en cours (référence gardée tant que la tâche tourne)
+_drain_tasks = set()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def upload_path(uploads_dir: Path, url: str) -> Path:
+    """Chemin disque d'une URL /uploads/..."""
+    return Path(uploads_dir) / url.removeprefix("/uploads/")
+
+
+def derived_urls(message: dict) -> dict:
+    """URLs de la version normalisée et du poster d'un message (calculées depuis media_url)"""
+    base = message["media_url"].rsplit("/", 1)[0] + "/" + message["id"]
+    if message["message_type"] == "video":
+        return {
+            "normalized_url": f"{base}.norm.mp4",
+            "poster_url": f"{base}.poster.jpg",
+            "preview_url": f"{base}.preview.mp4"
+        }
+    return {"normalized_url": f"{base}.norm.m4a", "preview_url": f"{base}.preview.m4a"}
+
+
+def derived_paths(uploads_dir: Path, message: dict) -> list:
+    """Fichiers produits par la normalisation (à supprimer avec le message)"""
+    if not message.get("media_url"):
+        return []
+    return [upload_path(uploads_dir, url) for url in derived_urls(message).values()]
+
+
+# ==================== COMMANDES FFMPEG ====================
+
+def probe_command(src: str) -> list:
+    return [
+        "ffprobe", "-v", "error",
+        "-show_entries", "stream=codec_type:format=duration",
+        "-of", "json", src
+    ]
+
+
+def parse_probe(output: str) -> dict:
+    """{"has_video", "has_audio", "duration"} depuis la sortie JSON de ffprobe"""
+    data = json.loads(output or "{}")
+    types = {stream.get("codec_type") for stream in data.get("streams", [])}
+    try:
+        duration = round(float(data.get("format", {}).get("duration")), 2)
+    except (TypeError, ValueError):
+        duration = None
+    return {"has_video": "video" in types, "has_audio": "audio" in types, "duration": duration}
+
+
+def video_filter() -> str:
+    """Mise à l'échelle avec bandes noires (pas de déformation), pixels carrés, cadence fixe"""
+    w, h = VIDEO_WIDTH, VIDEO_HEIGHT
+    return (
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={VIDEO_FPS},format=yuv420p"
+    )
+
+
+def audio_encode_args() -> list:
+    return ["-c:a", "aac", "-b:a", AUDIO_BITRATE, "-ar", str(AUDIO_RATE), "-ac", "2"]
+
+
+def normalize_video_command(src: str, dst: str, has_audio: bool = True) -> list:
+    """Vidéo au profil commun ; une piste silencieuse est ajoutée si le clip n'a pas de son,
+    pour que tous les clips aient les mêmes flux"""
+    cmd = ["ffmpeg", "-y", "-i", src]
+    if has_audio:
+        cmd += ["-map", "0:v:0", "-map", "0:a:0", "-af", f"loudnorm={LOUDNESS}"]
+    else:
+        cmd += [
+            "-f", "lavfi", "-i", f"anullsrc=channel_layout=stereo:sample_rate={AUDIO_RATE}",
+            "-map", "0:v:0", "-map", "1:a:0", "-shortest"
+        ]
+    cmd += [
+        "-vf", video_filter(),
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "high", "-level", "4.0",
+        "-crf", str(VIDEO_CRF), "-g", str(VIDEO_FPS * 2),
+        "-video_track_timescale", str(VIDEO_TIMESCALE),
+        *audio_encode_args(),
+        "-movflags", "+faststart",
+        dst
+    ]
+    return cmd
+
+
+def normalize_audio_command(src: str, dst: str) -> list:
+    return [
+        "ffmpeg", "-y", "-i", src, "-vn",
+        "-af", f"loudnorm={LOUDNESS}",
+        *audio_encode_args(),
+        "-movflags", "+faststart",
+        dst
+    ]
+
+
+def poster_command(src: str, dst: str) -> list:
+    """Image la plus représentative des premières images (filtre thumbnail), sans dépendre de la durée"""
+    return ["ffmpeg", "-y", "-i", src, "-vf", "thumbnail,scale=640:-2", "-frames:v", "1", "-q:v", "3", dst]
+
+
+def preview_command(src: str, dst: str, video: bool = True) -> list:
+    """Premières secondes en bas débit : de quoi animer le mur du livre d'or sans charger l'original"""
+    cmd = ["ffmpeg", "-y", "-i", src, "-t", str(PREVIEW_SECONDS)]
+    if video:
+        cmd += [
+            "-vf", f"scale={PREVIEW_WIDTH}:-2,fps=15",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-crf", "32", "-maxrate", "400k", "-bufsize", "800k"
+        ]
+    else:
+        cmd += ["-vn"]
+    return cmd + ["-c:a", "aac", "-b:a", "48k", "-ac", "1", "-movflags", "+faststart", dst]
+
+
+def waveform_command(src: str) -> list:
+    """PCM 16 bits mono basse fréquence sur la sortie standard (suffisant pour des crêtes)"""
+    return ["ffmpeg", "-i", src, "-vn", "-ac", "1", "-ar", str(WAVEFORM_RATE), "-f", "s16le", "-"]
+
+
+def waveform_peaks(pcm: bytes, points: int = WAVEFORM_POINTS) -> list:
+    """Crête de chaque tranche du signal, en pourcentage de la pleine échelle"""
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    if not samples:
+        return []
+    if sys.byteorder == "big":
+        samples.byteswap()
+    total = len(samples)
+    points = min(points, total)
+    return [
+        min(100, round(max(map(abs, samples[i * total // points:(i + 1) * total // points])) * 100 / 32767))
+        for i in range(points)
+    ]
+
+
+def concat_list(paths: list) -> str:
+    """Contenu du fichier liste du démultiplexeur concat (apostrophes échappées)"""
+    return "".join("file '{}'\n".format(str(p).replace("'", "'\\''")) for p in paths)
+
+
+def concat_copy_command(list_file: str, dst: str) -> list:
+    return [
+        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file,
+        "-c", "copy", "-movflags", "+faststart", dst
+    ]
+
+
+def concat_reencode_command(list_file: str, dst: str) -> list:
+    """Ancien chemin : clips hétérogènes, tout est réencodé"""
+    return [
+        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_file,
+        "-c:v", "libx264", "-preset", "fast",
+        "-c:a", "aac", "-b:a", "128k",
+        "-movflags", "+faststart", dst
+    ]
+
+
+def is_copyable(message: dict) -> bool:
+    return message.get("media_status") == "ready" and message.get("normalized_profile") == PROFILE
+
+
+def montage_sources(uploads_dir: Path, messages: list) -> tuple:
+    """(chemins, copie_possible) : les versions normalisées si tous les clips le sont avec le profil
+    courant, sinon les originaux (réencodage)"""
+    if messages and all(is_copyable(m) for m in messages):
+        paths = [upload_path(uploads_dir, m["normalized_url"]) for m in messages]
+        if all(p.exists() for p in paths):
+            return [str(p) for p in paths], True
+    paths = [upload_path(uploads_dir, m["media_url"]) for m in messages if m.get("media_url")]
+    return [str(p) for p in paths if p.exists()], False
+
+
+# ==================== TRAITEMENT ====================
+
+async def _ffmpeg(cmd: list, text: bool = True) -> subprocess.CompletedProcess:
+    result = await run_ffmpeg_bg(subprocess.run, cmd, capture_output=True, text=text, timeout=NORMALIZE_TIMEOUT)
+    if result.returncode != 0:
+        stderr = result.stderr if text else (result.stderr or b"").decode(errors="replace")
+        raise RuntimeError(f"{cmd[0]} exited with {result.returncode}: {(stderr or '')[-500:]}")
+    return result
+
+
+async def _claim(db, message_id: str):
+    """Passe le message en 'processing' si personne d'autre ne le traite"""
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=STALE_AFTER_SECONDS)).isoformat()
+    return await db[COLLECTION].find_one_and_update(
+        {"id": message_id, "$or": [
+            {"media_status": {"$in": ["pending", None]}},
+            {"media_status": "processing", "media_processing_at": {"$lt": stale}}
+        ]},
+        {"$set": {"media_status": "processing", "media_processing_at": _now()}},
+        projection={"_id": 0}
+    )
+
+
+async def _render_to(dst: Path, command):
+    """ffmpeg écrit dans un fichier temporaire renommé sur dst : un fichier régénéré ne réécrit jamais
+    le blob dédupliqué de l'ancien (voir media_store.replace_file)"""
+    tmp = media_store.temporary_path(dst)
+    try:
+        await _ffmpeg(command(str(tmp)))
+        await run_io(os.replace, tmp, dst)
+    finally:
+        if tmp.exists():
+            await run_io(tmp.unlink)
+
+
+async def normalize_message(db, uploads_dir: Path, message_id: str) -> str:
+    """Normalise un message ; retourne son media_status final (None si traité ailleurs)"""
+    message = await _claim(db, message_id)
+    if not message:
+        return None
+    src = upload_path(uploads_dir, message["media_url"])
+    urls = derived_urls(message)
+    video = message["message_type"] == "video"
+    dst = upload_path(uploads_dir, urls["normalized_url"])
+    try:
+        probe = parse_probe((await _ffmpeg(probe_command(str(src)))).stdout)
+        if video:
+            if not probe["has_video"]:
+                raise ValueError("no video stream")
+            await _render_to(dst, lambda out: normalize_video_command(str(src), out, has_audio=probe["has_audio"]))
+            await _render_to(upload_path(uploads_dir, urls["poster_url"]), lambda out: poster_command(str(dst), out))
+        else:
+            if not probe["has_audio"]:
+                raise ValueError("no audio stream")
+            await _render_to(dst, lambda out: normalize_audio_command(str(src), out))
+        await _render_to(upload_path(uploads_dir, urls["preview_url"]), lambda out: preview_command(str(dst), out, video=video))
+        pcm = (await _ffmpeg(waveform_command(str(dst)), text=False)).stdout
+        waveform = await run_cpu(waveform_peaks, pcm)
+    except Exception as e:
+        logging.error(f"Guestbook media {message_id} not normalized: {e}")
+        await db[COLLECTION].update_one(
+            {"id": message_id},
+            {"$set": {"media_status": "failed", "media_error": str(e)[:500], "media_processed_at": _now()}}
+        )
+        return "failed"
+
+    await db[COLLECTION].update_one(
+        {"id": message_id},
+        {"$set": {
+            **urls,
+            "media_status": "ready",
+            "normalized_profile": PROFILE,
+            "media_duration": probe["duration"],
+            "waveform": waveform,
+            "media_processed_at": _now()
+        }, "$unset": {"media_error": ""}}
+    )
+    return "ready"
+
+
+def enqueue(db, uploads_dir: Path, message_id: str) -> asyncio.Task:
+    """Lance la normalisation d'un message en tâche de fond (une seule tâche par message)"""
+    task = _running_tasks.get(message_id)
+    if task is None or task.done():
+        task = asyncio.create_task(normalize_message(db, uploads_dir, message_id))
+        _running_tasks[message_id] = task
+        task.add_done_callback(lambda _t: _running_tasks.pop(message_id, None))
+    return task
+
+
+async def enqueue_unready(db, uploads_dir: Path, messages: list) -> int:
+    """Lance en tâche de fond, sans l'attendre, la normalisation des clips qui ne sont pas prêts
+    (y compris ceux normalisés avec un ancien profil) ; renvoie leur nombre"""
+    outdated = [m["id"] for m in messages if m.get("media_status") == "ready" and m.get("normalized_profile") != PROFILE]
+    if outdated:
+        await db[COLLECTION].update_many(
+            {"id": {"$in": outdated}, "media_status": "ready", "normalized_profile": {"$ne": PROFILE}},
+            {"$set": {"media_status": "pending"}}
+        )
+    pending = [m["id"] for m in messages if not is_copyable(m) and m.get("media_status") != "failed"]
+    for message_id in pending:
+        enqueue(db, uploads_dir, message_id)
+    return len(pending)
+
+
+async def ensure_indexes(db):
+    await db[COLLECTION].create_index("media_status")
+    await db[COLLECTION].create_index([("guestbook_id", 1), ("is_approved", 1), ("created_at", -1), ("id", -1)])
+
+
+async def _drain(db, uploads_dir: Path, message_ids: list):
+    for message_id in message_ids:
+        try:
+            await enqueue(db, uploads_dir, message_id)
+        except Exception as e:
+            logging.error(f"Guestbook media {message_id} not normalized: {e}")
+
+
+async def resume_pending(db, uploads_dir: Path) -> int:
+    """Reprend en tâche de fond, un message à la fois, les envois en attente ou antérieurs à la normalisation ;
+    renvoie le nombre de messages repris (0 si une reprise est déjà en cours dans ce processus)"""
+    if _drain_tasks:
+        return 0
+    messages = await db[COLLECTION].find(
+        {"message_type": {"$in": ["audio", "video"]}, "media_status": {"$in": ["pending", "processing", None]}},
+        {"_id": 0, "id": 1}
+    ).sort("created_at", 1).to_list(None)
+    if messages:
+        task = asyncio.create_task(_drain(db, uploads_dir, [m["id"] for m in messages]))
+        _drain_tasks.add(task)
+        task.add_done_callback(_drain_tasks.discard)
+    return len(messages)
+
+
+# ==================== FIL PUBLIC ====================
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 50
+
+# Champs servis au mur public : l'original reste disponible (chargé à la demande), pas l'état interne
+FEED_PROJECTION = {
+    "_id": 0, "id": 1, "author_name": 1, "message_type": 1, "text_content": 1, "created_at": 1,
+    "media_url": 1, "normalized_url": 1, "poster_url": 1, "preview_url": 1,
+    "waveform": 1, "duration": 1, "media_duration": 1, "media_status": 1
+}
+
+
+def encode_cursor(message: dict) -> str:
+    raw = f"{message['created_at']}|{message['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, id) ; ValueError si le curseur est illisible"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        raise ValueError("invalid cursor")
+    created_at, sep, message_id = raw.rpartition("|")
+    if not sep or not created_at or not message_id:
+        raise ValueError("invalid cursor")
+    return created_at, message_id
+
+
+def feed_query(guestbook_id: str, cursor: str = None) -> dict:
+    query = {"guestbook_id": guestbook_id, "is_approved": True}
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": message_id}}
+        ]
+    return query
+
+
+async def feed_page(db, guestbook_id: str, cursor: str = None, limit: int = FEED_PAGE_SIZE) -> dict:
+    """Une page du fil (plus récents d'abord) et le curseur de la suivante (None à la fin).
+    Le total n'est compté qu'à la première page."""
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+    query = feed_query(guestbook_id, cursor)
+    rows = await db[COLLECTION].find(query, FEED_PROJECTION).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    page = {"messages": rows[:limit], "next_cursor": encode_cursor(rows[limit - 1]) if len(rows) > limit else None}
+    if not cursor:
+        page["total"] = await db[COLLECTION].count_documents({"guestbook_id": guestbook_id, "is_approved": True})
+    return page
@@ -0,0 +1,241 @@
+"""
+Stockage des médias adressé par contenu (SHA-256) avec déduplication
+- Chaque contenu n'est stocké qu'une fois : uploads/.blobs/<aa>/<bb>/<sha256>
+- Les chemins publics (uploads/galleries/..., uploads/photofind/<event>/..., uploads/client_transfers/...)
+  sont des liens physiques vers le blob : URLs, fichiers statiques, ZIP et suppressions existants
+  fonctionnent sans modification
+- Le compteur de références d'un blob est son nombre de liens (st_nlink - 1) : il est tenu à jour
+  atomiquement par le système de fichiers, y compris quand une route supprime un fichier avec unlink()
+- Les blobs sans référence sont supprimés par collect_garbage() (tâche planifiée quotidienne)
+- Les caches dérivés (miniatures, rendus d'impression) se rangent par empreinte (derivative_path) et
+  sont donc partagés entre toutes les copies d'une même photo
+- Les fichiers ne sont jamais réécrits en place : un contenu différent donne un autre blob. Un fichier
+  régénéré sous un chemin existant (facture, QR code, aperçu...) est écrit à côté puis renommé par-dessus
+  (replace_file) : le lien vers l'ancien blob est retiré, le blob lui-même n'est pas modifié
+- Si le lien physique est impossible (autre système de fichiers, MEDIA_DEDUP=0) le fichier est
+  simplement renommé vers sa destination, sans déduplication
+Toutes les fonctions sont bloquantes (disque) : les appeler depuis le pool "io".
+"""
+import hashlib
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+UPLOADS_DIR = ROOT_DIR / "uploads"
+
+MEDIA_DEDUP = os.environ.get("MEDIA_DEDUP", "1") != "0"
+BLOBS_DIR = Path(os.environ.get("MEDIA_BLOBS_DIR", UPLOADS_DIR / ".blobs"))
+DERIVED_DIR = BLOBS_DIR / "derived"
+# Un blob sans référence plus jeune que ce délai peut être en cours de publication
+GC_MIN_AGE_SECONDS = int(os.environ.get("MEDIA_GC_MIN_AGE_SECONDS", 3600))
+
+# Dossiers de médias pris en charge par la migration (dedupe_tree)
+MEDIA_DIRS = [
+    "galleries", "photofind", "client_transfers", "clients", "portfolio",
+    "guestbooks", "news", "videos", "content", "client_music", "welcome", "chat",
+]
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def blob_path(sha256: str) -> Path:
+    return BLOBS_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def derivative_path(sha256: str, kind: str, suffix: str = ".jpg") -> Path:
+    """Emplacement d'un fichier dérivé (ex. kind="thumb_400") partagé par toutes les copies du contenu"""
+    return DERIVED_DIR / kind / sha256[:2] / f"{sha256}{suffix}"
+
+
+def refcount(sha256: str) -> int:
+    """Nombre de chemins publics qui référencent ce contenu (0 si le blob n'existe pas)"""
+    try:
+        return blob_path(sha256).stat().st_nlink - 1
+    except FileNotFoundError:
+        return 0
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_into_place(blob: Path, dest: Path):
+    """dest devient un lien vers blob ; remplacement atomique si dest existe déjà"""
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:8]}.link")
+    os.link(blob, tmp)
+    try:
+        os.replace(tmp, dest)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def store_file(src: Path, sha256: str, dest: Path) -> bool:
+    """Publie `src` (fichier complet, même système de fichiers que uploads/) sous `dest`.
+    Renvoie True si le contenu existait déjà (src est alors supprimé, aucun octet supplémentaire)."""
+    if not MEDIA_DEDUP:
+        os.replace(src, dest)
+        return False
+    blob = blob_path(sha256)
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(src, blob)
+            existed = False
+        except FileExistsError:
+            existed = True
+        _link_into_place(blob, dest)
+    except OSError as e:
+        # Pas de lien physique possible (EXDEV, EPERM, ...) : stockage simple
+        logger.warning(f"Media store: no hardlink for {dest} ({e}), stored without dedup")
+        os.replace(src, dest)
+        return False
+    os.unlink(src)
+    return existed
+
+
+def temporary_path(dest: Path) -> Path:
+    """Fichier caché voisin de dest (même dossier, même extension) à renommer ensuite sur dest ;
+    ignoré par dedupe_tree"""
+    dest = Path(dest)
+    return dest.with_name(f".{dest.stem}.{uuid.uuid4().hex[:8]}.tmp{dest.suffix}")
+
+
+def replace_file(dest: Path, write) -> Path:
+    """Écrit le nouveau contenu de dest sans toucher au blob éventuellement lié à l'ancien :
+    write(chemin) produit le fichier dans un chemin temporaire, renommé atomiquement sur dest"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temporary_path(dest)
+    try:
+        write(tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return dest
+
+
+def write_file(dest: Path, content: bytes) -> Path:
+    """replace_file() pour un contenu en mémoire"""
+    return replace_file(dest, lambda tmp: tmp.write_bytes(content))
+
+
+@dataclass
+class DedupeReport:
+    files: int = 0
+    bytes_scanned: int = 0
+    already_linked: int = 0
+    adopted: int = 0
+    deduplicated: int = 0
+    bytes_saved: int = 0
+    errors: list = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "files": self.files, "bytes_scanned": self.bytes_scanned, "already_linked": self.already_linked,
+            "adopted": self.adopted, "deduplicated": self.deduplicated, "bytes_saved": self.bytes_saved,
+            "errors": self.errors[:50],
+        }
+
+
+def _media_files(uploads_dir: Path, dirs: list):
+    for name in dirs:
+        base = uploads_dir / name
+        if not base.is_dir():
+            continue
+        for path in base.rglob("*"):
+            if path.is_file() and not path.is_symlink() and not path.name.startswith("."):
+                yield path
+
+
+def dedupe_tree(uploads_dir: Path = UPLOADS_DIR, dirs: list = None, dry_run: bool = False) -> DedupeReport:
+    """Migration : rattache chaque fichier existant au blob de son contenu.
+    Le premier fichier d'un contenu devient le blob (lien ajouté, aucune copie) ; les suivants sont
+    remplacés par un lien vers ce blob, ce qui libère leur espace. Idempotent : un fichier déjà lié est ignoré."""
+    report = DedupeReport()
+    seen = set()   # dry_run : contenus qui auraient été adoptés
+    if not dry_run:
+        BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+    for path in _media_files(uploads_dir, dirs or MEDIA_DIRS):
+        try:
+            stat = path.stat()
+            report.files += 1
+            report.bytes_scanned += stat.st_size
+            sha256 = file_sha256(path)
+            blob = blob_path(sha256)
+            try:
+                blob_stat = blob.stat()
+            except FileNotFoundError:
+                blob_stat = None
+            if blob_stat is not None and blob_stat.st_ino == stat.st_ino and blob_stat.st_dev == stat.st_dev:
+                report.already_linked += 1
+                continue
+            if blob_stat is None and sha256 not in seen:
+                if dry_run:
+                    seen.add(sha256)
+                else:
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    os.link(path, blob)
+                report.adopted += 1
+                continue
+            if blob_stat is not None and blob_stat.st_size != stat.st_size:
+                report.errors.append(f"{path}: size mismatch with blob {sha256}")
+                continue
+            if not dry_run:
+                _link_into_place(blob, path)
+            report.deduplicated += 1
+            # L'espace n'est libéré que si ce chemin était le dernier lien vers son ancien inode
+            if stat.st_nlink == 1:
+                report.bytes_saved += stat.st_size
+        except OSError as e:
+            report.errors.append(f"{path}: {e}")
+    return report
+
+
+def collect_garbage(min_age_seconds: int = GC_MIN_AGE_SECONDS) -> dict:
+    """Supprime les blobs (et leurs dérivés) qui ne sont plus référencés par aucun chemin public"""
+    removed, freed = 0, 0
+    if not BLOBS_DIR.is_dir():
+        return {"removed": 0, "bytes_freed": 0}
+    now = time.time()
+    for blob in BLOBS_DIR.glob("??/??/*"):
+        try:
+            stat = blob.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_nlink > 1 or now - stat.st_mtime < min_age_seconds:
+            continue
+        blob.unlink(missing_ok=True)
+        for derived in DERIVED_DIR.glob(f"*/{blob.name[:2]}/{blob.name}.*"):
+            derived.unlink(missing_ok=True)
+        removed += 1
+        freed += stat.st_size
+    if removed:
+        logger.info(f"Media store: {removed} unreferenced blobs removed ({freed // (1024 * 1024)} MB)")
+    return {"removed": removed, "bytes_freed": freed}
+
+
+def store_stats() -> dict:
+    """Taille logique (somme des références) et physique (blobs) du stockage dédupliqué"""
+    blobs, physical, logical = 0, 0, 0
+    for blob in BLOBS_DIR.glob("??/??/*"):
+        try:
+            stat = blob.stat()
+        except FileNotFoundError:
+            continue
+        blobs += 1
+        physical += stat.st_size
+        logical += stat.st_size * max(stat.st_nlink - 1, 0)
+    return {"blobs": blobs, "physical_bytes": physical, "logical_bytes": logical,
+            "saved_bytes": max(logical - physical, 0), "dedup_enabled": MEDIA_DEDUP}
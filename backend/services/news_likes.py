@@ -0,0 +1,85 @@
+"""
+Likes des actualités (collection news_likes)
+- Un document par like, _id "<post_id>:<client_id>" : aimer / ne plus aimer = une insertion ou une
+  suppression atomique, sans relire ni réécrire la liste des likes de la publication
+- likes_count de la publication maintenu par $inc, seulement quand l'insertion / la suppression a eu lieu
+- Indicateur "aimé" de tout un fil calculé en une requête ($in sur les _id)
+- Migration : les anciennes listes news_posts.likes sont déplacées dans news_likes (une fois)
+"""
+
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+COLLECTION = "news_likes"
+
+
+def like_id(post_id: str, client_id: str) -> str:
+    return f"{post_id}:{client_id}"
+
+
+async def ensure_indexes(db):
+    await db[COLLECTION].create_index("post_id")
+
+
+async def toggle_like(db, post_id: str, client_id: str) -> tuple:
+    """(action, likes_count) : "liked" si le like a été créé, "unliked" s'il a été retiré"""
+    try:
+        await db[COLLECTION].insert_one({
+            "_id": like_id(post_id, client_id),
+            "post_id": post_id,
+            "client_id": client_id,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        action, delta = "liked", 1
+    except DuplicateKeyError:
+        result = await db[COLLECTION].delete_one({"_id": like_id(post_id, client_id)})
+        # Retiré entre-temps par une requête concurrente : rien à décompter
+        action, delta = "unliked", -1 if result.deleted_count else 0
+    post = await db.news_posts.find_one_and_update(
+        {"id": post_id},
+        {"$inc": {"likes_count": delta}},
+        projection={"_id": 0, "likes_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return action, max(0, (post or {}).get("likes_count", 0))
+
+
+async def is_liked(db, post_id: str, client_id: str) -> bool:
+    return await db[COLLECTION].count_documents({"_id": like_id(post_id, client_id)}, limit=1) > 0
+
+
+async def liked_post_ids(db, client_id: str, post_ids: list) -> set:
+    """Publications de post_ids aimées par le client, en une requête"""
+    if not client_id or not post_ids:
+        return set()
+    likes = await db[COLLECTION].find(
+        {"_id": {"$in": [like_id(post_id, client_id) for post_id in post_ids]}},
+        {"_id": 0, "post_id": 1}
+    ).to_list(None)
+    return {like["post_id"] for like in likes}
+
+
+async def delete_post(db, post_id: str):
+    await db[COLLECTION].delete_many({"post_id": post_id})
+
+
+async def migrate_embedded_likes(db) -> int:
+    """Déplace les listes news_posts.likes dans news_likes ; renvoie le nombre de publications migrées"""
+    migrated = 0
+    async for post in db.news_posts.find({"likes": {"$exists": True}}, {"_id": 0, "id": 1, "likes": 1}):
+        client_ids = list(dict.fromkeys(post.get("likes") or []))
+        if client_ids:
+            await db[COLLECTION].bulk_write([
+                UpdateOne(
+                    {"_id": like_id(post["id"], client_id)},
+                    {"$setOnInsert": {"post_id": post["id"], "client_id": client_id, "created_at": None}},
+                    upsert=True
+                )
+                for client_id in client_ids
+            ], ordered=False)
+        count = await db[COLLECTION].count_documents({"post_id": post["id"]})
+        await db.news_posts.update_one({"id": post["id"]}, {"$set": {"likes_count": count}, "$unset": {"likes": ""}})
+        migrated += 1
+    return migrated
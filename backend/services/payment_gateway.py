@@ -0,0 +1,320 @@
+"""
+Passerelle de paiement asynchrone (PayPal + Stripe)
+- Un seul client HTTP (httpx.AsyncClient) partagé : connexions keep-alive réutilisées
+- Jeton OAuth PayPal mis en cache jusqu'à son expiration (un seul appel réseau par opération)
+- Clés d'idempotence (PayPal-Request-Id / Idempotency-Key) : une relance ne crée jamais un second paiement
+- URLs d'API surchargeables (PAYPAL_API_BASE, STRIPE_API_BASE) pour le serveur de test local (services/payment_mock.py)
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from urllib.parse import urlencode
+
+import httpx
+
+PAYPAL_LIVE_URL = "https://api-m.paypal.com"
+PAYPAL_SANDBOX_URL = "https://api-m.sandbox.paypal.com"
+STRIPE_API_URL = "https://api.stripe.com"
+
+PAYMENT_HTTP_TIMEOUT = float(os.environ.get("PAYMENT_HTTP_TIMEOUT", 20))
+PAYMENT_HTTP_MAX_CONNECTIONS = int(os.environ.get("PAYMENT_HTTP_MAX_CONNECTIONS", 20))
+# Marge avant expiration du jeton PayPal (secondes)
+TOKEN_EXPIRY_MARGIN = 60
+
+_http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Client HTTP partagé par toutes les passerelles"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=PAYMENT_HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=PAYMENT_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=PAYMENT_HTTP_MAX_CONNECTIONS
+            )
+        )
+    return _http_client
+
+
+async def close_payment_gateways():
+    """Ferme le client HTTP partagé (arrêt du serveur)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    _paypal_gateways.clear()
+    _stripe_gateways.clear()
+
+
+class PaymentGatewayError(Exception):
+    """Erreur renvoyée par PayPal / Stripe (ou erreur réseau)"""
+
+    def __init__(self, message: str, status_code: int = None, details=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details or {}
+
+
+class PaymentAuthError(PaymentGatewayError):
+    """Identifiants refusés ou service d'authentification injoignable"""
+
+
+class GatewayObject(dict):
+    """Réponse JSON accessible par attribut (intent.id, intent.metadata.get(...)), comme les objets du SDK Stripe"""
+
+    def __getattr__(self, name):
+        try:
+            value = self[name]
+        except KeyError:
+            raise AttributeError(name)
+        return GatewayObject(value) if isinstance(value, dict) and not isinstance(value, GatewayObject) else value
+
+
+def new_idempotency_key() -> str:
+    return str(uuid.uuid4())
+
+
+def _link(data: dict, rel: str):
+    return next((link.get("href") for link in data.get("links", []) if link.get("rel") == rel), None)
+
+
+# ==================== PAYPAL ====================
+
+class PayPalPayment:
+    """Résultat d'un appel à l'API PayPal v1 /payments (même usage que paypalrestsdk.Payment)"""
+
+    def __init__(self, data: dict = None, error: dict = None):
+        self.data = GatewayObject(data or {})
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def id(self):
+        return self.data.get("id")
+
+    @property
+    def approval_url(self):
+        return _link(self.data, "approval_url")
+
+
+class PayPalGateway:
+    """Client PayPal REST avec cache du jeton OAuth"""
+
+    def __init__(self, client_id: str, secret: str, base_url: str):
+        self.client_id = client_id
+        self.secret = secret
+        self.base_url = base_url.rstrip("/")
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.client_id and self.secret)
+
+    async def get_access_token(self) -> str:
+        if self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+        async with self._token_lock:
+            # Un autre appel a pu rafraîchir le jeton pendant l'attente du verrou
+            if self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+            try:
+                response = await get_http_client().post(
+                    f"{self.base_url}/v1/oauth2/token",
+                    auth=(self.client_id, self.secret),
+                    data={"grant_type": "client_credentials"}
+                )
+            except httpx.HTTPError as e:
+                raise PaymentAuthError(f"PayPal injoignable: {e}")
+            if response.status_code != 200:
+                raise PaymentAuthError("Erreur authentification PayPal", response.status_code, _json(response))
+            data = response.json()
+            self._token = data["access_token"]
+            self._token_expires_at = time.monotonic() + max(0, int(data.get("expires_in", 0)) - TOKEN_EXPIRY_MARGIN)
+            return self._token
+
+    def invalidate_token(self):
+        self._token = None
+        self._token_expires_at = 0.0
+
+    async def request(self, method: str, path: str, json: dict = None, request_id: str = None) -> httpx.Response:
+        """Appel authentifié ; un jeton refusé (401) est renouvelé une fois, les erreurs réseau relancées une fois"""
+        headers = {"Content-Type": "application/json"}
+        if request_id:
+            headers["PayPal-Request-Id"] = request_id
+        for attempt in range(2):
+            headers["Authorization"] = f"Bearer {await self.get_access_token()}"
+            try:
+                response = await get_http_client().request(method, f"{self.base_url}{path}", json=json, headers=headers)
+            except httpx.TransportError as e:
+                # Sans clé d'idempotence, un POST relancé pourrait être exécuté deux fois
+                if attempt or (method != "GET" and not request_id):
+                    raise PaymentGatewayError(f"PayPal injoignable: {e}")
+                continue
+            if response.status_code == 401 and not attempt:
+                self.invalidate_token()
+                continue
+            return response
+        return response
+
+    # ---- API v2 /checkout/orders ----
+
+    async def create_order(self, payload: dict, request_id: str = None) -> GatewayObject:
+        response = await self.request("POST", "/v2/checkout/orders", json=payload,
+                                      request_id=request_id or new_idempotency_key())
+        if response.status_code not in (200, 201):
+            logging.error(f"PayPal order creation error: {response.text}")
+            raise PaymentGatewayError("Erreur création commande PayPal", response.status_code, _json(response))
+        return GatewayObject(response.json())
+
+    async def get_order(self, order_id: str) -> GatewayObject:
+        response = await self.request("GET", f"/v2/checkout/orders/{order_id}")
+        if response.status_code != 200:
+            raise PaymentGatewayError("Commande non trouvée", response.status_code, _json(response))
+        return GatewayObject(response.json())
+
+    async def capture_order(self, order_id: str, request_id: str = None) -> GatewayObject:
+        # Clé dérivée de la commande : deux captures de la même commande renvoient le même résultat
+        response = await self.request("POST", f"/v2/checkout/orders/{order_id}/capture",
+                                      request_id=request_id or f"capture-{order_id}")
+        if response.status_code not in (200, 201):
+            logging.error(f"PayPal capture error: {response.text}")
+            raise PaymentGatewayError("Erreur capture paiement PayPal", response.status_code, _json(response))
+        return GatewayObject(response.json())
+
+    @staticmethod
+    def approval_url(order: dict):
+        return _link(order, "approve")
+
+    # ---- API v1 /payments (anciennement paypalrestsdk) ----
+
+    async def create_payment(self, payload: dict, request_id: str = None) -> PayPalPayment:
+        try:
+            response = await self.request("POST", "/v1/payments/payment", json=payload,
+                                          request_id=request_id or new_idempotency_key())
+        except PaymentGatewayError as e:
+            return PayPalPayment(error={"message": e.message})
+        if response.status_code not in (200, 201):
+            return PayPalPayment(error=_json(response) or {"message": response.text})
+        return PayPalPayment(response.json())
+
+    async def execute_payment(self, payment_id: str, payer_id: str) -> PayPalPayment:
+        try:
+            response = await self.request("POST", f"/v1/payments/payment/{payment_id}/execute",
+                                          json={"payer_id": payer_id}, request_id=f"execute-{payment_id}")
+        except PaymentGatewayError as e:
+            return PayPalPayment(error={"message": e.message})
+        if response.status_code not in (200, 201):
+            return PayPalPayment(error=_json(response) or {"message": response.text})
+        return PayPalPayment(response.json())
+
+
+# ==================== STRIPE ====================
+
+def _form_encode(data: dict, prefix: str = "") -> list:
+    """Encode un dict imbriqué au format attendu par l'API Stripe (metadata[key]=value)"""
+    items = []
+    for key, value in data.items():
+        name = f"{prefix}[{key}]" if prefix else key
+        if isinstance(value, dict):
+            items.extend(_form_encode(value, name))
+        elif value is not None:
+            items.append((name, str(value)))
+    return items
+
+
+class StripeGateway:
+    """Client Stripe REST (PaymentIntents)"""
+
+    def __init__(self, secret_key: str, base_url: str):
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip("/")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.secret_key)
+
+    async def request(self, method: str, path: str, data: dict = None, idempotency_key: str = None) -> GatewayObject:
+        headers = {"Authorization": f"Bearer {self.secret_key}"}
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        content = None
+        if data:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            content = urlencode(_form_encode(data))
+        for attempt in range(2):
+            try:
+                response = await get_http_client().request(
+                    method, f"{self.base_url}{path}", content=content, headers=headers
+                )
+                break
+            except httpx.TransportError as e:
+                if attempt or (method != "GET" and not idempotency_key):
+                    raise PaymentGatewayError(f"Stripe injoignable: {e}")
+        body = _json(response)
+        if response.status_code >= 400:
+            error = body.get("error", {}) if isinstance(body, dict) else {}
+            raise PaymentGatewayError(error.get("message") or response.text, response.status_code, error)
+        return GatewayObject(body)
+
+    async def create_payment_intent(self, amount: int, currency: str = "eur", metadata: dict = None,
+                                    idempotency_key: str = None) -> GatewayObject:
+        return await self.request(
+            "POST", "/v1/payment_intents",
+            data={"amount": amount, "currency": currency, "metadata": metadata or {}},
+            idempotency_key=idempotency_key or new_idempotency_key()
+        )
+
+    async def retrieve_payment_intent(self, payment_intent_id: str) -> GatewayObject:
+        return await self.request("GET", f"/v1/payment_intents/{payment_intent_id}")
+
+
+def _json(response: httpx.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+# ==================== INSTANCES ====================
+
+_paypal_gateways = {}
+_stripe_gateways = {}
+
+
+def paypal_base_url(mode: str = None) -> str:
+    override = os.environ.get("PAYPAL_API_BASE")
+    if override:
+        return override
+    mode = mode or os.environ.get("PAYPAL_MODE", "sandbox")
+    return PAYPAL_LIVE_URL if mode == "live" else PAYPAL_SANDBOX_URL
+
+
+def get_paypal(client_id: str = None, secret: str = None, mode: str = None) -> PayPalGateway:
+    """Passerelle PayPal (une instance, donc un jeton en cache, par jeu d'identifiants)"""
+    client_id = client_id if client_id is not None else os.environ.get("PAYPAL_CLIENT_ID", "")
+    secret = secret if secret is not None else os.environ.get("PAYPAL_SECRET", "")
+    base_url = paypal_base_url(mode)
+    key = (client_id, secret, base_url)
+    if key not in _paypal_gateways:
+        _paypal_gateways[key] = PayPalGateway(client_id, secret, base_url)
+    return _paypal_gateways[key]
+
+
+def get_stripe(secret_key: str = None) -> StripeGateway:
+    secret_key = secret_key if secret_key is not None else os.environ.get("STRIPE_SECRET_KEY", "")
+    base_url = os.environ.get("STRIPE_API_BASE", STRIPE_API_URL)
+    key = (secret_key, base_url)
+    if key not in _stripe_gateways:
+        _stripe_gateways[key] = StripeGateway(secret_key, base_url)
+    return _stripe_gateways[key]
@@ -0,0 +1,200 @@
+"""
+Serveur PayPal / Stripe factice pour les tests et le développement local
+- OAuth PayPal, commandes v2 (create / get / capture), paiements v1 (create / execute)
+- PaymentIntents Stripe (create / retrieve), automatiquement "succeeded"
+- Respecte les clés d'idempotence et compte les appels (mock.calls) pour vérifier le nombre d'allers-retours
+
+Usage :
+    python -m services.payment_mock --port 8089
+    PAYPAL_API_BASE=http://127.0.0.1:8089 STRIPE_API_BASE=http://127.0.0.1:8089 uvicorn server:app
+"""
+
+import argparse
+import json
+import threading
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class PaymentMock:
+    def __init__(self, token_ttl: int = 32400):
+        self.token_ttl = token_ttl
+        self.calls = Counter()
+        self.orders = {}
+        self.payments = {}
+        self.intents = {}
+        self.idempotent = {}
+        self.tokens = set()
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "PaymentMock":
+        mock = self
+
+        class Handler(MockHandler):
+            state = mock
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    # ---- routes ----
+
+    def handle(self, method: str, path: str, headers, body: bytes):
+        parts = [p for p in path.split("?")[0].split("/") if p]
+
+        if method == "POST" and parts == ["v1", "oauth2", "token"]:
+            self.calls["paypal_token"] += 1
+            token = uuid.uuid4().hex
+            self.tokens.add(token)
+            return 200, {"access_token": token, "token_type": "Bearer", "expires_in": self.token_ttl}
+
+        if parts[:1] == ["v1"] and parts[1:2] == ["payment_intents"]:
+            if headers.get("Authorization", "")[:7] != "Bearer ":
+                return 401, {"error": {"message": "Invalid API Key"}}
+            return self._stripe(method, parts[2:], headers, body)
+
+        if headers.get("Authorization", "").replace("Bearer ", "") not in self.tokens:
+            return 401, {"name": "AUTHENTICATION_FAILURE", "message": "Token invalid"}
+
+        request_id = headers.get("PayPal-Request-Id")
+        if request_id and request_id in self.idempotent:
+            return self.idempotent[request_id]
+
+        result = self._paypal(method, parts, body)
+        if request_id and method == "POST":
+            self.idempotent[request_id] = result
+        return result
+
+    def _paypal(self, method, parts, body):
+        payload = json.loads(body or b"{}")
+        if parts[:3] == ["v2", "checkout", "orders"]:
+            if method == "POST" and len(parts) == 3:
+                self.calls["paypal_create_order"] += 1
+                order_id = uuid.uuid4().hex[:17].upper()
+                order = {
+                    "id": order_id,
+                    "status": "CREATED",
+                    "purchase_units": payload.get("purchase_units", []),
+                    "links": [{"rel": "approve", "href": f"https://paypal.test/checkoutnow?token={order_id}"}]
+                }
+                self.orders[order_id] = order
+                return 201, order
+            order = self.orders.get(parts[3]) if len(parts) > 3 else None
+            if not order:
+                return 404, {"name": "RESOURCE_NOT_FOUND"}
+            if method == "GET":
+                self.calls["paypal_get_order"] += 1
+                return 200, order
+            if method == "POST" and parts[4:] == ["capture"]:
+                self.calls["paypal_capture"] += 1
+                if order["status"] == "COMPLETED":
+                    return 422, {"name": "UNPROCESSABLE_ENTITY", "details": [{"issue": "ORDER_ALREADY_CAPTURED"}]}
+                order["status"] = "COMPLETED"
+                return 201, order
+
+        if parts[:3] == ["v1", "payments", "payment"]:
+            if method == "POST" and len(parts) == 3:
+                self.calls["paypal_create_payment"] += 1
+                payment_id = f"PAYID-{uuid.uuid4().hex[:20].upper()}"
+                payment = {
+                    "id": payment_id,
+                    "state": "created",
+                    "transactions": payload.get("transactions", []),
+                    "links": [{"rel": "approval_url", "href": f"https://paypal.test/checkout?token={payment_id}"}]
+                }
+                self.payments[payment_id] = payment
+                return 201, payment
+            payment = self.payments.get(parts[3]) if len(parts) > 3 else None
+            if not payment:
+                return 404, {"name": "INVALID_RESOURCE_ID", "message": "Payment not found"}
+            if method == "POST" and parts[4:] == ["execute"]:
+                self.calls["paypal_execute"] += 1
+                if payment["state"] == "approved":
+                    return 400, {"name": "PAYMENT_ALREADY_DONE", "message": "Payment has been done already"}
+                payment["state"] = "approved"
+                payment["payer"] = {"payer_info": {"payer_id": payload.get("payer_id")}}
+                return 200, payment
+            if method == "GET":
+                return 200, payment
+
+        return 404, {"name": "NOT_FOUND"}
+
+    def _stripe(self, method, parts, headers, body):
+        key = headers.get("Idempotency-Key")
+        if key and key in self.idempotent:
+            return self.idempotent[key]
+        if method == "POST" and not parts:
+            self.calls["stripe_create_intent"] += 1
+            form = dict(parse_qsl(body.decode()))
+            intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+            intent = {
+                "id": intent_id,
+                "object": "payment_intent",
+                "amount": int(form.get("amount", 0)),
+                "currency": form.get("currency", "eur"),
+                "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:12]}",
+                "status": "succeeded",
+                "metadata": {k[9:-1]: v for k, v in form.items() if k.startswith("metadata[")}
+            }
+            self.intents[intent_id] = intent
+            result = (200, intent)
+            if key:
+                self.idempotent[key] = result
+            return result
+        if method == "GET" and len(parts) == 1:
+            self.calls["stripe_retrieve_intent"] += 1
+            intent = self.intents.get(parts[0])
+            if not intent:
+                return 404, {"error": {"message": f"No such payment_intent: '{parts[0]}'"}}
+            return 200, intent
+        return 404, {"error": {"message": "Unrecognized request URL"}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    state: PaymentMock = None
+
+    def _dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with self.state.lock:
+            status, payload = self.state.handle(method, self.path, self.headers, body)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur PayPal/Stripe factice")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+    mock = PaymentMock()
+    mock.server = ThreadingHTTPServer((args.host, args.port), type("Handler", (MockHandler,), {"state": mock}))
+    print(f"Payment mock listening on {mock.base_url}")
+    mock.server.serve_forever()
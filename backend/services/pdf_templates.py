@@ -0,0 +1,560 @@
+"""
+PDF templates (ReportLab)
+- One renderer per document type (devis, factures, devis mariage, fiche de déplacement, courrier de fin de projet)
+- Styles compiled once per process and reused by every renderer
+Imported on first render only (see pdf_service), so ReportLab is not loaded at server startup.
+"""
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.enums import TA_CENTER
+
+GOLD = colors.HexColor('#d4af37')
+
+COMPANY_INFO = {
+    "name": "CREATIVINDUSTRY FRANCE",
+    "legal": "SASU au capital de 101 €",
+    "rcs": "RCS Paris 100 871 425",
+    "siret": "SIRET : 100 871 425",
+    "tva": "TVA intracommunautaire : FR7501100871425",
+    "address": "60 rue François 1er, 75008 Paris",
+    "email": "contact@creativindustry.com",
+    "phone": ""
+}
+
+
+# ==================== STYLES ====================
+
+@lru_cache(maxsize=1)
+def get_styles() -> dict:
+    """Paragraph styles shared by all templates (built once per process)"""
+    base = getSampleStyleSheet()
+    normal = base['Normal']
+    return {
+        "base": base,
+        "normal": normal,
+        # Client devis / invoices
+        "doc_title": ParagraphStyle('DocTitle', parent=base['Heading1'], fontSize=22, textColor=GOLD, alignment=TA_CENTER, spaceAfter=5),
+        "doc_subtitle": ParagraphStyle('DocSubtitle', parent=normal, fontSize=16, textColor=GOLD, alignment=TA_CENTER, spaceAfter=15),
+        "heading": ParagraphStyle('Heading', parent=base['Heading2'], fontSize=14, textColor=GOLD, spaceBefore=20, spaceAfter=10),
+        "body": ParagraphStyle('CustomNormal', parent=normal, fontSize=11, spaceAfter=5),
+        "small": ParagraphStyle('Small', parent=normal, fontSize=8, textColor=colors.HexColor('#666666'), spaceAfter=2),
+        "footer": ParagraphStyle('Footer', parent=normal, fontSize=8, textColor=colors.HexColor('#888888'), alignment=TA_CENTER, spaceBefore=20),
+        "total": ParagraphStyle('Total', parent=base['Heading1'], fontSize=18, textColor=GOLD),
+        # Wedding quote
+        "quote_title": ParagraphStyle('QuoteTitle', parent=base['Heading1'], fontSize=24, textColor=GOLD, alignment=TA_CENTER, spaceAfter=20),
+        "quote_subtitle": ParagraphStyle('QuoteSubtitle', parent=normal, fontSize=12, textColor=colors.HexColor('#666666'), alignment=TA_CENTER, spaceAfter=30),
+        "quote_footer": ParagraphStyle('QuoteFooter', parent=normal, fontSize=9, textColor=colors.HexColor('#888888'), alignment=TA_CENTER, spaceBefore=30),
+        # Renewal invoice
+        "renewal_title": ParagraphStyle('RenewalTitle', parent=base['Heading1'], fontSize=24, textColor=colors.HexColor('#D4AF37'), alignment=TA_CENTER),
+        "renewal_sub": ParagraphStyle('Sub', parent=normal, alignment=TA_CENTER, textColor=colors.gray),
+        "renewal_inv_title": ParagraphStyle('InvTitle', parent=base['Heading2'], fontSize=16),
+        "paid": ParagraphStyle('Paid', parent=normal, textColor=colors.green),
+        "thanks": ParagraphStyle('Thanks', parent=normal, alignment=TA_CENTER, textColor=colors.gray),
+        "thanks_small": ParagraphStyle('Thanks2', parent=normal, alignment=TA_CENTER, textColor=colors.gray, fontSize=8),
+        # Deployment checklist
+        "sheet_title": ParagraphStyle('SheetTitle', parent=base['Heading1'], fontSize=18, spaceAfter=20),
+        "sheet_subtitle": ParagraphStyle('SheetSubtitle', parent=base['Heading2'], fontSize=14, spaceAfter=10),
+    }
+
+
+def _new_document(buffer, **margins):
+    options = {"rightMargin": 2*cm, "leftMargin": 2*cm, "topMargin": 2*cm, "bottomMargin": 2*cm}
+    options.update(margins)
+    return SimpleDocTemplate(buffer, pagesize=A4, **options)
+
+
+def _company_header(elements: list, title: str):
+    styles = get_styles()
+    elements.append(Paragraph(COMPANY_INFO["name"], styles["doc_title"]))
+    elements.append(Paragraph(title, styles["doc_subtitle"]))
+    elements.append(Spacer(1, 10))
+    for key in ("legal", "rcs", "siret", "tva"):
+        elements.append(Paragraph(COMPANY_INFO[key], styles["small"]))
+    elements.append(Paragraph(f"Siège social : {COMPANY_INFO['address']}", styles["small"]))
+    elements.append(Paragraph(f"Email : {COMPANY_INFO['email']}", styles["small"]))
+    elements.append(Spacer(1, 20))
+
+
+def _company_footer(elements: list):
+    styles = get_styles()
+    elements.append(Spacer(1, 15))
+    elements.append(Paragraph(f"{COMPANY_INFO['name']} - {COMPANY_INFO['legal']}", styles["footer"]))
+    elements.append(Paragraph(f"{COMPANY_INFO['siret']} - {COMPANY_INFO['tva']}", styles["footer"]))
+    elements.append(Paragraph(f"{COMPANY_INFO['address']}", styles["footer"]))
+
+
+def _tva_totals(elements: list, total_ttc: float):
+    styles = get_styles()
+    total_ht = round(total_ttc / 1.20, 2)
+    tva_amount = round(total_ttc - total_ht, 2)
+    elements.append(Paragraph("─" * 60, styles["body"]))
+    elements.append(Paragraph(f"<b>Total HT :</b> {total_ht:.2f} €", styles["body"]))
+    elements.append(Paragraph(f"<b>TVA (20%) :</b> {tva_amount:.2f} €", styles["body"]))
+    elements.append(Spacer(1, 10))
+    elements.append(Paragraph(f"<b>TOTAL TTC :</b> {total_ttc:.2f} €", styles["total"]))
+    elements.append(Paragraph("─" * 60, styles["body"]))
+
+
+# ==================== TEMPLATES ====================
+
+def generate_quote_pdf(quote_data: dict, options_details: list) -> bytes:
+    """Generate a professional PDF wedding quote"""
+    styles = get_styles()
+    buffer = BytesIO()
+    doc = _new_document(buffer)
+
+    elements = []
+
+    # Header
+    elements.append(Paragraph("CREATIVINDUSTRY France", styles["quote_title"]))
+    elements.append(Paragraph("Devis Mariage", styles["quote_subtitle"]))
+    elements.append(Spacer(1, 20))
+
+    # Quote reference
+    ref_date = quote_data.get('date') or datetime.now().strftime("%d/%m/%Y")
+    quote_id = quote_data.get('id', '')[:8].upper()
+    elements.append(Paragraph(f"<b>Référence:</b> #{quote_id} | <b>Date:</b> {ref_date}", styles["body"]))
+    elements.append(Spacer(1, 20))
+
+    # Client info section
+    elements.append(Paragraph("Informations Client", styles["heading"]))
+    client_data = [
+        ["Nom:", quote_data.get('client_name', '')],
+        ["Email:", quote_data.get('client_email', '')],
+        ["Téléphone:", quote_data.get('client_phone', '')],
+        ["Date du mariage:", quote_data.get('event_date', '')],
+        ["Lieu:", quote_data.get('event_location', '') or 'Non précisé'],
+    ]
+    client_table = Table(client_data, colWidths=[4*cm, 12*cm])
+    client_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#666666')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    elements.append(client_table)
+    elements.append(Spacer(1, 20))
+
+    # Prestations section, grouped by category
+    elements.append(Paragraph("Prestations Sélectionnées", styles["heading"]))
+    prestations_data = [["Prestation", "Prix"]]
+    categories = {'coverage': '📸 Couverture', 'extras': '✨ Options', 'editing': '🎬 Livrables', 'other': 'Autres'}
+    options_by_cat = {}
+    for opt in options_details:
+        options_by_cat.setdefault(opt.get('category', 'other'), []).append(opt)
+    for cat, cat_label in categories.items():
+        if cat in options_by_cat:
+            prestations_data.append([cat_label, ""])
+            for opt in options_by_cat[cat]:
+                prestations_data.append([f"   {opt['name']}", f"{opt['price']} €"])
+
+    total = sum(opt['price'] for opt in options_details)
+    prestations_data.append(["TOTAL", f"{total} €"])
+
+    prestations_table = Table(prestations_data, colWidths=[12*cm, 4*cm])
+    prestations_table.setStyle(TableStyle([
+        # Header
+        ('BACKGROUND', (0, 0), (-1, 0), GOLD),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        # Body
+        ('FONTSIZE', (0, 1), (-1, -2), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+        ('TOPPADDING', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dddddd')),
+        # Category rows (bold)
+        ('FONTNAME', (0, 1), (0, -2), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 1), (0, -2), GOLD),
+        # Total row
+        ('BACKGROUND', (0, -1), (-1, -1), GOLD),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.black),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, -1), (-1, -1), 14),
+    ]))
+    elements.append(prestations_table)
+    elements.append(Spacer(1, 30))
+
+    # Message if any
+    if quote_data.get('message'):
+        elements.append(Paragraph("Message du Client", styles["heading"]))
+        elements.append(Paragraph(f"<i>\"{quote_data['message']}\"</i>", styles["body"]))
+        elements.append(Spacer(1, 20))
+
+    # Footer
+    elements.append(Paragraph("─" * 50, styles["quote_footer"]))
+    elements.append(Paragraph("CREATIVINDUSTRY France", styles["quote_footer"]))
+    elements.append(Paragraph("contact@creativindustry.com | communication@creativindustry.com", styles["quote_footer"]))
+    elements.append(Paragraph(f"Devis valable 30 jours à compter du {ref_date}", styles["quote_footer"]))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def generate_devis_pdf(devis: dict, client_name: str) -> bytes:
+    """Generate the client devis PDF (client space)"""
+    styles = get_styles()
+    buffer = BytesIO()
+    doc = _new_document(buffer, topMargin=1.5*cm)
+    normal_style = styles["body"]
+
+    elements = []
+    _company_header(elements, "DEVIS")
+
+    # Devis info
+    elements.append(Paragraph("─" * 60, normal_style))
+    elements.append(Paragraph(f"<b>Référence Devis :</b> DEV-{devis.get('devis_id', '')[:8].upper()}", normal_style))
+    elements.append(Paragraph(f"<b>Date d'émission :</b> {devis.get('synced_at', '')[:10] if devis.get('synced_at') else 'N/A'}", normal_style))
+    elements.append(Paragraph(f"<b>Client :</b> {client_name}", normal_style))
+    elements.append(Paragraph("─" * 60, normal_style))
+    elements.append(Spacer(1, 15))
+
+    # Event info
+    if devis.get('event_type'):
+        elements.append(Paragraph(f"<b>Type d'événement :</b> {devis.get('event_type')}", normal_style))
+    if devis.get('event_date'):
+        elements.append(Paragraph(f"<b>Date de l'événement :</b> {devis.get('event_date')}", normal_style))
+
+    # Devis details if available
+    devis_data = devis.get('devis_data', {})
+    if devis_data and isinstance(devis_data, dict):
+        elements.append(Spacer(1, 15))
+        elements.append(Paragraph("Détails de la prestation", styles["heading"]))
+        for key, value in devis_data.items():
+            if key not in ['_id', 'id']:
+                elements.append(Paragraph(f"• {key} : {value}", normal_style))
+
+    elements.append(Spacer(1, 25))
+    _tva_totals(elements, float(devis.get('total_amount', 0)))
+
+    # Legal footer
+    elements.append(Spacer(1, 30))
+    elements.append(Paragraph("Conditions de paiement : 30% à la commande, solde à la livraison", styles["footer"]))
+    elements.append(Paragraph("Validité du devis : 30 jours", styles["footer"]))
+    _company_footer(elements)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def generate_invoice_pdf(invoice: dict, client_name: str) -> bytes:
+    """Generate the client invoice PDF (client space)"""
+    styles = get_styles()
+    buffer = BytesIO()
+    doc = _new_document(buffer, topMargin=1.5*cm)
+    normal_style = styles["body"]
+
+    elements = []
+    _company_header(elements, "FACTURE")
+
+    # Invoice info
+    elements.append(Paragraph("─" * 60, normal_style))
+    elements.append(Paragraph(f"<b>Numéro de facture :</b> {invoice.get('invoice_number', 'N/A')}", normal_style))
+    elements.append(Paragraph(f"<b>Date d'émission :</b> {invoice.get('invoice_date', 'N/A')}", normal_style))
+    elements.append(Paragraph(f"<b>Client :</b> {client_name}", normal_style))
+    elements.append(Paragraph("─" * 60, normal_style))
+    elements.append(Spacer(1, 20))
+
+    elements.append(Paragraph("Désignation", styles["heading"]))
+    elements.append(Paragraph("Prestation de services audiovisuels", normal_style))
+    elements.append(Spacer(1, 20))
+
+    _tva_totals(elements, float(invoice.get('amount', 0)))
+
+    # Legal footer
+    elements.append(Spacer(1, 30))
+    elements.append(Paragraph("Conditions de règlement : paiement à réception de facture", styles["footer"]))
+    elements.append(Paragraph("En cas de retard de paiement, une pénalité de 3 fois le taux d'intérêt légal sera appliquée.", styles["footer"]))
+    elements.append(Paragraph("Indemnité forfaitaire pour frais de recouvrement : 40 €", styles["footer"]))
+    _company_footer(elements)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def generate_renewal_invoice_pdf(invoice: dict) -> bytes:
+    """Generate a renewal (account extension) invoice PDF"""
+    styles = get_styles()
+    normal_style = styles["normal"]
+    buffer = BytesIO()
+    doc = _new_document(buffer)
+
+    content = []
+
+    # Header
+    content.append(Paragraph("CREATIVINDUSTRY", styles["renewal_title"]))
+    content.append(Paragraph("L'Industrie Créative", styles["renewal_sub"]))
+    content.append(Spacer(1, 30))
+
+    # Invoice title
+    content.append(Paragraph(f"FACTURE N° {invoice.get('invoice_number', 'N/A')}", styles["renewal_inv_title"]))
+    content.append(Spacer(1, 10))
+
+    # Date
+    created_at = invoice.get('created_at', '')
+    if created_at:
+        try:
+            formatted_date = datetime.fromisoformat(created_at.replace('Z', '+00:00')).strftime("%d/%m/%Y")
+        except ValueError:
+            formatted_date = created_at[:10]
+    else:
+        formatted_date = "N/A"
+    content.append(Paragraph(f"Date : {formatted_date}", normal_style))
+    content.append(Spacer(1, 20))
+
+    # Client info
+    content.append(Paragraph("<b>Client :</b>", normal_style))
+    content.append(Paragraph(f"{invoice.get('client_name', 'N/A')}", normal_style))
+    content.append(Paragraph(f"{invoice.get('client_email', 'N/A')}", normal_style))
+    content.append(Spacer(1, 30))
+
+    # Invoice details table
+    data = [
+        ['Description', 'Quantité', 'Prix HT', 'TVA', 'Total TTC'],
+        [
+            f"Renouvellement accès - {invoice.get('plan_label', 'N/A')}\n({invoice.get('days', 0)} jours)",
+            '1',
+            f"{invoice.get('amount_ht', 0):.2f} €",
+            f"{invoice.get('tva', 0):.2f} €",
+            f"{invoice.get('amount_ttc', 0):.2f} €"
+        ]
+    ]
+    table = Table(data, colWidths=[8*cm, 2*cm, 2.5*cm, 2.5*cm, 2.5*cm])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D4AF37')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f5f5f5')),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 1), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 10),
+    ]))
+    content.append(table)
+    content.append(Spacer(1, 20))
+
+    # Totals
+    totals_data = [
+        ['', 'Total HT :', f"{invoice.get('amount_ht', 0):.2f} €"],
+        ['', 'TVA (20%) :', f"{invoice.get('tva', 0):.2f} €"],
+        ['', 'Total TTC :', f"{invoice.get('amount_ttc', 0):.2f} €"],
+    ]
+    totals_table = Table(totals_data, colWidths=[10*cm, 4*cm, 3*cm])
+    totals_table.setStyle(TableStyle([
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (1, 2), (-1, 2), 'Helvetica-Bold'),
+        ('FONTSIZE', (1, 2), (-1, 2), 12),
+        ('TEXTCOLOR', (2, 2), (2, 2), colors.HexColor('#D4AF37')),
+    ]))
+    content.append(totals_table)
+    content.append(Spacer(1, 30))
+
+    # Payment info
+    content.append(Paragraph(f"<b>Mode de paiement :</b> {invoice.get('payment_method', 'PayPal')}", normal_style))
+    content.append(Paragraph("<b>Statut :</b> Payée ✓", styles["paid"]))
+    content.append(Spacer(1, 40))
+
+    # Footer
+    content.append(Paragraph("Merci pour votre confiance !", styles["thanks"]))
+    content.append(Paragraph("CREATIVINDUSTRY - L'Industrie Créative", styles["thanks_small"]))
+
+    doc.build(content)
+    return buffer.getvalue()
+
+
+def generate_deployment_pdf(deployment: dict, equipment_map: dict, categories: dict, with_validation: bool = True) -> bytes:
+    """Generate the equipment checklist of a deployment.
+    `with_validation` adds the check column and the departure/return signature block."""
+    styles = get_styles()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
+
+    elements = []
+
+    # Title
+    elements.append(Paragraph("Fiche de Déplacement", styles["sheet_title"]))
+    elements.append(Paragraph(f"<b>{deployment.get('name', 'Sans nom')}</b>", styles["sheet_subtitle"]))
+
+    # Info
+    info_data = [
+        ["Lieu:", deployment.get('location', '-')],
+        ["Date de départ:", deployment.get('start_date', '-')],
+        ["Date de retour:", deployment.get('end_date', '-')],
+    ]
+    if deployment.get('notes'):
+        info_data.append(["Notes:", deployment.get('notes')])
+
+    info_table = Table(info_data, colWidths=[4*cm, 12*cm])
+    info_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+    elements.append(info_table)
+    elements.append(Spacer(1, 20))
+
+    # Equipment table
+    elements.append(Paragraph("Liste du Matériel", styles["sheet_subtitle"]))
+
+    header = ["Qté", "Équipement", "Marque/Modèle", "Catégorie"]
+    table_data = [["☐"] + header if with_validation else header]
+    for item in deployment.get("items", []):
+        eq = equipment_map.get(item["equipment_id"], {})
+        cat = categories.get(eq.get("category_id"), {})
+        brand_model = f"{eq.get('brand', '')} {eq.get('model', '')}".strip() or "-"
+        row = [str(item.get("quantity", 1)), eq.get("name", "Unknown"), brand_model, cat.get("name", "-")]
+        table_data.append(["☐"] + row if with_validation else row)
+
+    if with_validation:
+        eq_table = Table(table_data, colWidths=[1*cm, 1.2*cm, 5*cm, 4*cm, 3.5*cm])
+        eq_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.2, 0.2)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'CENTER'),  # Center quantity column
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.Color(0.95, 0.95, 0.95)),
+            ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.7, 0.7, 0.7)),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        ]))
+    else:
+        eq_table = Table(table_data, colWidths=[1.2*cm, 6*cm, 5*cm, 3.5*cm])
+        eq_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.2, 0.2, 0.2)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.7, 0.7, 0.7)),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+        ]))
+    elements.append(eq_table)
+
+    if with_validation:
+        elements.append(Spacer(1, 30))
+        elements.append(Paragraph("Validation", styles["sheet_subtitle"]))
+        sig_data = [
+            ["Départ", "Retour"],
+            ["Date: _________________", "Date: _________________"],
+            ["Signature:", "Signature:"],
+            ["", ""],
+            ["", ""],
+        ]
+        sig_table = Table(sig_data, colWidths=[8*cm, 8*cm])
+        sig_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+            ('BOX', (0, 0), (0, -1), 1, colors.black),
+            ('BOX', (1, 0), (1, -1), 1, colors.black),
+        ]))
+        elements.append(sig_table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+DELIVERY_LETTER_LINES = [
+    "Bonjour,",
+    "",
+    "Nous sommes heureux de vous livrer vos fichiers ce jour et espérons qu'ils vous",
+    "feront plaisir.",
+    "",
+    "Notre équipe a mis tout son savoir-faire en termes de qualité d'image et de prise",
+    "de vue afin que vous puissiez garder les plus belles images du plus beau jour",
+    "de votre vie.",
+    "",
+    "Pour tout problème (modification ou autre des images de votre mariage),",
+    "n'hésitez pas à nous contacter par email à l'adresse contact@creativindustry.com.",
+    "Nous ferons le point ensemble et apporterons des modifications si besoin.",
+    "",
+    "Par exemple : à 1H30 la vidéo a sauté ou à 2H la vidéo s'est arrêtée.",
+    "Ces indications permettront à notre équipe d'effectuer les modifications",
+    "nécessaires.",
+    "",
+    "Après nous avoir informé des problèmes rencontrés, vous recevrez une nouvelle",
+    "copie modifiée disponible en téléchargement via notre site sous une semaine.",
+    "",
+    "IMPORTANT : Nous n'interviendrons qu'une seule fois pour toute modification.",
+    "Passé le délai d'une semaine, la modification ne sera plus possible.",
+    "Nous vous remercions de bien vouloir regarder la vidéo du début à la fin",
+    "et de noter tout problème éventuel.",
+    "",
+    "Merci de votre confiance et nous espérons que le résultat sera à la hauteur",
+    "de vos attentes. Ce fut un plaisir de partager avec vous ce jour si important.",
+    "",
+    "Nous vous souhaitons un bon visionnage !",
+    "",
+    "",
+    "Cordialement,",
+    "L'équipe CREATIVINDUSTRY",
+]
+
+
+def generate_delivery_letter_pdf(client_name: str, date: str) -> bytes:
+    """Generate the end-of-project letter attached to the delivery email"""
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    # Header
+    c.setFillColor(colors.HexColor("#D4AF37"))
+    c.rect(0, height - 100, width, 100, fill=True, stroke=False)
+    c.setFillColor(colors.HexColor("#000000"))
+    c.setFont("Helvetica-Bold", 24)
+    c.drawCentredString(width / 2, height - 60, "CREATIVINDUSTRY")
+    c.setFont("Helvetica", 12)
+    c.drawCentredString(width / 2, height - 85, "Courrier de fin de projet")
+
+    # Content
+    c.setFillColor(colors.HexColor("#333333"))
+    y_position = height - 150
+    c.setFont("Helvetica", 12)
+    c.drawString(50, y_position, f"Date : {date}")
+    y_position -= 40
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, y_position, f"À l'attention de : {client_name}")
+    y_position -= 40
+    c.setFont("Helvetica", 12)
+    for line in DELIVERY_LETTER_LINES:
+        c.drawString(50, y_position, line)
+        y_position -= 20
+
+    # Footer
+    c.setFillColor(colors.HexColor("#D4AF37"))
+    c.rect(0, 0, width, 40, fill=True, stroke=False)
+    c.setFillColor(colors.HexColor("#000000"))
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(width / 2, 15, "CREATIVINDUSTRY France - Votre partenaire audiovisuel")
+
+    c.save()
+    return buffer.getvalue()
+
+
+# Template name -> renderer. Renderers must be pure functions of their keyword arguments.
+PDF_TEMPLATES = {
+    "wedding_quote": generate_quote_pdf,
+    "client_devis": generate_devis_pdf,
+    "client_invoice": generate_invoice_pdf,
+    "renewal_invoice": generate_renewal_invoice_pdf,
+    "deployment_checklist": generate_deployment_pdf,
+    "delivery_letter": generate_delivery_letter_pdf,
+}
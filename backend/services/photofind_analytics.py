@@ -0,0 +1,229 @@
+"""
+Statistiques PhotoFind pré-calculées par événement
+- Compteurs mis à jour à chaque achat kiosque et à chaque impression ($inc)
+- Lecture du tableau de bord en une seule requête, quel que soit le volume
+- Reconstruction complète depuis les collections brutes (photofind_kiosk_purchases, photofind_print_logs)
+"""
+
+import logging
+from datetime import datetime, timezone
+
+STATS_COLLECTION = "photofind_event_stats"
+
+
+def _key(value, default="unknown") -> str:
+    """Nettoie une valeur pour l'utiliser comme clé de sous-document Mongo"""
+    value = str(value or default)
+    return value.replace(".", "_").replace("$", "_")
+
+
+def _hour_bucket(created_at) -> str:
+    """Retourne le créneau horaire 'YYYY-MM-DDTHH' d'une date ISO"""
+    if isinstance(created_at, datetime):
+        return created_at.strftime("%Y-%m-%dT%H")
+    if isinstance(created_at, str) and len(created_at) >= 13:
+        return created_at[:13]
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H")
+
+
+async def ensure_indexes(db):
+    """Index utilisés par les compteurs et les listes 'récents'"""
+    await db[STATS_COLLECTION].create_index("event_id", unique=True)
+    await db.photofind_kiosk_purchases.create_index([("event_id", 1), ("created_at", -1)])
+    await db.photofind_print_logs.create_index([("event_id", 1), ("created_at", -1)])
+
+
+async def record_purchase(db, purchase: dict):
+    """Incrémente les compteurs de ventes pour un achat kiosque"""
+    try:
+        amount = float(purchase.get("amount") or 0)
+        method = _key(purchase.get("payment_method"))
+        hour = _hour_bucket(purchase.get("created_at"))
+        await db[STATS_COLLECTION].update_one(
+            {"event_id": purchase["event_id"]},
+            {
+                "$inc": {
+                    "total_purchases": 1,
+                    "total_revenue": amount,
+                    "total_photos_sold": len(purchase.get("photo_ids") or []),
+                    f"revenue_by_method.{method}": amount,
+                    f"purchases_by_method.{method}": 1,
+                    f"purchases_by_hour.{hour}": 1,
+                    f"revenue_by_hour.{hour}": amount
+                },
+                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        # Les statistiques ne doivent jamais bloquer une vente
+        logging.error(f"PhotoFind stats (purchase) update failed: {e}")
+
+
+async def record_payment_method_change(db, purchase: dict, new_method: str):
+    """Déplace le chiffre d'affaires d'un achat 'payer plus tard' vers le moyen de paiement final"""
+    old_method = _key(purchase.get("payment_method"))
+    new_method = _key(new_method)
+    if old_method == new_method:
+        return
+    try:
+        amount = float(purchase.get("amount") or 0)
+        await db[STATS_COLLECTION].update_one(
+            {"event_id": purchase["event_id"]},
+            {
+                "$inc": {
+                    f"revenue_by_method.{old_method}": -amount,
+                    f"purchases_by_method.{old_method}": -1,
+                    f"revenue_by_method.{new_method}": amount,
+                    f"purchases_by_method.{new_method}": 1
+                },
+                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logging.error(f"PhotoFind stats (payment) update failed: {e}")
+
+
+async def record_print(db, log_entry: dict):
+    """Incrémente les compteurs d'impression pour une entrée photofind_print_logs"""
+    try:
+        count = int(log_entry.get("count") or 0)
+        print_format = _key(log_entry.get("format"))
+        hour = _hour_bucket(log_entry.get("created_at"))
+        await db[STATS_COLLECTION].update_one(
+            {"event_id": log_entry["event_id"]},
+            {
+                "$inc": {
+                    "total_printed": count,
+                    "total_print_jobs": 1,
+                    f"prints_by_format.{print_format}": count,
+                    f"prints_by_hour.{hour}": count
+                },
+                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logging.error(f"PhotoFind stats (print) update failed: {e}")
+
+
+async def get_event_stats(db, event_id: str, recent: int = 10) -> dict:
+    """Tableau de bord d'un événement : compteurs + derniers achats/impressions triés par date"""
+    stats = await db[STATS_COLLECTION].find_one({"event_id": event_id}, {"_id": 0}) or {}
+
+    recent_purchases = await db.photofind_kiosk_purchases.find(
+        {"event_id": event_id}, {"_id": 0}
+    ).sort("created_at", -1).limit(recent).to_list(recent)
+
+    recent_prints = await db.photofind_print_logs.find(
+        {"event_id": event_id}, {"_id": 0}
+    ).sort("created_at", -1).limit(recent).to_list(recent)
+
+    return {
+        "total_purchases": stats.get("total_purchases", 0),
+        "total_revenue": round(stats.get("total_revenue", 0), 2),
+        "total_photos_sold": stats.get("total_photos_sold", 0),
+        "total_printed": stats.get("total_printed", 0),
+        "total_print_jobs": stats.get("total_print_jobs", 0),
+        "revenue_by_method": stats.get("revenue_by_method", {}),
+        "purchases_by_method": stats.get("purchases_by_method", {}),
+        "prints_by_format": stats.get("prints_by_format", {}),
+        "purchases_by_hour": dict(sorted(stats.get("purchases_by_hour", {}).items())),
+        "revenue_by_hour": dict(sorted(stats.get("revenue_by_hour", {}).items())),
+        "prints_by_hour": dict(sorted(stats.get("prints_by_hour", {}).items())),
+        "stats_updated_at": stats.get("updated_at"),
+        "recent_purchases": recent_purchases,
+        "recent_prints": recent_prints
+    }
+
+
+async def rebuild_event_stats(db, event_id: str) -> dict:
+    """Recalcule les compteurs d'un événement depuis les collections brutes"""
+    hour_expr = {"$substrCP": [{"$ifNull": ["$created_at", ""]}, 0, 13]}
+    stats = {
+        "event_id": event_id,
+        "total_purchases": 0,
+        "total_revenue": 0.0,
+        "total_photos_sold": 0,
+        "total_printed": 0,
+        "total_print_jobs": 0,
+        "revenue_by_method": {},
+        "purchases_by_method": {},
+        "purchases_by_hour": {},
+        "revenue_by_hour": {},
+        "prints_by_format": {},
+        "prints_by_hour": {}
+    }
+
+    purchase_facets = await db.photofind_kiosk_purchases.aggregate([
+        {"$match": {"event_id": event_id}},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "revenue": {"$sum": {"$ifNull": ["$amount", 0]}},
+                "photos": {"$sum": {"$size": {"$ifNull": ["$photo_ids", []]}}}
+            }}],
+            "by_method": [{"$group": {
+                "_id": "$payment_method",
+                "count": {"$sum": 1},
+                "revenue": {"$sum": {"$ifNull": ["$amount", 0]}}
+            }}],
+            "by_hour": [{"$group": {
+                "_id": hour_expr,
+                "count": {"$sum": 1},
+                "revenue": {"$sum": {"$ifNull": ["$amount", 0]}}
+            }}]
+        }}
+    ]).to_list(1)
+
+    if purchase_facets:
+        facets = purchase_facets[0]
+        if facets["totals"]:
+            totals = facets["totals"][0]
+            stats["total_purchases"] = totals["count"]
+            stats["total_revenue"] = float(totals["revenue"])
+            stats["total_photos_sold"] = totals["photos"]
+        for row in facets["by_method"]:
+            stats["revenue_by_method"][_key(row["_id"])] = float(row["revenue"])
+            stats["purchases_by_method"][_key(row["_id"])] = row["count"]
+        for row in facets["by_hour"]:
+            if row["_id"]:
+                stats["purchases_by_hour"][row["_id"]] = row["count"]
+                stats["revenue_by_hour"][row["_id"]] = float(row["revenue"])
+
+    print_facets = await db.photofind_print_logs.aggregate([
+        {"$match": {"event_id": event_id}},
+        {"$facet": {
+            "totals": [{"$group": {"_id": None, "jobs": {"$sum": 1}, "count": {"$sum": {"$ifNull": ["$count", 0]}}}}],
+            "by_format": [{"$group": {"_id": "$format", "count": {"$sum": {"$ifNull": ["$count", 0]}}}}],
+            "by_hour": [{"$group": {"_id": hour_expr, "count": {"$sum": {"$ifNull": ["$count", 0]}}}}]
+        }}
+    ]).to_list(1)
+
+    if print_facets:
+        facets = print_facets[0]
+        if facets["totals"]:
+            stats["total_printed"] = facets["totals"][0]["count"]
+            stats["total_print_jobs"] = facets["totals"][0]["jobs"]
+        for row in facets["by_format"]:
+            stats["prints_by_format"][_key(row["_id"])] = row["count"]
+        for row in facets["by_hour"]:
+            if row["_id"]:
+                stats["prints_by_hour"][row["_id"]] = row["count"]
+
+    stats["updated_at"] = datetime.now(timezone.utc).isoformat()
+    stats["rebuilt_at"] = stats["updated_at"]
+    await db[STATS_COLLECTION].replace_one({"event_id": event_id}, stats, upsert=True)
+    return stats
+
+
+async def rebuild_all_event_stats(db) -> int:
+    """Recalcule les compteurs de tous les événements ayant des achats ou des impressions"""
+    event_ids = set(await db.photofind_kiosk_purchases.distinct("event_id"))
+    event_ids |= set(await db.photofind_print_logs.distinct("event_id"))
+    event_ids |= set(await db.photofind_events.distinct("id"))
+    for event_id in event_ids:
+        await rebuild_event_stats(db, event_id)
+    return len(event_ids)
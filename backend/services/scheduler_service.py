@@ -2,23 +2,174 @@
 Scheduler automatique pour les tâches planifiées
 - Rappels SMS 24h avant les RDV (tous les jours à 10h)
 - Rappels équipement retour (tous les jours à 9h)
+- Rappels de tâches (toutes les heures)
+- Nettoyage des blobs médias sans référence (tous les jours à 4h)
+- Nettoyage du cache PDF (tous les jours à 4h30)
+- Reprise de la normalisation des médias du livre d'or restés en attente (toutes les 15 minutes)
+
+Avec plusieurs workers uvicorn, chaque processus démarre ce scheduler mais un seul exécute les jobs :
+- Élection d'un leader par bail Mongo (scheduler_leases, _id "scheduler") renouvelé toutes les
+  SCHEDULER_LEASE_SECONDS / 3 secondes ; si le leader s'arrête, un autre worker reprend à l'expiration
+- Chaque échéance est réservée par un document scheduler_runs d'_id unique (job + minute prévue) :
+  même pendant un changement de leader, une échéance ne s'exécute qu'une fois
+- Verrou par job (scheduler_leases, "job:<id>") : un déclenchement manuel ne chevauche pas l'exécution planifiée
+- Historique des exécutions (durée, statut, résultat ou erreur) dans scheduler_runs, conservé SCHEDULER_HISTORY_DAYS jours
+- Les jobs utilisent le pool Mongo partagé du processus (database.db)
 """
 
 import logging
+import socket
+import time
+import uuid
 from datetime import datetime, timezone, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from motor.motor_asyncio import AsyncIOMotorClient
+from apscheduler.triggers.interval import IntervalTrigger
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 
+from database import db
+from services import guestbook_media, media_store, pdf_service, task_reminders
+from services.executors import run_io
+
 # Configuration
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'test_database')
 SITE_URL = os.environ.get("SITE_URL", "https://creativindustry.com")
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() not in ("0", "false", "no")
+LEASE_SECONDS = int(os.environ.get("SCHEDULER_LEASE_SECONDS", "60"))
+JOB_LOCK_SECONDS = int(os.environ.get("SCHEDULER_JOB_LOCK_SECONDS", "1800"))
+HISTORY_DAYS = int(os.environ.get("SCHEDULER_HISTORY_DAYS", "30"))
+TIMEZONE = 'Europe/Paris'
+
+# Identifiant de ce processus (propriétaire des baux)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
 
 # Scheduler instance
 scheduler = AsyncIOScheduler()
 
+
+# ==================== BAUX ET HISTORIQUE ====================
+
+class Lease:
+    """Bail Mongo : un seul propriétaire à la fois, jusqu'à expiration ou libération"""
+
+    def __init__(self, collection, name: str, owner: str, ttl: int):
+        self.collection = collection
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.expires_at = None
+
+    def held(self, now: datetime = None) -> bool:
+        """Bail détenu et pas encore expiré (vérifié localement, sans requête)"""
+        now = now or datetime.now(timezone.utc)
+        return self.expires_at is not None and now < self.expires_at
+
+    async def acquire(self, now: datetime = None) -> bool:
+        """Prend ou renouvelle le bail ; False s'il appartient à un autre processus"""
+        now = now or datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        update = {"owner": self.owner, "expires_at": expires_at, "renewed_at": now}
+        if not self.held(now):
+            update["acquired_at"] = now
+        try:
+            lease = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": update},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Le document existe et appartient à un autre propriétaire (bail non expiré)
+            lease = None
+        self.expires_at = expires_at if lease and lease.get("owner") == self.owner else None
+        return self.expires_at is not None
+
+    async def release(self):
+        self.expires_at = None
+        await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+
+
+leader = Lease(db.scheduler_leases, "scheduler", WORKER_ID, LEASE_SECONDS)
+
+
+async def ensure_indexes():
+    await db.scheduler_runs.create_index([("job_id", 1), ("started_at", -1)])
+    await db.scheduler_runs.create_index("started_at", expireAfterSeconds=HISTORY_DAYS * 86400)
+
+
+async def renew_leadership():
+    """Exécuté par chaque worker : prend ou renouvelle le bail du leader"""
+    was_leader = leader.held()
+    try:
+        is_leader = await leader.acquire()
+    except Exception as e:
+        logging.error(f"❌ Bail scheduler non renouvelé: {e}")
+        return
+    if is_leader != was_leader:
+        logging.info(f"📅 Scheduler {'leader' if is_leader else 'en attente'} ({WORKER_ID})")
+
+
+async def run_job(job_id: str, func, trigger: str = "manual", run_key: str = None):
+    """Exécute un job sous son verrou et enregistre l'exécution dans scheduler_runs.
+    Renvoie le résultat du job, ou None s'il tourne déjà ailleurs / si l'échéance a déjà été traitée."""
+    lock = Lease(db.scheduler_leases, f"job:{job_id}", f"{WORKER_ID}:{uuid.uuid4().hex[:8]}", JOB_LOCK_SECONDS)
+    if not await lock.acquire():
+        logging.info(f"📅 Job {job_id} déjà en cours sur un autre worker")
+        return None
+    run_id = run_key or f"{job_id}:{trigger}:{uuid.uuid4().hex}"
+    try:
+        try:
+            await db.scheduler_runs.insert_one({
+                "_id": run_id,
+                "job_id": job_id,
+                "trigger": trigger,
+                "worker": WORKER_ID,
+                "status": "running",
+                "started_at": datetime.now(timezone.utc)
+            })
+        except DuplicateKeyError:
+            return None
+        start = time.perf_counter()
+        status, result, error = "success", None, None
+        try:
+            result = await func()
+        except Exception as e:
+            status, error = "failed", str(e)
+            logging.exception(f"❌ Job {job_id} en échec")
+        await db.scheduler_runs.update_one({"_id": run_id}, {"$set": {
+            "status": status,
+            "finished_at": datetime.now(timezone.utc),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "result": result if isinstance(result, dict) else None,
+            "error": error
+        }})
+        return result
+    finally:
+        await lock.release()
+
+
+def run_key(job_id: str, now: datetime = None) -> str:
+    """Clé d'une échéance planifiée : le job et la minute de déclenchement (identique sur tous les workers)"""
+    now = now or datetime.now(timezone.utc)
+    return f"{job_id}:{now.replace(second=0, microsecond=0).isoformat()}"
+
+
+def leader_only(job_id: str, func):
+    """Job planifié : ignoré hors du leader, et réservé une seule fois par échéance"""
+    async def scheduled_job():
+        if not leader.held():
+            return None
+        return await run_job(job_id, func, trigger="schedule", run_key=run_key(job_id))
+    scheduled_job.__name__ = func.__name__
+    return scheduled_job
+
+
+async def recent_runs(job_id: str = None, limit: int = 50) -> list:
+    query = {"job_id": job_id} if job_id else {}
+    return await db.scheduler_runs.find(query).sort("started_at", -1).to_list(limit)
+
+
 async def send_daily_appointment_reminders():
     """
     Envoie les rappels SMS pour les RDV de demain.
@@ -29,10 +180,6 @@ async def send_daily_appointment_reminders():
     logging.info("🔔 Début de l'envoi des rappels SMS quotidiens...")
     
     try:
-        # Connexion à la base de données
-        client = AsyncIOMotorClient(MONGO_URL)
-        db = client[DB_NAME]
-        
         # Calculer la date de demain
         now = datetime.now(timezone.utc)
         tomorrow = now + timedelta(hours=24)
@@ -53,7 +200,7 @@ async def send_daily_appointment_reminders():
             if not client_phone:
                 continue
             
-            success = send_appointment_reminder_sms(
+            success = await run_io(send_appointment_reminder_sms,
                 client_phone=client_phone,
                 client_name=apt.get("client_name", ""),
                 appointment_date=apt.get("proposed_date", ""),
@@ -76,12 +223,11 @@ async def send_daily_appointment_reminders():
                 logging.error(f"❌ Échec rappel pour {apt.get('client_name')} ({client_phone})")
         
         logging.info(f"🔔 Rappels terminés: {sent_count} envoyés, {failed_count} échecs (RDV du {tomorrow_str})")
-        
-        # Fermer la connexion
-        client.close()
+        return {"sent": sent_count, "failed": failed_count, "date": tomorrow_str}
         
     except Exception as e:
         logging.error(f"❌ Erreur scheduler rappels SMS: {e}")
+        raise
 
 async def send_equipment_return_reminders():
     """
@@ -95,9 +241,6 @@ async def send_equipment_return_reminders():
     logging.info("📦 Vérification des rappels de retour matériel...")
     
     try:
-        client = AsyncIOMotorClient(MONGO_URL)
-        db = client[DB_NAME]
-        
         today = datetime.now(timezone.utc).date()
         tomorrow = today + timedelta(days=1)
         
@@ -122,14 +265,13 @@ async def send_equipment_return_reminders():
         
         if not admin_emails:
             logging.warning("⚠️ Aucun email admin trouvé pour les rappels")
-            client.close()
-            return
+            return {"reminders_sent": 0, "ending_tomorrow": len(deployments_ending), "overdue": len(deployments_overdue)}
         
         # Send reminder for deployments ending tomorrow
         for dep in deployments_ending:
             for email in admin_emails:
                 try:
-                    await send_email(
+                    await run_io(send_email,
                         to_email=email,
                         subject=f"📦 Rappel: Retour matériel demain - {dep.get('name')}",
                         html_content=f"""
@@ -163,7 +305,7 @@ async def send_equipment_return_reminders():
                 
             for email in admin_emails:
                 try:
-                    await send_email(
+                    await run_io(send_email,
                         to_email=email,
                         subject=f"⚠️ ALERTE: Matériel non retourné - {dep.get('name')}",
                         html_content=f"""
@@ -190,11 +332,11 @@ async def send_equipment_return_reminders():
             )
         
         logging.info(f"📦 Rappels équipement: {reminders_sent} envoyés, {len(deployments_ending)} à retourner demain, {len(deployments_overdue)} en retard")
-        
-        client.close()
+        return {"reminders_sent": reminders_sent, "ending_tomorrow": len(deployments_ending), "overdue": len(deployments_overdue)}
         
     except Exception as e:
         logging.error(f"❌ Erreur scheduler rappels équipement: {e}")
+        raise
 
 async def send_loss_ticket_reminders():
     """
@@ -207,9 +349,6 @@ async def send_loss_ticket_reminders():
     logging.info("🎫 Vérification des tickets de perte/vol...")
     
     try:
-        client = AsyncIOMotorClient(MONGO_URL)
-        db = client[DB_NAME]
-        
         today = datetime.now(timezone.utc)
         three_days_ago = (today - timedelta(days=3)).isoformat()
         
@@ -224,8 +363,7 @@ async def send_loss_ticket_reminders():
         
         if not tickets:
             logging.info("🎫 Aucun ticket nécessitant un rappel")
-            client.close()
-            return
+            return {"reminders_sent": 0, "pending_tickets": 0}
         
         notification_email = "communication@creativindustry.com"
         reminders_sent = 0
@@ -239,7 +377,7 @@ async def send_loss_ticket_reminders():
             }
             
             try:
-                await send_email(
+                await run_io(send_email,
                     to_email=notification_email,
                     subject=f"🔔 RAPPEL #{reminders_sent+1} - Matériel {issue_labels.get(ticket.get('issue_type'), '')}: {ticket.get('equipment_name')}",
                     html_content=f"""
@@ -275,46 +413,98 @@ async def send_loss_ticket_reminders():
                 logging.error(f"❌ Erreur rappel ticket {ticket.get('id')}: {e}")
         
         logging.info(f"🎫 Rappels tickets: {reminders_sent} envoyés sur {len(tickets)} tickets en attente")
-        client.close()
+        return {"reminders_sent": reminders_sent, "pending_tickets": len(tickets)}
         
     except Exception as e:
         logging.error(f"❌ Erreur scheduler rappels tickets: {e}")
+        raise
 
-def start_scheduler():
-    """Démarre le scheduler avec toutes les tâches planifiées"""
+async def send_task_reminders():
+    """
+    Envoie les rappels de tâches prévus aujourd'hui (collection task_reminders, voir services/task_reminders.py).
+    Exécuté automatiquement toutes les heures (remplace l'appel cron de /tasks/check-reminders).
+    """
+    from services.email_service import send_email
     
-    # Rappels SMS RDV tous les jours à 10h
-    scheduler.add_job(
-        send_daily_appointment_reminders,
-        CronTrigger(hour=10, minute=0, timezone='Europe/Paris'),
-        id='daily_sms_reminders',
-        name='Rappels SMS quotidiens',
-        replace_existing=True
-    )
+    return await task_reminders.send_due_reminders(db, send_email)
+
+async def collect_media_garbage():
+    """Supprime les contenus du stockage média qui ne sont plus référencés (fichiers supprimés par les routes)"""
+    try:
+        return await run_io(media_store.collect_garbage)
+    except Exception as e:
+        logging.error(f"❌ Erreur nettoyage stockage média: {e}")
+        raise
+
+async def prune_cached_pdfs():
+    """Supprime les PDF en cache non régénérés depuis PDF_CACHE_MAX_AGE_DAYS jours"""
+    removed = await run_io(pdf_service.prune_pdf_cache)
+    logging.info(f"🧹 Cache PDF: {removed} fichier(s) supprimé(s)")
+    return {"removed": removed}
+
+async def resume_guestbook_media():
+    """Reprend en tâche de fond la normalisation des messages du livre d'or restés en attente
+    (envois interrompus par un redémarrage, messages antérieurs à la normalisation)"""
+    queued = await guestbook_media.resume_pending(db, media_store.UPLOADS_DIR)
+    if queued:
+        logging.info(f"🎬 Livre d'or: normalisation de {queued} message(s) reprise")
+    return {"queued": queued}
+
+# (id, fonction, déclencheur, libellé)
+JOBS = [
+    ('daily_sms_reminders', send_daily_appointment_reminders,
+     CronTrigger(hour=10, minute=0, timezone=TIMEZONE), 'Rappels SMS quotidiens'),
+    ('daily_equipment_reminders', send_equipment_return_reminders,
+     CronTrigger(hour=9, minute=0, timezone=TIMEZONE), 'Rappels retour matériel'),
+    ('daily_loss_ticket_reminders', send_loss_ticket_reminders,
+     CronTrigger(hour=9, minute=30, timezone=TIMEZONE), 'Rappels tickets perte/vol'),
+    ('hourly_task_reminders', send_task_reminders,
+     CronTrigger(minute=5, timezone=TIMEZONE), 'Rappels de tâches'),
+    ('daily_media_gc', collect_media_garbage,
+     CronTrigger(hour=4, minute=0, timezone=TIMEZONE), 'Nettoyage stockage média'),
+    ('daily_pdf_cache_prune', prune_cached_pdfs,
+     CronTrigger(hour=4, minute=30, timezone=TIMEZONE), 'Nettoyage cache PDF'),
+    ('guestbook_media_resume', resume_guestbook_media,
+     CronTrigger(minute='*/15', timezone=TIMEZONE), "Reprise normalisation livre d'or"),
+]
+
+
+def start_scheduler():
+    """Démarre le scheduler : tous les workers se disputent le bail, seul le leader exécute les jobs"""
+    if not SCHEDULER_ENABLED:
+        logging.info("📅 Scheduler désactivé (SCHEDULER_ENABLED)")
+        return
     
-    # Rappels équipement tous les jours à 9h
+    # Bail du leader, pris immédiatement puis renouvelé bien avant son expiration
     scheduler.add_job(
-        send_equipment_return_reminders,
-        CronTrigger(hour=9, minute=0, timezone='Europe/Paris'),
-        id='daily_equipment_reminders',
-        name='Rappels retour matériel',
+        renew_leadership,
+        IntervalTrigger(seconds=max(1, LEASE_SECONDS // 3)),
+        id='scheduler_leadership',
+        name='Bail du scheduler',
+        next_run_time=datetime.now(timezone.utc),
         replace_existing=True
     )
     
-    # Rappels tickets perte/vol tous les jours à 9h30
-    scheduler.add_job(
-        send_loss_ticket_reminders,
-        CronTrigger(hour=9, minute=30, timezone='Europe/Paris'),
-        id='daily_loss_ticket_reminders',
-        name='Rappels tickets perte/vol',
-        replace_existing=True
-    )
+    for job_id, func, trigger, name in JOBS:
+        scheduler.add_job(
+            leader_only(job_id, func),
+            trigger,
+            id=job_id,
+            name=name,
+            replace_existing=True
+        )
     
     scheduler.start()
-    logging.info("📅 Scheduler démarré - SMS 10h, Équipement 9h, Tickets perte/vol 9h30")
+    logging.info("📅 Scheduler démarré - SMS 10h, Équipement 9h, Tickets perte/vol 9h30, Tâches toutes les heures, Nettoyage médias 4h, Cache PDF 4h30, Livre d'or toutes les 15 min")
+
 
-def stop_scheduler():
-    """Arrête le scheduler proprement"""
+async def stop_scheduler():
+    """Arrête le scheduler proprement et libère le bail pour qu'un autre worker reprenne sans attendre"""
     if scheduler.running:
         scheduler.shutdown()
         logging.info("📅 Scheduler arrêté")
+    if leader.held():
+        try:
+            await leader.release()
+        except Exception as e:
+            logging.error(f"❌ Bail scheduler non libéré: {e}")
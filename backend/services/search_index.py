@@ -0,0 +1,121 @@
+"""
+Recherche indexée (matériel) et recherches insensibles à la casse sans expression régulière
+- Chaque document recherchable porte des clés normalisées (minuscules, sans accents ni ponctuation) :
+  search_tokens (mots, index multiclé : recherche par préfixe ancré), search_grams (trigrammes,
+  index multiclé : recherche dans un mot, ex. milieu d'un numéro de série) et search_text (texte normalisé)
+- La saisie utilisateur est normalisée puis échappée (re.escape) : aucun motif fourni par l'utilisateur
+  n'est exécuté, et chaque terme est limité en nombre et en longueur
+- Égalité insensible à la casse (emails, noms) : collation CASE_INSENSITIVE + index de même collation,
+  au lieu de $regex "^...$" (qui parcourait toute la collection et cassait sur "+" ou "." dans un email)
+"""
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+from pymongo import UpdateOne
+
+SEARCH_FIELDS = ("search_tokens", "search_grams", "search_text")
+# Projection à ajouter aux lectures pour ne pas renvoyer les clés de recherche
+HIDDEN_SEARCH_FIELDS = {field: 0 for field in SEARCH_FIELDS}
+
+CASE_INSENSITIVE = {"locale": "fr", "strength": 2}
+
+MAX_TERMS = 6
+MAX_TERM_LENGTH = 40
+GRAM_SIZE = 3
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text) -> str:
+    """Minuscules, sans accents, ponctuation remplacée par des espaces"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", stripped.lower()).strip()
+
+
+def trigrams(token: str) -> set:
+    return {token[i:i + GRAM_SIZE] for i in range(len(token) - GRAM_SIZE + 1)}
+
+
+def search_keys(*values) -> dict:
+    """Champs de recherche à enregistrer avec le document"""
+    text = " ".join(filter(None, (normalize(v) for v in values)))
+    tokens = set(text.split())
+    grams = set()
+    for token in tokens:
+        grams |= trigrams(token)
+    # Numéros de série et références : la version sans séparateurs ("EOS-R5" -> "eosr5") est aussi un mot
+    compact = {normalize(v).replace(" ", "") for v in values if v}
+    for token in compact - tokens:
+        if token:
+            tokens.add(token)
+            grams |= trigrams(token)
+    return {"search_tokens": sorted(tokens), "search_grams": sorted(grams), "search_text": text}
+
+
+def query_terms(search: str) -> list:
+    """Termes normalisés d'une saisie utilisateur (bornés en nombre et en longueur)"""
+    terms = []
+    for term in normalize(search).split():
+        term = term[:MAX_TERM_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def search_filter(search: str) -> Optional[dict]:
+    """Filtre Mongo : chaque terme est le début d'un mot, ou (3 caractères et plus) contenu dans un mot.
+    None si la saisie ne contient aucun terme exploitable."""
+    terms = query_terms(search)
+    if not terms:
+        return None
+    clauses = []
+    for term in terms:
+        prefix = {"search_tokens": {"$regex": f"^{re.escape(term)}"}}
+        if len(term) >= GRAM_SIZE:
+            clauses.append({"$or": [prefix, {"search_grams": {"$all": sorted(trigrams(term))}}]})
+        else:
+            clauses.append(prefix)
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def matches(document: dict, search: str) -> bool:
+    """Contrôle final des candidats trouvés par trigrammes (les trigrammes peuvent venir de mots différents)"""
+    tokens = document.get("search_tokens")
+    if tokens is None:
+        return True
+    return all(any(term in token for token in tokens) for term in query_terms(search))
+
+
+def strip_search_fields(documents: Iterable[dict]) -> list:
+    documents = list(documents)
+    for document in documents:
+        for field in SEARCH_FIELDS:
+            document.pop(field, None)
+    return documents
+
+
+async def ensure_indexes(collection):
+    await collection.create_index("search_tokens")
+    await collection.create_index("search_grams")
+
+
+async def backfill(collection, fields: tuple, batch_size: int = 500) -> int:
+    """Ajoute les clés de recherche aux documents qui n'en ont pas encore ; renvoie le nombre mis à jour"""
+    projection = {"_id": 1, **{field: 1 for field in fields}}
+    updated = 0
+    batch = []
+    async for document in collection.find({"search_text": {"$exists": False}}, projection):
+        batch.append(UpdateOne({"_id": document["_id"]},
+                               {"$set": search_keys(*(document.get(field) for field in fields))}))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
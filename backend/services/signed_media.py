@@ -0,0 +1,129 @@
+"""
+URLs signées et limitées dans le temps pour les médias (galeries, PhotoFind)
+- Les API de galerie/PhotoFind font l'autorisation une seule fois (galerie du client, achat HD, achat payé)
+  et renvoient pour chaque photo des URLs /api/media/<taille>/<chemin>?exp=...&sig=...
+- La route /api/media vérifie uniquement la signature HMAC-SHA256 et l'expiration : aucune requête
+  MongoDB par image ; le fichier est ensuite envoyé par deliver_file (X-Accel-Redirect si activé)
+- L'expiration est arrondie à une fenêtre de MEDIA_URL_TTL : une même photo garde la même URL pendant
+  la fenêtre, ce qui permet le cache navigateur ; durée de validité entre TTL et 2 x TTL
+- Tailles : thumb (400 px), web (1600 px), original. Les réductions sont générées à la première demande
+  dans le cache des dérivés (media_store.derivative_path) et partagées entre copies identiques ;
+  sans empreinte SHA-256 (anciens enregistrements) ou sans Pillow, l'original est servi
+- Le nom de téléchargement (dl) fait partie de la signature : une URL d'affichage ne peut pas être
+  transformée en téléchargement, ni une photo en une autre
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote, urlencode
+
+from services import media_store
+
+ROOT_DIR = Path(__file__).parent.parent
+UPLOADS_DIR = ROOT_DIR / "uploads"
+
+MEDIA_URL_SECRET = os.environ.get("MEDIA_URL_SECRET") or os.environ.get("JWT_SECRET", "creativindustry-secret-key-2024")
+MEDIA_URL_TTL = int(os.environ.get("MEDIA_URL_TTL", 6 * 3600))
+MEDIA_URL_PREFIX = "/api/media"
+
+# Largeur maximale par taille (None : fichier original)
+SIZES = {"thumb": 400, "web": 1600, "original": None}
+# Seuls ces dossiers de uploads/ peuvent être servis par URL signée
+SIGNED_DIRS = ("galleries", "photofind")
+
+logger = logging.getLogger(__name__)
+
+
+def _signature(size: str, path: str, expires: int, download: str, sha256: str) -> str:
+    message = "\n".join((size, path, str(expires), download, sha256)).encode()
+    digest = hmac.new(MEDIA_URL_SECRET.encode(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def expiry_for(now: float = None, ttl: int = None) -> int:
+    ttl = ttl or MEDIA_URL_TTL
+    now = time.time() if now is None else now
+    return (int(now) // ttl + 2) * ttl
+
+
+def sign_media_url(path: str, size: str = "original", download: str = None, sha256: str = None,
+                   now: float = None) -> str:
+    """URL signée pour un fichier de uploads/ (path relatif, ex. "galleries/abc.jpg")"""
+    if size not in SIZES:
+        raise ValueError(f"Taille inconnue: {size}")
+    path = path.lstrip("/")
+    expires = expiry_for(now)
+    params = {"exp": expires}
+    if download:
+        params["dl"] = download
+    if sha256:
+        params["h"] = sha256
+    params["sig"] = _signature(size, path, expires, download or "", sha256 or "")
+    return f"{MEDIA_URL_PREFIX}/{size}/{quote(path)}?{urlencode(params)}"
+
+
+def photo_urls(path: str, sha256: str = None, download: str = None, now: float = None) -> dict:
+    """URLs signées d'une photo pour chaque taille d'affichage, plus le téléchargement si autorisé"""
+    urls = {size: sign_media_url(path, size, sha256=sha256, now=now) for size in ("thumb", "web")}
+    if download:
+        urls["download"] = sign_media_url(path, "original", download=download, sha256=sha256, now=now)
+    return urls
+
+
+def verify_media_signature(size: str, path: str, expires: int, signature: str, download: str = None,
+                           sha256: str = None, now: float = None) -> bool:
+    now = time.time() if now is None else now
+    if size not in SIZES or expires < now:
+        return False
+    expected = _signature(size, path, expires, download or "", sha256 or "")
+    return hmac.compare_digest(expected, signature or "")
+
+
+def resolve_media_path(path: str, uploads_dir: Path = None) -> Optional[Path]:
+    """Chemin absolu d'un média signable, ou None s'il sort des dossiers autorisés"""
+    base = (uploads_dir or UPLOADS_DIR).resolve()
+    target = (base / path).resolve()
+    try:
+        relative = target.relative_to(base)
+    except ValueError:
+        return None
+    if not relative.parts or relative.parts[0] not in SIGNED_DIRS:
+        return None
+    return target
+
+
+def _render_resized(src: Path, dest: Path, width: int):
+    from PIL import Image, ImageOps
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.part")
+    with Image.open(src) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, width * 4))
+        image.convert("RGB").save(tmp, "JPEG", quality=82, optimize=True, progressive=True)
+    os.replace(tmp, dest)
+
+
+def resized_path(src: Path, size: str, sha256: str = None) -> Path:
+    """Version réduite de src pour la taille demandée (générée si absente) ; src si impossible.
+    Bloquant : à appeler dans le pool "cpu"."""
+    width = SIZES.get(size)
+    if not width or not sha256:
+        return src
+    dest = media_store.derivative_path(sha256, f"w{width}")
+    if dest.exists():
+        return dest
+    try:
+        _render_resized(src, dest, width)
+    except ImportError:
+        logger.warning("Pillow is not installed, serving original media instead of resized copies")
+        return src
+    except Exception as e:
+        logger.warning(f"Could not resize {src.name} to {width}px: {e}")
+        return src
+    return dest
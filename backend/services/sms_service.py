@@ -3,7 +3,6 @@ SMS Notification Service using Brevo (Sendinblue) API
 """
 import os
 import logging
-import requests
 from typing import Optional
 
 # Brevo API Configuration
@@ -28,6 +27,7 @@ def send_sms(phone_number: str, message: str) -> bool:
     if not BREVO_API_KEY:
         logger.warning("BREVO_API_KEY not configured - skipping SMS")
         return False
+    import requests
     
     # Clean phone number - ensure it starts with +
     if not phone_number.startswith('+'):
@@ -0,0 +1,190 @@
+"""
+Vues des stories : déduplication journalière idempotente et compteurs pré-calculés
+- Une vue = un upsert dans story_views d'_id "<story>:<spectateur>:<jour>" (spectateur = client ou
+  empreinte d'IP) : une seule vue comptée par spectateur et par jour, sans lecture préalable
+- Premier passage d'un spectateur sur une story : upsert story_viewers "<story>:<spectateur>"
+- Compteurs par story (total, unique, clients, anonymous) dans story_view_stats, mis à jour par $inc
+- Statistiques admin : lecture directe des compteurs (une requête pour toutes les stories)
+- Migration : les anciennes vues (sans champ day) sont regroupées une fois dans story_viewers / story_view_stats
+  (elles restent dans story_views, sans expiration)
+"""
+
+import hashlib
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+VIEWS_COLLECTION = "story_views"
+VIEWERS_COLLECTION = "story_viewers"
+STATS_COLLECTION = "story_view_stats"
+
+# Les vues journalières ne servent qu'à la déduplication : supprimées (index TTL) après ce délai
+DAILY_VIEW_RETENTION_DAYS = 2
+
+MIGRATION_BATCH_SIZE = 500
+
+
+def viewer_key(story_id: str, client_id: str = None, client_ip: str = None) -> tuple:
+    """(clé du spectateur, empreinte d'IP) : le client s'il est connecté, sinon l'IP hachée"""
+    if client_id:
+        return f"c:{client_id}", None
+    ip_hash = hashlib.sha256(f"{client_ip or 'unknown'}{story_id}".encode()).hexdigest()[:16]
+    return f"a:{ip_hash}", ip_hash
+
+
+async def ensure_indexes(db):
+    await db[VIEWS_COLLECTION].create_index("story_id")
+    await db[VIEWS_COLLECTION].create_index("expires_at", expireAfterSeconds=0)
+    await db[VIEWERS_COLLECTION].create_index([("story_id", 1), ("viewer_type", 1), ("first_viewed_at", 1)])
+
+
+async def _upsert_new(collection, key: str, update: dict) -> bool:
+    """Upsert par _id ; True si le document vient d'être créé (un upsert concurrent perdant lève DuplicateKeyError)"""
+    try:
+        result = await collection.update_one({"_id": key}, update, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return result.upserted_id is not None
+
+
+async def record_view(db, story_id: str, client_id: str = None, client_name: str = None,
+                      client_ip: str = None, now: datetime = None) -> bool:
+    """Enregistre une vue ; False si ce spectateur a déjà vu la story aujourd'hui"""
+    now = now or datetime.now(timezone.utc)
+    day = now.strftime("%Y-%m-%d")
+    key, ip_hash = viewer_key(story_id, client_id, client_ip)
+    viewer_type = "client" if client_id else "anonymous"
+
+    new_view = await _upsert_new(db[VIEWS_COLLECTION], f"{story_id}:{key}:{day}", {"$setOnInsert": {
+        "story_id": story_id,
+        "viewer_type": viewer_type,
+        "viewer_id": client_id,
+        "viewer_name": client_name,
+        "ip_hash": ip_hash,
+        "day": day,
+        "viewed_at": now.isoformat(),
+        "expires_at": now + timedelta(days=DAILY_VIEW_RETENTION_DAYS)
+    }})
+    if not new_view:
+        return False
+
+    viewer_update = {
+        "$setOnInsert": {
+            "story_id": story_id,
+            "viewer_type": viewer_type,
+            "viewer_id": client_id,
+            "ip_hash": ip_hash,
+            "first_viewed_at": now.isoformat()
+        },
+        "$set": {"last_viewed_at": now.isoformat()},
+        "$inc": {"views": 1}
+    }
+    if client_name:
+        viewer_update["$set"]["viewer_name"] = client_name
+    try:
+        result = await db[VIEWERS_COLLECTION].update_one({"_id": f"{story_id}:{key}"}, viewer_update, upsert=True)
+        new_viewer = result.upserted_id is not None
+    except DuplicateKeyError:
+        # Spectateur créé au même instant par une autre requête : son document existe désormais
+        viewer_update.pop("$setOnInsert")
+        await db[VIEWERS_COLLECTION].update_one({"_id": f"{story_id}:{key}"}, viewer_update)
+        new_viewer = False
+
+    increments = {"total": 1}
+    if new_viewer:
+        increments["unique"] = 1
+        increments["clients" if client_id else "anonymous"] = 1
+    await db[STATS_COLLECTION].update_one(
+        {"_id": story_id},
+        {"$inc": increments, "$set": {"last_viewed_at": now.isoformat()}},
+        upsert=True
+    )
+    return True
+
+
+def _counts(stats: dict = None) -> dict:
+    stats = stats or {}
+    return {field: stats.get(field, 0) for field in ("total", "unique", "clients", "anonymous")}
+
+
+async def get_story_stats(db, story_id: str, limit: int = 1000) -> dict:
+    """Compteurs d'une story et liste des clients l'ayant vue (première vue)"""
+    stats = _counts(await db[STATS_COLLECTION].find_one({"_id": story_id}))
+    clients = await db[VIEWERS_COLLECTION].find(
+        {"story_id": story_id, "viewer_type": "client"},
+        {"_id": 0, "viewer_name": 1, "first_viewed_at": 1}
+    ).sort("first_viewed_at", 1).to_list(limit)
+    return {
+        "total_views": stats["total"],
+        "unique_views": stats["unique"],
+        "client_views": [{"name": c.get("viewer_name") or "Client", "viewed_at": c.get("first_viewed_at")} for c in clients],
+        "anonymous_views": stats["anonymous"]
+    }
+
+
+async def get_all_stats(db, story_ids: list) -> dict:
+    """{story_id: {total, clients, anonymous}} en une requête"""
+    found = {s["_id"]: s for s in await db[STATS_COLLECTION].find({"_id": {"$in": story_ids}}).to_list(None)}
+    result = {}
+    for story_id in story_ids:
+        counts = _counts(found.get(story_id))
+        result[story_id] = {"total": counts["total"], "clients": counts["clients"], "anonymous": counts["anonymous"]}
+    return result
+
+
+async def delete_story(db, story_id: str):
+    await db[VIEWS_COLLECTION].delete_many({"story_id": story_id})
+    await db[VIEWERS_COLLECTION].delete_many({"story_id": story_id})
+    await db[STATS_COLLECTION].delete_one({"_id": story_id})
+
+
+async def _write_groups(source, pipeline: list, target, operation):
+    """Écrit par lots dans target les groupes produits par pipeline (operation(_id, groupe) -> opération bulk)"""
+    batch = []
+    async for group in source.aggregate(pipeline):
+        batch.append(operation(group.pop("_id"), group))
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            await target.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await target.bulk_write(batch, ordered=False)
+
+
+async def migrate_legacy_views(db) -> int:
+    """Regroupe les vues enregistrées avant les compteurs (documents sans champ day) ; renvoie le nombre de stories"""
+    if await db[STATS_COLLECTION].estimated_document_count():
+        return 0
+    if not await db[VIEWS_COLLECTION].count_documents({"day": {"$exists": False}}, limit=1):
+        return 0
+    viewer = {"$cond": [
+        {"$eq": ["$viewer_type", "client"]},
+        {"$concat": ["c:", {"$ifNull": ["$viewer_id", ""]}]},
+        {"$concat": ["a:", {"$ifNull": ["$ip_hash", ""]}]}
+    ]}
+    # Spectateurs déjà créés par les nouvelles vues : conservés tels quels
+    await _write_groups(db[VIEWS_COLLECTION], [
+        {"$match": {"day": {"$exists": False}}},
+        {"$group": {
+            "_id": {"$concat": ["$story_id", ":", viewer]},
+            "story_id": {"$first": "$story_id"},
+            "viewer_type": {"$first": {"$ifNull": ["$viewer_type", "anonymous"]}},
+            "viewer_id": {"$first": "$viewer_id"},
+            "viewer_name": {"$last": "$viewer_name"},
+            "ip_hash": {"$first": "$ip_hash"},
+            "first_viewed_at": {"$min": "$viewed_at"},
+            "last_viewed_at": {"$max": "$viewed_at"},
+            "views": {"$sum": 1}
+        }}
+    ], db[VIEWERS_COLLECTION], lambda key, doc: UpdateOne({"_id": key}, {"$setOnInsert": doc}, upsert=True))
+    await _write_groups(db[VIEWERS_COLLECTION], [
+        {"$group": {
+            "_id": "$story_id",
+            "total": {"$sum": "$views"},
+            "unique": {"$sum": 1},
+            "clients": {"$sum": {"$cond": [{"$eq": ["$viewer_type", "client"]}, 1, 0]}},
+            "anonymous": {"$sum": {"$cond": [{"$eq": ["$viewer_type", "client"]}, 0, 1]}},
+            "last_viewed_at": {"$max": "$last_viewed_at"}
+        }}
+    ], db[STATS_COLLECTION], lambda key, doc: ReplaceOne({"_id": key}, doc, upsert=True))
+    return await db[STATS_COLLECTION].estimated_document_count()
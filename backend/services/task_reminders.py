@@ -0,0 +1,182 @@
+"""
+Rappels de tâches matérialisés (collection task_reminders)
+- Un document par rappel actif : _id "<task_id>:<days_before>", date d'envoi précalculée fire_on
+  (échéance - days_before, "YYYY-MM-DD") et indicateur sent ; index (sent, fire_on)
+- Resynchronisé à la création / modification d'une tâche (échéance ou rappels), supprimé avec elle
+- Le job ne lit que les rappels du jour : tâches puis destinataires récupérés en une requête $in chacun,
+  emails envoyés en parallèle dans le pool "io", puis une écriture groupée par collection
+  (task_reminders, et l'indicateur sent des rappels embarqués dans la tâche, affiché par l'interface)
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+
+from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+from services.executors import run_io
+
+COLLECTION = "task_reminders"
+
+TASK_FIELDS = {"_id": 0, "id": 1, "title": 1, "description": 1, "due_date": 1, "priority": 1,
+               "client_name": 1, "assigned_to": 1, "status": 1}
+
+
+def fire_on(due_date: str, days_before: int) -> str:
+    due = datetime.strptime(due_date[:10], "%Y-%m-%d").date()
+    return (due - timedelta(days=days_before)).isoformat()
+
+
+def reminder_docs(task: dict) -> list:
+    """Rappels actifs et non envoyés d'une tâche, prêts à être enregistrés"""
+    docs = []
+    if not task.get("due_date"):
+        return docs
+    for reminder in task.get("reminders") or []:
+        if not reminder.get("enabled", True) or reminder.get("sent", False):
+            continue
+        days_before = int(reminder.get("days_before", 1))
+        docs.append({
+            "_id": f"{task['id']}:{days_before}",
+            "task_id": task["id"],
+            "days_before": days_before,
+            "fire_on": fire_on(task["due_date"], days_before),
+            "sent": False
+        })
+    return docs
+
+
+async def ensure_indexes(db):
+    await db[COLLECTION].create_index([("sent", 1), ("fire_on", 1)])
+    await db[COLLECTION].create_index("task_id")
+
+
+async def sync_task(db, task: dict):
+    """Remplace les rappels en attente d'une tâche ; un rappel déjà envoyé pour la même date n'est pas recréé"""
+    already_sent = {
+        r["_id"]: r["fire_on"]
+        for r in await db[COLLECTION].find({"task_id": task["id"], "sent": True}, {"_id": 1, "fire_on": 1}).to_list(None)
+    }
+    operations = [DeleteMany({"task_id": task["id"], "sent": False})]
+    for doc in reminder_docs(task):
+        if already_sent.get(doc["_id"]) != doc["fire_on"]:
+            operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+    await db[COLLECTION].bulk_write(operations, ordered=True)
+
+
+async def delete_task(db, task_id: str):
+    await db[COLLECTION].delete_many({"task_id": task_id})
+
+
+async def backfill(db) -> int:
+    """Matérialise les rappels des tâches ouvertes créées avant la collection (une fois, collection vide)"""
+    if await db[COLLECTION].estimated_document_count():
+        return 0
+    operations = []
+    async for task in db.tasks.find(
+        {"status": {"$ne": "completed"}, "reminders": {"$elemMatch": {"sent": {"$ne": True}}}},
+        {"_id": 0, "id": 1, "due_date": 1, "reminders": 1}
+    ):
+        try:
+            operations += [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in reminder_docs(task)]
+        except ValueError:
+            logging.warning(f"Task {task.get('id')}: invalid due_date {task.get('due_date')!r}, reminders skipped")
+    if operations:
+        await db[COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def reminder_html(task: dict, name: str, days_text: str) -> str:
+    return f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; background-color: #1a1a1a; color: #ffffff; padding: 20px;">
+        <div style="max-width: 600px; margin: 0 auto; background-color: #2a2a2a; padding: 30px; border-radius: 10px;">
+            <h1 style="color: #D4AF37;">⏰ Rappel de tâche</h1>
+            <p>Bonjour {name},</p>
+            <p>Ceci est un rappel pour la tâche suivante :</p>
+            <div style="background-color: #3a3a3a; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                <h2 style="color: #D4AF37; margin-top: 0;">{task['title']}</h2>
+                <p><strong>Échéance :</strong> {task['due_date']} ({days_text})</p>
+                <p><strong>Priorité :</strong> {task['priority'].upper()}</p>
+                {f"<p><strong>Client :</strong> {task['client_name']}</p>" if task.get('client_name') else ""}
+                {f"<p>{task['description']}</p>" if task.get('description') else ""}
+            </div>
+            <p style="color: #888;">Connectez-vous à votre espace pour marquer cette tâche comme terminée.</p>
+        </div>
+    </body>
+    </html>
+    """
+
+
+def _days_text(days_before: int) -> str:
+    if days_before == 0:
+        return "aujourd'hui"
+    return f"dans {days_before} jour(s)" if days_before > 0 else f"depuis {-days_before} jour(s)"
+
+
+def build_messages(reminders: list, tasks: dict, users: dict, admin_email: str = None) -> list:
+    """(destinataire, sujet, html) pour chaque rappel dont la tâche est encore ouverte"""
+    messages = []
+    for reminder in reminders:
+        task = tasks.get(reminder["task_id"])
+        if not task:
+            continue
+        days_text = _days_text(reminder["days_before"])
+        for user_id in task.get("assigned_to") or []:
+            user = users.get(user_id)
+            if user and user.get("email"):
+                messages.append((user["email"], f"⏰ Rappel : {task['title']}",
+                                 reminder_html(task, user.get("name", ""), days_text)))
+        if admin_email:
+            messages.append((admin_email, f"⏰ Rappel de tâche : {task['title']}",
+                             reminder_html(task, "", days_text)))
+    return messages
+
+
+async def send_due_reminders(db, send_email, today: str = None, admin_email: str = None) -> dict:
+    """Envoie les rappels dont fire_on est aujourd'hui et les marque envoyés"""
+    today = today or datetime.now(timezone.utc).date().isoformat()
+    admin_email = admin_email if admin_email is not None else os.environ.get("SMTP_EMAIL")
+
+    reminders = await db[COLLECTION].find({"sent": False, "fire_on": today}).to_list(None)
+    if not reminders:
+        return {"reminders_sent": 0, "due": 0}
+
+    task_ids = list({r["task_id"] for r in reminders})
+    tasks = {
+        t["id"]: t
+        for t in await db.tasks.find({"id": {"$in": task_ids}, "status": {"$ne": "completed"}}, TASK_FIELDS).to_list(None)
+    }
+    user_ids = list({user_id for task in tasks.values() for user_id in task.get("assigned_to") or []})
+    users = {
+        u["id"]: u
+        for u in await db.team_users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1}).to_list(None)
+    } if user_ids else {}
+
+    messages = build_messages(reminders, tasks, users, admin_email)
+    results = await asyncio.gather(
+        *(run_io(send_email, to_email, subject, html) for to_email, subject, html in messages),
+        return_exceptions=True
+    )
+    sent = sum(1 for result in results if result is True)
+    for (to_email, _, _), result in zip(messages, results):
+        if result is not True:
+            logging.error(f"Failed to send task reminder to {to_email}: {result}")
+
+    # Rappels des tâches terminées ou supprimées : marqués aussi, pour ne pas être relus
+    now = datetime.now(timezone.utc).isoformat()
+    await db[COLLECTION].update_many(
+        {"_id": {"$in": [r["_id"] for r in reminders]}},
+        {"$set": {"sent": True, "sent_at": now}}
+    )
+    task_updates = [
+        UpdateOne({"id": r["task_id"], "reminders": {"$elemMatch": {"days_before": r["days_before"], "sent": {"$ne": True}}}},
+                  {"$set": {"reminders.$.sent": True, "reminders.$.last_sent_at": now}})
+        for r in reminders if r["task_id"] in tasks
+    ]
+    if task_updates:
+        await db.tasks.bulk_write(task_updates, ordered=False)
+
+    logging.info(f"Task reminders: {len(reminders)} due, {sent}/{len(messages)} emails sent")
+    return {"reminders_sent": sent, "due": len(reminders), "emails": len(messages)}
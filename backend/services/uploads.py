@@ -0,0 +1,220 @@
+"""
+Écriture en continu des fichiers uploadés (utilisée par toutes les routes d'upload)
+- Le fichier reçu est lu par blocs de UPLOAD_CHUNK_SIZE et écrit au fil de l'eau : la mémoire utilisée par
+  upload est constante, quelle que soit la taille du fichier ou le nombre de fichiers d'un lot
+- Empreinte SHA-256 et taille calculées pendant l'écriture, sans relecture du fichier
+- Limites appliquées pendant la lecture : taille maximale, type déclaré / extension, signature du premier bloc
+- Écriture dans un fichier temporaire du dossier cible puis publication atomique : un fichier refusé ou
+  interrompu n'est jamais publié
+- Publication via le stockage adressé par contenu (services/media_store.py) : un contenu déjà présent
+  n'occupe pas d'espace supplémentaire
+- Écritures disque et hachage dans le pool "io" (services/executors.py)
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from services import media_store
+from services.executors import run_io
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+MB = 1024 * 1024
+MAX_IMAGE_SIZE = int(os.environ.get("UPLOAD_MAX_IMAGE_MB", 50)) * MB
+MAX_AUDIO_SIZE = int(os.environ.get("UPLOAD_MAX_AUDIO_MB", 200)) * MB
+MAX_DOCUMENT_SIZE = int(os.environ.get("UPLOAD_MAX_DOCUMENT_MB", 1024)) * MB
+MAX_VIDEO_SIZE = int(os.environ.get("UPLOAD_MAX_VIDEO_MB", 5 * 1024)) * MB
+
+# Familles ("image/") ou types exacts acceptés par les routes
+IMAGE_TYPES = ("image/",)
+VIDEO_TYPES = ("video/",)
+AUDIO_TYPES = ("audio/",)
+DOCUMENT_TYPES = (
+    "application/pdf", "application/zip", "application/x-zip-compressed",
+    "application/x-rar-compressed", "application/vnd.rar", "application/octet-stream",
+)
+
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"Rar!\x1a\x07", "application/x-rar-compressed"),
+    (b"\x1a\x45\xdf\xa3", "video/webm"),
+    (b"ID3", "audio/mpeg"),
+    (b"fLaC", "audio/flac"),
+    (b"OggS", "audio/ogg"),
+]
+_RIFF_FORMATS = {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}
+_FTYP_BRANDS = {b"qt  ": "video/quicktime", b"heic": "image/heic", b"heix": "image/heic",
+                b"mif1": "image/heif", b"M4A ": "audio/mp4"}
+# Conteneurs partagés par l'audio et la vidéo : la signature seule ne permet pas de les distinguer
+_CONTAINER_ALIASES = {
+    "video/webm": ("audio/webm",),
+    "video/mp4": ("audio/mp4", "audio/x-m4a", "audio/aac"),
+    "audio/ogg": ("video/ogg",),
+    "audio/wav": ("audio/x-wav", "audio/wave"),
+}
+
+
+@dataclass
+class StoredUpload:
+    """Fichier écrit sur disque"""
+    path: Path
+    size: int
+    sha256: str
+    content_type: str        # type détecté par signature, sinon type déclaré par le client
+    original_name: str
+    deduplicated: bool = False   # contenu déjà stocké : aucun octet supplémentaire sur disque
+
+
+def sniff_type(head: bytes) -> Optional[str]:
+    """Type MIME d'après les premiers octets (None si inconnu)"""
+    if head[:4] == b"RIFF":
+        return _RIFF_FORMATS.get(head[8:12])
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4")
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def _type_allowed(content_type: Optional[str], allowed_types: Iterable[str]) -> bool:
+    if not content_type:
+        return False
+    return any(content_type == allowed or (allowed.endswith("/") and content_type.startswith(allowed))
+               for allowed in allowed_types)
+
+
+def _human_size(size: int) -> str:
+    return f"{size // (1024 * MB)} Go" if size >= 1024 * MB else f"{size // MB} Mo"
+
+
+def check_declared_type(upload: UploadFile, allowed_types: Iterable[str] = None,
+                        allowed_extensions: Iterable[str] = None):
+    """Refus immédiat (avant lecture) si ni le type déclaré ni l'extension ne sont acceptés"""
+    if allowed_types is None and allowed_extensions is None:
+        return
+    extension = Path(upload.filename or "").suffix.lower()
+    if allowed_types is not None and _type_allowed(upload.content_type, allowed_types):
+        return
+    if allowed_extensions is not None and extension in allowed_extensions:
+        return
+    raise HTTPException(status_code=400, detail=f"Type de fichier non supporté ({upload.content_type or extension})")
+
+
+def check_signature(head: bytes, allowed_types: Iterable[str] = None):
+    """Refus si le contenu réel (signature du premier bloc) n'est pas un type accepté"""
+    if allowed_types is None:
+        return
+    detected = sniff_type(head)
+    candidates = (detected,) + _CONTAINER_ALIASES.get(detected, ())
+    if detected and not any(_type_allowed(candidate, allowed_types) for candidate in candidates):
+        raise HTTPException(status_code=400, detail=f"Type de fichier non supporté ({detected})")
+
+
+class UploadWriter:
+    """Écrit un flux par blocs dans un fichier temporaire en calculant taille et SHA-256.
+    commit() publie le fichier sous son nom définitif, abort() supprime le fichier partiel."""
+
+    def __init__(self, dest: Path, max_size: int = None, dedupe: bool = True):
+        self.dest = Path(dest)
+        self.max_size = max_size
+        self.dedupe = dedupe
+        self.deduplicated = False
+        self.size = 0
+        self.head = b""
+        self._digest = hashlib.sha256()
+        self._tmp = self.dest.with_name(f".{self.dest.name}.{uuid.uuid4().hex[:8]}.part")
+        self._fh = None
+
+    def _open(self):
+        self.dest.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self._tmp, "wb")
+
+    def _write(self, chunk: bytes):
+        self._digest.update(chunk)
+        self._fh.write(chunk)
+
+    async def write(self, chunk: bytes):
+        if self._fh is None:
+            await run_io(self._open)
+        if not self.head:
+            self.head = chunk[:64]
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise HTTPException(status_code=413,
+                                detail=f"Fichier trop volumineux. Maximum {_human_size(self.max_size)}.")
+        await run_io(self._write, chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def _commit(self):
+        if self._fh is None:
+            self._open()
+        self._fh.close()
+        if self.dedupe:
+            self.deduplicated = media_store.store_file(self._tmp, self.sha256, self.dest)
+        else:
+            os.replace(self._tmp, self.dest)
+
+    async def commit(self):
+        await run_io(self._commit)
+
+    def _abort(self):
+        if self._fh is not None:
+            self._fh.close()
+        self._tmp.unlink(missing_ok=True)
+
+    async def abort(self):
+        await run_io(self._abort)
+
+
+async def save_upload(upload: UploadFile, dest: Path, *, max_size: int = None,
+                      allowed_types: Iterable[str] = None, allowed_extensions: Iterable[str] = None,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE, dedupe: bool = True) -> StoredUpload:
+    """Enregistre un fichier uploadé sous `dest` sans jamais le charger entièrement en mémoire.
+    Lève HTTPException 400 (type refusé) ou 413 (taille dépassée) ; rien n'est écrit à `dest` dans ce cas.
+    dedupe=False pour les fichiers temporaires (morceaux, fichiers de travail ffmpeg)."""
+    check_declared_type(upload, allowed_types, allowed_extensions)
+    writer = UploadWriter(dest, max_size=max_size, dedupe=dedupe)
+    try:
+        while chunk := await upload.read(chunk_size):
+            if writer.size == 0:
+                check_signature(chunk, allowed_types)
+            await writer.write(chunk)
+        await writer.commit()
+    except BaseException:
+        await writer.abort()
+        raise
+    return StoredUpload(
+        path=writer.dest, size=writer.size, sha256=writer.sha256,
+        content_type=sniff_type(writer.head) or upload.content_type or "application/octet-stream",
+        original_name=upload.filename or "", deduplicated=writer.deduplicated,
+    )
+
+
+async def read_upload(upload: UploadFile, *, max_size: int, allowed_types: Iterable[str] = None,
+                      allowed_extensions: Iterable[str] = None, chunk_size: int = UPLOAD_CHUNK_SIZE) -> bytes:
+    """Lit en mémoire un petit fichier dont le contenu est nécessaire tel quel (ex. selfie envoyé à
+    Rekognition), en refusant dès que max_size est dépassé"""
+    check_declared_type(upload, allowed_types, allowed_extensions)
+    chunks, size = [], 0
+    while chunk := await upload.read(chunk_size):
+        if size == 0:
+            check_signature(chunk, allowed_types)
+        size += len(chunk)
+        if size > max_size:
+            raise HTTPException(status_code=413, detail=f"Fichier trop volumineux. Maximum {_human_size(max_size)}.")
+        chunks.append(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,53 @@
+"""
+Shared test fixtures
+Service tests run against one Motor-compatible database: an in-memory mongomock-motor database by
+default, or a throwaway database on a real server when MONGO_TEST_URL is set
+(e.g. MONGO_TEST_URL=mongodb://localhost:27017 pytest tests/).
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MONGO_TEST_URL = os.environ.get("MONGO_TEST_URL")
+
+# Read methods recorded by the queries fixture
+QUERY_METHODS = ("find", "find_one", "find_one_and_update", "aggregate", "count_documents")
+
+
+@pytest.fixture
+def db():
+    """Empty database, dropped after the test"""
+    if not MONGO_TEST_URL:
+        from mongomock_motor import AsyncMongoMockClient
+        yield AsyncMongoMockClient()["test_database"]
+        return
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import MongoClient
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    client = AsyncIOMotorClient(MONGO_TEST_URL)
+    yield client[name]
+    client.close()
+    with MongoClient(MONGO_TEST_URL) as sync_client:
+        sync_client.drop_database(name)
+
+
+@pytest.fixture
+def queries(db, monkeypatch):
+    """(collection, method, filter) of every query sent through the db fixture, in order"""
+    log = []
+    collection_class = type(db["queries"])
+    for method in QUERY_METHODS:
+        original = getattr(collection_class, method)
+
+        def spy(self, *args, _method=method, _original=original, **kwargs):
+            log.append((self.name, _method, args[0] if args else kwargs.get("filter")))
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(collection_class, method, spy)
+    return log
+
@@ -0,0 +1,64 @@
+"""
+Benchmark harness - report tests
+Percentiles and baseline comparison used by bench/run.py to flag regressions before deploy.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.run import percentile, summarize, compare, format_report
+
+
+def result(p50, p99, rps, errors=0):
+    return {"requests": 100, "errors": errors, "p50_ms": p50, "p95_ms": p99, "p99_ms": p99,
+            "max_ms": p99, "rps": rps, "rss_mb": 120.0}
+
+
+BASELINE = {
+    "scenarios": {"public_content": result(10.0, 40.0, 500.0), "heartbeat": result(1.0, 3.0, 900.0)},
+    "rss_mb_peak": 150.0,
+}
+
+
+class TestStatistics:
+    """Latency summary"""
+
+    def test_percentiles_interpolate(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50.5
+        assert percentile(values, 99) == 99.01
+        assert percentile([], 99) == 0.0
+
+    def test_summary_counts_errors_separately(self):
+        summary = summarize([0.01] * 9, errors=1, elapsed=1.0)
+        assert summary["requests"] == 10
+        assert summary["errors"] == 1
+        assert summary["p50_ms"] == 10.0
+        assert summary["rps"] == 9.0
+
+
+class TestBaselineComparison:
+    """Regression detection against bench/baseline.json"""
+
+    def test_within_tolerance_is_not_a_regression(self):
+        current = {"scenarios": {"public_content": result(11.0, 45.0, 450.0)}, "rss_mb_peak": 160.0}
+        assert compare(current, BASELINE, tolerance=0.2) == []
+
+    def test_slower_and_lower_throughput_are_flagged(self):
+        current = {"scenarios": {"public_content": result(20.0, 90.0, 300.0, errors=2)}, "rss_mb_peak": 200.0}
+        metrics = {(r["scenario"], r["metric"]) for r in compare(current, BASELINE, tolerance=0.2)}
+        assert metrics == {
+            ("public_content", "p50_ms"), ("public_content", "p99_ms"), ("public_content", "rps"),
+            ("public_content", "errors"), ("*", "rss_mb_peak"),
+        }
+
+    def test_millisecond_noise_is_ignored(self):
+        current = {"scenarios": {"heartbeat": result(2.0, 4.5, 900.0)}, "rss_mb_peak": 150.0}
+        assert compare(current, BASELINE, tolerance=0.2) == []
+
+    def test_report_shows_deltas(self):
+        current = {"scenarios": {"public_content": result(15.0, 40.0, 500.0)}, "rss_mb_peak": 150.0}
+        report = format_report(current, BASELINE)
+        assert "public_content" in report
+        assert "+50%" in report
@@ -0,0 +1,142 @@
+"""
+Chatbot tests (offline)
+Replies are streamed as events, history is read through a bounded query, frequent questions are
+answered from the curated FAQ by similarity (never from model output), and the stub / mocked
+providers stand in for the LLM.
+"""
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chatbot import AnswerCache, Chatbot, OpenAIProvider, StubProvider, FALLBACK_MESSAGE, sse
+
+
+def saved_roles(db):
+    return [m["role"] for m in asyncio.run(db.chat_messages.find().sort("created_at", 1).to_list(None))]
+
+
+class CountingProvider(StubProvider):
+    def __init__(self):
+        self.calls = []
+
+    async def stream(self, session_id, history, message):
+        self.calls.append((session_id, list(history), message))
+        async for delta in super().stream(session_id, history, message):
+            yield delta
+
+
+class FailingProvider:
+    async def stream(self, session_id, history, message):
+        raise RuntimeError("provider down")
+        yield
+
+
+def collect(bot, db, session_id, message):
+    async def run():
+        return [event async for event in bot.reply(db, session_id, message)]
+    return asyncio.run(run())
+
+
+class TestAnswerCache:
+    """Similar questions share an answer"""
+
+    def test_faq_matches_variants_only(self):
+        cache = AnswerCache()
+        assert "1500€" in cache.lookup("Quels sont vos tarifs ?")
+        assert "1500€" in cache.lookup("combien coûte un mariage")
+        assert "réserver" in cache.lookup("Comment réserver ?")
+        assert cache.lookup("Avez-vous un parking devant le studio ?") is None
+
+    def test_cache_holds_only_the_faq(self):
+        assert not hasattr(AnswerCache(), "store")
+        assert AnswerCache(faq=[]).lookup("Quels sont vos tarifs ?") is None
+
+
+class TestReply:
+    """Streamed events, bounded history, cache and fallback"""
+
+    def test_streams_deltas_and_saves_messages(self, db):
+        provider = CountingProvider()
+        bot = Chatbot(provider=provider, cache=AnswerCache(faq=[]))
+
+        events = collect(bot, db, "s1", "Bonjour, je cherche un vidéaste")
+
+        deltas = [e["delta"] for e in events if "delta" in e]
+        assert len(deltas) > 3
+        assert events[-1]["done"] and events[-1]["response"] == "".join(deltas) and not events[-1]["cached"]
+        assert saved_roles(db) == ["user", "assistant"]
+
+    def test_history_is_windowed(self, db):
+        provider = CountingProvider()
+        asyncio.run(db.chat_messages.insert_many([
+            {"session_id": "s1" if i < 30 else "s2", "role": "user", "content": f"m{i}",
+             "created_at": f"2026-06-12T10:{i:02d}:00"}
+            for i in range(32)
+        ]))
+        bot = Chatbot(provider=provider, cache=AnswerCache(faq=[]))
+
+        collect(bot, db, "s1", "Et le samedi ?")
+
+        _, history, _ = provider.calls[0]
+        assert [m["content"] for m in history] == [f"m{i}" for i in range(20, 30)]
+
+    def test_faq_skips_the_provider_but_model_answers_are_not_reused(self, db):
+        provider = CountingProvider()
+        bot = Chatbot(provider=provider)
+
+        events = collect(bot, db, "s1", "Quels sont vos prix ?")
+        assert events[-1]["cached"] and provider.calls == []
+
+        collect(bot, db, "s2", "Proposez-vous des drones pour les mariages ?")
+        again = collect(bot, db, "s3", "proposez vous des drones pour les mariages")
+        assert len(provider.calls) == 2 and not again[-1]["cached"]
+
+    def test_provider_failure_falls_back(self, db):
+        events = collect(Chatbot(provider=FailingProvider(), cache=AnswerCache(faq=[])), db, "s1", "Bonjour")
+        assert events[-1]["response"] == FALLBACK_MESSAGE and events[-1]["error"]
+
+    def test_database_failure_falls_back(self):
+        class BrokenDb:
+            @property
+            def chat_messages(self):
+                raise RuntimeError("mongo down")
+
+        events = collect(Chatbot(provider=CountingProvider(), cache=AnswerCache(faq=[])), BrokenDb(), "s1", "Bonjour")
+        assert events == [{"delta": FALLBACK_MESSAGE},
+                          {"done": True, "response": FALLBACK_MESSAGE, "cached": False, "error": True}]
+
+    def test_sse_format(self):
+        assert sse({"delta": "Bon"}) == 'event: message\ndata: {"delta": "Bon"}\n\n'
+        assert sse({"done": True, "response": "é"}).startswith("event: done\ndata: ")
+
+
+class TestOpenAIProvider:
+    """Chat Completions stream parsing, against a mocked transport"""
+
+    def test_stream_parsing(self):
+        chunks = ["Bon", "jour", " !"]
+        body = "".join(f"data: {json.dumps({'choices': [{'delta': {'content': c}}]})}\n\n" for c in chunks)
+        body += "data: [DONE]\n\n"
+        requests = []
+
+        def handler(request):
+            requests.append(json.loads(request.content))
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+        provider = OpenAIProvider("key", base_url="https://llm.test/v1", model="test-model")
+        provider._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        async def run():
+            deltas = [d async for d in provider.stream("s1", [{"role": "user", "content": "avant"}], "Salut")]
+            await provider.close()
+            return deltas
+
+        assert asyncio.run(run()) == chunks
+        sent = requests[0]
+        assert sent["stream"] is True and sent["model"] == "test-model"
+        assert [m["role"] for m in sent["messages"]] == ["system", "user", "user"]
@@ -0,0 +1,126 @@
+"""
+Client lifecycle - file operation tests
+Archive and delete helpers run in the lifecycle thread pool and must be safe to re-run
+when an interrupted job is resumed.
+Lifecycle jobs are held under a renewed lease, so a long batch is never picked up by a second worker.
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import client_lifecycle, pdf_service
+from services.client_lifecycle import archive_client_files, delete_client_files
+
+
+CLIENT = {"id": "abcdef12-3456", "name": "Jean Dupont", "email": "jean@example.com", "expires_at": "2025-01-01T00:00:00+00:00"}
+
+
+@pytest.fixture(autouse=True)
+def pdf_cache(tmp_path, monkeypatch):
+    """Cached invoice of the client, in a throwaway PDF cache"""
+    monkeypatch.setattr(pdf_service, "PDF_CACHE_DIR", tmp_path / "cache")
+    cached = tmp_path / "cache" / "clients" / CLIENT["id"] / "client_invoice" / "0123.pdf"
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(b"pdf")
+    return cached
+
+
+def make_client_tree(uploads_dir):
+    (uploads_dir / "client_transfers" / "photos" / CLIENT["id"]).mkdir(parents=True)
+    (uploads_dir / "client_transfers" / "photos" / CLIENT["id"] / "a.jpg").write_bytes(b"a")
+    (uploads_dir / "clients" / CLIENT["id"]).mkdir(parents=True)
+    (uploads_dir / "clients" / CLIENT["id"] / "contract.pdf").write_bytes(b"pdf")
+
+
+class TestArchiveClientFiles:
+    """Moving client files to uploads/archives"""
+
+    def test_moves_files_and_writes_metadata(self, tmp_path, pdf_cache):
+        make_client_tree(tmp_path)
+        archive = archive_client_files(tmp_path, CLIENT, "2025-02-01T00:00:00+00:00")
+
+        archive_dir = tmp_path / "archives" / "archive_Jean_Dupont_abcdef12"
+        assert archive == str(archive_dir)
+        assert (archive_dir / "photos" / "a.jpg").exists()
+        assert (archive_dir / "uploads" / "contract.pdf").exists()
+        assert not (tmp_path / "client_transfers" / "photos" / CLIENT["id"]).exists()
+        assert not (tmp_path / "clients" / CLIENT["id"]).exists()
+        assert not pdf_cache.exists()
+
+        metadata = json.loads((archive_dir / "metadata.json").read_text())
+        assert metadata["client_email"] == "jean@example.com"
+        assert metadata["original_expires_at"] == CLIENT["expires_at"]
+
+    def test_resume_after_partial_move(self, tmp_path):
+        make_client_tree(tmp_path)
+        archive_client_files(tmp_path, CLIENT, "2025-02-01T00:00:00+00:00")
+
+        # A file uploaded again before the job resumed is merged into the existing archive
+        (tmp_path / "clients" / CLIENT["id"]).mkdir(parents=True)
+        (tmp_path / "clients" / CLIENT["id"] / "late.pdf").write_bytes(b"late")
+        archive_client_files(tmp_path, CLIENT, "2025-02-01T00:00:00+00:00")
+
+        archive_dir = tmp_path / "archives" / "archive_Jean_Dupont_abcdef12"
+        assert (archive_dir / "uploads" / "contract.pdf").exists()
+        assert (archive_dir / "uploads" / "late.pdf").exists()
+
+
+class TestDeleteClientFiles:
+    """Removing client and gallery folders"""
+
+    def test_deletes_client_and_gallery_folders(self, tmp_path, pdf_cache):
+        make_client_tree(tmp_path)
+        (tmp_path / "galleries" / "gal-1").mkdir(parents=True)
+
+        removed = delete_client_files(tmp_path, CLIENT["id"], ["gal-1"])
+
+        assert removed == 3
+        assert not (tmp_path / "galleries" / "gal-1").exists()
+        assert not (tmp_path / "clients" / CLIENT["id"]).exists()
+        assert not pdf_cache.exists()
+        # Re-running on an already cleaned client is a no-op
+        assert delete_client_files(tmp_path, CLIENT["id"], ["gal-1"]) == 0
+
+
+class TestJobLease:
+    """A running job stays with its owner while its batches run"""
+
+    def test_long_batch_is_not_claimed_twice(self, db, tmp_path, monkeypatch):
+        calls = []
+
+        async def slow_batch(db, uploads_dir, batch, counts):
+            calls.append(list(batch))
+            await asyncio.sleep(0.6)  # several leases long
+            return batch, []
+
+        monkeypatch.setattr(client_lifecycle, "LEASE_SECONDS", 0.15)
+        monkeypatch.setitem(client_lifecycle.BATCH_HANDLERS, "archive", slow_batch)
+
+        async def scenario():
+            job = await client_lifecycle.create_job(db, tmp_path, "archive", ["c1", "c2"])
+            await asyncio.sleep(0.4)
+            # Another worker resuming jobs finds the lease still held
+            other = await client_lifecycle._claim_job(db, job["id"], "other-worker")
+            await client_lifecycle.wait_for_job(db, job["id"], timeout=5)
+            return other, await client_lifecycle.get_job(db, job["id"])
+
+        other, job = asyncio.run(scenario())
+        assert other is None
+        assert calls == [["c1", "c2"]]
+        assert job["status"] == "completed" and job["done_ids"] == ["c1", "c2"]
+
+    def test_expired_lease_is_taken_over(self, db, tmp_path, monkeypatch):
+        monkeypatch.setattr(client_lifecycle, "LEASE_SECONDS", 0.05)
+        asyncio.run(db[client_lifecycle.JOBS_COLLECTION].insert_one({
+            "id": "j1", "action": "archive", "status": "running", "client_ids": [],
+            "owner": "gone", "lease_until": "2026-01-01T00:00:00+00:00", "updated_at": "2026-01-01T00:00:00+00:00"
+        }))
+
+        assert asyncio.run(client_lifecycle._claim_job(db, "j1", "me")) is not None
+        assert asyncio.run(client_lifecycle.get_job(db, "j1"))["owner"] == "me"
+        assert asyncio.run(client_lifecycle._claim_job(db, "j1", "third")) is None
@@ -0,0 +1,100 @@
+"""
+Aggregated dashboard tests
+Each dashboard counts everything in one $facet aggregation per collection; results are cached
+and dropped as soon as a write command touches one of the collections they read.
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import CollectionWriteTracker, write_tracker
+from services.dashboard_stats import DashboardCache, facet_counts
+
+_request_ids = iter(range(1, 1_000_000))
+
+
+def command(name, collection):
+    return SimpleNamespace(command_name=name, command={name: collection}, connection_id=("localhost", 27017),
+                           request_id=next(_request_ids))
+
+
+def write(collection, tracker=write_tracker):
+    event = command("update", collection)
+    tracker.started(event)
+    tracker.succeeded(event)
+
+
+class TestFacetCounts:
+    """One aggregation returns every counter"""
+
+    def test_single_pipeline_and_missing_facets_are_zero(self, db, queries):
+        asyncio.run(db.tasks.insert_many(
+            [{"status": "pending", "due_date": "2026-02-01"} for _ in range(3)]
+            + [{"status": "completed", "due_date": "2026-03-01"} for _ in range(9)]
+        ))
+
+        counts = asyncio.run(facet_counts(db.tasks, {
+            "total": {}, "pending": {"status": "pending"}, "late": {"due_date": {"$lt": "2026-01-01"}}
+        }))
+
+        assert counts == {"total": 12, "pending": 3, "late": 0}
+        (collection, method, pipeline), = queries
+        assert (collection, method) == ("tasks", "aggregate")
+        assert pipeline[0]["$facet"]["pending"] == [{"$match": {"status": "pending"}}, {"$count": "n"}]
+
+
+class TestWriteTracker:
+    """Write commands bump the collection version, reads do not"""
+
+    def test_versions(self):
+        tracker = CollectionWriteTracker()
+        tracker.started(command("find", "tasks"))
+        assert tracker.versions("tasks") == (0,)
+
+        write("tasks", tracker)
+        write("deployments", tracker)
+        assert tracker.versions("tasks", "equipment", "deployments") == (2, 0, 2)
+
+
+class TestDashboardCache:
+    """Cached until a write or the TTL"""
+
+    def test_hit_then_invalidated_by_write(self):
+        cache = DashboardCache(ttl=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"total": len(calls)}
+
+        async def scenario():
+            first = await asyncio.gather(*(cache.get("tasks", ("tasks",), compute) for _ in range(5)))
+            again = await cache.get("tasks", ("tasks",), compute)
+            write("equipment")
+            unrelated = await cache.get("tasks", ("tasks",), compute)
+            write("tasks")
+            fresh = await cache.get("tasks", ("tasks",), compute)
+            return first, again, unrelated, fresh
+
+        first, again, unrelated, fresh = asyncio.run(scenario())
+
+        assert first == [{"total": 1}] * 5
+        assert again == unrelated == {"total": 1}
+        assert fresh == {"total": 2}
+
+    def test_ttl_expiry(self):
+        cache = DashboardCache(ttl=0)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return len(calls)
+
+        async def scenario():
+            return [await cache.get("admin", ("bookings",), compute) for _ in range(2)]
+
+        assert asyncio.run(scenario()) == [1, 2]
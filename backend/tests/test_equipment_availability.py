@@ -0,0 +1,194 @@
+"""
+Equipment availability index tests
+Active deployments reserve equipment quantities over a period; the index answers the peak
+quantity booked on any window and lists the deployments that conflict with a new booking.
+A version counter in Mongo tells each worker when another one changed a deployment.
+"""
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from services import equipment_availability
+from services.equipment_availability import AvailabilityIndex, ItemTimeline, reservation_window
+
+
+def deployment(deployment_id, start, end, items, status="planned"):
+    return {
+        "id": deployment_id, "name": deployment_id, "status": status, "start_date": start, "end_date": end,
+        "items": [{"equipment_id": eq, "quantity": qty} for eq, qty in items.items()],
+    }
+
+
+def window(start, end=None):
+    return reservation_window(start, end)
+
+
+def brute_force_peak(bookings, start, end, exclude=None):
+    """Hour-by-hour sweep over the bookings"""
+    hours = int((end - start).total_seconds() // 3600) + 1
+    return max(
+        sum(q for key, (s, e, q) in bookings.items() if key != exclude and s <= start + timedelta(hours=h) < e)
+        for h in range(hours) if start + timedelta(hours=h) < end
+    )
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """A fresh process-wide index"""
+    fresh = AvailabilityIndex()
+    monkeypatch.setattr(equipment_availability, "availability_index", fresh)
+    return fresh
+
+
+class TestReservationWindow:
+    """Date handling"""
+
+    def test_date_only_end_is_inclusive(self):
+        start, end = window("2026-06-12", "2026-06-14")
+        assert start == datetime(2026, 6, 12, tzinfo=timezone.utc)
+        assert end == datetime(2026, 6, 15, tzinfo=timezone.utc)
+
+    def test_missing_end(self):
+        assert window("2026-06-12")[1] == datetime(2026, 6, 13, tzinfo=timezone.utc)
+        assert reservation_window("2026-06-12", None, open_ended=True)[1].year == 9999
+
+
+class TestAvailabilityIndex:
+    """Bookings, peaks and conflicts"""
+
+    def test_overlapping_bookings_add_up(self):
+        index = AvailabilityIndex()
+        index.load([
+            deployment("wedding-a", "2026-06-12", "2026-06-13", {"cam": 2, "drone": 1}),
+            deployment("wedding-b", "2026-06-13", "2026-06-14", {"cam": 1}),
+            deployment("done", "2026-06-13", "2026-06-13", {"cam": 5}, status="completed"),
+        ])
+
+        assert index.reserved("cam", *window("2026-06-13")) == 3
+        assert index.reserved("cam", *window("2026-06-14")) == 1
+        assert index.reserved("cam", *window("2026-06-15")) == 0
+        assert index.reserved("cam", *window("2026-06-01", "2026-06-30")) == 3
+        assert index.reserved("drone", *window("2026-06-14")) == 0
+        assert {d["id"] for d in index.conflicting_deployments("cam", *window("2026-06-13"))} == {"wedding-a", "wedding-b"}
+
+    def test_updates_returns_and_edits(self):
+        index = AvailabilityIndex()
+        booking = deployment("wedding-a", "2026-06-12", "2026-06-13", {"cam": 2})
+        index.upsert(booking)
+        index.upsert(deployment("wedding-b", "2026-06-12", None, {"cam": 1}))
+
+        assert index.reserved("cam", *window("2026-06-12")) == 3
+        # Editing wedding-a: its own booking does not count against itself
+        assert index.reserved("cam", *window("2026-06-12"), exclude="wedding-a") == 1
+
+        booking["items"][0]["return_status"] = "returned"
+        index.upsert(booking)
+        assert index.reserved("cam", *window("2026-06-12")) == 1
+
+        index.remove("wedding-b")
+        assert index.reserved("cam", *window("2026-06-12")) == 0
+        assert index.items == {}
+
+    def test_in_progress_without_end_stays_booked(self):
+        index = AvailabilityIndex()
+        index.upsert(deployment("tour", "2026-06-01", None, {"light": 1}, status="in_progress"))
+        assert index.reserved("light", *window("2027-01-01")) == 1
+
+
+class TestItemTimeline:
+    """The segment tree peaks match a brute-force sweep"""
+
+    def test_peak_matches_brute_force(self):
+        rng = random.Random(7)
+        base = datetime(2026, 5, 1, tzinfo=timezone.utc)
+        timeline = ItemTimeline()
+        bookings = {}
+        for i in range(60):
+            start = base + timedelta(days=rng.randrange(120))
+            end = start + timedelta(days=rng.randrange(1, 5))
+            bookings[f"d{i}"] = (start, end, rng.randrange(1, 4))
+            timeline.set(f"d{i}", *bookings[f"d{i}"])
+
+        for _ in range(200):
+            start = base + timedelta(days=rng.randrange(-5, 130), hours=rng.randrange(24))
+            end = start + timedelta(days=rng.randrange(0, 10), hours=rng.randrange(1, 24))
+            assert timeline.peak(start, end) == brute_force_peak(bookings, start, end)
+
+    def test_peak_without_matches_brute_force(self):
+        rng = random.Random(11)
+        base = datetime(2026, 5, 1, tzinfo=timezone.utc)
+        timeline = ItemTimeline()
+        bookings = {}
+        for i in range(40):
+            start = base + timedelta(days=rng.randrange(60))
+            end = start + timedelta(days=rng.randrange(1, 6))
+            bookings[f"d{i}"] = (start, end, rng.randrange(1, 4))
+            timeline.set(f"d{i}", *bookings[f"d{i}"])
+        # Two bookings sharing both bounds
+        bookings["twin"] = bookings["d0"]
+        timeline.set("twin", *bookings["twin"])
+        tree = list(timeline._tree)
+
+        for _ in range(200):
+            excluded = rng.choice(sorted(bookings) + ["unknown"])
+            start = base + timedelta(days=rng.randrange(-5, 70), hours=rng.randrange(24))
+            end = start + timedelta(days=rng.randrange(0, 10), hours=rng.randrange(1, 24))
+            assert timeline.peak_without(excluded, start, end) == brute_force_peak(bookings, start, end, excluded)
+        # The excluded bounds are restored after each query
+        assert timeline._tree == tree
+
+
+class TestFindConflicts:
+    """Conflict checks against the shared index"""
+
+    def seed(self, db, *deployments):
+        async def run():
+            await db.equipment.insert_one({"id": "light", "name": "Projecteur", "quantity": 1})
+            if deployments:
+                await db.deployments.insert_many([dict(d) for d in deployments])
+        asyncio.run(run())
+
+    def test_open_ended_edit_matches_the_index(self, db, index):
+        self.seed(db, deployment("tour", "2026-06-01", None, {"light": 1}, status="in_progress"),
+                  deployment("gala", "2026-09-01", "2026-09-02", {"light": 1}))
+
+        async def scenario():
+            await equipment_availability.rebuild(db)
+            # Editing the tour in progress: booked until its return, so it collides with the gala
+            inferred = await equipment_availability.find_conflicts(
+                db, {"light": 1}, "2026-06-01", None, exclude_deployment_id="tour")
+            bounded = await equipment_availability.find_conflicts(
+                db, {"light": 1}, "2026-06-01", None, exclude_deployment_id="tour", open_ended=False)
+            return inferred, bounded
+
+        inferred, bounded = asyncio.run(scenario())
+        assert [d["id"] for d in inferred[0]["deployments"]] == ["gala"]
+        assert bounded == []
+
+    def test_writes_from_another_worker_trigger_a_rebuild(self, db, index):
+        self.seed(db)
+
+        async def scenario():
+            free = await equipment_availability.find_conflicts(db, {"light": 1}, "2026-06-12", None)
+            # Our own write keeps the index current without a rebuild
+            await db.deployments.insert_one(deployment("wedding", "2026-06-12", None, {"light": 1}))
+            await equipment_availability.refresh_deployment(db, "wedding")
+            loaded_at = index.loaded_at
+            mine = await equipment_availability.find_conflicts(db, {"light": 1}, "2026-06-12", None)
+            rebuilt_after_own_write = index.loaded_at != loaded_at
+            # Another worker deletes the booking and bumps the version
+            await db.deployments.delete_one({"id": "wedding"})
+            await equipment_availability.bump_version(db)
+            theirs = await equipment_availability.find_conflicts(db, {"light": 1}, "2026-06-12", None)
+            return free, mine, rebuilt_after_own_write, theirs
+
+        free, mine, rebuilt_after_own_write, theirs = asyncio.run(scenario())
+        assert free == [] and theirs == []
+        assert mine[0]["available"] == 0 and not rebuilt_after_own_write
+        assert index.version == 2
@@ -0,0 +1,74 @@
+"""
+Protected file delivery tests
+In python mode the file is served by the app; in nginx/sendfile mode the route only returns
+the internal redirect header and an empty body, with the download headers set by the app.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+from fastapi.testclient import TestClient
+
+from services import file_delivery
+from services.file_delivery import deliver_file
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    (root / "galleries").mkdir(parents=True)
+    (root / "galleries" / "photo 1.jpg").write_bytes(b"\xff\xd8\xff" + b"x" * 100)
+    monkeypatch.setattr(file_delivery, "DELIVERY_ROOT", root.resolve())
+    return root
+
+
+def client_for(path, **kwargs):
+    app = FastAPI()
+
+    @app.get("/file")
+    async def get_file():
+        return deliver_file(path, **kwargs)
+
+    return TestClient(app)
+
+
+class TestFileDelivery:
+    """deliver_file per FILE_DELIVERY mode"""
+
+    def test_python_mode_serves_the_bytes(self, uploads, monkeypatch):
+        monkeypatch.setattr(file_delivery, "FILE_DELIVERY", "python")
+        path = uploads / "galleries" / "photo 1.jpg"
+
+        response = client_for(path, filename="photo 1.jpg").get("/file")
+
+        assert response.status_code == 200
+        assert response.content == path.read_bytes()
+        assert "X-Accel-Redirect" not in response.headers
+        assert isinstance(deliver_file(path), FileResponse)
+
+    def test_nginx_mode_returns_internal_redirect_only(self, uploads, monkeypatch):
+        monkeypatch.setattr(file_delivery, "FILE_DELIVERY", "nginx")
+        path = uploads / "galleries" / "photo 1.jpg"
+
+        response = client_for(path, filename="Mariage été.jpg", media_type="image/jpeg").get("/file")
+
+        assert response.status_code == 200
+        assert response.content == b""
+        assert response.headers["x-accel-redirect"] == "/_protected/galleries/photo%201.jpg"
+        assert response.headers["content-type"] == "image/jpeg"
+        assert response.headers["content-disposition"] == "attachment; filename*=utf-8''Mariage%20%C3%A9t%C3%A9.jpg"
+
+    def test_sendfile_mode_and_files_outside_root(self, uploads, tmp_path, monkeypatch):
+        monkeypatch.setattr(file_delivery, "FILE_DELIVERY", "sendfile")
+        path = uploads / "galleries" / "photo 1.jpg"
+        assert deliver_file(path).headers["x-sendfile"] == str(path.resolve())
+
+        outside = tmp_path / "cache.pdf"
+        outside.write_bytes(b"%PDF-1.7")
+        assert file_delivery.offload_response(outside) is None
+        assert isinstance(deliver_file(outside), FileResponse)
@@ -0,0 +1,255 @@
+"""
+Guestbook media normalization tests (offline)
+Uploads are normalized in the background to one video profile with a poster, a preview clip and
+waveform peaks; montages stream-copy the normalized clips when they all share the current profile and
+otherwise re-encode the originals without waiting, while the missing clips are normalized in the
+background. The public feed is paginated with a (created_at, id) cursor.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+from array import array
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import guestbook_media
+from services.executors import run_ffmpeg
+
+
+def seed(db, *messages):
+    asyncio.run(db.guestbook_messages.insert_many([dict(m) for m in messages]))
+
+
+def stored(db, message_id):
+    return asyncio.run(db.guestbook_messages.find_one({"id": message_id}, {"_id": 0}))
+
+
+def video_message(message_id, **extra):
+    return {"id": message_id, "guestbook_id": "g1", "message_type": "video",
+            "media_url": f"/uploads/guestbooks/g1/{message_id}.webm", "media_status": "pending", **extra}
+
+
+def fake_ffmpeg(commands, has_audio=True, fail_on=None):
+    """Records the commands and writes the output file like ffmpeg would"""
+    async def run(cmd, text=True):
+        commands.append(cmd)
+        if fail_on and cmd[0] == fail_on:
+            raise RuntimeError("ffmpeg exited with 1")
+        if cmd[-1] == "-":
+            return SimpleNamespace(stdout=array("h", [0, 1000, -32767, 200] * 50).tobytes())
+        if cmd[0] == "ffprobe":
+            streams = [{"codec_type": "video"}] + ([{"codec_type": "audio"}] if has_audio else [])
+            return SimpleNamespace(stdout=json.dumps({"streams": streams, "format": {"duration": "12.345"}}))
+        with open(cmd[-1], "wb") as f:
+            f.write(b"media")
+        return SimpleNamespace(stdout="")
+    return run
+
+
+class TestCommands:
+    """One profile for every clip"""
+
+    def test_video_profile(self):
+        cmd = guestbook_media.normalize_video_command("in.webm", "out.mp4")
+        joined = " ".join(cmd)
+        assert "-profile:v high" in joined and "format=yuv420p" in joined and "fps=30" in joined
+        assert "loudnorm=" in joined and "-ar 48000 -ac 2" in joined
+        assert "-video_track_timescale 15360" in joined and cmd[-1] == "out.mp4"
+
+    def test_silent_clip_gets_an_audio_track(self):
+        cmd = guestbook_media.normalize_video_command("in.mp4", "out.mp4", has_audio=False)
+        assert "anullsrc=channel_layout=stereo:sample_rate=48000" in cmd and "-shortest" in cmd
+        assert "loudnorm" not in " ".join(cmd)
+
+    def test_probe_and_concat_list(self):
+        probe = guestbook_media.parse_probe(json.dumps({"streams": [{"codec_type": "video"}], "format": {}}))
+        assert probe == {"has_video": True, "has_audio": False, "duration": None}
+        assert guestbook_media.concat_list(["/a/b.mp4", "/a/l'ami.mp4"]) == "file '/a/b.mp4'\nfile '/a/l'\\''ami.mp4'\n"
+        assert "-c" in guestbook_media.concat_copy_command("list.txt", "out.mp4")
+
+    def test_waveform_peaks(self):
+        pcm = array("h", [100] * 10 + [-32767] * 10 + [16384] * 10 + [0] * 10).tobytes()
+        assert guestbook_media.waveform_peaks(pcm, points=4) == [0, 100, 50, 0]
+        assert guestbook_media.waveform_peaks(pcm[:5], points=64) == [0, 0]
+        assert guestbook_media.waveform_peaks(b"") == []
+
+    def test_preview_is_short_and_light(self):
+        cmd = guestbook_media.preview_command("in.mp4", "out.mp4")
+        assert cmd[cmd.index("-t") + 1] == str(guestbook_media.PREVIEW_SECONDS)
+        assert "-maxrate" in cmd and cmd[-1] == "out.mp4"
+        assert "-vn" in guestbook_media.preview_command("in.m4a", "out.m4a", video=False)
+
+
+class TestNormalizeMessage:
+    """Background worker state and outputs"""
+
+    def test_video_ready_with_poster(self, db, tmp_path, monkeypatch):
+        commands = []
+        monkeypatch.setattr(guestbook_media, "_ffmpeg", fake_ffmpeg(commands, has_audio=False))
+        (tmp_path / "guestbooks" / "g1").mkdir(parents=True)
+        seed(db, video_message("m1"))
+
+        status = asyncio.run(guestbook_media.normalize_message(db, tmp_path, "m1"))
+
+        doc = stored(db, "m1")
+        assert status == "ready" and doc["media_status"] == "ready"
+        assert doc["normalized_url"] == "/uploads/guestbooks/g1/m1.norm.mp4"
+        assert doc["poster_url"] == "/uploads/guestbooks/g1/m1.poster.jpg"
+        assert doc["preview_url"] == "/uploads/guestbooks/g1/m1.preview.mp4"
+        assert doc["normalized_profile"] == guestbook_media.PROFILE and doc["media_duration"] == 12.35
+        assert len(doc["waveform"]) == guestbook_media.WAVEFORM_POINTS and max(doc["waveform"]) == 100
+        assert [c[0] for c in commands] == ["ffprobe", "ffmpeg", "ffmpeg", "ffmpeg", "ffmpeg"]
+        assert (tmp_path / "guestbooks" / "g1" / "m1.preview.mp4").exists()
+        assert (tmp_path / "guestbooks" / "g1" / "m1.norm.mp4").exists()
+        assert not list((tmp_path / "guestbooks" / "g1").glob(".*"))
+        # Already processed: a second run does nothing
+        assert asyncio.run(guestbook_media.normalize_message(db, tmp_path, "m1")) is None
+
+    def test_failure_is_recorded(self, db, tmp_path, monkeypatch):
+        monkeypatch.setattr(guestbook_media, "_ffmpeg", fake_ffmpeg([], fail_on="ffmpeg"))
+        (tmp_path / "guestbooks" / "g1").mkdir(parents=True)
+        seed(db, video_message("m1"))
+
+        assert asyncio.run(guestbook_media.normalize_message(db, tmp_path, "m1")) == "failed"
+        assert "ffmpeg exited" in stored(db, "m1")["media_error"]
+
+    def test_pending_uploads_are_resumed(self, db, tmp_path, monkeypatch):
+        monkeypatch.setattr(guestbook_media, "_ffmpeg", fake_ffmpeg([]))
+        (tmp_path / "guestbooks" / "g1").mkdir(parents=True)
+        seed(
+            db,
+            video_message("m1", created_at="2026-06-12T10:00:00"),
+            video_message("m2", created_at="2026-06-12T09:00:00", media_status="processing",
+                          media_processing_at="2026-06-01T00:00:00+00:00"),
+            video_message("m3", created_at="2026-06-12T11:00:00", media_status="failed"),
+            {"id": "m4", "guestbook_id": "g1", "message_type": "text", "created_at": "2026-06-12T08:00:00"},
+        )
+
+        async def scenario():
+            queued = await guestbook_media.resume_pending(db, tmp_path)
+            # One drain at a time per process, held until it finishes
+            again = await guestbook_media.resume_pending(db, tmp_path)
+            drains = list(guestbook_media._drain_tasks)
+            await asyncio.gather(*drains)
+            return queued, again, len(drains)
+
+        assert asyncio.run(scenario()) == (2, 0, 1)
+        assert not guestbook_media._drain_tasks
+        assert [stored(db, m)["media_status"] for m in ("m1", "m2", "m3")] == ["ready", "ready", "failed"]
+
+    def test_request_ffmpeg_does_not_wait_for_normalizations(self, db, tmp_path, monkeypatch):
+        gate = threading.Event()
+
+        def slow_run(cmd, **kwargs):
+            gate.wait(10)
+            return subprocess.CompletedProcess(cmd, 1, "", "stopped")
+
+        monkeypatch.setattr(guestbook_media, "subprocess", SimpleNamespace(run=slow_run))
+        (tmp_path / "guestbooks" / "g1").mkdir(parents=True)
+        seed(db, *[video_message(f"m{i}") for i in range(4)])
+
+        async def scenario():
+            tasks = [guestbook_media.enqueue(db, tmp_path, f"m{i}") for i in range(4)]
+            await asyncio.sleep(0.05)
+            try:
+                # A montage / slideshow / thumbnail ffmpeg call goes straight through
+                return await asyncio.wait_for(run_ffmpeg(lambda: "thumbnail"), timeout=2)
+            finally:
+                gate.set()
+                await asyncio.gather(*tasks)
+
+        assert asyncio.run(scenario()) == "thumbnail"
+        assert [stored(db, f"m{i}")["media_status"] for i in range(4)] == ["failed"] * 4
+
+
+class TestMontageSources:
+    """Stream copy only when every clip is normalized with the current profile"""
+
+    def test_copy_or_reencode(self, tmp_path):
+        folder = tmp_path / "guestbooks" / "g1"
+        folder.mkdir(parents=True)
+        for name in ("m1.webm", "m1.norm.mp4", "m2.mp4", "m2.norm.mp4"):
+            (folder / name).write_bytes(b"x")
+        ready = [
+            video_message("m1", media_status="ready", normalized_profile=guestbook_media.PROFILE,
+                          normalized_url="/uploads/guestbooks/g1/m1.norm.mp4"),
+            video_message("m2", media_url="/uploads/guestbooks/g1/m2.mp4", media_status="ready",
+                          normalized_profile=guestbook_media.PROFILE, normalized_url="/uploads/guestbooks/g1/m2.norm.mp4"),
+        ]
+
+        paths, copy = guestbook_media.montage_sources(tmp_path, ready)
+        assert copy and paths == [str(folder / "m1.norm.mp4"), str(folder / "m2.norm.mp4")]
+
+        ready[1]["normalized_profile"] = "h264-high-1920x1080-25fps-aac48k"
+        paths, copy = guestbook_media.montage_sources(tmp_path, ready)
+        assert not copy and paths == [str(folder / "m1.webm"), str(folder / "m2.mp4")]
+
+    def test_unready_clips_are_queued_not_awaited(self, db, tmp_path, monkeypatch):
+        monkeypatch.setattr(guestbook_media, "_ffmpeg", fake_ffmpeg([]))
+        folder = tmp_path / "guestbooks" / "g1"
+        folder.mkdir(parents=True)
+        for name in ("m1.webm", "m2.webm", "m3.webm"):
+            (folder / name).write_bytes(b"x")
+        messages = [
+            video_message("m1"),
+            video_message("m2", media_status="ready", normalized_profile="h264-high-1920x1080-25fps-aac48k",
+                          normalized_url="/uploads/guestbooks/g1/m2.norm.mp4"),
+            video_message("m3", media_status="failed"),
+        ]
+        seed(db, *messages)
+
+        async def scenario():
+            queued = await guestbook_media.enqueue_unready(db, tmp_path, messages)
+            # The montage does not wait: originals, re-encoded
+            sources = guestbook_media.montage_sources(tmp_path, messages)
+            await asyncio.gather(*guestbook_media._running_tasks.values())
+            return queued, sources
+
+        queued, (paths, copy) = asyncio.run(scenario())
+        assert queued == 2
+        assert not copy and [os.path.basename(p) for p in paths] == ["m1.webm", "m2.webm", "m3.webm"]
+        # Normalized in the background, the outdated profile included; the failed clip is left alone
+        assert [stored(db, m)["media_status"] for m in ("m1", "m2", "m3")] == ["ready", "ready", "failed"]
+        assert stored(db, "m2")["normalized_profile"] == guestbook_media.PROFILE
+
+
+class TestFeed:
+    """Cursor pages, newest first, without internal fields"""
+
+    def test_pages_follow_the_cursor(self, db, queries):
+        docs = [
+            {"id": f"m{i:02d}", "guestbook_id": "g1", "is_approved": True, "author_name": "A",
+             "message_type": "text", "created_at": f"2026-06-12T10:{i // 2:02d}:00", "media_error": "x"}
+            for i in range(7)
+        ]
+        docs.append({**docs[0], "id": "hidden", "is_approved": False})
+        seed(db, *docs)
+
+        async def scenario():
+            pages, cursor = [], None
+            while True:
+                page = await guestbook_media.feed_page(db, "g1", cursor=cursor, limit=3)
+                pages.append(page)
+                cursor = page["next_cursor"]
+                if not cursor:
+                    return pages
+
+        pages = asyncio.run(scenario())
+        assert [[m["id"] for m in p["messages"]] for p in pages] == [["m06", "m05", "m04"], ["m03", "m02", "m01"], ["m00"]]
+        assert pages[0]["total"] == 7 and "total" not in pages[1]
+        assert [q[1] for q in queries].count("count_documents") == 1
+        assert "media_error" not in pages[0]["messages"][0]
+
+    def test_invalid_cursor(self):
+        message = {"id": "m1", "created_at": "2026-06-12T10:00:00+00:00"}
+        assert guestbook_media.decode_cursor(guestbook_media.encode_cursor(message)) == (message["created_at"], "m1")
+        for cursor in ("%%%", "bm9waXBl"):
+            try:
+                guestbook_media.decode_cursor(cursor)
+                assert False, cursor
+            except ValueError:
+                pass
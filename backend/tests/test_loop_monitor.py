@@ -0,0 +1,101 @@
+"""
+Event loop monitor and executor registry tests
+A blocking call inside a request is detected, attributed to its route and reported;
+work sent to the shared executors runs off the loop thread with the caller's context.
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from loop_monitor import LoopMonitor
+from metrics import MetricsMiddleware
+from services.executors import run_io, run_ffmpeg, executor_stats, shutdown_executors
+
+
+def blocking_handler(seconds):
+    async def app(scope, receive, send):
+        time.sleep(seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+async def serve(app, path="/api/blocking"):
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    await MetricsMiddleware(app)(scope, None, send)
+
+
+class TestLoopMonitor:
+    """Lag measurement and blocking call detection"""
+
+    def test_blocking_call_is_reported_with_its_stack(self):
+        monitor = LoopMonitor(interval_ms=10, threshold_ms=50)
+
+        async def scenario():
+            monitor.start()
+            await asyncio.sleep(0.05)
+            await serve(blocking_handler(0.3))
+            await asyncio.sleep(0.05)
+            monitor.stop()
+
+        asyncio.run(scenario())
+
+        snapshot = monitor.snapshot()
+        assert snapshot["blocks"] == 1
+        assert snapshot["lag_max_ms"] >= 250
+        worst = monitor.worst_offenders()[0]
+        assert worst["route"] == metrics.UNMATCHED_ROUTE
+        assert worst["count"] == 1
+        assert worst["total_seconds"] >= 0.25
+        assert "time.sleep(seconds)" in worst["stack"]
+
+    def test_non_blocking_requests_are_not_reported(self):
+        monitor = LoopMonitor(interval_ms=10, threshold_ms=50)
+
+        async def handler(scope, receive, send):
+            await run_io(time.sleep, 0.2)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def scenario():
+            monitor.start()
+            await serve(handler)
+            monitor.stop()
+
+        asyncio.run(scenario())
+
+        assert monitor.snapshot()["blocks"] == 0
+        assert monitor.worst_offenders() == []
+
+
+class TestExecutors:
+    """Shared executor registry"""
+
+    def teardown_method(self):
+        shutdown_executors()
+
+    def test_runs_off_loop_with_caller_context(self):
+        request_id = contextvars.ContextVar("request_id", default=None)
+
+        def work():
+            return threading.current_thread().name, request_id.get()
+
+        async def scenario():
+            request_id.set("req-1")
+            return await run_io(work), await run_ffmpeg(work)
+
+        (io_thread, io_value), (ffmpeg_thread, ffmpeg_value) = asyncio.run(scenario())
+
+        assert io_thread.startswith("io") and io_value == "req-1"
+        assert ffmpeg_thread.startswith("ffmpeg") and ffmpeg_value == "req-1"
+        stats = executor_stats()
+        assert stats["io"]["started"] and stats["io"]["pending"] == 0
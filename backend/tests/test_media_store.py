@@ -0,0 +1,127 @@
+"""
+Content-addressed media store tests
+Identical uploads share one blob through hardlinks, the link count is the reference count,
+the migration dedupes an existing tree in place and unreferenced blobs are collected.
+A file regenerated under an existing path is replaced, never written through its blob.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from services import media_store
+from services.uploads import save_upload
+
+PHOTO = b"\xff\xd8\xff\xe0" + os.urandom(4096)
+SHA = hashlib.sha256(PHOTO).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    blobs = tmp_path / "uploads" / ".blobs"
+    monkeypatch.setattr(media_store, "BLOBS_DIR", blobs)
+    monkeypatch.setattr(media_store, "DERIVED_DIR", blobs / "derived")
+    monkeypatch.setattr(media_store, "MEDIA_DEDUP", True)
+    return tmp_path / "uploads"
+
+
+def upload(data, filename="photo.jpg"):
+    return UploadFile(file=io.BytesIO(data), filename=filename, headers=Headers({"content-type": "image/jpeg"}))
+
+
+class TestStoreUploads:
+    """Uploads are published through the blob store"""
+
+    def test_same_content_is_stored_once(self, store):
+        first = asyncio.run(save_upload(upload(PHOTO), store / "galleries" / "a.jpg"))
+        second = asyncio.run(save_upload(upload(PHOTO), store / "photofind" / "event" / "b.jpg"))
+
+        a, b = store / "galleries" / "a.jpg", store / "photofind" / "event" / "b.jpg"
+        assert not first.deduplicated and second.deduplicated
+        assert a.read_bytes() == b.read_bytes() == PHOTO
+        assert os.path.samefile(a, b)
+        assert media_store.refcount(SHA) == 2
+        assert media_store.store_stats()["saved_bytes"] == len(PHOTO)
+
+    def test_deleting_a_copy_releases_its_reference(self, store):
+        for name in ("a.jpg", "b.jpg"):
+            asyncio.run(save_upload(upload(PHOTO), store / "galleries" / name))
+
+        (store / "galleries" / "a.jpg").unlink()
+        assert media_store.refcount(SHA) == 1
+        assert media_store.collect_garbage(min_age_seconds=0)["removed"] == 0
+
+        (store / "galleries" / "b.jpg").unlink()
+        derived = media_store.derivative_path(SHA, "thumb_400")
+        derived.parent.mkdir(parents=True)
+        derived.write_bytes(b"thumb")
+        assert media_store.collect_garbage(min_age_seconds=0) == {"removed": 1, "bytes_freed": len(PHOTO)}
+        assert not media_store.blob_path(SHA).exists() and not derived.exists()
+
+    def test_temporary_files_bypass_the_store(self, store):
+        asyncio.run(save_upload(upload(PHOTO), store / "videos" / "chunks" / "c0", dedupe=False))
+        assert media_store.refcount(SHA) == 0
+
+
+class TestDedupeTree:
+    """Migration of an existing uploads tree"""
+
+    def test_duplicates_become_links_and_rerun_is_noop(self, store):
+        other = b"\x89PNG\r\n\x1a\n" + os.urandom(1024)
+        paths = [store / "galleries" / "g1.jpg", store / "photofind" / "e1" / "p1.jpg",
+                 store / "client_transfers" / "photos" / "c1" / "t1.jpg"]
+        for path in paths:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(PHOTO)
+        (store / "galleries" / "unique.png").write_bytes(other)
+
+        dry = media_store.dedupe_tree(store, dry_run=True)
+        assert (dry.adopted, dry.deduplicated, dry.bytes_saved) == (2, 2, 2 * len(PHOTO))
+        assert not media_store.BLOBS_DIR.exists()
+
+        report = media_store.dedupe_tree(store)
+        assert (report.files, report.adopted, report.deduplicated) == (4, 2, 2)
+        assert report.bytes_saved == 2 * len(PHOTO)
+        assert all(os.path.samefile(paths[0], path) for path in paths)
+        assert all(path.read_bytes() == PHOTO for path in paths)
+        assert media_store.refcount(SHA) == 3
+
+        rerun = media_store.dedupe_tree(store)
+        assert (rerun.already_linked, rerun.adopted, rerun.deduplicated) == (4, 0, 0)
+
+
+class TestReplaceFile:
+    """Rewriting a deduplicated path leaves the shared blob alone"""
+
+    def test_replacing_a_linked_copy(self, store):
+        for name in ("a.pdf", "b.pdf"):
+            asyncio.run(save_upload(upload(PHOTO, name), store / "client_transfers" / "documents" / name))
+        a, b = store / "client_transfers" / "documents" / "a.pdf", store / "client_transfers" / "documents" / "b.pdf"
+
+        media_store.write_file(a, b"new invoice")
+
+        assert a.read_bytes() == b"new invoice" and b.read_bytes() == PHOTO
+        assert media_store.blob_path(SHA).read_bytes() == PHOTO
+        assert media_store.refcount(SHA) == 1
+
+    def test_failed_write_keeps_the_old_file(self, store):
+        dest = store / "photofind" / "e1" / "qr_code.png"
+        media_store.write_file(dest, b"old")
+
+        def broken(tmp):
+            assert tmp.suffix == ".png" and tmp.name.startswith(".")
+            tmp.write_bytes(b"partial")
+            raise OSError("disk full")
+
+        with pytest.raises(OSError):
+            media_store.replace_file(dest, broken)
+        assert dest.read_bytes() == b"old"
+        assert [p.name for p in dest.parent.iterdir()] == ["qr_code.png"]
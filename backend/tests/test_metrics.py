@@ -0,0 +1,100 @@
+"""
+Request metrics tests
+Timing middleware (per-route latency, in-flight requests, Server-Timing header),
+attribution of Mongo commands to the current request and Prometheus rendering.
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+from metrics import MetricsMiddleware, MongoCommandListener
+
+
+def mongo_event(request_id, command_name="find", micros=2000):
+    return SimpleNamespace(
+        connection_id=("localhost", 27017), request_id=request_id, command_name=command_name,
+        command={command_name: "clients"}, database_name="test_database", duration_micros=micros
+    )
+
+
+def make_app(listener, commands=2, status=200):
+    async def app(scope, receive, send):
+        for i in range(commands):
+            listener.started(mongo_event(i))
+            listener.succeeded(mongo_event(i))
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def call(middleware, path="/api/clients"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+
+class TestMetricsMiddleware:
+    """Per-request timing and Mongo attribution"""
+
+    def setup_method(self):
+        metrics.registry.reset()
+
+    def test_records_latency_and_mongo_commands(self):
+        listener = MongoCommandListener()
+        call(MetricsMiddleware(make_app(listener, commands=3)))
+
+        key = ("GET", metrics.UNMATCHED_ROUTE)
+        assert metrics.registry.latency[key].count == 1
+        assert metrics.registry.in_flight[key] == 0
+        assert metrics.registry.responses[("GET", metrics.UNMATCHED_ROUTE, "200")] == 1
+        assert metrics.registry.request_mongo_commands[key] == 3
+        assert metrics.registry.request_mongo_max[key] == 3
+        assert metrics.registry.mongo_commands[("find", metrics.UNMATCHED_ROUTE)] == 3
+
+    def test_server_timing_header_is_optional(self):
+        listener = MongoCommandListener()
+        without = call(MetricsMiddleware(make_app(listener), server_timing=False))
+        with_header = call(MetricsMiddleware(make_app(listener), server_timing=True))
+
+        assert without[0]["headers"] == []
+        name, value = with_header[0]["headers"][0]
+        assert name == b"server-timing"
+        assert b'desc="2 commands"' in value
+
+    def test_commands_outside_requests_are_background(self):
+        listener = MongoCommandListener()
+        listener.started(mongo_event(1, "update", micros=500_000))
+        listener.succeeded(mongo_event(1, "update", micros=500_000))
+
+        assert metrics.registry.mongo_commands[("update", metrics.BACKGROUND_ROUTE)] == 1
+        assert metrics.registry.mongo_slow[("update", metrics.BACKGROUND_ROUTE)] == 1
+
+
+class TestPrometheusRendering:
+    """Text exposition format"""
+
+    def setup_method(self):
+        metrics.registry.reset()
+
+    def test_histogram_is_cumulative(self):
+        metrics.registry.request_started("GET", "/api/stats")
+        metrics.registry.request_finished("GET", "/api/stats", 200, 0.02, metrics.RequestStats("/api/stats"))
+        text = metrics.registry.render_prometheus({"mongo_pool_in_use": ("In use", 4)})
+
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/stats",le="0.01"} 0' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/stats",le="0.025"} 1' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/stats",le="+Inf"} 1' in text
+        assert 'http_requests_total{method="GET",route="/api/stats",status="200"} 1' in text
+        assert "mongo_pool_in_use 4" in text
@@ -0,0 +1,68 @@
+"""
+News likes tests
+A like is one document in news_likes; toggling inserts or deletes it and moves likes_count with $inc.
+The feed's "liked" flags come from a single $in query.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import news_likes
+
+
+class TestToggleLike:
+    """Insert or delete one document; the counter follows"""
+
+    def test_like_unlike_and_counter(self, db):
+        async def scenario():
+            await db.news_posts.insert_one({"id": "p1", "likes_count": 0})
+            return [
+                await news_likes.toggle_like(db, "p1", "alice"),
+                await news_likes.toggle_like(db, "p1", "bob"),
+                await news_likes.toggle_like(db, "p1", "alice"),
+            ]
+
+        assert asyncio.run(scenario()) == [("liked", 1), ("liked", 2), ("unliked", 1)]
+        assert asyncio.run(db.news_likes.distinct("_id")) == ["p1:bob"]
+
+
+class TestLikedFlags:
+    """One query for the whole feed"""
+
+    def test_batched_flags(self, db, queries):
+        for post_id in ("p1", "p3"):
+            asyncio.run(news_likes.toggle_like(db, post_id, "alice"))
+        asyncio.run(news_likes.toggle_like(db, "p2", "bob"))
+
+        reads = len(queries)
+        liked = asyncio.run(news_likes.liked_post_ids(db, "alice", ["p1", "p2", "p3", "p4"]))
+
+        assert liked == {"p1", "p3"}
+        assert [q[:2] for q in queries[reads:]] == [("news_likes", "find")]
+        assert asyncio.run(news_likes.liked_post_ids(db, None, ["p1"])) == set()
+
+
+class TestMigration:
+    """Embedded like lists move to news_likes once, counters follow"""
+
+    def test_embedded_likes_are_moved(self, db):
+        async def scenario():
+            await db.news_posts.insert_many([
+                {"id": "p1", "likes": ["alice", "bob", "alice"]},
+                {"id": "p2", "likes": []},
+                {"id": "p3", "likes_count": 4},
+            ])
+            # Liked again after the new code went live, before the migration ran
+            await news_likes.toggle_like(db, "p1", "carol")
+            first = await news_likes.migrate_embedded_likes(db)
+            second = await news_likes.migrate_embedded_likes(db)
+            posts = await db.news_posts.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+            return first, second, posts, sorted(await db.news_likes.distinct("_id"))
+
+        first, second, posts, likes = asyncio.run(scenario())
+
+        assert (first, second) == (2, 0)
+        assert posts == [{"id": "p1", "likes_count": 3}, {"id": "p2", "likes_count": 0}, {"id": "p3", "likes_count": 4}]
+        assert likes == ["p1:alice", "p1:bob", "p1:carol"]
@@ -0,0 +1,169 @@
+"""
+Payment gateway tests
+Runs the async PayPal / Stripe gateway against the local mock server (services/payment_mock.py):
+OAuth token caching, idempotency keys and Stripe PaymentIntents; concurrent guestbook confirmations.
+"""
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.payment_gateway import PayPalGateway, StripeGateway, PaymentGatewayError, close_payment_gateways
+from services.payment_mock import PaymentMock
+
+
+ORDER = {
+    "intent": "CAPTURE",
+    "purchase_units": [{"amount": {"currency_code": "EUR", "value": "12.00"}, "description": "PhotoFind - 3 photo(s)"}]
+}
+
+
+@pytest.fixture
+def mock():
+    server = PaymentMock().start()
+    yield server
+    server.stop()
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await close_payment_gateways()
+    return asyncio.run(wrapper())
+
+
+class TestPayPalGateway:
+    """PayPal orders and v1 payments through one cached OAuth token"""
+
+    def test_token_is_fetched_once_for_a_checkout(self, mock):
+        async def checkout():
+            paypal = PayPalGateway("client", "secret", mock.base_url)
+            order = await paypal.create_order(ORDER)
+            status = await paypal.get_order(order.id)
+            capture = await paypal.capture_order(order.id)
+            return order, status, capture
+
+        order, status, capture = run(checkout())
+
+        assert PayPalGateway.approval_url(order).endswith(order.id)
+        assert status.status == "CREATED"
+        assert capture.status == "COMPLETED"
+        assert mock.calls["paypal_token"] == 1
+        assert mock.calls["paypal_create_order"] == 1
+
+    def test_create_order_is_idempotent(self, mock):
+        async def create_twice():
+            paypal = PayPalGateway("client", "secret", mock.base_url)
+            first = await paypal.create_order(ORDER, request_id="pending-1")
+            second = await paypal.create_order(ORDER, request_id="pending-1")
+            return first, second
+
+        first, second = run(create_twice())
+
+        assert first.id == second.id
+        assert mock.calls["paypal_create_order"] == 1
+
+    def test_capture_retry_returns_first_result(self, mock):
+        async def capture_twice():
+            paypal = PayPalGateway("client", "secret", mock.base_url)
+            order = await paypal.create_order(ORDER)
+            await paypal.capture_order(order.id)
+            return await paypal.capture_order(order.id)
+
+        capture = run(capture_twice())
+
+        assert capture.status == "COMPLETED"
+        assert mock.calls["paypal_capture"] == 1
+
+    def test_expired_token_is_renewed(self, mock):
+        async def with_revoked_token():
+            paypal = PayPalGateway("client", "secret", mock.base_url)
+            await paypal.create_order(ORDER)
+            mock.tokens.clear()
+            return await paypal.create_order(ORDER)
+
+        order = run(with_revoked_token())
+
+        assert order.status == "CREATED"
+        assert mock.calls["paypal_token"] == 2
+
+    def test_v1_payment_create_and_execute(self, mock):
+        async def payment_flow():
+            paypal = PayPalGateway("client", "secret", mock.base_url)
+            created = await paypal.create_payment({"intent": "sale", "transactions": []})
+            executed = await paypal.execute_payment(created.id, "PAYER123")
+            unknown = await paypal.execute_payment("PAYID-UNKNOWN", "PAYER123")
+            return created, executed, unknown
+
+        created, executed, unknown = run(payment_flow())
+
+        assert created.ok and created.approval_url
+        assert executed.ok
+        assert not unknown.ok
+        assert unknown.error["name"] == "INVALID_RESOURCE_ID"
+
+
+class TestStripeGateway:
+    """Stripe PaymentIntents over the shared HTTP client"""
+
+    def test_create_and_retrieve_intent(self, mock):
+        async def intent_flow():
+            stripe = StripeGateway("sk_test", mock.base_url)
+            intent = await stripe.create_payment_intent(
+                amount=1200, metadata={"event_id": "evt-1", "photo_ids": "a,b"}, idempotency_key="purchase-1"
+            )
+            retry = await stripe.create_payment_intent(amount=1200, idempotency_key="purchase-1")
+            retrieved = await stripe.retrieve_payment_intent(intent.id)
+            return intent, retry, retrieved
+
+        intent, retry, retrieved = run(intent_flow())
+
+        assert retry.id == intent.id
+        assert mock.calls["stripe_create_intent"] == 1
+        assert retrieved.status == "succeeded"
+        assert retrieved.amount == 1200
+        assert retrieved.metadata.get("photo_ids") == "a,b"
+
+    def test_unknown_intent_raises(self, mock):
+        async def retrieve_unknown():
+            stripe = StripeGateway("sk_test", mock.base_url)
+            await stripe.retrieve_payment_intent("pi_unknown")
+
+        with pytest.raises(PaymentGatewayError) as exc:
+            run(retrieve_unknown())
+        assert exc.value.status_code == 404
+
+
+class TestGuestbookConfirm:
+    """Concurrent confirmations of one PayPal payment create a single guestbook"""
+
+    def test_concurrent_confirms(self, db, tmp_path, monkeypatch):
+        import server
+
+        async def capture_order(order_id):
+            await asyncio.sleep(0.01)  # both confirmations are in flight
+            return {"status": "COMPLETED"}  # idempotent capture: the same answer for both
+
+        monkeypatch.setattr(server, "db", db)
+        monkeypatch.setattr(server, "GUESTBOOK_DIR", tmp_path)
+        monkeypatch.setattr(server, "get_paypal", lambda *args: SimpleNamespace(capture_order=capture_order))
+        asyncio.run(db.paypal_payments.insert_one(
+            {"id": "p1", "client_id": "c1", "status": "pending", "paypal_order_id": "O-1", "amount": 200}))
+        client = {"id": "c1", "name": "Alice"}
+
+        async def scenario():
+            confirm = lambda: server.confirm_guestbook_paypal_payment(
+                pending_id="p1", name="Mariage", event_date=None, client=client)
+            return await asyncio.gather(confirm(), confirm())
+
+        first, second = asyncio.run(scenario())
+        guestbooks = asyncio.run(db.guestbooks.find({}, {"_id": 0}).to_list(None))
+        assert len(guestbooks) == 1
+        assert first["guestbook_id"] == second["guestbook_id"] == guestbooks[0]["id"]
+        assert asyncio.run(db.paypal_payments.find_one({"id": "p1"}))["status"] == "completed"
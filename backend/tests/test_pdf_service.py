@@ -0,0 +1,123 @@
+"""
+PDF service tests (offline)
+Rendered PDFs are cached on disk by content hash of the source document; client documents live in a
+per-client folder purged with the account, a broken worker pool falls back to a thread, and old
+entries are pruned by a scheduled job.
+"""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import pdf_service
+from services.pdf_service import pdf_cache_key, prune_pdf_cache, purge_client_pdfs, render_pdf, render_pdf_file
+
+INVOICE = {"id": "inv-1", "invoice_number": "FAC-1", "amount_ttc": 120.0}
+
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    """Renders served by a stand-in worker pool, recorded as (executor, template, kwargs)"""
+    calls = []
+
+    async def run_in(executor, func, template, kwargs):
+        calls.append((executor, template, kwargs))
+        return f"%PDF {template} {len(calls)}".encode()
+
+    monkeypatch.setattr(pdf_service, "PDF_CACHE_DIR", tmp_path / "pdf")
+    monkeypatch.setattr(pdf_service, "run_in", run_in)
+    return calls
+
+
+class TestCache:
+    """Unchanged documents are not rendered again"""
+
+    def test_miss_then_hit(self, renders):
+        first = asyncio.run(render_pdf("renewal_invoice", invoice=INVOICE))
+        again = asyncio.run(render_pdf("renewal_invoice", invoice=dict(INVOICE)))
+
+        assert first == again == b"%PDF renewal_invoice 1"
+        assert [(executor, template) for executor, template, _ in renders] == [("pdf", "renewal_invoice")]
+
+    def test_key_follows_inputs(self, renders):
+        key = pdf_cache_key("client_invoice", {"invoice": INVOICE, "client_name": "A"})
+        assert key == pdf_cache_key("client_invoice", {"client_name": "A", "invoice": dict(INVOICE)})
+        assert key != pdf_cache_key("client_invoice", {"invoice": INVOICE, "client_name": "B"})
+        assert key != pdf_cache_key("client_devis", {"invoice": INVOICE, "client_name": "A"})
+        assert key != pdf_cache_key("client_invoice", {"invoice": {**INVOICE, "amount_ttc": 121.0}, "client_name": "A"})
+
+        asyncio.run(render_pdf("renewal_invoice", invoice=INVOICE))
+        asyncio.run(render_pdf("renewal_invoice", invoice={**INVOICE, "amount_ttc": 240.0}))
+        assert len(renders) == 2
+
+    def test_template_version_invalidates(self, renders, monkeypatch):
+        asyncio.run(render_pdf("renewal_invoice", invoice=INVOICE))
+        monkeypatch.setattr(pdf_service, "TEMPLATE_VERSION", "2")
+        asyncio.run(render_pdf("renewal_invoice", invoice=INVOICE))
+        assert len(renders) == 2
+
+    def test_one_off_documents_are_not_written(self, renders, tmp_path):
+        pdf = asyncio.run(render_pdf("delivery_letter", cache=False, client_name="Jean", date="12/06/2026"))
+        assert pdf == b"%PDF delivery_letter 1"
+        assert not (tmp_path / "pdf").exists()
+
+
+class TestClientDocuments:
+    """A client's cached PDFs are kept apart and purged with the account"""
+
+    def test_purge(self, renders, tmp_path):
+        mine = asyncio.run(render_pdf_file("client_invoice", client_id="c1", invoice=INVOICE, client_name="A"))
+        other = asyncio.run(render_pdf_file("client_invoice", client_id="c2", invoice=INVOICE, client_name="A"))
+        shared = asyncio.run(render_pdf_file("renewal_invoice", invoice=INVOICE))
+
+        assert mine.is_relative_to(tmp_path / "pdf" / "clients" / "c1")
+        assert purge_client_pdfs("c1") is True
+        assert not mine.exists() and other.exists() and shared.exists()
+        assert purge_client_pdfs("c1") is False and purge_client_pdfs("") is False
+
+
+class TestBrokenPool:
+    """A crashed worker pool does not fail the request"""
+
+    def test_falls_back_to_a_thread(self, tmp_path, monkeypatch):
+        rendered_in_thread = []
+
+        async def broken(executor, func, template, kwargs):
+            raise BrokenProcessPool("worker died")
+
+        def render(template, kwargs):
+            rendered_in_thread.append(template)
+            return b"%PDF thread"
+
+        shutdowns = []
+        monkeypatch.setattr(pdf_service, "PDF_CACHE_DIR", tmp_path / "pdf")
+        monkeypatch.setattr(pdf_service, "run_in", broken)
+        monkeypatch.setattr(pdf_service, "_render", render)
+        monkeypatch.setattr(pdf_service, "shutdown_pdf_workers", lambda: shutdowns.append(1))
+
+        assert asyncio.run(render_pdf("renewal_invoice", invoice=INVOICE)) == b"%PDF thread"
+        assert rendered_in_thread == ["renewal_invoice"] and shutdowns == [1]
+
+
+class TestPrune:
+    """Entries older than the retention are removed"""
+
+    def test_old_entries_only(self, renders, tmp_path):
+        fresh = asyncio.run(render_pdf_file("renewal_invoice", invoice=INVOICE))
+        old = asyncio.run(render_pdf_file("client_devis", client_id="c1", devis={"id": "d1"}, client_name="A"))
+        stale = time.time() - 40 * 86400
+        os.utime(old, (stale, stale))
+        (tmp_path / "pdf" / "notes.txt").write_text("not a cache entry")
+        os.utime(tmp_path / "pdf" / "notes.txt", (stale, stale))
+
+        assert prune_pdf_cache(max_age_days=30) == 1
+        assert fresh.exists() and not old.exists() and (tmp_path / "pdf" / "notes.txt").exists()
+
+    def test_missing_cache_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(pdf_service, "PDF_CACHE_DIR", tmp_path / "nothing")
+        assert prune_pdf_cache() == 0
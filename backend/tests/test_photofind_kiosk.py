@@ -97,6 +97,38 @@ class TestPhotoFindKioskPurchase:
         
         print(f"PASS: Kiosk purchase created successfully with ID: {purchase_id}")
     
+    def test_download_page_resolves_purchase(self):
+        """Test GET /api/public/photofind/download/{purchaseId} - Resolves a kiosk purchase by token"""
+        response = requests.post(
+            f"{BASE_URL}/api/public/photofind/{TEST_EVENT_ID}/kiosk-purchase",
+            json={
+                "photo_ids": ["test-photo-1", "upload_nonexistent-session"],
+                "email": f"test_{uuid.uuid4().hex[:8]}@example.com",
+                "amount": 10.0,
+                "payment_method": "card"
+            }
+        )
+        assert response.status_code == 200
+        purchase = response.json()
+        
+        response = requests.get(
+            f"{BASE_URL}/api/public/photofind/download/{purchase['id']}",
+            params={"token": purchase["download_token"]}
+        )
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        data = response.json()
+        assert data["status"] == "completed"
+        assert data["photo_count"] == len(data["photos"])
+        assert all(p["id"] != "upload_nonexistent-session" for p in data["photos"])
+        
+        # Wrong token is rejected
+        response = requests.get(
+            f"{BASE_URL}/api/public/photofind/download/{purchase['id']}",
+            params={"token": "invalid-token"}
+        )
+        assert response.status_code == 404
+        print(f"PASS: Download page resolved {data['photo_count']} photo(s)")
+    
     def test_create_kiosk_purchase_nonexistent_event(self):
         """Test POST /api/public/photofind/{eventId}/kiosk-purchase - Returns 404 for non-existent event"""
         payload = {
@@ -185,5 +217,70 @@ class TestPhotoFindKioskPhotoServing:
         print("PASS: Non-existent photo returns 404")
 
 
+@pytest.fixture(scope="module")
+def admin_headers():
+    """Headers with admin token"""
+    response = requests.post(
+        f"{BASE_URL}/api/auth/login",
+        json={"email": "test@admin.com", "password": "admin123"}
+    )
+    if response.status_code != 200:
+        pytest.skip("Admin authentication failed")
+    return {"Authorization": f"Bearer {response.json().get('token')}"}
+
+
+class TestPhotoFindKioskStats:
+    """Tests for precomputed kiosk statistics"""
+    
+    def test_print_log_updates_counters(self, admin_headers):
+        """Test GET /api/admin/photofind/events/{eventId}/kiosk-stats - Counters follow print logs"""
+        before = requests.get(
+            f"{BASE_URL}/api/admin/photofind/events/{TEST_EVENT_ID}/kiosk-stats",
+            headers=admin_headers
+        ).json()
+        
+        requests.post(
+            f"{BASE_URL}/api/public/photofind/{TEST_EVENT_ID}/log-print",
+            json={"photo_ids": ["test-photo-1", "test-photo-2"], "format": "10x15"}
+        )
+        
+        after = requests.get(
+            f"{BASE_URL}/api/admin/photofind/events/{TEST_EVENT_ID}/kiosk-stats",
+            headers=admin_headers
+        ).json()
+        
+        assert after["total_printed"] == before["total_printed"] + 2
+        assert after["prints_by_format"].get("10x15", 0) == before["prints_by_format"].get("10x15", 0) + 2
+        assert sum(after["prints_by_hour"].values()) == after["total_printed"]
+        print(f"PASS: Counters updated ({after['total_printed']} printed)")
+    
+    def test_recent_lists_sorted(self, admin_headers):
+        """Test recent purchases/prints are returned newest first"""
+        response = requests.get(
+            f"{BASE_URL}/api/admin/photofind/events/{TEST_EVENT_ID}/kiosk-stats",
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        
+        for key in ("recent_purchases", "recent_prints"):
+            dates = [item["created_at"] for item in data[key]]
+            assert dates == sorted(dates, reverse=True), f"{key} should be sorted newest first"
+        print("PASS: Recent lists sorted by date")
+    
+    def test_rebuild_matches_counters(self, admin_headers):
+        """Test POST /api/admin/photofind/events/{eventId}/kiosk-stats/rebuild - Recomputes from raw data"""
+        response = requests.post(
+            f"{BASE_URL}/api/admin/photofind/events/{TEST_EVENT_ID}/kiosk-stats/rebuild",
+            headers=admin_headers
+        )
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        rebuilt = response.json()
+        
+        assert sum(rebuilt["purchases_by_method"].values()) == rebuilt["total_purchases"]
+        assert sum(rebuilt["prints_by_format"].values()) == rebuilt["total_printed"]
+        print(f"PASS: Stats rebuilt ({rebuilt['total_purchases']} purchases)")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
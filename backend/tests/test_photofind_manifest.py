@@ -0,0 +1,71 @@
+"""
+PhotoFind purchase manifest tests (offline)
+Paid purchases cache the resolved photo manifest; the cache is only written when every purchased photo
+was resolved, and manifests built for other photo ids or before photos carried their sha256 are rebuilt.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes import photofind
+
+
+@pytest.fixture
+def purchases(db, monkeypatch):
+    monkeypatch.setattr(photofind, "db", db)
+    asyncio.run(db.photofind_photos.insert_many([
+        {"id": "p1", "event_id": "e1", "filename": "a.jpg", "sha256": "aa"},
+        {"id": "p2", "event_id": "e1", "filename": "b.jpg", "sha256": "bb"},
+    ]))
+    return db
+
+
+def cached(db, purchase_id):
+    return asyncio.run(db.photofind_purchases.find_one({"id": purchase_id}, {"_id": 0}))
+
+
+def resolve_and_cache(db, purchase):
+    async def scenario():
+        await db.photofind_purchases.insert_one(dict(purchase))
+        manifest = await photofind.resolve_purchase_photos(purchase)
+        await photofind.cache_purchase_manifest(purchase, "photofind_purchases", manifest)
+        return manifest
+    return asyncio.run(scenario())
+
+
+class TestManifestCache:
+    """Only complete, current manifests are cached and reused"""
+
+    def test_complete_manifest_is_cached(self, purchases):
+        manifest = resolve_and_cache(purchases, {"id": "b1", "event_id": "e1", "photo_ids": ["p2", "p1"]})
+
+        assert [(p["id"], p["sha256"]) for p in manifest] == [("p2", "bb"), ("p1", "aa")]
+        doc = cached(purchases, "b1")
+        assert doc["photo_manifest"] == manifest and doc["photo_manifest_ids"] == ["p2", "p1"]
+        assert photofind.cached_purchase_manifest(doc) == manifest
+
+    def test_incomplete_manifest_is_not_cached(self, purchases):
+        manifest = resolve_and_cache(purchases, {"id": "b1", "event_id": "e1", "photo_ids": ["p1", "gone"]})
+
+        assert [p["id"] for p in manifest] == ["p1"]
+        assert "photo_manifest" not in cached(purchases, "b1")
+
+    def test_manifest_without_sha256_is_rebuilt(self, purchases):
+        legacy = [{"id": "p1", "filename": "a.jpg", "url": "/uploads/photofind/e1/a.jpg", "path": "e1/a.jpg"}]
+        purchase = {"id": "b1", "event_id": "e1", "photo_ids": ["p1"],
+                    "photo_manifest": legacy, "photo_manifest_ids": ["p1"]}
+        assert photofind.cached_purchase_manifest(purchase) is None
+
+        manifest = resolve_and_cache(purchases, purchase)
+        assert manifest[0]["sha256"] == "aa"
+        assert cached(purchases, "b1")["photo_manifest"] == manifest
+
+    def test_other_photo_ids_are_rebuilt(self, purchases):
+        purchase = {"id": "b1", "event_id": "e1", "photo_ids": ["p1", "p2"],
+                    "photo_manifest": [], "photo_manifest_ids": ["p1"]}
+        assert photofind.cached_purchase_manifest(purchase) is None
+        assert len(resolve_and_cache(purchases, purchase)) == 2
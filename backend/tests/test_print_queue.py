@@ -0,0 +1,152 @@
+"""
+DNP Print Service - Print Queue Tests
+Tests for the persistent print queue using the file-sink backend (no printer required)
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "print_service"))
+
+from print_queue import PrintQueue, FileSinkBackend, STATUS_DONE, STATUS_FAILED
+
+
+def make_prepare(failures=None):
+    """Fake downloader: writes a dummy JPEG, fails `failures[url]` times first"""
+    failures = dict(failures or {})
+
+    def prepare(url, dest_path):
+        if failures.get(url, 0) > 0:
+            failures[url] -= 1
+            raise RuntimeError("network error")
+        with open(dest_path, "wb") as f:
+            f.write(b"\xff\xd8fake-jpeg")
+        return True
+
+    return prepare
+
+
+@pytest.fixture
+def queue_factory(tmp_path):
+    queues = []
+
+    def factory(failures=None, max_attempts=3, **options):
+        queue = PrintQueue(
+            str(tmp_path / "spool"),
+            FileSinkBackend(str(tmp_path / "sink")),
+            make_prepare(failures),
+            max_attempts=max_attempts,
+            **{"retry_delay": 0.01, **options}
+        )
+        queues.append(queue)
+        return queue
+
+    yield factory
+    for queue in queues:
+        queue.stop()
+
+
+class TestPrintQueue:
+    """Tests for job ids, retries and throughput stats"""
+
+    def test_batch_prints_all_copies(self, queue_factory, tmp_path):
+        """Every job of a batch is printed with its copies in the sink"""
+        queue = queue_factory()
+        batch_id, job_ids = queue.submit_batch([
+            {"url": "http://kiosk/a.jpg", "copies": 1},
+            {"url": "http://kiosk/b.jpg", "copies": 2}
+        ])
+
+        jobs = queue.wait(job_ids, timeout=10)
+
+        assert len(set(job_ids)) == 2
+        assert all(job["batch_id"] == batch_id for job in jobs)
+        assert all(job["status"] == STATUS_DONE for job in jobs)
+        assert len(os.listdir(tmp_path / "sink")) == 3
+        print("PASS: Batch printed with per-job ids")
+
+    def test_transient_download_failure_is_retried(self, queue_factory):
+        """A failed download is retried for that job only"""
+        queue = queue_factory(failures={"http://kiosk/flaky.jpg": 1})
+        _, job_ids = queue.submit_batch([{"url": "http://kiosk/flaky.jpg"}, {"url": "http://kiosk/ok.jpg"}])
+
+        jobs = queue.wait(job_ids, timeout=10)
+
+        assert [job["status"] for job in jobs] == [STATUS_DONE, STATUS_DONE]
+        assert jobs[0]["attempts"] == 1
+        print("PASS: Transient failure retried")
+
+    def test_retry_backoff_does_not_hold_a_download_thread(self, queue_factory):
+        """Other jobs download while a failed one waits for its retry"""
+        queue = queue_factory(failures={"http://kiosk/flaky.jpg": 1}, prefetch_workers=1, retry_delay=1.0)
+        _, job_ids = queue.submit_batch([{"url": "http://kiosk/flaky.jpg"}, {"url": "http://kiosk/ok.jpg"}])
+
+        ok = queue.wait(job_ids[1:], timeout=0.8)[0]
+        assert ok["status"] == STATUS_DONE
+        assert queue.get_job(job_ids[0])["attempts"] == 1
+
+        assert queue.wait(job_ids[:1], timeout=10)[0]["status"] == STATUS_DONE
+        print("PASS: Backoff rescheduled without blocking the worker")
+
+    def test_failed_job_can_be_retried(self, queue_factory):
+        """A job failing all attempts is reported and can be retried alone"""
+        queue = queue_factory(failures={"http://kiosk/down.jpg": 2}, max_attempts=2)
+        job_id = queue.submit("http://kiosk/down.jpg")
+
+        job = queue.wait([job_id], timeout=10)[0]
+        assert job["status"] == STATUS_FAILED
+        assert job["error"]
+
+        assert queue.retry(job_id) is True
+        job = queue.wait([job_id], timeout=10)[0]
+        assert job["status"] == STATUS_DONE
+        print("PASS: Failed job retried individually")
+
+    def test_queue_survives_restart(self, queue_factory, tmp_path):
+        """Jobs are persisted in the spool database"""
+        queue = queue_factory()
+        job_id = queue.submit("http://kiosk/a.jpg")
+        queue.wait([job_id], timeout=10)
+        queue.stop()
+
+        reopened = queue_factory()
+        assert reopened.get_job(job_id)["status"] == STATUS_DONE
+        print("PASS: Queue persisted across restarts")
+
+    def test_status_reports_throughput(self, queue_factory):
+        """Status exposes counts and prints per minute"""
+        queue = queue_factory()
+        _, job_ids = queue.submit_batch([{"url": f"http://kiosk/{i}.jpg"} for i in range(3)])
+        queue.wait(job_ids, timeout=10)
+
+        status = queue.status()
+
+        assert status["counts"].get(STATUS_DONE) == 3
+        assert status["pending"] == 0
+        assert status["prints_per_minute"] > 0
+        assert status["backend"].startswith("file")
+        print(f"PASS: {status['prints_per_minute']} prints/min")
+
+    def test_batch_with_missing_url_adds_nothing(self, queue_factory):
+        """A batch is validated before any job is queued"""
+        queue = queue_factory()
+
+        with pytest.raises(ValueError):
+            queue.submit_batch([{"url": "http://kiosk/a.jpg"}, {"copies": 2}])
+
+        assert queue.status()["counts"] == {}
+        print("PASS: Invalid batch rejected as a whole")
+
+    def test_finished_jobs_are_pruned(self, queue_factory):
+        """Finished jobs older than the retention leave the spool database"""
+        queue = queue_factory(failures={"http://kiosk/down.jpg": 1}, max_attempts=1, retention=60)
+        done_id = queue.submit("http://kiosk/a.jpg")
+        failed_id = queue.submit("http://kiosk/down.jpg")
+        queue.wait([done_id, failed_id], timeout=10)
+
+        assert queue.prune() == 0
+        assert queue.prune(now=time.time() + 120) == 2
+        assert queue.get_job(done_id) is None and queue.get_job(failed_id) is None
+        print("PASS: Finished jobs pruned")
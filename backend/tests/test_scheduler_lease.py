@@ -0,0 +1,118 @@
+"""
+Scheduler lease tests
+Every worker starts the scheduler but only the lease holder runs jobs; each scheduled occurrence is
+claimed once in scheduler_runs, which also records duration and outcome.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import scheduler_service
+from services.scheduler_service import Lease, run_job, run_key, leader_only
+
+NOW = datetime(2026, 6, 12, 9, 0, 0, 250000, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def leases(db, monkeypatch):
+    """Points the scheduler at the test database; returns the leases collection"""
+    monkeypatch.setattr(scheduler_service, "db", db)
+    return db.scheduler_leases
+
+
+def find(collection, query=None):
+    return asyncio.run(collection.find(query or {}).to_list(None))
+
+
+class TestLease:
+    """One owner at a time, taken over only after expiry"""
+
+    def test_single_owner_until_expiry(self, leases):
+        collection = leases
+        worker_a = Lease(collection, "scheduler", "a", ttl=60)
+        worker_b = Lease(collection, "scheduler", "b", ttl=60)
+
+        async def scenario():
+            return [
+                await worker_a.acquire(NOW),
+                await worker_b.acquire(NOW + timedelta(seconds=10)),
+                await worker_a.acquire(NOW + timedelta(seconds=20)),  # renewal
+                await worker_b.acquire(NOW + timedelta(seconds=70)),  # still renewed by a
+                await worker_b.acquire(NOW + timedelta(seconds=81)),  # a stopped renewing
+            ]
+
+        assert asyncio.run(scenario()) == [True, False, True, False, True]
+        assert [lease["owner"] for lease in find(collection)] == ["b"]
+        assert not worker_a.held(NOW + timedelta(seconds=81))
+
+    def test_release_lets_another_worker_in(self, leases):
+        collection = leases
+        worker_a = Lease(collection, "scheduler", "a", ttl=60)
+        worker_b = Lease(collection, "scheduler", "b", ttl=60)
+
+        async def scenario():
+            await worker_a.acquire(NOW)
+            await worker_b.release()  # not the owner: no effect
+            blocked = await worker_b.acquire(NOW)
+            await worker_a.release()
+            return blocked, await worker_b.acquire(NOW)
+
+        assert asyncio.run(scenario()) == (False, True)
+
+
+class TestRunJob:
+    """Scheduled occurrences run once and are recorded"""
+
+    def test_occurrence_claimed_once_with_history(self, db, leases):
+        calls = []
+
+        async def job():
+            calls.append(1)
+            return {"sent": 2}
+
+        key = run_key("daily_sms_reminders", NOW)
+
+        async def scenario():
+            first = await run_job("daily_sms_reminders", job, trigger="schedule", run_key=key)
+            # Another worker (e.g. a new leader) firing the same minute
+            second = await run_job("daily_sms_reminders", job, trigger="schedule", run_key=key)
+            return first, second
+
+        assert asyncio.run(scenario()) == ({"sent": 2}, None)
+        assert calls == [1]
+        run, = find(db.scheduler_runs)
+        assert run["_id"] == key == "daily_sms_reminders:2026-06-12T09:00:00+00:00"
+        assert run["status"] == "success" and run["result"] == {"sent": 2}
+        assert run["duration_ms"] >= 0
+        # The job lock is released after the run
+        assert find(leases) == []
+
+    def test_failure_is_recorded(self, db, leases):
+        async def job():
+            raise RuntimeError("smtp down")
+
+        assert asyncio.run(run_job("daily_equipment_reminders", job)) is None
+        run, = find(db.scheduler_runs)
+        assert run["status"] == "failed" and run["error"] == "smtp down" and run["trigger"] == "manual"
+
+    def test_only_the_leader_runs_scheduled_jobs(self, leases, monkeypatch):
+        calls = []
+
+        async def job():
+            calls.append(1)
+
+        leader = Lease(leases, "scheduler", "me", ttl=60)
+        monkeypatch.setattr(scheduler_service, "leader", leader)
+        scheduled = leader_only("hourly_task_reminders", job)
+
+        asyncio.run(scheduled())
+        assert calls == []
+
+        asyncio.run(leader.acquire())
+        asyncio.run(scheduled())
+        assert calls == [1]
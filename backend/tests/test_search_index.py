@@ -0,0 +1,90 @@
+"""
+Search index tests
+Documents carry normalized tokens and trigrams; user input is normalized, bounded and escaped
+into anchored prefix / trigram clauses that Mongo can answer from multikey indexes.
+"""
+import asyncio
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search_index import (
+    normalize, search_keys, search_filter, query_terms, matches, backfill, MAX_TERMS, MAX_TERM_LENGTH,
+)
+
+CAMERA = search_keys("Boîtier Hybride", "Canon", "EOS R5", "SN-0042-XZ")
+
+
+def evaluate(query, document):
+    """Minimal evaluator for the filters produced by search_filter"""
+    if "$and" in query:
+        return all(evaluate(clause, document) for clause in query["$and"])
+    if "$or" in query:
+        return any(evaluate(clause, document) for clause in query["$or"])
+    if "search_tokens" in query:
+        pattern = re.compile(query["search_tokens"]["$regex"])
+        return any(pattern.search(token) for token in document["search_tokens"])
+    return set(query["search_grams"]["$all"]) <= set(document["search_grams"])
+
+
+class TestSearchKeys:
+    """Normalized keys stored with each document"""
+
+    def test_normalize_strips_case_accents_and_punctuation(self):
+        assert normalize("Boîtier  HYBRIDE / Élite-2") == "boitier hybride elite 2"
+        assert normalize(None) == ""
+
+    def test_tokens_grams_and_compact_references(self):
+        assert {"boitier", "canon", "eos", "r5", "eosr5", "sn0042xz"} <= set(CAMERA["search_tokens"])
+        assert {"bo", "oit"} & set(CAMERA["search_grams"]) == {"oit"}
+        assert CAMERA["search_text"] == "boitier hybride canon eos r5 sn 0042 xz"
+
+
+class TestSearchFilter:
+    """User input becomes bounded, escaped, index-friendly clauses"""
+
+    def test_prefix_and_infix_matches(self):
+        for search in ("can", "Canon eos", "eos-r5", "0042", "hybr boî"):
+            query = search_filter(search)
+            assert evaluate(query, CAMERA) and matches(CAMERA, search), search
+        assert not evaluate(search_filter("nikon"), CAMERA)
+
+    def test_trigram_candidates_are_checked(self):
+        # Every trigram of "abcde" exists, but in two different words: the index returns a candidate
+        # and the final check rejects it
+        document = search_keys("ABCD", "bcde")
+        assert evaluate(search_filter("abcde"), document)
+        assert not matches(document, "abcde")
+        assert matches(CAMERA, "EOSR5") and matches(CAMERA, "0042")
+
+    def test_input_is_escaped_and_bounded(self):
+        assert search_filter("   ") is None
+        assert search_filter(".*") is None
+        query = search_filter("(a+)+$ " * 3 + "x" * 500)
+        regexes = [c["search_tokens"]["$regex"] for c in query["$and"] if "search_tokens" in c] + \
+                  [c["$or"][0]["search_tokens"]["$regex"] for c in query["$and"] if "$or" in c]
+        assert all(r.startswith("^") and re.fullmatch(r"\^[0-9a-z]+", r) for r in regexes)
+        assert len(query_terms(" ".join(f"w{i}" for i in range(20)))) == MAX_TERMS
+        assert max(len(t) for t in query_terms("y" * 500)) == MAX_TERM_LENGTH
+
+
+class TestBackfill:
+    """Documents without keys get them, in batches, once"""
+
+    def test_missing_keys_are_added(self, db):
+        async def scenario():
+            await db.equipment.insert_many(
+                [{"name": f"Objectif {i}", "brand": "Sigma"} for i in range(5)]
+                + [{"name": "Déjà indexé", "brand": "Sony", **search_keys("Déjà indexé", "Sony")}]
+            )
+            first = await backfill(db.equipment, ("name", "brand"), batch_size=2)
+            second = await backfill(db.equipment, ("name", "brand"), batch_size=2)
+            return first, second, await db.equipment.find({}, {"_id": 0}).to_list(None)
+
+        first, second, documents = asyncio.run(scenario())
+        assert (first, second) == (5, 0)
+        assert all("search_text" in d for d in documents)
+        assert documents[2]["search_text"] == "objectif 2 sigma"
+        assert evaluate(search_filter("sigm"), documents[0])
@@ -0,0 +1,100 @@
+"""
+Signed media URL tests
+Gallery and PhotoFind APIs sign one URL per photo and size; the media route checks the HMAC
+and expiry only (no database) and refuses tampered, expired or out-of-tree paths.
+"""
+import os
+import sys
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services import file_delivery, signed_media
+from services.signed_media import sign_media_url, photo_urls, verify_media_signature, resolve_media_path
+from routes.media import router
+
+NOW = 1_700_000_000
+
+
+def parse(url):
+    parts = urlsplit(url)
+    size, path = parts.path[len("/api/media/"):].split("/", 1)
+    return size, unquote(path), dict(parse_qsl(parts.query))
+
+
+def check(url, now=NOW, **changes):
+    size, path, query = parse(url)
+    values = {"size": size, "path": path, **query, **changes}
+    return verify_media_signature(values["size"], values["path"], int(values["exp"]), values["sig"],
+                                  download=values.get("dl"), sha256=values.get("h"), now=now)
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    (root / "galleries").mkdir(parents=True)
+    (root / "clients").mkdir()
+    (root / "galleries" / "g_p_photo.jpg").write_bytes(b"\xff\xd8\xff" + b"x" * 64)
+    (root / "clients" / "contract.pdf").write_bytes(b"%PDF-1.7")
+    monkeypatch.setattr(signed_media, "UPLOADS_DIR", root)
+    monkeypatch.setattr(file_delivery, "FILE_DELIVERY", "python")
+    return root
+
+
+class TestSignature:
+    """Signing and stateless verification"""
+
+    def test_valid_until_expiry_and_stable_within_window(self):
+        url = sign_media_url("galleries/g_p_photo.jpg", "thumb", now=NOW)
+        _, _, query = parse(url)
+
+        assert check(url)
+        assert check(url, now=int(query["exp"]) - 1)
+        assert not check(url, now=int(query["exp"]) + 1)
+        assert sign_media_url("galleries/g_p_photo.jpg", "thumb", now=NOW + 60) == url
+
+    def test_tampering_is_rejected(self):
+        url = photo_urls("galleries/g_p_photo.jpg", sha256="ab" * 32, download="photo.jpg", now=NOW)["download"]
+
+        assert check(url)
+        assert not check(url, path="galleries/other.jpg")
+        assert not check(url, size="thumb")
+        assert not check(url, dl="other.jpg")
+        assert not check(url, sig="A" * 43)
+
+    def test_download_url_only_when_allowed(self):
+        assert set(photo_urls("galleries/a.jpg", now=NOW)) == {"thumb", "web"}
+        assert set(photo_urls("galleries/a.jpg", download="a.jpg", now=NOW)) == {"thumb", "web", "download"}
+
+    def test_only_signed_media_dirs_resolve(self, uploads):
+        assert resolve_media_path("galleries/g_p_photo.jpg") == (uploads / "galleries" / "g_p_photo.jpg").resolve()
+        assert resolve_media_path("clients/contract.pdf") is None
+        assert resolve_media_path("galleries/../clients/contract.pdf") is None
+        assert resolve_media_path("../secret.env") is None
+
+
+class TestMediaRoute:
+    """GET /api/media/{size}/{path}"""
+
+    def test_serves_signed_files_and_refuses_the_rest(self, uploads):
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        client = TestClient(app)
+
+        urls = photo_urls("galleries/g_p_photo.jpg", download="Mariage.jpg")
+        response = client.get(urls["thumb"])
+        assert response.status_code == 200
+        assert response.content == (uploads / "galleries" / "g_p_photo.jpg").read_bytes()
+        assert response.headers["cache-control"].startswith("private, max-age=")
+
+        download = client.get(urls["download"])
+        assert download.headers["content-disposition"] == 'attachment; filename="Mariage.jpg"'
+
+        assert client.get(urls["thumb"].replace("sig=", "sig=x")).status_code == 403
+        forged = sign_media_url("clients/contract.pdf")
+        assert client.get(forged).status_code == 404
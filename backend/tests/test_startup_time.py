@@ -0,0 +1,72 @@
+"""
+Startup time regression tests
+Importing the server in a fresh interpreter must stay under a time budget and must not
+pull the heavy dependencies that are only needed by a few endpoints (PDF, Rekognition,
+chatbot, MFA, QR codes, SMS).
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from scripts.importtime_report import parse, summarize
+
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 4000))
+DEFERRED_MODULES = [
+    "reportlab", "services.pdf_templates", "boto3", "botocore",
+    "emergentintegrations", "qrcode", "pyotp", "requests",
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+elapsed_ms = (time.perf_counter() - started) * 1000
+loaded = sorted({name.split(".")[0] if not name.startswith("services.") else name
+                 for name in sys.modules})
+print(json.dumps({"elapsed_ms": elapsed_ms, "loaded": loaded}))
+"""
+
+
+def run_probe():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestStartupTime:
+    """Import cost of the server module"""
+
+    def test_heavy_dependencies_are_deferred(self):
+        loaded = set(run_probe()["loaded"])
+        assert not loaded & set(DEFERRED_MODULES)
+
+    def test_import_stays_under_budget(self):
+        elapsed_ms = min(run_probe()["elapsed_ms"] for _ in range(2))
+        assert elapsed_ms < STARTUP_BUDGET_MS, f"import server: {elapsed_ms:.0f} ms"
+
+
+class TestImportTimeReport:
+    """Parsing of python -X importtime output"""
+
+    def test_summary_ranks_modules_and_packages(self):
+        output = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 |     motor.core",
+            "import time:       400 |        500 |   motor",
+            "import time:      1000 |       1000 |     fastapi.routing",
+            "import time:       200 |       1200 |   fastapi",
+            "import time:        50 |       1750 | server",
+        ])
+        summary = summarize(parse(output), top=2)
+
+        assert summary["total_ms"] == 1.75
+        assert summary["modules"] == 5
+        assert [e[0] for e in summary["by_cumulative"]] == ["server", "fastapi"]
+        assert [e[0] for e in summary["by_self"]] == ["fastapi.routing", "motor"]
+        assert summary["by_package"] == [("fastapi", 1200), ("motor", 500)]
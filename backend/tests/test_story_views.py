@@ -0,0 +1,123 @@
+"""
+Story view counter tests
+A view is an idempotent upsert keyed by story, viewer and day; per-story counters are kept with $inc
+so the admin statistics are a direct read.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import story_views
+
+DAY = datetime(2026, 6, 12, 10, 0, tzinfo=timezone.utc)
+
+
+def documents(db, collection):
+    return {d["_id"]: d for d in asyncio.run(db[collection].find().to_list(None))}
+
+
+def view(db, story="s1", client=None, ip="10.0.0.1", when=DAY):
+    return asyncio.run(story_views.record_view(db, story, client, client and f"Client {client}", ip, now=when))
+
+
+class TestRecordView:
+    """One view per viewer and day; counters follow"""
+
+    def test_daily_dedup_and_counters(self, db):
+        assert view(db) is True
+        assert view(db, when=DAY + timedelta(hours=5)) is False  # same visitor, same day
+        assert view(db, ip="10.0.0.2") is True
+        assert view(db, client="c1") is True
+        assert view(db, client="c1", ip="10.0.0.9") is False  # the client, not the IP, identifies the viewer
+        assert view(db, when=DAY + timedelta(days=1)) is True  # back the next day: a view, not a new viewer
+
+        stats = documents(db, story_views.STATS_COLLECTION)["s1"]
+        assert (stats["total"], stats["unique"], stats["clients"], stats["anonymous"]) == (4, 3, 1, 2)
+        views = documents(db, story_views.VIEWS_COLLECTION)
+        assert len(views) == 4 and all("expires_at" in doc for doc in views.values())
+
+    def test_anonymous_key_is_per_story(self):
+        assert story_views.viewer_key("s1", client_ip="1.2.3.4") != story_views.viewer_key("s2", client_ip="1.2.3.4")
+        assert story_views.viewer_key("s1", client_id="c1") == ("c:c1", None)
+
+
+class TestStats:
+    """Admin statistics read the counters"""
+
+    def test_story_and_all_stories(self, db, queries):
+        view(db, client="c1")
+        view(db, client="c2", when=DAY - timedelta(hours=1))
+        view(db)
+
+        stats = asyncio.run(story_views.get_story_stats(db, "s1"))
+        assert stats["total_views"] == 3 and stats["unique_views"] == 3 and stats["anonymous_views"] == 1
+        assert [c["name"] for c in stats["client_views"]] == ["Client c2", "Client c1"]
+
+        reads = len(queries)
+        everything = asyncio.run(story_views.get_all_stats(db, ["s1", "s2"]))
+        assert everything == {"s1": {"total": 3, "clients": 2, "anonymous": 1},
+                              "s2": {"total": 0, "clients": 0, "anonymous": 0}}
+        assert [q[:2] for q in queries[reads:]] == [(story_views.STATS_COLLECTION, "find")]
+
+
+class TestMigration:
+    """Views recorded before the counters are grouped once; existing viewers are kept"""
+
+    def test_legacy_views_become_viewers_and_counters(self, db):
+        legacy = [
+            {"story_id": "s1", "viewer_type": "client", "viewer_id": "c1", "viewer_name": "Old name",
+             "viewed_at": "2026-06-01T10:00:00"},
+            {"story_id": "s1", "viewer_type": "client", "viewer_id": "c1", "viewer_name": "Client c1",
+             "viewed_at": "2026-06-03T10:00:00"},
+            {"story_id": "s1", "viewer_type": "anonymous", "ip_hash": "abc", "viewed_at": "2026-06-02T10:00:00"},
+            {"story_id": "s2", "viewer_type": "client", "viewer_id": "c2", "viewer_name": "Client c2",
+             "viewed_at": "2026-06-02T08:00:00"},
+        ]
+        asyncio.run(db[story_views.VIEWS_COLLECTION].insert_many(legacy))
+        # Written by an interrupted run (viewers grouped, counters not yet): kept as is
+        asyncio.run(db[story_views.VIEWERS_COLLECTION].insert_one({
+            "_id": "s2:c:c2", "story_id": "s2", "viewer_type": "client", "viewer_id": "c2",
+            "first_viewed_at": "2026-05-30T08:00:00", "last_viewed_at": "2026-06-02T08:00:00", "views": 5
+        }))
+
+        assert asyncio.run(story_views.migrate_legacy_views(db)) == 2
+        assert asyncio.run(story_views.migrate_legacy_views(db)) == 0
+
+        viewers = documents(db, story_views.VIEWERS_COLLECTION)
+        client = viewers["s1:c:c1"]
+        assert (client["views"], client["viewer_name"]) == (2, "Client c1")
+        assert (client["first_viewed_at"], client["last_viewed_at"]) == ("2026-06-01T10:00:00", "2026-06-03T10:00:00")
+        assert viewers["s1:a:abc"]["views"] == 1
+        assert (viewers["s2:c:c2"]["first_viewed_at"], viewers["s2:c:c2"]["views"]) == ("2026-05-30T08:00:00", 5)
+
+        stats = documents(db, story_views.STATS_COLLECTION)
+        assert {k: v for k, v in stats["s1"].items() if k != "last_viewed_at"} == {
+            "_id": "s1", "total": 3, "unique": 2, "clients": 1, "anonymous": 1}
+        assert (stats["s2"]["total"], stats["s2"]["unique"]) == (5, 1)
+
+
+class TestRoute:
+    """POST /stories/{id}/view identifies the client from its token"""
+
+    def test_client_token(self, db, monkeypatch):
+        import server
+        monkeypatch.setattr(server, "db", db)
+        asyncio.run(db.portfolio.insert_one({"id": "s1", "media_type": "story"}))
+        asyncio.run(db.clients.insert_one({"id": "c1", "name": "Alice"}))
+        request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.1"))
+
+        def record(token):
+            return asyncio.run(server.record_story_view("s1", request, client_token=token))["new_view"]
+
+        assert record(server.create_token("c1", "client")) is True
+        assert record("not-a-token") is True  # an invalid token counts as an anonymous view
+        assert record(server.create_token("c1", "client")) is False
+
+        stats = asyncio.run(story_views.get_story_stats(db, "s1"))
+        assert (stats["total_views"], stats["anonymous_views"]) == (2, 1)
+        assert [c["name"] for c in stats["client_views"]] == ["Alice"]
+        assert documents(db, story_views.STATS_COLLECTION)["s1"]["clients"] == 1
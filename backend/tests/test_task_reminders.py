@@ -0,0 +1,115 @@
+"""
+Task reminder pipeline tests
+Reminders are materialized with a precomputed fire_on date; the job reads only today's reminders,
+resolves tasks and recipients with one $in query each and marks everything with bulk writes.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.task_reminders import reminder_docs, build_messages, send_due_reminders, backfill
+
+TASK = {
+    "id": "t1", "title": "Montage clip", "due_date": "2026-06-15", "priority": "high", "status": "pending",
+    "assigned_to": ["u1", "u2", "u3"],
+    "reminders": [
+        {"days_before": 1, "enabled": True, "sent": False},
+        {"days_before": 3, "enabled": True, "sent": True},
+        {"days_before": 0, "enabled": False, "sent": False},
+    ],
+}
+
+
+class TestReminderDocs:
+    """Only enabled, unsent reminders are materialized with their fire date"""
+
+    def test_fire_on_is_precomputed(self):
+        assert reminder_docs(TASK) == [{
+            "_id": "t1:1", "task_id": "t1", "days_before": 1, "fire_on": "2026-06-14", "sent": False
+        }]
+        assert reminder_docs({**TASK, "due_date": None}) == []
+
+
+def seed(db, reminders=(), tasks=(), users=()):
+    async def run():
+        for name, docs in (("task_reminders", reminders), ("tasks", tasks), ("team_users", users)):
+            if docs:
+                await db[name].insert_many([dict(d) for d in docs])
+    asyncio.run(run())
+
+
+class TestSendDueReminders:
+    """One query per collection, one write per collection"""
+
+    def test_batched_lookups_and_bulk_marking(self, db, queries):
+        seed(
+            db,
+            reminders=[
+                {"_id": "t1:1", "task_id": "t1", "days_before": 1, "fire_on": "2026-06-14", "sent": False},
+                {"_id": "t2:0", "task_id": "t2", "days_before": 0, "fire_on": "2026-06-14", "sent": False},
+                {"_id": "t3:1", "task_id": "t3", "days_before": 1, "fire_on": "2026-06-20", "sent": False},
+            ],
+            tasks=[TASK, {**TASK, "id": "t2", "status": "completed"}],
+            users=[{"id": "u1", "name": "Léa", "email": "lea@example.com"}, {"id": "u2", "name": "Sans email"}],
+        )
+        sent_to = []
+
+        def send_email(to_email, subject, html):
+            sent_to.append(to_email)
+            return True
+
+        result = asyncio.run(send_due_reminders(db, send_email, today="2026-06-14", admin_email="admin@example.com"))
+
+        assert sorted(sent_to) == ["admin@example.com", "lea@example.com"]
+        assert result == {"reminders_sent": 2, "due": 2, "emails": 2}
+        # Recipients resolved with a single $in query, tasks with another
+        users_queries = [q for q in queries if q[0] == "team_users"]
+        assert len(users_queries) == 1 and set(users_queries[0][2]["id"]["$in"]) == {"u1", "u2", "u3"}
+        assert len([q for q in queries if q[0] == "tasks"]) == 1
+
+        async def state():
+            reminders = {r["_id"]: r["sent"] for r in await db.task_reminders.find().to_list(None)}
+            tasks = {t["id"]: t["reminders"][0] for t in await db.tasks.find().to_list(None)}
+            return reminders, tasks
+
+        reminders, tasks = asyncio.run(state())
+        # Both due reminders marked, including the completed task's
+        assert reminders == {"t1:1": True, "t2:0": True, "t3:1": False}
+        # Embedded flag updated only for the open task
+        assert tasks["t1"]["sent"] is True and "last_sent_at" in tasks["t1"]
+        assert tasks["t2"]["sent"] is False
+
+    def test_nothing_due(self, db, queries):
+        seed(db, tasks=[TASK])
+        assert asyncio.run(send_due_reminders(db, lambda *a: True, today="2026-06-14")) == {"reminders_sent": 0, "due": 0}
+        assert [q[0] for q in queries] == ["task_reminders"]
+
+    def test_messages_are_personalized(self):
+        messages = build_messages(
+            [{"task_id": "t1", "days_before": 1}], {"t1": TASK}, {"u1": {"name": "Léa", "email": "lea@example.com"}}
+        )
+        assert len(messages) == 1
+        assert "Bonjour Léa" in messages[0][2] and "dans 1 jour(s)" in messages[0][2]
+
+
+class TestBackfill:
+    """Open tasks created before the collection get their reminders, once"""
+
+    def test_materializes_open_tasks_only_once(self, db):
+        seed(db, tasks=[
+            TASK,
+            {**TASK, "id": "t2", "status": "completed"},
+            {**TASK, "id": "t3", "due_date": "bientôt"},
+            {**TASK, "id": "t4", "reminders": [{"days_before": 1, "enabled": True, "sent": True}]},
+        ])
+
+        async def scenario():
+            first = await backfill(db)
+            second = await backfill(db)
+            return first, second, await db.task_reminders.find({}, {"_id": 1, "fire_on": 1}).to_list(None)
+
+        first, second, docs = asyncio.run(scenario())
+        assert (first, second) == (1, 0)
+        assert docs == [{"_id": "t1:1", "fire_on": "2026-06-14"}]
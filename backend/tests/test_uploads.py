@@ -0,0 +1,115 @@
+"""
+Streaming upload writer tests
+Uploads are written to disk chunk by chunk with size and SHA-256 computed on the fly;
+size and type limits are enforced while streaming and a rejected upload leaves no file behind.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from services import media_store
+from services.uploads import save_upload, read_upload, sniff_type, IMAGE_TYPES, AUDIO_TYPES
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 40
+PDF = b"%PDF-1.7\n" + b"0" * 1000
+
+
+@pytest.fixture(autouse=True)
+def blob_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "BLOBS_DIR", tmp_path / ".blobs")
+
+
+class CountingFile(io.BytesIO):
+    """Records the largest read so tests can check memory stays bounded"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.largest_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.largest_read = max(self.largest_read, len(chunk))
+        return chunk
+
+
+def make_upload(data, filename="photo.jpg", content_type="image/jpeg"):
+    raw = CountingFile(data)
+    return UploadFile(file=raw, filename=filename, headers=Headers({"content-type": content_type})), raw
+
+
+class TestSaveUpload:
+    """save_upload streams to disk and enforces limits"""
+
+    def test_streams_in_chunks_with_hash_and_size(self, tmp_path):
+        upload, raw = make_upload(JPEG)
+        dest = tmp_path / "galleries" / "photo.jpg"
+
+        stored = asyncio.run(save_upload(upload, dest, max_size=1024 * 1024, allowed_types=IMAGE_TYPES,
+                                         chunk_size=1000))
+
+        assert dest.read_bytes() == JPEG
+        assert stored.size == len(JPEG)
+        assert stored.sha256 == hashlib.sha256(JPEG).hexdigest()
+        assert stored.content_type == "image/jpeg"
+        assert raw.largest_read <= 1000
+        assert list(dest.parent.iterdir()) == [dest]
+        assert media_store.refcount(stored.sha256) == 1
+
+    def test_size_limit_rejects_and_removes_partial_file(self, tmp_path):
+        upload, raw = make_upload(JPEG)
+
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(save_upload(upload, tmp_path / "photo.jpg", max_size=2000, chunk_size=1000))
+
+        assert error.value.status_code == 413
+        assert list(tmp_path.iterdir()) == []
+        assert raw.tell() <= 3000
+
+    def test_declared_type_and_real_content_are_checked(self, tmp_path):
+        declared, _ = make_upload(JPEG, filename="notes.txt", content_type="text/plain")
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(save_upload(declared, tmp_path / "a.jpg", allowed_types=IMAGE_TYPES))
+        assert error.value.status_code == 400
+
+        disguised, _ = make_upload(PDF, filename="photo.jpg", content_type="image/jpeg")
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(save_upload(disguised, tmp_path / "b.jpg", allowed_types=IMAGE_TYPES))
+        assert error.value.status_code == 400
+        assert list(tmp_path.iterdir()) == []
+
+    def test_audio_in_shared_container_is_accepted(self, tmp_path):
+        webm = b"\x1a\x45\xdf\xa3" + b"\x00" * 100
+        upload, _ = make_upload(webm, filename="voice.webm", content_type="audio/webm")
+
+        stored = asyncio.run(save_upload(upload, tmp_path / "voice.webm", allowed_types=AUDIO_TYPES))
+
+        assert stored.size == len(webm)
+
+
+class TestReadUpload:
+    """read_upload keeps small payloads in memory with a hard cap"""
+
+    def test_reads_within_limit_and_rejects_above(self):
+        upload, _ = make_upload(JPEG)
+        assert asyncio.run(read_upload(upload, max_size=len(JPEG), allowed_types=IMAGE_TYPES)) == JPEG
+
+        upload, _ = make_upload(JPEG)
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(read_upload(upload, max_size=len(JPEG) - 1, chunk_size=1000))
+        assert error.value.status_code == 413
+
+    def test_sniff_type(self):
+        assert sniff_type(JPEG) == "image/jpeg"
+        assert sniff_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+        assert sniff_type(b"\x00\x00\x00\x18ftypqt  ") == "video/quicktime"
+        assert sniff_type(b"\x00\x00\x00\x18ftypisom") == "video/mp4"
+        assert sniff_type(b"plain text") is None
@@ -3,13 +3,14 @@ Common dependencies for routes - Authentication, Database, etc.
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
 import jwt
 import os
 from datetime import datetime, timezone
 
+from database import db  # shared pool, see database.py
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,10 +22,6 @@ security = HTTPBearer()
 SECRET_KEY = os.environ.get('JWT_SECRET', 'creativindustry-secret-key-2024')
 ALGORITHM = "HS256"
 
-# Database connection
-mongo_client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-db = mongo_client[os.environ.get('DB_NAME', 'test_database')]
-
 
 def verify_token(token: str):
     """Verify JWT token and return payload"""
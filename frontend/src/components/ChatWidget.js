@@ -1,5 +1,4 @@
 import { useState, useEffect, useRef } from "react";
-import axios from "axios";
 import { motion, AnimatePresence } from "framer-motion";
 import { MessageCircle, X, Send } from "lucide-react";
 import { API } from "../config/api";
@@ -42,13 +41,37 @@ const ChatWidget = () => {
     setLoading(true);
 
     try {
-      const res = await axios.post(`${API}/chat`, {
-        session_id: sessionId,
-        message: userMessage
+      // Streamed reply (SSE): the assistant bubble fills in as the text arrives
+      const res = await fetch(`${API}/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ session_id: sessionId, message: userMessage })
       });
-      setMessages(prev => [...prev, { role: "assistant", content: res.data.response }]);
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      setMessages(prev => [...prev, { role: "assistant", content: "" }]);
+      const setReply = (content) => setMessages(prev => [...prev.slice(0, -1), { role: "assistant", content }]);
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let reply = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const dataLine = raw.split("\n").find(line => line.startsWith("data:"));
+          if (!dataLine) continue;
+          const event = JSON.parse(dataLine.slice(5));
+          reply = event.done ? event.response : reply + (event.delta || "");
+          setReply(reply);
+        }
+      }
     } catch (e) {
-      setMessages(prev => [...prev, {
+      setMessages(prev => [...prev.filter(m => m.content !== ""), {
         role: "assistant",
         content: "Désolé, je rencontre un problème. Veuillez nous contacter au +33 1 23 45 67 89"
       }]);
@@ -104,7 +127,7 @@ const ChatWidget = () => {
                   </div>
                 </div>
               ))}
-              {loading && (
+              {loading && messages[messages.length - 1]?.role === "user" && (
                 <div className="flex justify-start">
                   <div className="bg-white/10 px-4 py-2 text-sm text-white/60">
                     En train d'écrire...
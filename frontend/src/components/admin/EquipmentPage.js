@@ -18,6 +18,24 @@ import { API, BACKEND_URL } from "../../config/api";
 import SignaturePad from "../SignaturePad";
 import { OfflineIndicator } from "../../hooks/useOfflineEquipment";
 
+// Save a deployment; on a booking conflict (409) list the clashes and offer to save anyway
+const saveDeployment = async (request, payload) => {
+  try {
+    return await request(payload);
+  } catch (e) {
+    const conflicts = e.response?.status === 409 ? e.response.data?.detail?.conflicts : null;
+    if (!conflicts) throw e;
+    const lines = conflicts.map(c =>
+      `• ${c.equipment_name} : ${c.requested} demandé(s), ${c.available} libre(s)` +
+      (c.deployments?.length ? ` (${c.deployments.map(d => d.name).join(", ")})` : "")
+    );
+    if (!window.confirm(`Matériel déjà réservé sur cette période :\n${lines.join("\n")}\n\nEnregistrer quand même ?`)) {
+      return null;
+    }
+    return await request({ ...payload, force: true });
+  }
+};
+
 // Category icons map
 const CATEGORY_ICONS = {
   "Caméras": Camera,
@@ -656,9 +674,10 @@ function DeploymentModal({ equipment = [], onClose, onSave, categories = [] }) {
           quantity: qty
         }))
       };
-      await axios.post(`${API}/deployments`, payload, {
+      const saved = await saveDeployment(body => axios.post(`${API}/deployments`, body, {
         headers: { Authorization: `Bearer ${token}` }
-      });
+      }), payload);
+      if (!saved) return;
       toast.success("Déplacement créé");
       onSave();
     } catch (e) {
@@ -910,9 +929,10 @@ function EditDeploymentModal({ deployment, equipment = [], categories = [], onCl
           quantity: qty
         }))
       };
-      await axios.put(`${API}/deployments/${deployment.id}`, payload, {
+      const saved = await saveDeployment(body => axios.put(`${API}/deployments/${deployment.id}`, body, {
         headers: { Authorization: `Bearer ${token}` }
-      });
+      }), payload);
+      if (!saved) return;
       toast.success("Déplacement modifié");
       onSave();
     } catch (e) {
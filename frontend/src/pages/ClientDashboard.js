@@ -3092,9 +3092,10 @@ const ClientDashboard = () => {
                     >
                       <div className="aspect-square bg-black/50 overflow-hidden">
                         <img
-                          src={`${BACKEND_URL}${photo.url}`}
+                          src={`${BACKEND_URL}${photo.signed_urls?.thumb || photo.url}`}
                           alt={photo.filename}
                           className="w-full h-full object-cover"
+                          loading="lazy"
                         />
                       </div>
                       {!isValidated && (
@@ -3,7 +3,7 @@ import { useParams, useNavigate } from "react-router-dom";
 import axios from "axios";
 import { Loader, Move, Mouse, Maximize, Info, X, ChevronLeft, ChevronRight, ZoomIn, RotateCcw } from "lucide-react";
 import { toast } from "sonner";
-import { API } from "../config/api";
+import { API, BACKEND_URL } from "../config/api";
 
 export default function Gallery3DPage() {
   const { galleryId } = useParams();
@@ -26,7 +26,7 @@ export default function Gallery3DPage() {
         const prepared = (res.data.photos || []).slice(0, 30).map((p, i) => ({
           ...p,
           id: p.id || `photo-${i}`,
-          fullUrl: `${API}/public/galleries/${galleryId}/image/${p.id}`,
+          fullUrl: p.signed_urls ? `${BACKEND_URL}${p.signed_urls.web}` : `${API}/public/galleries/${galleryId}/image/${p.id}`,
           title: p.title || p.filename || `Photo ${i + 1}`
         }));
         
@@ -5,10 +5,60 @@ import { Camera, Mic, Video, Send, Loader, Heart, Play, Pause, StopCircle, Clock
 import { toast } from "sonner";
 import { API, BACKEND_URL } from "../config/api";
 
+// Poster / short preview first; the full recording is only fetched when the guest presses play
+const GuestbookMedia = ({ msg }) => {
+  const [full, setFull] = useState(false);
+  const fullUrl = `${BACKEND_URL}${msg.normalized_url || msg.media_url}`;
+
+  if (msg.message_type === "audio") {
+    return (
+      <div className="mt-2">
+        {msg.waveform?.length > 0 && (
+          <div className="flex items-center gap-px h-10 mb-2">
+            {msg.waveform.map((peak, i) => (
+              <span key={i} className="flex-1 bg-primary/60 rounded-sm" style={{ height: `${Math.max(4, peak)}%` }} />
+            ))}
+          </div>
+        )}
+        <audio src={fullUrl} controls preload="none" className="w-full" />
+      </div>
+    );
+  }
+
+  if (!full && msg.preview_url) {
+    return (
+      <video
+        src={`${BACKEND_URL}${msg.preview_url}`}
+        poster={msg.poster_url ? `${BACKEND_URL}${msg.poster_url}` : undefined}
+        autoPlay
+        muted
+        loop
+        playsInline
+        onClick={() => setFull(true)}
+        className="mt-2 w-full rounded-lg cursor-pointer"
+      />
+    );
+  }
+
+  return (
+    <video
+      src={fullUrl}
+      poster={msg.poster_url ? `${BACKEND_URL}${msg.poster_url}` : undefined}
+      controls
+      autoPlay={full}
+      preload="none"
+      className="mt-2 w-full rounded-lg"
+    />
+  );
+};
+
 const GuestbookPage = () => {
   const { guestbookId } = useParams();
   const [guestbook, setGuestbook] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [totalMessages, setTotalMessages] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   
@@ -38,7 +88,9 @@ const GuestbookPage = () => {
           axios.get(`${API}/public/guestbooks/${guestbookId}/messages`)
         ]);
         setGuestbook(gbRes.data);
-        setMessages(msgRes.data);
+        setMessages(msgRes.data.messages);
+        setTotalMessages(msgRes.data.total);
+        setNextCursor(msgRes.data.next_cursor);
       } catch (err) {
         setError("Ce livre d'or n'existe pas ou n'est plus disponible.");
       }
@@ -50,6 +102,20 @@ const GuestbookPage = () => {
     }
   }, [guestbookId]);
 
+  const loadMoreMessages = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await axios.get(`${API}/public/guestbooks/${guestbookId}/messages`, {
+        params: { cursor: nextCursor }
+      });
+      setMessages((prev) => [...prev, ...res.data.messages]);
+      setNextCursor(res.data.next_cursor);
+    } catch (err) {
+      toast.error("Impossible de charger plus de messages");
+    }
+    setLoadingMore(false);
+  };
+
   const startRecording = async () => {
     try {
       const constraints = messageType === "video" 
@@ -476,7 +542,7 @@ const GuestbookPage = () => {
       {messages.length > 0 && (
         <div className="max-w-2xl mx-auto px-4 py-8 border-t border-white/10">
           <h2 className="font-primary font-bold text-xl text-white mb-6 text-center">
-            Messages ({messages.length})
+            Messages ({totalMessages})
           </h2>
           <div className="space-y-4">
             {messages.map((msg) => (
@@ -490,17 +556,25 @@ const GuestbookPage = () => {
                     {msg.message_type === "text" && (
                       <p className="text-white/70 mt-1">{msg.text_content}</p>
                     )}
-                    {msg.message_type === "audio" && (
-                      <audio src={`${BACKEND_URL}${msg.media_url}`} controls className="mt-2 w-full" />
-                    )}
-                    {msg.message_type === "video" && (
-                      <video src={`${BACKEND_URL}${msg.media_url}`} controls className="mt-2 w-full rounded-lg" />
+                    {(msg.message_type === "audio" || msg.message_type === "video") && (
+                      <GuestbookMedia msg={msg} />
                     )}
                   </div>
                 </div>
               </div>
             ))}
           </div>
+          {nextCursor && (
+            <div className="text-center mt-6">
+              <button
+                onClick={loadMoreMessages}
+                disabled={loadingMore}
+                className="px-6 py-2 border border-white/20 text-white/80 rounded-lg hover:bg-white/10 disabled:opacity-50"
+              >
+                {loadingMore ? <Loader className="animate-spin inline" size={16} /> : "Voir plus de messages"}
+              </button>
+            </div>
+          )}
         </div>
       )}
 
@@ -27,19 +27,14 @@ const NewsPage = () => {
 
   const fetchPosts = async () => {
     try {
-      const res = await axios.get(`${API}/news`);
+      // The feed includes the "liked" flag of the authenticated client
+      const res = await axios.get(`${API}/news`, { headers });
       setPosts(res.data);
       
-      // Check liked status for each post if authenticated
       if (isAuthenticated) {
         const likedStatus = {};
         for (const post of res.data) {
-          try {
-            const likeRes = await axios.get(`${API}/news/${post.id}/liked`, { headers });
-            likedStatus[post.id] = likeRes.data.liked;
-          } catch {
-            likedStatus[post.id] = false;
-          }
+          likedStatus[post.id] = !!post.liked;
         }
         setLikedPosts(likedStatus);
       }
@@ -273,7 +273,7 @@ const PhotoFindDownloadPage = () => {
     }
     
     const link = document.createElement('a');
-    link.href = `${BACKEND_URL}${photo.url}`;
+    link.href = `${BACKEND_URL}${photo.signed_urls?.download || photo.url}`;
     link.setAttribute('download', photo.filename);
     link.setAttribute('target', '_blank');
     document.body.appendChild(link);
@@ -350,7 +350,7 @@ const PhotoFindDownloadPage = () => {
                     className="relative rounded-lg overflow-hidden border border-white/10"
                   >
                     <img
-                      src={`${BACKEND_URL}${photo.url}`}
+                      src={`${BACKEND_URL}${photo.signed_urls?.thumb || photo.url}`}
                       alt={`Photo ${index + 1}`}
                       className="w-full aspect-square object-cover blur-sm opacity-70"
                     />
@@ -445,7 +445,7 @@ const PhotoFindDownloadPage = () => {
                     className="relative group rounded-lg overflow-hidden border border-white/10"
                   >
                     <img
-                      src={`${BACKEND_URL}${photo.url}`}
+                      src={`${BACKEND_URL}${photo.signed_urls?.thumb || photo.url}`}
                       alt={`Photo ${index + 1}`}
                       className="w-full aspect-square object-cover"
                     />